@@ -3,7 +3,7 @@
 """
 
 from typing import Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Form, Query, HTTPException, status
 from pydantic import ValidationError
 
 from app.models.schemas import (
@@ -11,9 +11,31 @@ from app.models.schemas import (
     BubbleNoteResponse,
     ApiResponse,
     BubbleNoteListResponse,
+    GeniusLociRecordListResponse,
 )
 from app.services.bubble_service import bubble_service
-from app.core.database import get_nearby_bubbles, get_top_bubbles
+from app.core.database import (
+    db,
+    get_nearby_bubbles,
+    get_top_bubbles,
+    get_bubble_note_by_id,
+    get_bubble_genius_loci_records,
+    get_user_genius_loci_memories,
+    get_cache_stats,
+    get_rpc_status,
+    get_db_metrics,
+    get_write_queue_stats,
+)
+from app.utils.pagination import (
+    CURSOR_NEARBY,
+    CURSOR_RECORDS,
+    CURSOR_TOP,
+    decode_cursor,
+    split_page,
+    nearby_key,
+    records_key,
+    top_key,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -178,8 +200,11 @@ async def create_or_update_bubble_note_with_image(
     - longitude: 中心点经度
     - latitude: 中心点纬度
     - radius_km: 搜索半径 (公里), 默认 1.0
-    - limit: 返回数量限制, 默认 20
+    - limit: 每页数量, 默认 20
     - status: 状态筛选 (1-公开/2-私有), 默认全部
+    - cursor: 分页游标 (上一页响应中的 next_cursor), 不传表示第一页
+
+    结果按距离升序, 同距离按 id 升序
     """
 )
 async def get_nearby_bubbles_api(
@@ -187,7 +212,8 @@ async def get_nearby_bubbles_api(
     latitude: float,
     radius_km: float = 1.0,
     limit: int = 20,
-    status: Optional[int] = None
+    note_status: Optional[int] = Query(None, alias="status", description="状态筛选 (1-公开/2-私有)"),
+    cursor: Optional[str] = None
 ):
     """获取附近的气泡笔记"""
 
@@ -202,20 +228,27 @@ async def get_nearby_bubbles_api(
         if limit <= 0 or limit > 100:
             raise ValueError("返回数量必须在 (0, 100] 范围内")
 
-        # 查询附近气泡
+        # 游标绑定查询条件, 换了位置/半径/状态的游标视为无效
+        scope = [longitude, latitude, radius_km, note_status]
+        after = decode_cursor(cursor, CURSOR_NEARBY, scope)
+
+        # 查询附近气泡 (多取一条判断是否还有下一页)
         bubbles = await get_nearby_bubbles(
             longitude=longitude,
             latitude=latitude,
             radius_km=radius_km,
-            limit=limit,
-            status=status
+            limit=limit + 1,
+            status=note_status,
+            after=after
         )
+        bubbles, next_cursor = split_page(bubbles, limit, CURSOR_NEARBY, nearby_key, scope)
 
         return BubbleNoteListResponse(
             code=200,
             message="查询成功",
             data=bubbles,
-            total=len(bubbles)
+            total=len(bubbles),
+            next_cursor=next_cursor
         )
 
     except ValueError as e:
@@ -252,13 +285,17 @@ async def get_nearby_bubbles_api(
     获取权重最高的气泡笔记
 
     **参数:**
-    - limit: 返回数量限制, 默认 20
+    - limit: 每页数量, 默认 20
     - user_id: 用户 ID (可选), 如果指定则只返回该用户的笔记
+    - cursor: 分页游标 (上一页响应中的 next_cursor), 不传表示第一页
+
+    结果按权重降序, 同分按 id 降序
     """
 )
 async def get_top_bubbles_api(
     limit: int = 20,
-    user_id: Optional[int] = None
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
     """获取权重最高的 Top N 气泡"""
 
@@ -266,13 +303,173 @@ async def get_top_bubbles_api(
         if limit <= 0 or limit > 100:
             raise ValueError("返回数量必须在 (0, 100] 范围内")
 
-        bubbles = await get_top_bubbles(limit=limit, user_id=user_id)
+        scope = [user_id]
+        after = decode_cursor(cursor, CURSOR_TOP, scope)
+
+        bubbles = await get_top_bubbles(limit=limit + 1, user_id=user_id, after=after)
+        bubbles, next_cursor = split_page(bubbles, limit, CURSOR_TOP, top_key, scope)
 
         return BubbleNoteListResponse(
             code=200,
             message="查询成功",
             data=bubbles,
-            total=len(bubbles)
+            total=len(bubbles),
+            next_cursor=next_cursor
+        )
+
+    except ValueError as e:
+        logger.error(f"参数校验失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "code": 400,
+                "message": str(e),
+                "detail": None
+            }
+        )
+    except Exception as e:
+        logger.error(f"查询失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "code": 500,
+                "message": "服务器内部错误",
+                "detail": str(e)
+            }
+        )
+
+
+# ========================================
+# 查询 API: 地灵 AI 处理记录
+# ========================================
+
+def _decode_records_cursor(cursor: Optional[str], scope: list):
+    """解码地灵记录游标, 排序键须为 (process_time 字符串, id)"""
+    after = decode_cursor(cursor, CURSOR_RECORDS, scope)
+    if after is not None and not (
+        len(after) == 2 and isinstance(after[0], str) and isinstance(after[1], int)
+    ):
+        raise ValueError("分页游标无效")
+    return after
+
+
+@router.get(
+    "/note/{note_id}/records",
+    response_model=GeniusLociRecordListResponse,
+    summary="获取气泡笔记的地灵 AI 处理记录",
+    description="""
+    获取笔记作者自己的某条笔记下的地灵 AI 处理记录
+
+    **参数:**
+    - user_id: 用户 ID (须为笔记作者)
+    - limit: 每页数量, 默认 20
+    - cursor: 分页游标 (上一页响应中的 next_cursor), 不传表示第一页
+
+    结果按处理时间倒序, 同时间按 id 倒序
+    """
+)
+async def get_note_records_api(
+    note_id: int,
+    user_id: int,
+    limit: int = 20,
+    cursor: Optional[str] = None
+):
+    """获取气泡笔记的地灵 AI 处理记录"""
+
+    try:
+        if limit <= 0 or limit > 100:
+            raise ValueError("返回数量必须在 (0, 100] 范围内")
+
+        scope = [note_id]
+        after = _decode_records_cursor(cursor, scope)
+
+        note = await get_bubble_note_by_id(note_id)
+        if note is None or note.get("user_id") != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={
+                    "code": 404,
+                    "message": "笔记不存在或无权限查看",
+                    "detail": f"note_id={note_id}"
+                }
+            )
+
+        records = await get_bubble_genius_loci_records(note_id, limit=limit + 1, after=after)
+        records, next_cursor = split_page(records, limit, CURSOR_RECORDS, records_key, scope)
+
+        return GeniusLociRecordListResponse(
+            code=200,
+            message="查询成功",
+            data=records,
+            total=len(records),
+            next_cursor=next_cursor
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"参数校验失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "code": 400,
+                "message": str(e),
+                "detail": None
+            }
+        )
+    except Exception as e:
+        logger.error(f"查询失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "code": 500,
+                "message": "服务器内部错误",
+                "detail": str(e)
+            }
+        )
+
+
+@router.get(
+    "/user/{user_id}/records",
+    response_model=GeniusLociRecordListResponse,
+    summary="获取用户的地灵 AI 处理记录",
+    description="""
+    获取用户的地灵 AI 处理记录
+
+    **参数:**
+    - ai_process_type: AI 处理类型 (可选), 不传返回全部类型
+    - limit: 每页数量, 默认 20
+    - cursor: 分页游标 (上一页响应中的 next_cursor), 不传表示第一页
+
+    结果按处理时间倒序, 同时间按 id 倒序
+    """
+)
+async def get_user_records_api(
+    user_id: int,
+    ai_process_type: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+):
+    """获取用户的地灵 AI 处理记录"""
+
+    try:
+        if limit <= 0 or limit > 100:
+            raise ValueError("返回数量必须在 (0, 100] 范围内")
+
+        scope = [user_id, ai_process_type]
+        after = _decode_records_cursor(cursor, scope)
+
+        records = await get_user_genius_loci_memories(
+            user_id, ai_process_type=ai_process_type, limit=limit + 1, after=after
+        )
+        records, next_cursor = split_page(records, limit, CURSOR_RECORDS, records_key, scope)
+
+        return GeniusLociRecordListResponse(
+            code=200,
+            message="查询成功",
+            data=records,
+            total=len(records),
+            next_cursor=next_cursor
         )
 
     except ValueError as e:
@@ -352,5 +549,25 @@ async def health_check():
     """健康检查接口"""
     return {
         "status": "healthy",
-        "service": "bubble-note-api"
+        "service": "bubble-note-api",
+        "database": db.get_pool_stats(),
+        "rpc": get_rpc_status(),
+        "cache": get_cache_stats(),
+        "write_queue": get_write_queue_stats(),
+        "metrics": get_db_metrics(summary=True)
     }
+
+
+@router.get("/metrics", summary="数据库调用指标")
+async def db_metrics():
+    """
+    数据库调用指标
+
+    - operations: 按 database.py 函数汇总的耗时直方图 (按累计耗时降序)
+    - calls: 按 (函数, 表/RPC, HTTP 方法) 汇总的耗时直方图、返回行数、响应字节数与错误数
+    - slow_queries: 最近超过 DB_SLOW_QUERY_MS 的请求
+    """
+    metrics = get_db_metrics()
+    if metrics is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据库调用指标未开启 (DB_METRICS_ENABLED)")
+    return metrics
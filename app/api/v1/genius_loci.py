@@ -24,7 +24,7 @@ from app.services.genius_loci_service import (
     session_manager,
     archive_conversation
 )
-from app.core.database import get_ai_summary_by_bubble_id
+from app.core.database import get_ai_summary_by_bubble_id, get_rpc_status, get_db_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -168,7 +168,9 @@ async def health_check():
         "message": "地灵对话服务运行正常",
         "data": {
             "service": "genius-loci-chat",
-            "status": "active"
+            "status": "active",
+            "rpc": get_rpc_status(),
+            "metrics": get_db_metrics(summary=True)
         }
     }
 
@@ -278,7 +280,8 @@ async def end_session(request: EndSessionRequest):
                 session_id=session_id,
                 conversation=conversation,
                 gps_longitude=gps_longitude,
-                gps_latitude=gps_latitude
+                gps_latitude=gps_latitude,
+                emotion=session.get("emotion")
             )
         else:
             if not conversation:
@@ -0,0 +1,108 @@
+"""
+进程内缓存
+有界 LRU + TTL 缓存, 用于单条记录的读穿透缓存
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    有界 LRU + TTL 缓存
+
+    - 超过 max_entries 时淘汰最久未使用的条目, 内存有上界
+    - 条目超过 ttl_seconds 视为过期 (多进程部署下限制陈旧窗口)
+    - 只在事件循环线程中访问, 不加锁
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值的副本, 未命中或已过期则返回 None
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def set(self, key: Hashable, value: Dict[str, Any]) -> None:
+        """
+        写入缓存 (保存副本, 调用方后续修改不影响缓存)
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+        """
+        if self.max_entries <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除缓存条目"""
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中/未命中/淘汰计数与命中率
+        """
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,147 @@
+"""
+熔断器
+连续失败达到阈值后熔断一段时间, 期间调用方直接走降级路径;
+冷却结束后放行单个探测请求 (半开), 成功则恢复, 失败则继续熔断
+"""
+
+import time
+import logging
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    熔断器 (只在事件循环线程中访问, 不加锁)
+
+    用法:
+        if breaker.allow_request():
+            try:
+                result = await call()
+                breaker.record_success()
+            except Exception:
+                breaker.record_failure()
+            finally:
+                breaker.release()  # 调用被取消 (CancelledError) 时释放探测名额
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self._open_until = 0.0
+        self._probing = False
+
+        # 统计计数
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+
+    def allow_request(self) -> bool:
+        """
+        判断是否放行本次调用
+
+        Returns:
+            True 表示可以调用; False 表示熔断中, 应直接走降级路径
+        """
+        if self.state == STATE_CLOSED:
+            return True
+
+        if self.state == STATE_OPEN and time.monotonic() >= self._open_until:
+            self.state = STATE_HALF_OPEN
+            self._probing = False
+
+        # 半开状态只放行一个探测请求, 其余请求继续降级
+        if self.state == STATE_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        """记录一次成功调用"""
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != STATE_CLOSED:
+            logger.info(f"熔断器 {self.name} 探测成功, 恢复调用")
+        self.state = STATE_CLOSED
+        self._probing = False
+
+    def release(self) -> None:
+        """
+        结束本次调用 (在 finally 中调用)
+
+        调用被取消 (客户端断开/超时/退出, CancelledError 不是 Exception) 时既不记成功也不记失败,
+        半开状态下释放探测名额, 下一个请求重新探测; 已记录结果时为空操作
+        """
+        self._probing = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        """
+        记录一次失败调用
+
+        Args:
+            error: 失败原因 (用于健康检查展示)
+        """
+        self.failures += 1
+        self.consecutive_failures += 1
+        if error is not None:
+            self.last_error = str(error)
+
+        if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.trip(self.recovery_seconds)
+
+    def trip(self, recovery_seconds: Optional[float] = None, reason: Optional[str] = None) -> None:
+        """
+        立即熔断
+
+        Args:
+            recovery_seconds: 本次熔断时长, 默认使用 recovery_seconds
+            reason: 熔断原因
+        """
+        seconds = self.recovery_seconds if recovery_seconds is None else recovery_seconds
+        if reason is not None:
+            self.last_error = reason
+
+        if self.state != STATE_OPEN:
+            self.trips += 1
+            self.opened_at = time.time()
+            logger.warning(f"熔断器 {self.name} 打开 {seconds:.0f}s: {self.last_error}")
+
+        self.state = STATE_OPEN
+        self._open_until = time.monotonic() + seconds
+        self._probing = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态
+
+        Returns:
+            状态与计数
+        """
+        retry_in = max(self._open_until - time.monotonic(), 0.0) if self.state == STATE_OPEN else 0.0
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_in_seconds": round(retry_in, 1),
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "trips": self.trips,
+        }
@@ -0,0 +1,294 @@
+"""
+冷数据文件存储 (Parquet)
+把超过热数据窗口的地灵记录与已软删除的笔记按 月份/地理网格 写成 zstd 压缩的 Parquet 文件,
+保存在本地目录或 OSS (通过 OSS 的 S3 兼容接口访问)
+
+目录结构 (hive 风格, 可直接用 pyarrow.dataset / DuckDB 读取):
+    {table}/month=YYYY-MM/cell={列号}_{行号}/part-{run_id}.parquet
+
+- 文件写入后不再修改; 同一行可能因重试写入两次, 读取时按 id 去重
+- 每个文件按 (user_id, 时间列) 排序, 按 user_id / bubble_id 过滤时利用 row group 统计信息跳过无关数据,
+  远程存储只读取文件尾部元数据与命中的 row group
+- 依赖 pyarrow (可选依赖, 未安装时冷数据归档不可用)
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.utils.geo import tile_key
+from app.utils.time import parse_time, time_sort_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖, 未安装时 create_cold_store 返回 None
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 表 -> (分月使用的时间列, [(列名, 类型)]); 列与 database.py 的 *_DETAIL_COLUMNS 一致
+_TABLES: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    "genius_loci_record": ("process_time", [
+        ("id", "int64"),
+        ("bubble_id", "int64"),
+        ("user_id", "int64"),
+        ("ai_process_type", "int16"),
+        ("ai_result", "string"),
+        ("process_time", "timestamp"),
+        ("expire_time", "timestamp"),
+        ("is_effective", "int16"),
+        ("model_version", "string"),
+        ("gps_longitude", "float64"),
+        ("gps_latitude", "float64"),
+    ]),
+    "bubble_note": ("create_time", [
+        ("id", "int64"),
+        ("user_id", "int64"),
+        ("note_type", "int16"),
+        ("content", "string"),
+        ("image_urls", "string"),
+        ("gps_longitude", "float64"),
+        ("gps_latitude", "float64"),
+        ("status", "int16"),
+        ("emotion", "string"),
+        ("create_time", "timestamp"),
+        ("update_time", "timestamp"),
+        ("weight_score", "float64"),
+        ("is_valid", "int16"),
+    ]),
+}
+
+NO_CELL = "none"  # 没有经纬度的行
+
+
+def _arrow_type(name: str):
+    if name == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, name)()
+
+
+def month_of(moment: datetime) -> str:
+    """UTC 月份 (YYYY-MM)"""
+    moment = moment.astimezone(timezone.utc)
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+class ColdStore:
+    """Parquet 冷数据文件存储"""
+
+    def __init__(
+        self,
+        filesystem,
+        base_path: str,
+        cell_deg: float,
+        row_group_size: int,
+        list_ttl_seconds: float
+    ):
+        """
+        初始化
+
+        Args:
+            filesystem: pyarrow 文件系统 (本地或 S3 兼容)
+            base_path: 根目录 (S3 为 bucket/前缀)
+            cell_deg: 地理网格边长 (度)
+            row_group_size: 每个 row group 的行数
+            list_ttl_seconds: 文件列表缓存时间 (多实例部署时其他实例写入的文件在此时间内可见)
+        """
+        self.filesystem = filesystem
+        self.base_path = base_path.rstrip("/")
+        self.cell_deg = cell_deg
+        self.row_group_size = row_group_size
+        self.list_ttl_seconds = list_ttl_seconds
+
+        # 表 -> (列出时间, [(月份, 网格, 路径)])
+        self._files: Dict[str, Tuple[float, List[Tuple[str, str, str]]]] = {}
+
+        # 统计
+        self.files_written = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.files_read = 0
+        self.rows_read = 0
+
+    def cell_of(self, longitude: Optional[float], latitude: Optional[float]) -> str:
+        """坐标所在网格的目录名"""
+        if longitude is None or latitude is None:
+            return NO_CELL
+        column, row = tile_key(float(longitude), float(latitude), self.cell_deg)
+        return f"{column}_{row}"
+
+    # ========================================
+    # 写入
+    # ========================================
+
+    def write(self, table: str, rows: Iterable[Dict[str, Any]], run_id: str) -> List[str]:
+        """
+        按 月份/网格 分组写入 Parquet 文件 (同步执行, 在线程池中调用)
+
+        Args:
+            table: 表名 (genius_loci_record / bubble_note)
+            rows: 数据库中的行 (时间列为 ISO 字符串)
+            run_id: 本次写入的编号 (文件名的一部分, 同一表内不可重复)
+
+        Returns:
+            写入的文件路径列表
+        """
+        time_column, fields = _TABLES[table]
+        schema = pa.schema([(name, _arrow_type(kind)) for name, kind in fields])
+        time_columns = [name for name, kind in fields if kind == "timestamp"]
+
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for row in rows:
+            converted = {name: row.get(name) for name, _ in fields}
+            for name in time_columns:
+                converted[name] = parse_time(converted[name])
+            moment = converted[time_column] or datetime.now(timezone.utc)
+            key = (month_of(moment), self.cell_of(converted.get("gps_longitude"), converted.get("gps_latitude")))
+            groups.setdefault(key, []).append(converted)
+
+        written = []
+        for (month, cell), group in sorted(groups.items()):
+            data = pa.Table.from_pylist(group, schema=schema)
+            data = data.sort_by([("user_id", "ascending"), (time_column, "ascending")])
+
+            directory = f"{self.base_path}/{table}/month={month}/cell={cell}"
+            path = f"{directory}/part-{run_id}.parquet"
+            self.filesystem.create_dir(directory, recursive=True)
+            # 先写临时文件再改名, 读取方不会看到写了一半的文件 (列表只包含 .parquet 结尾的文件)
+            pq.write_table(
+                data, f"{path}.tmp", filesystem=self.filesystem,
+                compression="zstd", row_group_size=self.row_group_size
+            )
+            self.filesystem.move(f"{path}.tmp", path)
+
+            self.files_written += 1
+            self.rows_written += data.num_rows
+            self.bytes_written += self.filesystem.get_file_info(path).size or 0
+            written.append(path)
+
+        self._files.pop(table, None)
+        return written
+
+    # ========================================
+    # 读取
+    # ========================================
+
+    def read(
+        self,
+        table: str,
+        column: str,
+        value: int,
+        since: Optional[datetime] = None,
+        cells: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        读取某列等于给定值的全部归档行 (同步执行, 在线程池中调用)
+
+        Args:
+            table: 表名
+            column: 过滤列 (user_id / bubble_id 等整数列)
+            value: 过滤值
+            since: 只读取该时间所在月份及之后的文件
+            cells: 只读取这些网格的文件 (None 表示全部网格)
+
+        Returns:
+            按时间列倒序、id 倒序排列的行 (时间列为 ISO 字符串), 按 id 去重
+        """
+        time_column, fields = _TABLES[table]
+        time_columns = [name for name, kind in fields if kind == "timestamp"]
+        first_month = month_of(since) if since is not None else ""
+
+        rows: Dict[int, Dict[str, Any]] = {}
+        for month, cell, path in self._list(table):
+            if month < first_month or (cells is not None and cell not in cells):
+                continue
+            data = pq.read_table(path, filesystem=self.filesystem, filters=[(column, "=", value)], partitioning=None)
+            self.files_read += 1
+            self.rows_read += data.num_rows
+            for row in data.to_pylist():
+                for name in time_columns:
+                    if row[name] is not None:
+                        row[name] = row[name].isoformat()
+                rows.setdefault(row["id"], row)
+
+        return sorted(rows.values(), key=lambda row: (time_sort_key(row[time_column]), row["id"]), reverse=True)
+
+    def _list(self, table: str) -> List[Tuple[str, str, str]]:
+        """列出表的全部文件 (月份, 网格, 路径), 结果缓存 list_ttl_seconds 秒"""
+        cached = self._files.get(table)
+        if cached is not None and time.monotonic() - cached[0] < self.list_ttl_seconds:
+            return cached[1]
+
+        selector = pafs.FileSelector(f"{self.base_path}/{table}", recursive=True, allow_not_found=True)
+        files = []
+        for info in self.filesystem.get_file_info(selector):
+            if info.type != pafs.FileType.File or not info.path.endswith(".parquet"):
+                continue
+            parts = dict(
+                segment.split("=", 1) for segment in info.path.split("/") if segment.startswith(("month=", "cell="))
+            )
+            if "month" in parts and "cell" in parts:
+                files.append((parts["month"], parts["cell"], info.path))
+        files.sort(reverse=True)
+
+        self._files[table] = (time.monotonic(), files)
+        return files
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计
+
+        Returns:
+            写入/读取的文件数与行数
+        """
+        return {
+            "location": self.base_path,
+            "files_written": self.files_written,
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "files_read": self.files_read,
+            "rows_read": self.rows_read,
+        }
+
+
+def create_cold_store() -> Optional[ColdStore]:
+    """
+    按配置创建冷数据文件存储
+
+    Returns:
+        ColdStore, 未安装 pyarrow 或 OSS 配置不完整时返回 None
+    """
+    if pa is None:
+        logger.warning("未安装 pyarrow, 冷数据文件归档不可用 (pip install pyarrow)")
+        return None
+
+    if settings.COLD_ARCHIVE_TARGET == "oss":
+        if not all([settings.OSS_ACCESS_KEY_ID, settings.OSS_ACCESS_KEY_SECRET, settings.OSS_BUCKET_NAME]):
+            logger.warning("OSS 配置不完整, 冷数据文件归档不可用")
+            return None
+        # OSS 的 S3 兼容接口只支持虚拟主机风格的地址 (bucket.endpoint)
+        filesystem = pafs.S3FileSystem(
+            access_key=settings.OSS_ACCESS_KEY_ID,
+            secret_key=settings.OSS_ACCESS_KEY_SECRET,
+            endpoint_override=f"https://{settings.OSS_ENDPOINT}",
+            region=settings.OSS_ENDPOINT.split(".", 1)[0].removeprefix("oss-"),
+            force_virtual_addressing=True
+        )
+        base_path = f"{settings.OSS_BUCKET_NAME}/{settings.COLD_ARCHIVE_OSS_PREFIX.strip('/')}"
+    else:
+        filesystem = pafs.LocalFileSystem()
+        base_path = os.path.abspath(settings.COLD_ARCHIVE_DIR)
+
+    logger.info(f"冷数据文件存储: {settings.COLD_ARCHIVE_TARGET} ({base_path})")
+    return ColdStore(
+        filesystem,
+        base_path,
+        cell_deg=settings.COLD_ARCHIVE_CELL_DEG,
+        row_group_size=settings.COLD_ARCHIVE_ROW_GROUP_SIZE,
+        list_ttl_seconds=settings.COLD_ARCHIVE_LIST_TTL_SECONDS
+    )
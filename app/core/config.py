@@ -26,6 +26,138 @@ class Settings:
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+    # 存储后端 (supabase / memory / sqlite; 后两者无需网络, 用于压测与离线运行)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "data/genius_loci.sqlite3")
+    STORAGE_GRID_DEG: float = float(os.getenv("STORAGE_GRID_DEG", "0.01"))  # 本地后端网格索引边长 (度)
+
+    # 只读副本 (逗号分隔的 Supabase URL, 使用 SUPABASE_KEY; 可容忍复制延迟的匿名只读查询按延迟加权分配到健康副本)
+    SUPABASE_READ_URLS: list = [url.strip() for url in os.getenv("SUPABASE_READ_URLS", "").split(",") if url.strip()]
+    READ_REPLICA_PIN_SECONDS: float = float(os.getenv("READ_REPLICA_PIN_SECONDS", "2"))  # 本进程写入后多少秒内只读查询仍走主库
+    READ_REPLICA_HEALTH_SECONDS: float = float(os.getenv("READ_REPLICA_HEALTH_SECONDS", "10"))  # 健康检查间隔
+    READ_REPLICA_FAILURE_THRESHOLD: int = int(os.getenv("READ_REPLICA_FAILURE_THRESHOLD", "3"))  # 连续失败多少次后摘除
+    READ_REPLICA_RECOVERY_SECONDS: float = float(os.getenv("READ_REPLICA_RECOVERY_SECONDS", "30"))  # 摘除后多久重新探测
+
+    # 数据库线程池配置 (同步 Supabase 调用在该线程池中执行)
+    DB_MAX_WORKERS: int = int(os.getenv("DB_MAX_WORKERS", "16"))
+
+    # Supabase HTTP 连接池配置 (匿名/管理员客户端共享)
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "32"))
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "16"))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "60"))
+    SUPABASE_POOL_TIMEOUT: float = float(os.getenv("SUPABASE_POOL_TIMEOUT", "5"))
+    SUPABASE_HTTP2: bool = os.getenv("SUPABASE_HTTP2", "False").lower() == "true"
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    SUPABASE_CONNECT_TIMEOUT: float = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+    SUPABASE_CONNECT_RETRIES: int = int(os.getenv("SUPABASE_CONNECT_RETRIES", "1"))
+
+    # 单条笔记读穿透缓存 (LRU + TTL, MAX_ENTRIES=0 表示禁用)
+    NOTE_CACHE_MAX_ENTRIES: int = int(os.getenv("NOTE_CACHE_MAX_ENTRIES", "10000"))
+    NOTE_CACHE_TTL_SECONDS: float = float(os.getenv("NOTE_CACHE_TTL_SECONDS", "30"))
+
+    # 笔记最新对话总结投影 (写入总结时更新, 未命中查库后回填; 无总结的笔记负缓存到总结写入, MAX_ENTRIES=0 表示禁用)
+    SUMMARY_CACHE_MAX_ENTRIES: int = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "50000"))
+    SUMMARY_CACHE_TTL_SECONDS: float = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "300"))  # 其他进程写入的总结在此时间后可见
+
+    # 数据库调用指标 (按函数/表汇总延迟直方图, 见 /api/v1/bubbles/metrics)
+    DB_METRICS_ENABLED: bool = os.getenv("DB_METRICS_ENABLED", "True").lower() == "true"
+    DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "500"))  # 慢查询日志阈值, 0 表示不记录
+    DB_SLOW_QUERY_LOG_SIZE: int = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "50"))  # 保留最近的慢查询条数
+
+    # 附近查询地理瓦片缓存
+    GEO_TILE_CACHE_ENABLED: bool = os.getenv("GEO_TILE_CACHE_ENABLED", "True").lower() == "true"
+    GEO_TILE_DEG: float = float(os.getenv("GEO_TILE_DEG", "0.01"))  # 瓦片边长 (度), 约 1.1 公里
+    GEO_TILE_TTL_SECONDS: float = float(os.getenv("GEO_TILE_TTL_SECONDS", "15"))
+    GEO_TILE_MAX_TILES: int = int(os.getenv("GEO_TILE_MAX_TILES", "4096"))
+    GEO_TILE_MAX_ROWS: int = int(os.getenv("GEO_TILE_MAX_ROWS", "500"))  # 超过则视为热点瓦片, 不缓存
+    GEO_TILE_MAX_PER_QUERY: int = int(os.getenv("GEO_TILE_MAX_PER_QUERY", "16"))  # 半径过大时直接查库
+
+    # 附近查询 RPC 熔断 (连续失败达到阈值后直接走降级方案, 冷却后半开探测)
+    NEARBY_RPC_FAILURE_THRESHOLD: int = int(os.getenv("NEARBY_RPC_FAILURE_THRESHOLD", "3"))
+    NEARBY_RPC_RECOVERY_SECONDS: float = float(os.getenv("NEARBY_RPC_RECOVERY_SECONDS", "30"))
+    NEARBY_RPC_RECHECK_SECONDS: float = float(os.getenv("NEARBY_RPC_RECHECK_SECONDS", "300"))  # 函数不存在时的重新探测间隔
+
+    # 附近查询降级方案 (RPC 不可用时按边界框取候选, 本地计算距离)
+    NEARBY_FALLBACK_OVERFETCH: int = int(os.getenv("NEARBY_FALLBACK_OVERFETCH", "5"))  # 候选数 = limit x 倍数
+    NEARBY_FALLBACK_MAX_ROWS: int = int(os.getenv("NEARBY_FALLBACK_MAX_ROWS", "1000"))  # 单次候选上限
+
+    # 进程内空间索引 (开启后 nearby/top 查询直接由内存索引回答)
+    SPATIAL_INDEX_ENABLED: bool = os.getenv("SPATIAL_INDEX_ENABLED", "False").lower() == "true"
+    SPATIAL_INDEX_CELL_DEG: float = float(os.getenv("SPATIAL_INDEX_CELL_DEG", "0.01"))  # 网格边长 (度)
+    SPATIAL_INDEX_BATCH_SIZE: int = int(os.getenv("SPATIAL_INDEX_BATCH_SIZE", "5000"))  # 启动加载/增量同步每批行数
+    SPATIAL_INDEX_SYNC_SECONDS: float = float(os.getenv("SPATIAL_INDEX_SYNC_SECONDS", "30"))  # 增量同步间隔
+    SPATIAL_INDEX_REBUILD_RATIO: float = float(os.getenv("SPATIAL_INDEX_REBUILD_RATIO", "0.1"))  # 失效+未排序槽位比例超过则后台重建
+
+    # 并发读取合并 (nearby/top/AI 总结相同参数的并发查询共享一次数据库请求)
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "True").lower() == "true"
+
+    # 进程内 Top 排行榜 (全局榜启动时加载并定期对账, 用户榜首次查询时加载, 按 TTL 过期)
+    LEADERBOARD_ENABLED: bool = os.getenv("LEADERBOARD_ENABLED", "True").lower() == "true"
+    LEADERBOARD_SIZE: int = int(os.getenv("LEADERBOARD_SIZE", "1000"))  # 全局榜条数
+    LEADERBOARD_MIN_SIZE: int = int(os.getenv("LEADERBOARD_MIN_SIZE", "200"))  # 删除导致少于该条数时重新加载
+    LEADERBOARD_USER_SIZE: int = int(os.getenv("LEADERBOARD_USER_SIZE", "120"))  # 每个用户榜条数 (limit 上限 100, 预留余量)
+    LEADERBOARD_MAX_USERS: int = int(os.getenv("LEADERBOARD_MAX_USERS", "2000"))
+    LEADERBOARD_USER_TTL_SECONDS: float = float(os.getenv("LEADERBOARD_USER_TTL_SECONDS", "60"))
+    LEADERBOARD_RECONCILE_SECONDS: float = float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "60"))  # 全局榜对账间隔
+
+    # 批量写入 (每个插入请求的最大行数) 与写入队列 (逐条写入按批合并, 达到批大小或等待 FLUSH_SECONDS 后刷新)
+    BULK_INSERT_CHUNK_SIZE: int = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "500"))
+    WRITE_BEHIND_ENABLED: bool = os.getenv("WRITE_BEHIND_ENABLED", "True").lower() == "true"  # 地灵记录
+    WRITE_BEHIND_NOTES_ENABLED: bool = os.getenv("WRITE_BEHIND_NOTES_ENABLED", "False").lower() == "true"  # 笔记创建
+    WRITE_BEHIND_FLUSH_SECONDS: float = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.2"))
+    WRITE_BEHIND_MAX_PENDING: int = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))  # 积压上限, 达到后写入方等待
+    WRITE_BEHIND_MAX_RETRIES: int = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+    WRITE_BEHIND_BACKOFF_SECONDS: float = float(os.getenv("WRITE_BEHIND_BACKOFF_SECONDS", "0.5"))  # 重试等待, 每次翻倍
+    WRITE_BEHIND_BACKOFF_MAX_SECONDS: float = float(os.getenv("WRITE_BEHIND_BACKOFF_MAX_SECONDS", "10"))
+    WRITE_BEHIND_SHUTDOWN_SECONDS: float = float(os.getenv("WRITE_BEHIND_SHUTDOWN_SECONDS", "30"))  # 关闭时写入积压的最长等待
+
+    # weight_score 批量计算 (INTERVAL_SECONDS > 0 时在服务内定时增量计算, 也可用命令行单独运行)
+    WEIGHT_SCORE_BATCH_SIZE: int = int(os.getenv("WEIGHT_SCORE_BATCH_SIZE", "500"))
+    WEIGHT_SCORE_HALF_LIFE_DAYS: float = float(os.getenv("WEIGHT_SCORE_HALF_LIFE_DAYS", "7"))  # 修改后需全量重算
+    WEIGHT_SCORE_INTERVAL_SECONDS: float = float(os.getenv("WEIGHT_SCORE_INTERVAL_SECONDS", "0"))
+
+    # 冷数据归档 (软删除笔记与过期地灵记录移到冷数据表, 需执行迁移 004; INTERVAL_SECONDS > 0 时在服务内定时运行)
+    COMPACTION_INTERVAL_SECONDS: float = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "0"))
+    COMPACTION_BATCH_SIZE: int = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+    COMPACTION_MAX_ROWS_PER_SECOND: float = float(os.getenv("COMPACTION_MAX_ROWS_PER_SECOND", "2000"))  # <= 0 不限速
+    COMPACTION_MAX_ROWS_PER_RUN: int = int(os.getenv("COMPACTION_MAX_ROWS_PER_RUN", "100000"))
+    COMPACTION_GRACE_SECONDS: float = float(os.getenv("COMPACTION_GRACE_SECONDS", "86400"))  # 软删除后保留多久再归档
+
+    # genius_loci_record 按月分区 (需执行迁移 006; 分区维护随冷数据归档任务运行)
+    RECORD_PARTITION_MONTHS_AHEAD: int = int(os.getenv("RECORD_PARTITION_MONTHS_AHEAD", "3"))  # 提前创建的月份分区数
+    RECORD_RETENTION_MONTHS: int = int(os.getenv("RECORD_RETENTION_MONTHS", "0"))  # 保留的整月数 (另加当月), 0 表示永久保留
+
+    # 冷数据文件归档 (旧地灵记录与软删除笔记写成 Parquet 文件后从数据库删除, 依赖 pyarrow; INTERVAL_SECONDS > 0 时在服务内定时运行)
+    COLD_ARCHIVE_ENABLED: bool = os.getenv("COLD_ARCHIVE_ENABLED", "False").lower() == "true"
+    COLD_ARCHIVE_INTERVAL_SECONDS: float = float(os.getenv("COLD_ARCHIVE_INTERVAL_SECONDS", "0"))
+    COLD_ARCHIVE_AFTER_DAYS: float = float(os.getenv("COLD_ARCHIVE_AFTER_DAYS", "365"))  # 超过多少天的记录/软删除笔记归档
+    COLD_ARCHIVE_TARGET: str = os.getenv("COLD_ARCHIVE_TARGET", "local")  # local / oss
+    COLD_ARCHIVE_DIR: str = os.getenv("COLD_ARCHIVE_DIR", "data/cold_archive")  # TARGET=local 时的目录
+    COLD_ARCHIVE_OSS_PREFIX: str = os.getenv("COLD_ARCHIVE_OSS_PREFIX", "cold_archive")  # TARGET=oss 时 bucket 内的前缀
+    COLD_ARCHIVE_CELL_DEG: float = float(os.getenv("COLD_ARCHIVE_CELL_DEG", "1.0"))  # 文件按地理网格分目录的网格边长 (度)
+    COLD_ARCHIVE_BATCH_SIZE: int = int(os.getenv("COLD_ARCHIVE_BATCH_SIZE", "1000"))  # 每次从数据库读取/删除的行数
+    COLD_ARCHIVE_FILE_ROWS: int = int(os.getenv("COLD_ARCHIVE_FILE_ROWS", "50000"))  # 累积多少行写一批文件
+    COLD_ARCHIVE_ROW_GROUP_SIZE: int = int(os.getenv("COLD_ARCHIVE_ROW_GROUP_SIZE", "10000"))
+    COLD_ARCHIVE_MAX_ROWS_PER_RUN: int = int(os.getenv("COLD_ARCHIVE_MAX_ROWS_PER_RUN", "500000"))
+    COLD_ARCHIVE_QUERY_THROUGH: bool = os.getenv("COLD_ARCHIVE_QUERY_THROUGH", "True").lower() == "true"  # 列表接口补读归档
+    COLD_ARCHIVE_LIST_TTL_SECONDS: float = float(os.getenv("COLD_ARCHIVE_LIST_TTL_SECONDS", "60"))  # 文件列表缓存
+    COLD_ARCHIVE_CACHE_ENTRIES: int = int(os.getenv("COLD_ARCHIVE_CACHE_ENTRIES", "1000"))  # 按用户/笔记缓存的归档行
+    COLD_ARCHIVE_CACHE_TTL_SECONDS: float = float(os.getenv("COLD_ARCHIVE_CACHE_TTL_SECONDS", "600"))
+
+    # 地灵记忆网格索引 (首次对话按网格查找最近记忆, 空网格负缓存, MAX_ENTRIES=0 表示禁用)
+    MEMORY_INDEX_MAX_ENTRIES: int = int(os.getenv("MEMORY_INDEX_MAX_ENTRIES", "50000"))
+    MEMORY_INDEX_CELL_DEG: float = float(os.getenv("MEMORY_INDEX_CELL_DEG", "0.01"))  # 网格边长 (度)
+    MEMORY_INDEX_RADIUS_KM: float = float(os.getenv("MEMORY_INDEX_RADIUS_KM", "1.0"))  # 网格检索范围向外扩展的半径
+    MEMORY_INDEX_TTL_SECONDS: float = float(os.getenv("MEMORY_INDEX_TTL_SECONDS", "300"))
+    MEMORY_INDEX_NEGATIVE_TTL_SECONDS: float = float(os.getenv("MEMORY_INDEX_NEGATIVE_TTL_SECONDS", "60"))  # 空网格
+    MEMORY_INDEX_DEPTH: int = int(os.getenv("MEMORY_INDEX_DEPTH", "20"))  # 每个网格缓存的候选记忆数
+    MEMORY_LOOKBACK_DAYS: float = float(os.getenv("MEMORY_LOOKBACK_DAYS", "0"))  # 只检索最近多少天的记忆, 0 表示不限制
+
+    # 首次对话记忆排序与注入 (候选记忆按距离/时间/情感/多样性本地打分)
+    MEMORY_CONTEXT_MAX_ITEMS: int = int(os.getenv("MEMORY_CONTEXT_MAX_ITEMS", "3"))
+    MEMORY_CONTEXT_CHAR_BUDGET: int = int(os.getenv("MEMORY_CONTEXT_CHAR_BUDGET", "600"))  # 注入 system_context 的记忆总字数上限
+    MEMORY_RECENCY_HALF_LIFE_DAYS: float = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_DAYS", "30"))
+
     # 阿里云 OSS 配置
     OSS_ACCESS_KEY_ID: str = os.getenv("OSS_ACCESS_KEY_ID", "")
     OSS_ACCESS_KEY_SECRET: str = os.getenv("OSS_ACCESS_KEY_SECRET", "")
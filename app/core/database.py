@@ -1,71 +1,726 @@
 """
-Supabase 数据库连接
+数据库访问层
+全部查询通过存储后端 db 执行 (Supabase / 内存 / SQLite, 见 app/core/storage)
 """
 
-from typing import Optional, List, Dict, Any
-from supabase import create_client, Client
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
+import httpx
+from supabase import Client
+from postgrest.exceptions import APIError
 import logging
 
 from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.circuit_breaker import CircuitBreaker, STATE_CLOSED
+from app.core.cold_store import ColdStore, create_cold_store
+from app.core.geo_cache import GeoTileCache
+from app.core.leaderboard import Leaderboard
+from app.core.metrics import query_metrics, instrumented
+from app.core.memory_index import PlaceMemoryIndex
+from app.core.singleflight import SingleFlight
+from app.core.spatial_index import SpatialIndex
+from app.core.storage import create_backend
+from app.core.storage.schema import retention_cutoff
+from app.core.write_behind import PartialWriteError, WriteBehindQueue
+from app.utils.geo import DISTANCE_EPSILON_M, BBox, DistanceKey, bounding_box, rank_by_distance, within_radius
+from app.utils.pagination import keyset_filter
+from app.utils.time import parse_time, time_sort_key
 
 logger = logging.getLogger(__name__)
 
 
-class Database:
-    """数据库连接类 (单例模式)"""
+# 全局数据库实例 (存储后端由 STORAGE_BACKEND 选择)
+db = create_backend(settings.STORAGE_BACKEND)
 
-    _instance = None
-    _initialized = False
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+# ========================================
+# 只读副本健康检查
+# ========================================
+
+_replica_health_task: Optional[asyncio.Task] = None
+
+
+async def _probe_read_replicas() -> None:
+    """探测全部只读副本 (摘除中的副本在恢复等待期过后才探测)"""
+    loop = asyncio.get_running_loop()
+    for endpoint in db.read_router.endpoints:
+        if not endpoint.healthy and not endpoint.breaker.allow_request():
+            continue
+        query = endpoint.client.table("bubble_note").select("id").limit(1)
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(db.executor, query.execute)
+            db.read_router.record_success(endpoint, (time.perf_counter() - start) * 1000.0)
+        except Exception as e:
+            db.read_router.record_failure(endpoint, e)
+        finally:
+            endpoint.breaker.release()
+
+
+async def _run_replica_health() -> None:
+    """只读副本健康检查后台任务"""
+    while True:
+        try:
+            await _probe_read_replicas()
+        except Exception as e:
+            logger.error(f"只读副本健康检查失败: {e}")
+        await asyncio.sleep(settings.READ_REPLICA_HEALTH_SECONDS)
+
+
+def start_read_replicas() -> None:
+    """启动只读副本健康检查 (应用启动时调用, 未配置副本时为空操作)"""
+    global _replica_health_task
+    if db.read_router.endpoints and _replica_health_task is None:
+        _replica_health_task = asyncio.create_task(_run_replica_health())
+
+
+async def stop_read_replicas() -> None:
+    """停止只读副本健康检查 (应用退出时调用)"""
+    global _replica_health_task
+    if _replica_health_task is not None:
+        _replica_health_task.cancel()
+        try:
+            await _replica_health_task
+        except asyncio.CancelledError:
+            pass
+        _replica_health_task = None
+
+
+# ========================================
+# 查询列投影
+# ========================================
+
+# 笔记完整详情 (全部标量列, 不含体积较大的 location 地理列)
+BUBBLE_DETAIL_COLUMNS = (
+    "id,user_id,note_type,content,image_urls,gps_longitude,gps_latitude,"
+    "status,emotion,create_time,update_time,weight_score,is_valid"
+)
+# 列表卡片 (nearby/top 列表, BubbleNoteResponse 需要的字段)
+BUBBLE_LIST_COLUMNS = BUBBLE_DETAIL_COLUMNS
+# 所属权校验
+BUBBLE_OWNERSHIP_COLUMNS = "user_id"
+# 写入后仅回传服务端生成的列, 其余字段由请求数据合并
+BUBBLE_WRITE_RETURN_COLUMNS = "id,create_time,update_time,weight_score,is_valid"
+
+# 地灵记忆检索 (首次对话上下文)
+MEMORY_LOOKUP_COLUMNS = "id,bubble_id,user_id,ai_result,gps_longitude,gps_latitude,process_time,expire_time"
+# AI 总结查询
+SUMMARY_COLUMNS = "id,bubble_id,user_id,ai_result,process_time,expire_time,model_version"
+# 地灵记录完整详情
+RECORD_DETAIL_COLUMNS = (
+    "id,bubble_id,user_id,ai_process_type,ai_result,process_time,expire_time,"
+    "is_effective,model_version,gps_longitude,gps_latitude"
+)
+RECORD_WRITE_RETURN_COLUMNS = "id,process_time"
+
+# weight_score 批量计算 (笔记特征 / 地灵记忆特征)
+SCORING_COLUMNS = "id,user_id,status,emotion,create_time,update_time,weight_score,is_valid"
+SCORING_RECORD_COLUMNS = "id,bubble_id,ai_result"
+
+
+def _returning(query, columns: str):
+    """
+    为写入或 RPC 请求指定返回列 (PostgREST select 参数)
+
+    Args:
+        query: insert/update/rpc 查询
+        columns: 逗号分隔的列名
+
+    Returns:
+        设置了返回列的查询
+    """
+    query.params = query.params.set("select", columns)
+    return query
+
+
+def _order(query, *columns: str):
+    """
+    设置多列排序 (PostgREST order 参数, 如 "weight_score.desc", "id.desc")
+
+    postgrest-py 多次调用 order() 会产生重复的 order 参数, 多列排序需合并为一个
+
+    Args:
+        query: select 查询
+        columns: 排序列, 可带 .desc 后缀
+
+    Returns:
+        设置了排序的查询
+    """
+    query.params = query.params.set("order", ",".join(columns))
+    return query
+
+
+def _unexpired(query):
+    """
+    只保留未过期的地灵记录 (expire_time 为空或晚于当前时间)
+
+    Args:
+        query: genius_loci_record 的 select 查询
+
+    Returns:
+        增加了过期条件的查询
+    """
+    return query.or_(f"expire_time.is.null,expire_time.gt.{datetime.now(timezone.utc).isoformat()}")
+
+
+def _recent(query, since: Optional[datetime] = None):
+    """
+    为 genius_loci_record 查询加 process_time 下界, 分区表 (迁移 006) 只扫描下界之后的月份分区
+
+    下界取保留期起点 (RECORD_RETENTION_MONTHS, 更早的记录会被删除) 与 since 中较晚者, 都没有时不加条件
+
+    Args:
+        query: genius_loci_record 的 select 查询
+        since: 调用方语义允许的最早处理时间
+
+    Returns:
+        增加了下界条件的查询
+    """
+    floors = [floor for floor in (retention_cutoff(settings.RECORD_RETENTION_MONTHS), since) if floor is not None]
+    if not floors:
+        return query
+    return query.gte("process_time", max(floors).isoformat())
+
+
+def _is_expired(record: Dict[str, Any], now: datetime) -> bool:
+    """判断记录是否已过期 (不带时区的时间按 UTC 处理, 无法解析的过期时间按已过期处理)"""
+    expire_time = record.get("expire_time")
+    if not expire_time:
+        return False
+    expires_at = parse_time(expire_time)
+    return expires_at is None or expires_at <= now
+
+
+# ========================================
+# 单条笔记读穿透缓存
+# ========================================
+
+note_cache = TTLCache(
+    name="bubble_note",
+    max_entries=settings.NOTE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.NOTE_CACHE_TTL_SECONDS
+)
+
+_BUBBLE_DETAIL_FIELDS = tuple(BUBBLE_DETAIL_COLUMNS.split(","))
+
+
+def _refresh_note_cache(note_id: int, note: Optional[Dict[str, Any]]) -> None:
+    """
+    写入后刷新笔记缓存: 写入结果包含完整详情时直接回填, 否则失效
+
+    Args:
+        note_id: 笔记 ID
+        note: 写入后的笔记数据 (None 表示失效)
+    """
+    if note is not None and all(field in note for field in _BUBBLE_DETAIL_FIELDS):
+        note_cache.set(note_id, {k: note[k] for k in _BUBBLE_DETAIL_FIELDS})
+    else:
+        note_cache.invalidate(note_id)
+
+
+# ========================================
+# 附近查询地理瓦片缓存
+# ========================================
+
+geo_tile_cache: Optional[GeoTileCache] = GeoTileCache(
+    tile_deg=settings.GEO_TILE_DEG,
+    ttl_seconds=settings.GEO_TILE_TTL_SECONDS,
+    max_tiles=settings.GEO_TILE_MAX_TILES,
+    max_rows_per_tile=settings.GEO_TILE_MAX_ROWS,
+    max_tiles_per_query=settings.GEO_TILE_MAX_PER_QUERY
+) if settings.GEO_TILE_CACHE_ENABLED else None
+
+
+def _invalidate_geo_tiles(note_id: int, note: Optional[Dict[str, Any]] = None) -> None:
+    """
+    写入后失效受影响的瓦片 (笔记原所在瓦片 + 新坐标所在瓦片)
 
-    def __init__(self):
-        """初始化 Supabase 客户端"""
-        if Database._initialized:
+    Args:
+        note_id: 笔记 ID
+        note: 写入后的笔记数据 (包含新坐标时一并失效)
+    """
+    if geo_tile_cache is None:
+        return
+
+    geo_tile_cache.invalidate_note(note_id)
+    if note and note.get("gps_longitude") is not None and note.get("gps_latitude") is not None:
+        geo_tile_cache.invalidate_point(note["gps_longitude"], note["gps_latitude"])
+
+
+# ========================================
+# 进程内空间索引
+# ========================================
+
+spatial_index: Optional[SpatialIndex] = SpatialIndex(
+    cell_deg=settings.SPATIAL_INDEX_CELL_DEG,
+    rebuild_ratio=settings.SPATIAL_INDEX_REBUILD_RATIO
+) if settings.SPATIAL_INDEX_ENABLED else None
+
+_spatial_index_task: Optional[asyncio.Task] = None
+
+
+@instrumented
+async def _iter_valid_bubbles(batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    按 id 键集分页读取全部有效笔记 (空间索引启动加载)
+
+    Args:
+        batch_size: 每批行数
+
+    Yields:
+        一批笔记行
+    """
+    client = db.get_client()
+    last_id = 0
+    while True:
+        query = client.table("bubble_note").select(BUBBLE_LIST_COLUMNS)
+        query = query.eq("is_valid", 1).gt("id", last_id)
+        query = query.order("id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
             return
+        last_id = rows[-1]["id"]
 
-        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
-            raise ValueError("SUPABASE_URL 和 SUPABASE_KEY 必须在 .env 文件中配置")
 
-        # 创建 Supabase 客户端 (使用匿名 key)
-        self.client: Client = create_client(
-            settings.SUPABASE_URL,
-            settings.SUPABASE_KEY
-        )
+@instrumented
+async def _fetch_bubble_changes(watermark: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    拉取 update_time 水位之后变更的笔记 (含已失效的行, 由索引负责移除)
+
+    Args:
+        watermark: 上次同步到的 update_time, None 表示不做增量同步
+
+    Returns:
+        变更的笔记列表
+    """
+    if watermark is None:
+        return []
+
+    client = db.get_client()
+    changes: List[Dict[str, Any]] = []
+    batch_size = settings.SPATIAL_INDEX_BATCH_SIZE
+    after: Optional[Tuple[str, int]] = None
+    while True:
+        # 水位取闭区间, 同一时间戳的行会被重复合并 (幂等);
+        # 按 (update_time, id) 键集翻页, 同一时间戳的行超过一批 (批量更新) 时也能全部读到
+        query = client.table("bubble_note").select(BUBBLE_LIST_COLUMNS)
+        query = query.gte("update_time", watermark)
+        if after is not None:
+            query = query.or_(keyset_filter("update_time", after[0], after[1], descending=False))
+        query = _order(query, "update_time", "id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        changes.extend(rows)
+        if len(rows) < batch_size:
+            return changes
+        after = (rows[-1]["update_time"], rows[-1]["id"])
+
+
+async def _run_spatial_index() -> None:
+    """空间索引后台任务: 启动加载, 之后定期增量同步"""
+    try:
+        await spatial_index.bootstrap(_iter_valid_bubbles(settings.SPATIAL_INDEX_BATCH_SIZE))
+    except Exception as e:
+        logger.error(f"空间索引加载失败, 查询将继续走数据库: {e}")
+        return
+
+    while True:
+        await asyncio.sleep(settings.SPATIAL_INDEX_SYNC_SECONDS)
+        try:
+            merged = await spatial_index.sync_delta(_fetch_bubble_changes)
+            if merged:
+                logger.debug(f"空间索引增量同步: {merged} 条")
+        except Exception as e:
+            logger.error(f"空间索引增量同步失败: {e}")
+
+
+def start_spatial_index() -> None:
+    """启动空间索引后台任务 (应用启动时调用, 未开启时为空操作)"""
+    global _spatial_index_task
+    if spatial_index is not None and _spatial_index_task is None:
+        _spatial_index_task = asyncio.create_task(_run_spatial_index())
+
+
+async def stop_spatial_index() -> None:
+    """停止空间索引后台任务 (应用退出时调用)"""
+    global _spatial_index_task
+    if _spatial_index_task is not None:
+        _spatial_index_task.cancel()
+        try:
+            await _spatial_index_task
+        except asyncio.CancelledError:
+            pass
+        _spatial_index_task = None
+
+
+def _index_ready() -> bool:
+    return spatial_index is not None and spatial_index.ready
+
+
+# ========================================
+# 地灵记忆网格索引
+# ========================================
+
+memory_index = PlaceMemoryIndex(
+    cell_deg=settings.MEMORY_INDEX_CELL_DEG,
+    radius_km=settings.MEMORY_INDEX_RADIUS_KM,
+    ttl_seconds=settings.MEMORY_INDEX_TTL_SECONDS,
+    negative_ttl_seconds=settings.MEMORY_INDEX_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.MEMORY_INDEX_MAX_ENTRIES,
+    depth=settings.MEMORY_INDEX_DEPTH
+)
+
+
+# ========================================
+# 笔记最新对话总结投影
+# ========================================
+
+# (bubble_id, user_id) -> {"record": 最新有效总结或 None}; user_id 为 None 表示不限用户
+# 写入对话总结时更新 (_insert_records), 未命中时查库回填; None 为负缓存, 在该笔记的总结写入前一直有效
+summary_cache = TTLCache(
+    name="ai_summary",
+    max_entries=settings.SUMMARY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SUMMARY_CACHE_TTL_SECONDS
+)
+
+_SUMMARY_FIELDS = tuple(SUMMARY_COLUMNS.split(","))
+
+# 进行中的查库回填: (bubble_id, 加载期间写入的总结), 回填时与查询结果合并, 避免旧结果覆盖新写入的总结
+_summary_journals: List[Tuple[int, List[Dict[str, Any]]]] = []
+
+
+def _summary_key(summary: Dict[str, Any]) -> Tuple[datetime, int]:
+    """总结的新旧顺序 (process_time, id)"""
+    return time_sort_key(summary.get("process_time")), summary.get("id") or 0
+
+
+def _offer_summary(record: Dict[str, Any]) -> None:
+    """新写入的地灵记录是有效对话总结时, 更新所属笔记的最新总结"""
+    if record.get("ai_process_type") != 5 or record.get("is_effective", 1) != 1:
+        return
+
+    summary = {field: record.get(field) for field in _SUMMARY_FIELDS}
+    for bubble_id, journal in _summary_journals:
+        if bubble_id == summary["bubble_id"]:
+            journal.append(summary)
+
+    for key in ((summary["bubble_id"], None), (summary["bubble_id"], summary["user_id"])):
+        cached = summary_cache.get(key)
+        current = cached["record"] if cached is not None else None
+        # 写入队列按批写入, 同一笔记的总结可能乱序到达
+        if current is None or _summary_key(summary) >= _summary_key(current):
+            summary_cache.set(key, {"record": summary})
+
+
+def _begin_summary_load(bubble_id: int) -> List[Dict[str, Any]]:
+    """开始查库回填, 返回加载期间写入的总结列表 (需传给 _store_summary 与 _end_summary_load)"""
+    journal: List[Dict[str, Any]] = []
+    _summary_journals.append((bubble_id, journal))
+    return journal
+
+
+def _end_summary_load(journal: List[Dict[str, Any]]) -> None:
+    _summary_journals[:] = [entry for entry in _summary_journals if entry[1] is not journal]
+
+
+def _store_summary(
+    bubble_id: int,
+    user_id: Optional[int],
+    loaded: Optional[Dict[str, Any]],
+    journal: List[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """回填查库结果: 与加载期间写入的总结比较取最新, 返回最终的总结"""
+    candidates = [summary for summary in journal if user_id is None or summary["user_id"] == user_id]
+    if loaded is not None:
+        candidates.append(loaded)
+    latest = max(candidates, key=_summary_key) if candidates else None
+    summary_cache.set((bubble_id, user_id), {"record": latest})
+    return latest
+
+
+def _cached_summary(bubble_id: int, user_id: Optional[int]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    读取总结投影
 
-        # 创建管理员客户端 (使用 service_role key, 绕过 RLS)
-        self.admin_client: Client = create_client(
-            settings.SUPABASE_URL,
-            settings.SUPABASE_SERVICE_ROLE_KEY if settings.SUPABASE_SERVICE_ROLE_KEY else settings.SUPABASE_KEY
+    Returns:
+        (是否命中, 总结记录); 缓存的总结已过期、早于保留期或处理时间无法解析时视为未命中, 重新查库
+    """
+    cached = summary_cache.get((bubble_id, user_id))
+    if cached is None:
+        return False, None
+
+    record = cached["record"]
+    if record is None:
+        return True, None
+    moment = parse_time(record.get("process_time"))
+    floor = retention_cutoff(settings.RECORD_RETENTION_MONTHS)
+    if moment is None or _is_expired(record, datetime.now(timezone.utc)) or (floor is not None and moment < floor):
+        summary_cache.invalidate((bubble_id, user_id))
+        return False, None
+    return True, record
+
+
+# ========================================
+# 进程内 Top 排行榜
+# ========================================
+
+leaderboard: Optional[Leaderboard] = Leaderboard(
+    columns=BUBBLE_LIST_COLUMNS.split(","),
+    capacity=settings.LEADERBOARD_SIZE,
+    user_capacity=settings.LEADERBOARD_USER_SIZE,
+    max_users=settings.LEADERBOARD_MAX_USERS,
+    ttl_seconds=settings.LEADERBOARD_USER_TTL_SECONDS,
+    min_size=settings.LEADERBOARD_MIN_SIZE
+) if settings.LEADERBOARD_ENABLED else None
+
+_leaderboard_task: Optional[asyncio.Task] = None
+
+
+@instrumented
+async def _load_leaderboard(user_id: Optional[int] = None) -> int:
+    """
+    从数据库加载 (或重新加载) 一个榜单
+
+    Args:
+        user_id: 用户 ID, None 表示全局榜
+
+    Returns:
+        对账偏差 (新进入榜单的笔记数)
+    """
+    capacity = leaderboard.capacity if user_id is None else leaderboard.user_capacity
+    journal = leaderboard.begin_load(user_id)
+    try:
+        rows = await _query_top_bubbles(capacity, user_id, read_only=False)
+    except Exception:
+        leaderboard.abort_load(journal)
+        raise
+    return leaderboard.store(user_id, rows, journal)
+
+
+async def _run_leaderboard() -> None:
+    """排行榜后台任务: 启动时加载全局榜, 之后定期重新加载对账"""
+    while True:
+        try:
+            drift = await _load_leaderboard()
+            leaderboard.record_reconcile(drift)
+            if drift:
+                logger.info(f"Top 排行榜对账: {drift} 条笔记新进入全局榜")
+        except Exception as e:
+            logger.error(f"Top 排行榜加载失败, 查询将继续走数据库: {e}")
+        await asyncio.sleep(settings.LEADERBOARD_RECONCILE_SECONDS)
+
+
+def start_leaderboard() -> None:
+    """启动排行榜后台任务 (应用启动时调用, 未开启时为空操作)"""
+    global _leaderboard_task
+    if leaderboard is not None and _leaderboard_task is None:
+        _leaderboard_task = asyncio.create_task(_run_leaderboard())
+
+
+async def stop_leaderboard() -> None:
+    """停止排行榜后台任务 (应用退出时调用)"""
+    global _leaderboard_task
+    if _leaderboard_task is not None:
+        _leaderboard_task.cancel()
+        try:
+            await _leaderboard_task
+        except asyncio.CancelledError:
+            pass
+        _leaderboard_task = None
+
+
+# ========================================
+# 并发读取合并 (singleflight)
+# ========================================
+
+# 热点位置/榜单/总结被大量并发请求时, 相同参数的读取共享一次数据库请求
+nearby_flight: Optional[SingleFlight] = SingleFlight("nearby") if settings.SINGLEFLIGHT_ENABLED else None
+top_flight: Optional[SingleFlight] = SingleFlight("top") if settings.SINGLEFLIGHT_ENABLED else None
+summary_flight: Optional[SingleFlight] = SingleFlight("ai_summary") if settings.SINGLEFLIGHT_ENABLED else None
+
+
+def _coord_key(value: float) -> float:
+    """归一化坐标 (保留 7 位小数, 约 1 厘米), 避免浮点噪声导致相同位置无法合并"""
+    return round(float(value), 7)
+
+
+async def _coalesce(flight: Optional[SingleFlight], key: Tuple, fn):
+    """
+    合并相同键的并发调用 (未开启时直接调用)
+
+    Args:
+        flight: 合并器
+        key: 归一化后的查询参数
+        fn: 发起查询的函数 (返回可等待对象)
+
+    Returns:
+        查询结果
+    """
+    if flight is None:
+        return await fn()
+    return await flight.do(key, fn)
+
+
+# ========================================
+# 数据库函数 (RPC) 可用性与熔断
+# ========================================
+
+nearby_rpc_breaker = CircuitBreaker(
+    name="get_nearby_bubbles",
+    failure_threshold=settings.NEARBY_RPC_FAILURE_THRESHOLD,
+    recovery_seconds=settings.NEARBY_RPC_RECOVERY_SECONDS
+)
+
+# 翻页调用 (带 after_distance/after_id 参数, 迁移 002) 单独熔断:
+# 数据库函数未升级时只影响翻页, 第一页仍走 RPC
+nearby_cursor_rpc_breaker = CircuitBreaker(
+    name="get_nearby_bubbles(cursor)",
+    failure_threshold=settings.NEARBY_RPC_FAILURE_THRESHOLD,
+    recovery_seconds=settings.NEARBY_RPC_RECOVERY_SECONDS
+)
+
+# RPC 能力探测结果 (available: True/False, None 表示探测时数据库不可达)
+_rpc_capabilities: Dict[str, Dict[str, Any]] = {}
+
+# PostgREST / Postgres 的 "函数不存在" 错误码
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def _is_missing_function(error: Exception) -> bool:
+    return isinstance(error, APIError) and error.code in _MISSING_FUNCTION_CODES
+
+
+def _set_rpc_capability(name: str, available: Optional[bool]) -> None:
+    _rpc_capabilities[name] = {"available": available, "checked_at": time.time()}
+
+
+def _record_nearby_rpc_failure(error: Exception, paged: bool = False) -> None:
+    """
+    记录附近查询 RPC 失败: 函数不存在时长时间熔断, 其它错误按连续失败计数
+
+    Args:
+        error: RPC 异常
+        paged: 是否为翻页调用 (记入翻页熔断器)
+    """
+    capability = "get_nearby_bubbles_cursor" if paged else "get_nearby_bubbles"
+    breaker = nearby_cursor_rpc_breaker if paged else nearby_rpc_breaker
+    if _is_missing_function(error):
+        _set_rpc_capability(capability, False)
+        breaker.trip(
+            settings.NEARBY_RPC_RECHECK_SECONDS,
+            reason=f"数据库函数 {breaker.name} 不存在: {error.message}"
         )
+    else:
+        logger.error(f"附近查询 RPC 失败: {error}")
+        breaker.record_failure(error)
+
+
+@instrumented
+async def detect_rpc_capabilities() -> Dict[str, Any]:
+    """
+    启动时探测数据库函数是否可用 (结果缓存, 不可用时直接熔断, 请求不再逐个试错)
+
+    Returns:
+        各 RPC 的可用性与熔断状态
+    """
+    try:
+        await _call_nearby_rpc(0.0, 0.0, 0.001, 1, None)
+        _set_rpc_capability("get_nearby_bubbles", True)
+        nearby_rpc_breaker.record_success()
+        logger.info("数据库函数 get_nearby_bubbles 可用")
+    except Exception as e:
+        if not _is_missing_function(e):
+            _set_rpc_capability("get_nearby_bubbles", None)
+        _record_nearby_rpc_failure(e)
+        return get_rpc_status()
+
+    # 翻页参数 (迁移 002) 是否可用
+    try:
+        await _call_nearby_rpc(0.0, 0.0, 0.001, 1, None, after=(0.0, 0))
+        _set_rpc_capability("get_nearby_bubbles_cursor", True)
+        nearby_cursor_rpc_breaker.record_success()
+    except Exception as e:
+        if not _is_missing_function(e):
+            _set_rpc_capability("get_nearby_bubbles_cursor", None)
+        _record_nearby_rpc_failure(e, paged=True)
+
+    return get_rpc_status()
+
+
+def get_rpc_status() -> Dict[str, Any]:
+    """
+    获取 RPC 可用性与熔断状态 (用于健康检查)
 
-        Database._initialized = True
-        logger.info("Supabase 客户端初始化成功")
+    Returns:
+        状态字典
+    """
+    return {
+        "get_nearby_bubbles": {
+            **_rpc_capabilities.get("get_nearby_bubbles", {"available": None, "checked_at": None}),
+            "breaker": nearby_rpc_breaker.get_stats(),
+        },
+        "get_nearby_bubbles_cursor": {
+            **_rpc_capabilities.get("get_nearby_bubbles_cursor", {"available": None, "checked_at": None}),
+            "breaker": nearby_cursor_rpc_breaker.get_stats(),
+        },
+    }
+
+
+def get_db_metrics(summary: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    获取数据库调用指标
 
-    def get_client(self, use_admin: bool = False) -> Client:
-        """
-        获取 Supabase 客户端
+    Args:
+        summary: 是否只返回简要指标 (健康检查用)
 
-        Args:
-            use_admin: 是否使用管理员客户端 (绕过 RLS)
+    Returns:
+        指标字典, 未开启时返回 None
+    """
+    if query_metrics is None:
+        return None
+    return query_metrics.summary() if summary else query_metrics.snapshot()
 
-        Returns:
-            Supabase 客户端实例
-        """
-        return self.admin_client if use_admin else self.client
 
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    获取数据访问层缓存统计信息
 
-# 全局数据库实例
-db = Database()
+    Returns:
+        各缓存的命中/未命中/淘汰计数
+    """
+    stats = {
+        "bubble_note": note_cache.get_stats(),
+        "ai_summary": summary_cache.get_stats(),
+        "place_memory": memory_index.get_stats(),
+    }
+    if geo_tile_cache is not None:
+        stats["nearby_tiles"] = geo_tile_cache.get_stats()
+    if spatial_index is not None:
+        stats["spatial_index"] = spatial_index.get_stats()
+    if leaderboard is not None:
+        stats["leaderboard"] = leaderboard.get_stats()
+    if cold_store is not None:
+        stats["archived_records"] = archived_records_cache.get_stats()
+        stats["cold_store"] = cold_store.get_stats()
+    flights = [flight for flight in (nearby_flight, top_flight, summary_flight) if flight is not None]
+    if flights:
+        stats["singleflight"] = {flight.name: flight.get_stats() for flight in flights}
+    return stats
 
 
 # ========================================
 # 数据库操作函数
 # ========================================
 
+@instrumented
 async def create_bubble_note(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     创建新的气泡笔记
@@ -77,23 +732,17 @@ async def create_bubble_note(data: Dict[str, Any]) -> Dict[str, Any]:
         插入后的笔记数据 (包含生成的 id)
     """
     try:
-        client = db.get_client(use_admin=True)
+        insert_data = _note_insert_row(data)
 
-        # 插入数据
-        response = client.table("bubble_note").insert({
-            "user_id": data["user_id"],
-            "note_type": data["note_type"],
-            "content": data["content"],
-            "image_urls": data.get("image_urls"),
-            "gps_longitude": data["gps_longitude"],
-            "gps_latitude": data["gps_latitude"],
-            "status": data.get("status", 1),
-            "emotion": data.get("emotion", "未知"),
-        }).execute()
+        # 开启写入队列时与并发的创建请求合并为一次批量插入
+        if note_writer is not None and note_writer.running:
+            note = await asyncio.shield(await note_writer.put(insert_data))
+        else:
+            note = (await _insert_notes([insert_data]))[0]
 
-        if response.data:
-            logger.info(f"成功创建气泡笔记, id={response.data[0]['id']}")
-            return response.data[0]
+        if note:
+            logger.info(f"成功创建气泡笔记, id={note['id']}")
+            return note
         else:
             raise Exception("创建笔记失败: 无返回数据")
 
@@ -102,6 +751,52 @@ async def create_bubble_note(data: Dict[str, Any]) -> Dict[str, Any]:
         raise
 
 
+def _note_insert_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    """由请求数据构建 bubble_note 插入行"""
+    return {
+        "user_id": data["user_id"],
+        "note_type": data["note_type"],
+        "content": data["content"],
+        "image_urls": data.get("image_urls"),
+        "gps_longitude": data["gps_longitude"],
+        "gps_latitude": data["gps_latitude"],
+        "status": data.get("status", 1),
+        "emotion": data.get("emotion", "未知"),
+    }
+
+
+async def _insert_notes(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """插入笔记行 (只回传 id 等服务端生成的列) 并更新缓存与进程内索引"""
+    try:
+        notes = await _write_notes(rows)
+    except PartialWriteError as e:
+        _index_notes(list(e.written.values()))
+        raise
+    _index_notes(notes)
+    return notes
+
+
+async def _write_notes(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """插入笔记行 (写入队列的刷新函数, 不含缓存/索引更新)"""
+    return await _bulk_insert("bubble_note", rows, BUBBLE_WRITE_RETURN_COLUMNS)
+
+
+def _index_notes(notes: List[Dict[str, Any]]) -> None:
+    """笔记写入后更新缓存与进程内索引 (写入已提交, 出错只记录日志)"""
+    for note in notes:
+        try:
+            _refresh_note_cache(note["id"], note)
+            _invalidate_geo_tiles(note["id"], note)
+            if spatial_index is not None:
+                spatial_index.upsert(note)
+            if leaderboard is not None:
+                leaderboard.upsert(note)
+        except Exception as e:
+            note_cache.invalidate(note["id"])
+            logger.error(f"笔记写入后更新缓存失败, id={note['id']}: {e}")
+
+
+@instrumented
 async def update_bubble_note(note_id: int, user_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     更新气泡笔记
@@ -117,18 +812,6 @@ async def update_bubble_note(note_id: int, user_id: int, data: Dict[str, Any]) -
     try:
         client = db.get_client(use_admin=True)
 
-        # 先检查笔记是否存在且属于该用户
-        check_response = client.table("bubble_note").select("*").eq("id", note_id).execute()
-
-        if not check_response.data:
-            logger.warning(f"笔记不存在, id={note_id}")
-            return None
-
-        existing_note = check_response.data[0]
-        if existing_note["user_id"] != user_id:
-            logger.warning(f"用户无权限修改该笔记, user_id={user_id}, note_id={note_id}")
-            return None
-
         # 构建更新数据 (只更新允许修改的字段)
         update_data = {}
         if "note_type" in data:
@@ -146,20 +829,33 @@ async def update_bubble_note(note_id: int, user_id: int, data: Dict[str, Any]) -
         if "emotion" in data:
             update_data["emotion"] = data["emotion"]
 
-        # 执行更新
-        response = client.table("bubble_note").update(update_data).eq("id", note_id).execute()
+        # 条件更新: 同时按 id 和 user_id 过滤, 所属权校验与写入在同一条语句中完成
+        query = client.table("bubble_note").update(update_data)
+        query = query.eq("id", note_id).eq("user_id", user_id)
+        response = await db.execute(_returning(query, BUBBLE_WRITE_RETURN_COLUMNS))
 
         if response.data:
+            note = {"user_id": user_id, **update_data, **response.data[0]}
             logger.info(f"成功更新气泡笔记, id={note_id}")
-            return response.data[0]
-        else:
-            return None
+            _refresh_note_cache(note_id, note)
+            _invalidate_geo_tiles(note_id, note)
+            if spatial_index is not None:
+                spatial_index.apply_update(note_id, note)
+            if leaderboard is not None:
+                leaderboard.apply_update(note_id, note)
+            return note
+
+        # 未命中任何行: 笔记不存在或不属于该用户
+        note_cache.invalidate(note_id)
+        await _log_ownership_miss(client, note_id, user_id, action="修改")
+        return None
 
     except Exception as e:
         logger.error(f"更新气泡笔记失败: {e}")
         raise
 
 
+@instrumented
 async def get_bubble_note_by_id(note_id: int) -> Optional[Dict[str, Any]]:
     """
     根据 ID 获取气泡笔记
@@ -171,10 +867,17 @@ async def get_bubble_note_by_id(note_id: int) -> Optional[Dict[str, Any]]:
         笔记数据, 如果不存在则返回 None
     """
     try:
+        # 读穿透缓存 (写入路径负责刷新/失效)
+        cached = note_cache.get(note_id)
+        if cached is not None:
+            return cached
+
         client = db.get_client()
-        response = client.table("bubble_note").select("*").eq("id", note_id).execute()
+        query = client.table("bubble_note").select(BUBBLE_DETAIL_COLUMNS).eq("id", note_id)
+        response = await db.execute(query)
 
         if response.data:
+            note_cache.set(note_id, response.data[0])
             return response.data[0]
         return None
 
@@ -183,152 +886,352 @@ async def get_bubble_note_by_id(note_id: int) -> Optional[Dict[str, Any]]:
         raise
 
 
+@instrumented
 async def get_nearby_bubbles(
     longitude: float,
     latitude: float,
     radius_km: float = 1.0,
     limit: int = 20,
-    status: Optional[int] = None
+    status: Optional[int] = None,
+    after: Optional[DistanceKey] = None
 ) -> List[Dict[str, Any]]:
     """
     获取附近的气泡笔记 (使用 PostGIS 地理查询)
 
+    空间索引未就绪时, 相同参数的并发查询合并为一次
+
     Args:
         longitude: 经度
         latitude: 纬度
         radius_km: 半径 (公里)
         limit: 返回数量限制
         status: 状态筛选 (1-公开/2-私有), None 表示全部
+        after: 分页位置 (distance_meters, id), 只返回排在其后的笔记
 
     Returns:
-        附近的笔记列表
+        按 (距离, id) 升序的附近笔记列表
     """
-    try:
-        client = db.get_client()
+    if _index_ready():
+        return await _query_nearby_bubbles(longitude, latitude, radius_km, limit, status, after)
 
-        # 使用 PostGIS 的 ST_DWithin 函数查询附近的点
-        # 注意: Supabase RPC 需要在数据库中预先定义函数
-        # 这里使用原生 SQL 查询
-        query = f"""
-        SELECT *,
-               ST_Distance(
-                   location,
-                   ST_SetSRID(ST_MakePoint($1, $2), 4326)::GEOGRAPHY
-               ) as distance_meters
-        FROM bubble_note
-        WHERE ST_DWithin(
-            location,
-            ST_SetSRID(ST_MakePoint($1, $2), 4326)::GEOGRAPHY,
-            $3
-        )
-        AND is_valid = 1
-        {f"AND status = {status}" if status else ""}
-        ORDER BY distance_meters ASC
-        LIMIT $4
-        """
-
-        # 执行 SQL 查询 (需要使用 postgres_rpc)
-        response = client.rpc(
-            "get_nearby_bubbles",
-            {
-                "lon": longitude,
-                "lat": latitude,
-                "radius_m": int(radius_km * 1000),
-                "lim": limit,
-                "stat": status
-            }
-        ).execute()
+    key = (_coord_key(longitude), _coord_key(latitude), float(radius_km), limit, status, after)
+    return await _coalesce(
+        nearby_flight, key,
+        lambda: _query_nearby_bubbles(longitude, latitude, radius_km, limit, status, after)
+    )
 
-        if response.data:
-            return response.data
-        return []
+
+async def _query_nearby_bubbles(
+    longitude: float,
+    latitude: float,
+    radius_km: float,
+    limit: int,
+    status: Optional[int],
+    after: Optional[DistanceKey]
+) -> List[Dict[str, Any]]:
+    """依次由空间索引、地理瓦片缓存、数据库函数、降级查询回答附近查询 (参数同 get_nearby_bubbles)"""
+    try:
+        # 空间索引已就绪时直接在内存中回答
+        if _index_ready():
+            return spatial_index.nearby(longitude, latitude, radius_km, limit, status, after)
+
+        # 其次由地理瓦片缓存回答 (瓦片过大/热点瓦片时返回 None, 继续查询数据库)
+        if geo_tile_cache is not None:
+            cached = await geo_tile_cache.query(
+                longitude, latitude, radius_km, limit, status, _load_bubble_tile, after
+            )
+            if cached is not None:
+                return cached
+
+        # RPC 熔断中 (函数不存在或持续失败) 时直接走降级方案, 不再为每个请求付出一次失败调用;
+        # 翻页调用只在主熔断器关闭时尝试, 并单独计入翻页熔断器
+        paged = after is not None
+        if paged:
+            allowed = nearby_rpc_breaker.state == STATE_CLOSED and nearby_cursor_rpc_breaker.allow_request()
+        else:
+            allowed = nearby_rpc_breaker.allow_request()
+
+        if allowed:
+            capability = "get_nearby_bubbles_cursor" if paged else "get_nearby_bubbles"
+            breaker = nearby_cursor_rpc_breaker if paged else nearby_rpc_breaker
+            try:
+                rows = await _call_nearby_rpc(longitude, latitude, radius_km, limit, status, after)
+                breaker.record_success()
+                if not _rpc_capabilities.get(capability, {}).get("available"):
+                    _set_rpc_capability(capability, True)
+                return rows
+            except Exception as e:
+                _record_nearby_rpc_failure(e, paged)
+            finally:
+                breaker.release()
+
+        return await _get_nearby_bubbles_fallback(longitude, latitude, radius_km, limit, status, after)
 
     except Exception as e:
         logger.error(f"获取附近气泡失败: {e}")
-        # 如果 RPC 不可用,回退到普通查询 (不含距离)
-        return await _get_nearby_bubbles_fallback(longitude, latitude, limit, status)
+        return await _get_nearby_bubbles_fallback(longitude, latitude, radius_km, limit, status, after)
 
 
-async def _get_nearby_bubbles_fallback(
+@instrumented
+async def _call_nearby_rpc(
     longitude: float,
     latitude: float,
-    limit: int = 20,
-    status: Optional[int] = None
+    radius_km: float,
+    limit: int,
+    status: Optional[int],
+    after: Optional[DistanceKey] = None
 ) -> List[Dict[str, Any]]:
     """
-    获取附近气泡的降级方案 (不使用 PostGIS, 简单的边界框查询)
+    调用数据库函数 get_nearby_bubbles (PostGIS 距离查询)
 
     Args:
         longitude: 经度
         latitude: 纬度
+        radius_km: 半径 (公里)
         limit: 返回数量限制
         status: 状态筛选
+        after: 分页位置 (distance_meters, id)
 
     Returns:
-        附近的笔记列表
+        按 (距离, id) 升序的笔记列表 (含 distance_meters)
     """
-    try:
-        client = db.get_client()
+    client = db.get_client(read_only=True)
+
+    # 数据库函数定义见 docs/database/migrations/001_get_nearby_bubbles_knn.sql
+    # (ST_DWithin 半径过滤 + GiST 索引辅助的 <-> KNN 排序), 翻页参数见 002
+    params = {
+        "lon": longitude,
+        "lat": latitude,
+        "radius_m": int(radius_km * 1000),
+        "lim": limit,
+        "stat": status
+    }
+    if after is not None:
+        params["after_distance"], params["after_id"] = after
+
+    query = client.rpc("get_nearby_bubbles", params)
+    response = await db.execute(_returning(query, f"{BUBBLE_LIST_COLUMNS},distance_meters"))
+    return response.data or []
+
+
+@instrumented
+async def _load_bubble_tile(bounds: BBox, max_rows: int) -> List[Dict[str, Any]]:
+    """
+    加载一个地理瓦片内的全部有效笔记 (瓦片缓存回源)
 
-        # 计算边界框 (约1公里)
-        delta_lon = 0.01  # 约1公里
-        delta_lat = 0.01
+    Args:
+        bounds: 瓦片范围 (min_lon, max_lon, min_lat, max_lat), 左闭右开
+        max_rows: 最多返回条数
 
-        query = client.table("bubble_note").select("*")
-        query = query.gte("gps_longitude", longitude - delta_lon)
-        query = query.lte("gps_longitude", longitude + delta_lon)
-        query = query.gte("gps_latitude", latitude - delta_lat)
-        query = query.lte("gps_latitude", latitude + delta_lat)
-        query = query.eq("is_valid", 1)
+    Returns:
+        瓦片内的笔记列表
+    """
+    min_lon, max_lon, min_lat, max_lat = bounds
+    client = db.get_client(read_only=True)
 
-        if status is not None:
-            query = query.eq("status", status)
+    query = client.table("bubble_note").select(BUBBLE_LIST_COLUMNS)
+    query = query.gte("gps_longitude", min_lon).lt("gps_longitude", max_lon)
+    query = query.gte("gps_latitude", min_lat).lt("gps_latitude", max_lat)
+    query = query.eq("is_valid", 1).limit(max_rows)
 
-        query = query.order("weight_score", desc=True).limit(limit)
-        response = query.execute()
+    response = await db.execute(query)
+    return response.data or []
 
-        if response.data:
-            return response.data
-        return []
+
+# 降级查询单次请求最多读取的候选窗口数
+_FALLBACK_MAX_LOADS = 6
+# 环形窗口的分页位置: 排除距离恰好等于窗口外沿的笔记 (已包含在上一窗口中)
+_MAX_NOTE_ID = 2 ** 63 - 1
+
+
+@instrumented
+async def _get_nearby_bubbles_fallback(
+    longitude: float,
+    latitude: float,
+    radius_km: float = 1.0,
+    limit: int = 20,
+    status: Optional[int] = None,
+    after: Optional[DistanceKey] = None
+) -> List[Dict[str, Any]]:
+    """
+    获取附近气泡的降级方案 (不使用 PostGIS)
+
+    按半径和纬度计算边界框取候选, 本地向量化计算球面距离后过滤排序,
+    返回结构与 RPC 一致 (含 distance_meters); 候选过多时由内向外分环读取
+
+    Args:
+        longitude: 经度
+        latitude: 纬度
+        radius_km: 半径 (公里)
+        limit: 返回数量限制
+        status: 状态筛选
+        after: 分页位置 (distance_meters, id)
+
+    Returns:
+        按 (距离, id) 升序的附近笔记列表
+    """
+    try:
+        budget = min(max(limit * settings.NEARBY_FALLBACK_OVERFETCH, limit), settings.NEARBY_FALLBACK_MAX_ROWS)
+
+        # 由内向外按环形窗口 (lo, hi] 取候选, 窗口内的笔记已由 lo 之前的窗口或上一页返回:
+        # - 候选被截断 (窗口内笔记过多) 时向内收缩 hi 重新取
+        # - 候选完整时窗口内结果是精确的, 按距离追加后从 hi 继续向外
+        result: List[Dict[str, Any]] = []
+        cursor = after
+        lo_km = after[0] / 1000.0 if after is not None else 0.0
+        hi_km = radius_km
+        rows: List[Dict[str, Any]] = []
+        for _ in range(_FALLBACK_MAX_LOADS):
+            rows = await _load_nearby_candidates(longitude, latitude, hi_km, budget, status, lo_km)
+            if len(rows) >= budget:
+                hi_km = lo_km + (hi_km - lo_km) / 2
+                continue
+
+            result += rank_by_distance(rows, longitude, latitude, hi_km, limit - len(result), cursor)
+            if len(result) >= limit or hi_km >= radius_km:
+                return result
+            # 下一个窗口从 hi 之外开始 (抵消 nearest_order 的距离容差)
+            cursor = (hi_km * 1000.0 - DISTANCE_EPSILON_M, _MAX_NOTE_ID)
+            lo_km, hi_km = hi_km, radius_km
+
+        # 请求次数用尽 (极端密集): 在最后一次 (已截断的) 候选中按整个半径尽力补齐, 结果为近似值
+        result += rank_by_distance(rows, longitude, latitude, radius_km, limit - len(result), cursor)
+        return result
 
     except Exception as e:
         logger.error(f"降级查询失败: {e}")
         return []
 
 
-async def get_top_bubbles(limit: int = 20, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+@instrumented
+async def _load_nearby_candidates(
+    longitude: float,
+    latitude: float,
+    radius_km: float,
+    max_rows: int,
+    status: Optional[int],
+    exclude_km: float = 0.0
+) -> List[Dict[str, Any]]:
+    """
+    按半径边界框 (经度方向按纬度余弦修正) 读取候选笔记
+
+    Args:
+        longitude: 经度
+        latitude: 纬度
+        radius_km: 半径 (公里)
+        max_rows: 最多返回条数
+        status: 状态筛选
+        exclude_km: 排除该半径圆的内接正方形 (翻页时已返回的范围), 0 表示不排除
+
+    Returns:
+        边界框内的笔记列表 (未排序)
+    """
+    min_lon, max_lon, min_lat, max_lat = bounding_box(longitude, latitude, radius_km)
+    client = db.get_client(read_only=True)
+
+    query = client.table("bubble_note").select(BUBBLE_LIST_COLUMNS)
+    query = query.gte("gps_longitude", min_lon).lte("gps_longitude", max_lon)
+    query = query.gte("gps_latitude", min_lat).lte("gps_latitude", max_lat)
+    query = query.eq("is_valid", 1)
+
+    if status is not None:
+        query = query.eq("status", status)
+
+    # 内接正方形半边长为 r/√2, 取 0.7r 留出球面近似误差
+    if exclude_km > 0:
+        a, b, c, d = bounding_box(longitude, latitude, exclude_km * 0.7)
+        query.params = query.params.add(
+            "not.and",
+            f"(gps_longitude.gte.{a},gps_longitude.lte.{b},gps_latitude.gte.{c},gps_latitude.lte.{d})"
+        )
+
+    response = await db.execute(query.limit(max_rows))
+    return response.data or []
+
+
+@instrumented
+async def get_top_bubbles(
+    limit: int = 20,
+    user_id: Optional[int] = None,
+    after: Optional[Tuple[float, int]] = None
+) -> List[Dict[str, Any]]:
     """
-    获取权重最高的 Top N 气泡
+    获取权重最高的 Top N 气泡 (按 weight_score 降序, 同分按 id 降序)
+
+    依次尝试进程内排行榜、空间索引, 都无法回答时查询数据库
 
     Args:
         limit: 返回数量限制
         user_id: 用户 ID (可选, 如果指定则只返回该用户的笔记)
+        after: 分页位置 (weight_score, id), 只返回排在其后的笔记
 
     Returns:
         Top 笔记列表
     """
     try:
-        client = db.get_client()
+        if leaderboard is not None:
+            if leaderboard.needs_load(user_id):
+                try:
+                    await _coalesce(top_flight, ("load", user_id), lambda: _load_leaderboard(user_id))
+                except Exception as e:
+                    logger.warning(f"Top 排行榜加载失败, user_id={user_id}: {e}")
+            ranked = leaderboard.page(limit, user_id, after)
+            if ranked is not None:
+                return ranked
+
+        if _index_ready():
+            ranked = spatial_index.top(limit, user_id, after)
+            if ranked is not None:
+                return ranked
+
+        return await _coalesce(
+            top_flight, ("query", limit, user_id, after),
+            lambda: _query_top_bubbles(limit, user_id, after)
+        )
 
-        query = client.table("bubble_note").select("*")
-        query = query.eq("is_valid", 1)
-        query = query.eq("status", 1)  # 只返回公开笔记
+    except Exception as e:
+        logger.error(f"获取 Top 气泡失败: {e}")
+        return []
 
-        if user_id is not None:
-            query = query.eq("user_id", user_id)
 
-        query = query.order("weight_score", desc=True).limit(limit)
-        response = query.execute()
+@instrumented
+async def _query_top_bubbles(
+    limit: int,
+    user_id: Optional[int] = None,
+    after: Optional[Tuple[float, int]] = None,
+    read_only: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    从数据库查询 Top 公开笔记
 
-        if response.data:
-            return response.data
-        return []
+    Args:
+        limit: 返回数量限制
+        user_id: 用户 ID (可选)
+        after: 分页位置 (weight_score, id)
+        read_only: 是否允许走只读副本 (排行榜加载需要最新数据, 传 False)
 
-    except Exception as e:
-        logger.error(f"获取 Top 气泡失败: {e}")
-        return []
+    Returns:
+        按 (weight_score, id) 降序的笔记列表
+    """
+    client = db.get_client(read_only=read_only)
+
+    query = client.table("bubble_note").select(BUBBLE_LIST_COLUMNS)
+    query = query.eq("is_valid", 1)
+    query = query.eq("status", 1)  # 只返回公开笔记
+
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+
+    # 键集分页: 从上一页最后一条的 (weight_score, id) 之后继续, 不使用 offset
+    if after is not None:
+        query = query.or_(keyset_filter("weight_score", after[0], after[1], descending=True))
+
+    query = _order(query, "weight_score.desc", "id.desc").limit(limit)
+    response = await db.execute(query)
+    return response.data or []
 
 
+@instrumented
 async def delete_bubble_note(note_id: int, user_id: int) -> bool:
     """
     删除气泡笔记 (软删除, 设置 is_valid = 0)
@@ -343,22 +1246,26 @@ async def delete_bubble_note(note_id: int, user_id: int) -> bool:
     try:
         client = db.get_client(use_admin=True)
 
-        # 先检查权限
-        check_response = client.table("bubble_note").select("*").eq("id", note_id).execute()
+        # 条件软删除: 同时按 id 和 user_id 过滤, 所属权校验与写入在同一条语句中完成
+        query = client.table("bubble_note").update({"is_valid": 0})
+        query = query.eq("id", note_id).eq("user_id", user_id)
+        response = await db.execute(_returning(query, "id,gps_longitude,gps_latitude"))
 
-        if not check_response.data:
-            return False
-
-        existing_note = check_response.data[0]
-        if existing_note["user_id"] != user_id:
-            return False
-
-        # 软删除
-        response = client.table("bubble_note").update({"is_valid": 0}).eq("id", note_id).execute()
+        # 无论成功与否都失效缓存, 下次读取拿到最新的 is_valid
+        # 按坐标一并失效: 正在加载的瓦片尚未登记该笔记, 只按 id 失效会缓存已删除的笔记
+        note_cache.invalidate(note_id)
+        _invalidate_geo_tiles(note_id, response.data[0] if response.data else None)
 
         if response.data:
+            if spatial_index is not None:
+                spatial_index.remove(note_id)
+            if leaderboard is not None:
+                leaderboard.remove(note_id, user_id)
             logger.info(f"成功删除气泡笔记, id={note_id}")
             return True
+
+        # 未命中任何行: 笔记不存在或不属于该用户
+        await _log_ownership_miss(client, note_id, user_id, action="删除")
         return False
 
     except Exception as e:
@@ -366,10 +1273,36 @@ async def delete_bubble_note(note_id: int, user_id: int) -> bool:
         return False
 
 
+@instrumented
+async def _log_ownership_miss(client: Client, note_id: int, user_id: int, action: str) -> None:
+    """
+    条件写入未命中时, 区分 "笔记不存在" 与 "无权限" 并记录日志
+
+    仅在失败路径上执行, 成功路径保持单次往返
+
+    Args:
+        client: Supabase 客户端
+        note_id: 笔记 ID
+        user_id: 用户 ID
+        action: 操作名称 (用于日志)
+    """
+    query = client.table("bubble_note").select(BUBBLE_OWNERSHIP_COLUMNS).eq("id", note_id)
+    response = await db.execute(query)
+
+    if not response.data:
+        logger.warning(f"笔记不存在, id={note_id}")
+    else:
+        logger.warning(
+            f"用户无权限{action}该笔记, user_id={user_id}, note_id={note_id}, "
+            f"owner_id={response.data[0]['user_id']}"
+        )
+
+
 # ========================================
 # 地灵 AI 处理结果记录相关函数
 # ========================================
 
+@instrumented
 async def create_genius_loci_record(
     bubble_id: int,
     user_id: int,
@@ -378,7 +1311,8 @@ async def create_genius_loci_record(
     model_version: str = "Qwen2.5-7B",
     expire_time: Optional[str] = None,
     gps_longitude: Optional[float] = None,
-    gps_latitude: Optional[float] = None
+    gps_latitude: Optional[float] = None,
+    wait: bool = True
 ) -> Optional[Dict[str, Any]]:
     """
     创建地灵 AI 处理结果记录
@@ -392,37 +1326,30 @@ async def create_genius_loci_record(
         expire_time: 过期时间（可选）
         gps_longitude: 经度（可选，用于地理位置查询）
         gps_latitude: 纬度（可选，用于地理位置查询）
+        wait: 开启写入队列时是否等待写入完成 (超时归档等不需要结果的调用方传 False)
 
     Returns:
-        创建的记录数据，失败则返回 None
+        创建的记录数据，失败则返回 None (wait=False 且已进入写入队列时也返回 None)
     """
     try:
-        client = db.get_client(use_admin=True)
-
-        # 构建插入数据
-        insert_data = {
-            "bubble_id": bubble_id,
-            "user_id": user_id,
-            "ai_process_type": ai_process_type,
-            "ai_result": ai_result,
-            "model_version": model_version,
-            "is_effective": 1
-        }
-
-        if expire_time:
-            insert_data["expire_time"] = expire_time
-
-        # 添加经纬度信息（如果提供）
-        if gps_longitude is not None:
-            insert_data["gps_longitude"] = gps_longitude
-        if gps_latitude is not None:
-            insert_data["gps_latitude"] = gps_latitude
+        insert_data = _record_insert_row(
+            bubble_id, user_id, ai_process_type, ai_result,
+            model_version, expire_time, gps_longitude, gps_latitude
+        )
 
-        response = client.table("genius_loci_record").insert(insert_data).execute()
+        # 开启写入队列时合并为批量插入; 不等待时写入结果只记录日志
+        if record_writer is not None and record_writer.running:
+            future = await record_writer.put(insert_data)
+            if not wait:
+                logger.info(f"地灵AI记录已加入写入队列, bubble_id={bubble_id}, user_id={user_id}")
+                return None
+            record = await asyncio.shield(future)
+        else:
+            record = (await _insert_records([insert_data]))[0]
 
-        if response.data:
+        if record:
             logger.info(f"成功创建地灵AI记录, bubble_id={bubble_id}, user_id={user_id}, type={ai_process_type}")
-            return response.data[0]
+            return record
         else:
             raise Exception("创建记录失败: 无返回数据")
 
@@ -431,6 +1358,65 @@ async def create_genius_loci_record(
         return None
 
 
+def _record_insert_row(
+    bubble_id: int,
+    user_id: int,
+    ai_process_type: int,
+    ai_result: str,
+    model_version: str = "Qwen2.5-7B",
+    expire_time: Optional[str] = None,
+    gps_longitude: Optional[float] = None,
+    gps_latitude: Optional[float] = None
+) -> Dict[str, Any]:
+    """构建 genius_loci_record 插入行 (参数同 create_genius_loci_record, 未提供的可选列不写入)"""
+    insert_data = {
+        "bubble_id": bubble_id,
+        "user_id": user_id,
+        "ai_process_type": ai_process_type,
+        "ai_result": ai_result,
+        "model_version": model_version,
+        "is_effective": 1
+    }
+
+    if expire_time:
+        insert_data["expire_time"] = expire_time
+
+    # 添加经纬度信息（如果提供）
+    if gps_longitude is not None:
+        insert_data["gps_longitude"] = gps_longitude
+    if gps_latitude is not None:
+        insert_data["gps_latitude"] = gps_latitude
+
+    return insert_data
+
+
+async def _insert_records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """插入地灵记录行并写入记忆网格索引与总结投影"""
+    try:
+        records = await _write_records(rows)
+    except PartialWriteError as e:
+        _index_records(list(e.written.values()))
+        raise
+    _index_records(records)
+    return records
+
+
+async def _write_records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """插入地灵记录行 (写入队列的刷新函数, 不含缓存/索引更新)"""
+    return await _bulk_insert("genius_loci_record", rows, RECORD_WRITE_RETURN_COLUMNS)
+
+
+def _index_records(records: List[Dict[str, Any]]) -> None:
+    """地灵记录写入后更新记忆网格索引与总结投影 (写入已提交, 出错只记录日志)"""
+    for record in records:
+        try:
+            memory_index.offer(record)
+            _offer_summary(record)
+        except Exception as e:
+            logger.error(f"地灵记录写入后更新缓存失败, id={record.get('id')}: {e}")
+
+
+@instrumented
 async def get_nearby_genius_loci_memory(
     gps_longitude: float,
     gps_latitude: float,
@@ -454,130 +1440,212 @@ async def get_nearby_genius_loci_memory(
     Returns:
         最近的一条记忆记录，如果没有则返回 None
     """
-    try:
-        client = db.get_client()
+    records = await get_nearby_genius_loci_memories(
+        gps_longitude, gps_latitude, radius_km=radius_km, ai_process_type=ai_process_type, limit=1
+    )
+    return records[0] if records else None
 
-        # 计算边界框（约等于指定半径）
-        # 1度约等于111公里，所以 radius_km 对应约 radius_km/111 度
-        delta = radius_km / 111.0
-
-        min_lon = gps_longitude - delta
-        max_lon = gps_longitude + delta
-        min_lat = gps_latitude - delta
-        max_lat = gps_latitude + delta
-
-        # 直接查询 genius_loci_record 表（该表已有 gps_longitude 和 gps_latitude 字段）
-        # 地灵记住所有用户在该位置的记忆（不排除任何用户）
-        query = client.table("genius_loci_record").select("*")
-        query = query.gte("gps_longitude", min_lon)
-        query = query.lte("gps_longitude", max_lon)
-        query = query.gte("gps_latitude", min_lat)
-        query = query.lte("gps_latitude", max_lat)
-        query = query.eq("ai_process_type", ai_process_type)
-        query = query.eq("is_effective", 1)
 
-        # 按处理时间倒序，获取最近的记录
-        query = query.order("process_time", desc=True).limit(1)
+@instrumented
+async def get_nearby_genius_loci_memories(
+    gps_longitude: float,
+    gps_latitude: float,
+    radius_km: float = 1.0,
+    ai_process_type: int = 5,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    获取指定位置附近最近的若干条地灵记忆（候选集合, 由调用方在本地排序）
 
-        response = query.execute()
+    radius_km 等于 MEMORY_INDEX_RADIUS_KM 且 limit 不超过 MEMORY_INDEX_DEPTH 时，
+    按查询点所在网格查找（网格索引 + 负缓存），检索范围为该网格向外扩展 radius_km；
+    否则按半径边界框直接查询数据库。两种方式的结果都按球面距离过滤到 radius_km 以内
 
-        if response.data:
-            record = response.data[0]
-            logger.info(f"✓ 检索到附近地灵记忆: id={record['id']}, bubble_id={record['bubble_id']}, user_id={record['user_id']}")
-            return record
+    Args:
+        gps_longitude: 经度
+        gps_latitude: 纬度
+        radius_km: 搜索半径（公里），默认 1km
+        ai_process_type: AI 处理类型，默认为 5（对话总结）
+        limit: 返回数量限制
+
+    Returns:
+        按处理时间倒序的记忆记录列表
+    """
+    try:
+        # 一次字典查找, 未命中时按网格范围查库 (一次查询取 depth 条) 并回填
+        if radius_km == memory_index.radius_km and limit <= memory_index.depth:
+            key = memory_index.key_for(gps_longitude, gps_latitude, ai_process_type)
+            found, records = memory_index.lookup(key)
+            if not found:
+                # 加载期间新建的记忆记入写入日志, 回填时合并 (查询结果可能来自落后的只读副本)
+                journal = memory_index.begin_load(key)
+                try:
+                    records = await _query_latest_memories(
+                        memory_index.region(key), ai_process_type, memory_index.depth
+                    )
+                except Exception:
+                    memory_index.abort_load(journal)
+                    raise
+                records = memory_index.store(key, records, journal)
+            # 网格的检索范围大于查询半径 (网格本身 + radius_km), 按距离过滤;
+            # 网格中缓存的记忆可能在缓存期间过期
+            now = datetime.now(timezone.utc)
+            records = within_radius(records, gps_longitude, gps_latitude, radius_km)
+            records = [record for record in records if not _is_expired(record, now)][:limit]
         else:
-            # 调试：查询所有符合条件的记录（不限制地理位置）
-            logger.warning(f"附近 {radius_km}km 内无地灵记忆，开始调试查询...")
-            debug_query = client.table("genius_loci_record").select("*")
-            debug_query = debug_query.eq("ai_process_type", ai_process_type).eq("is_effective", 1)
-            debug_query = debug_query.order("process_time", desc=True).limit(5)
-
-            debug_response = debug_query.execute()
-            if debug_response.data:
-                logger.info(f"数据库中存在 {len(debug_response.data)} 条地灵记忆记录:")
-                for i, rec in enumerate(debug_response.data):
-                    logger.info(f"  [{i+1}] id={rec['id']}, gps=({rec.get('gps_longitude')}, {rec.get('gps_latitude')}), user_id={rec['user_id']}, bubble_id={rec.get('bubble_id')}")
-            else:
-                logger.warning("数据库中不存在任何地灵记忆记录（ai_process_type=5, is_effective=1）")
-
-            logger.info(f"查询范围: longitude[{min_lon:.6f}, {max_lon:.6f}], latitude[{min_lat:.6f}, {max_lat:.6f}]")
-            return None
+            records = await _query_latest_memories(
+                bounding_box(gps_longitude, gps_latitude, radius_km), ai_process_type, limit
+            )
+            # 边界框的四角超出半径
+            records = within_radius(records, gps_longitude, gps_latitude, radius_km)
+
+        if records:
+            logger.info(f"✓ 检索到附近地灵记忆 {len(records)} 条, 最近: id={records[0]['id']}, bubble_id={records[0]['bubble_id']}")
+        else:
+            logger.info(f"附近 {radius_km}km 内无地灵记忆: ({gps_longitude}, {gps_latitude})")
+        return records
 
     except Exception as e:
         logger.error(f"检索附近地灵记忆失败: {e}")
-        return None
+        return []
+
 
+@instrumented
+async def _query_latest_memories(bbox: BBox, ai_process_type: int, limit: int) -> List[Dict[str, Any]]:
+    """
+    查询经纬度范围内最近的若干条有效记忆
+
+    Args:
+        bbox: (min_lon, max_lon, min_lat, max_lat)
+        ai_process_type: AI 处理类型
+        limit: 返回数量限制
+
+    Returns:
+        按处理时间倒序的记忆记录列表
+    """
+    min_lon, max_lon, min_lat, max_lat = bbox
+    client = db.get_client(read_only=True)
 
+    # 地灵记住所有用户在该位置的记忆（不排除任何用户）
+    query = client.table("genius_loci_record").select(MEMORY_LOOKUP_COLUMNS)
+    query = query.gte("gps_longitude", min_lon)
+    query = query.lte("gps_longitude", max_lon)
+    query = query.gte("gps_latitude", min_lat)
+    query = query.lte("gps_latitude", max_lat)
+    query = query.eq("ai_process_type", ai_process_type)
+    query = query.eq("is_effective", 1)
+    query = _unexpired(query)
+
+    since = None
+    if settings.MEMORY_LOOKBACK_DAYS > 0:
+        since = datetime.now(timezone.utc) - timedelta(days=settings.MEMORY_LOOKBACK_DAYS)
+    query = _recent(query, since)
+
+    # 按处理时间倒序，获取最近的记录
+    query = query.order("process_time", desc=True).limit(limit)
+
+    response = await db.execute(query)
+    return response.data or []
+
+
+@instrumented
 async def get_bubble_genius_loci_records(
-    bubble_id: int
+    bubble_id: int,
+    limit: int = 50,
+    after: Optional[Tuple[str, int]] = None
 ) -> List[Dict[str, Any]]:
     """
-    获取某个气泡的所有 AI 处理记录
+    获取某个气泡的 AI 处理记录 (按处理时间倒序)
 
     Args:
         bubble_id: 气泡 ID
+        limit: 返回数量限制
+        after: 分页位置 (process_time, id), 只返回排在其后的记录
 
     Returns:
         该气泡的 AI 处理记录列表
     """
     try:
-        client = db.get_client()
+        client = db.get_client(read_only=True)
 
-        response = client.table("genius_loci_record") \
-            .select("*") \
+        query = client.table("genius_loci_record") \
+            .select(RECORD_DETAIL_COLUMNS) \
             .eq("bubble_id", bubble_id) \
-            .eq("is_effective", 1) \
-            .order("process_time", desc=True) \
-            .execute()
+            .eq("is_effective", 1)
+        query = _recent(_unexpired(query))
 
-        if response.data:
-            return response.data
-        return []
+        if after is not None:
+            # 冗余的上界条件: OR 形式的键集条件不能用于分区裁剪
+            query = query.lte("process_time", after[0])
+            query = query.or_(keyset_filter("process_time", after[0], after[1], descending=True))
+
+        query = _order(query, "process_time.desc", "id.desc").limit(limit)
+
+        response = await db.execute(query)
+        records = response.data or []
+
+        # 记录不会早于笔记的创建时间, 只读取笔记创建月份之后的归档文件
+        if cold_store is not None and len(records) < limit:
+            try:
+                note = await get_bubble_note_by_id(bubble_id)
+            except Exception:
+                note = None  # 已记录日志, 读取全部月份
+            since = parse_time(note.get("create_time")) if note else None
+            records = await _fill_from_archive(records, "bubble_id", bubble_id, limit, after, since=since)
+
+        return records
 
     except Exception as e:
         logger.error(f"获取气泡AI记录失败: {e}")
         return []
 
 
+@instrumented
 async def get_user_genius_loci_memories(
     user_id: int,
     ai_process_type: Optional[int] = None,
-    limit: int = 10
+    limit: int = 10,
+    after: Optional[Tuple[str, int]] = None
 ) -> List[Dict[str, Any]]:
     """
-    获取用户的地灵 AI 处理记录列表
+    获取用户的地灵 AI 处理记录列表 (按处理时间倒序)
 
     Args:
         user_id: 用户 ID
         ai_process_type: AI 处理类型（可选，不指定则返回所有类型）
         limit: 返回数量限制
+        after: 分页位置 (process_time, id), 只返回排在其后的记录
 
     Returns:
         用户的 AI 处理记录列表
     """
     try:
-        client = db.get_client()
+        client = db.get_client(read_only=True)
 
-        query = client.table("genius_loci_record").select("*")
+        query = client.table("genius_loci_record").select(RECORD_DETAIL_COLUMNS)
         query = query.eq("user_id", user_id)
         query = query.eq("is_effective", 1)
+        query = _recent(_unexpired(query))
 
         if ai_process_type is not None:
             query = query.eq("ai_process_type", ai_process_type)
 
-        query = query.order("process_time", desc=True).limit(limit)
+        if after is not None:
+            query = query.lte("process_time", after[0])  # 分区裁剪, 同上
+            query = query.or_(keyset_filter("process_time", after[0], after[1], descending=True))
 
-        response = query.execute()
+        query = _order(query, "process_time.desc", "id.desc").limit(limit)
 
-        if response.data:
-            return response.data
-        return []
+        response = await db.execute(query)
+
+        return await _fill_from_archive(response.data or [], "user_id", user_id, limit, after, ai_process_type)
 
     except Exception as e:
         logger.error(f"获取用户AI记录失败: {e}")
         return []
 
 
+@instrumented
 async def get_ai_summary_by_bubble_id(
     bubble_id: int,
     user_id: Optional[int] = None
@@ -585,6 +1653,8 @@ async def get_ai_summary_by_bubble_id(
     """
     根据 bubble_id 查询 AI 总结（从 genius_loci_record 表）
 
+    先查进程内的最新总结投影, 未命中时查库并回填, 同一笔记的并发查询合并为一次
+
     Args:
         bubble_id: 气泡笔记 ID
         user_id: 用户 ID（可选，用于权限验证）
@@ -592,26 +1662,28 @@ async def get_ai_summary_by_bubble_id(
     Returns:
         AI 记录字典，包含 ai_result 字段；如果不存在或未生成则返回 None
     """
-    try:
-        client = db.get_client()
+    # 总结投影命中时不查库 (含 "尚无总结" 的负缓存)
+    hit, record = _cached_summary(bubble_id, user_id)
+    if hit:
+        return record if record is not None and record.get("ai_result") else None
 
-        # 构建查询
-        query = client.table("genius_loci_record").select("*")
-        query = query.eq("bubble_id", bubble_id)
-        query = query.eq("ai_process_type", 5)  # 5-对话总结
-        query = query.eq("is_effective", 1)  # 只查询有效记录
+    return await _coalesce(
+        summary_flight, (bubble_id, user_id),
+        lambda: _query_ai_summary(bubble_id, user_id)
+    )
 
-        # 如果指定了 user_id，进行权限验证
-        if user_id is not None:
-            query = query.eq("user_id", user_id)
 
-        # 按处理时间倒序，获取最新的总结
-        query = query.order("process_time", desc=True).limit(1)
-
-        response = query.execute()
+async def _query_ai_summary(bubble_id: int, user_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    """查询最新的有效 AI 总结并回填总结投影 (参数同 get_ai_summary_by_bubble_id)"""
+    journal = _begin_summary_load(bubble_id)
+    try:
+        record = await _select_ai_summary(bubble_id, user_id, read_only=True)
+        if record is None:
+            # 只读副本可能还没有刚写入的总结, 负缓存以主库为准
+            record = await _select_ai_summary(bubble_id, user_id, read_only=False)
+        record = _store_summary(bubble_id, user_id, record, journal)
 
-        if response.data:
-            record = response.data[0]
+        if record:
             logger.info(f"找到 AI 总结记录: bubble_id={bubble_id}, record_id={record['id']}")
 
             # 检查 ai_result 是否为空
@@ -627,6 +1699,805 @@ async def get_ai_summary_by_bubble_id(
     except Exception as e:
         logger.error(f"查询 AI 总结失败: {e}")
         return None
+    finally:
+        _end_summary_load(journal)
+
+
+async def _select_ai_summary(bubble_id: int, user_id: Optional[int], read_only: bool) -> Optional[Dict[str, Any]]:
+    """从数据库读取最新的有效 AI 总结, 不存在时返回 None"""
+    client = db.get_client(read_only=read_only)
+
+    # 构建查询
+    query = client.table("genius_loci_record").select(SUMMARY_COLUMNS)
+    query = query.eq("bubble_id", bubble_id)
+    query = query.eq("ai_process_type", 5)  # 5-对话总结
+    query = query.eq("is_effective", 1)  # 只查询有效记录
+    query = _recent(_unexpired(query))
+
+    # 如果指定了 user_id，进行权限验证
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+
+    # 按处理时间倒序，获取最新的总结
+    query = query.order("process_time", desc=True).limit(1)
+
+    response = await db.execute(query)
+    return response.data[0] if response.data else None
+
+
+# ========================================
+# 批量写入与写入队列
+# ========================================
+
+# 值得重试的错误码 (连接/资源不足/序列化冲突/数据库重启); 其余 APIError 视为数据错误
+_TRANSIENT_WRITE_CODES = {"PGRST000", "PGRST001", "PGRST002", "08000", "08006", "40001", "40P01", "53300", "57P01", "57P03"}
+
+
+# 请求未发出的网络错误 (读超时等发出后的错误可能已提交, 不重试)
+_UNSENT_WRITE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionRefusedError)
+
+
+def _is_transient_write_error(error: Exception) -> bool:
+    """判断写入错误是否值得重试: 只有确定未提交的连接错误与已回滚的事务错误"""
+    if isinstance(error, APIError):
+        return error.code in _TRANSIENT_WRITE_CODES
+    return isinstance(error, _UNSENT_WRITE_ERRORS)
+
+
+def _is_data_write_error(error: Exception) -> bool:
+    """判断写入错误是否为数据错误 (数据库/PostgREST 拒绝了请求, 整个语句已回滚)"""
+    return isinstance(error, APIError) and error.code is not None and error.code not in _TRANSIENT_WRITE_CODES
+
+
+async def _bulk_insert(table: str, rows: List[Dict[str, Any]], returning: str) -> List[Dict[str, Any]]:
+    """
+    多行插入 (每个请求最多 BULK_INSERT_CHUNK_SIZE 行)
+
+    PostgREST 按第一行的键确定插入列, 键集合不同的行分到不同请求, 避免缺少的列被写成 NULL 而不是默认值
+
+    Args:
+        table: 表名
+        rows: 插入行
+        returning: 回传的列 (服务端生成的列)
+
+    Returns:
+        按输入顺序合并了回传列的行
+
+    Raises:
+        PartialWriteError: 部分请求已提交后失败 (携带已提交的行, 调用方只能重试其余行)
+    """
+    client = db.get_client(use_admin=True)
+    chunk_size = max(settings.BULK_INSERT_CHUNK_SIZE, 1)
+
+    groups: Dict[frozenset, List[int]] = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(frozenset(row), []).append(position)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    abandoned: List[int] = []
+    mismatch: Optional[Exception] = None
+    for positions in groups.values():
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            query = client.table(table).insert([rows[position] for position in chunk])
+            try:
+                response = await db.execute(_returning(query, returning))
+            except Exception as e:
+                written = {position: row for position, row in enumerate(results) if row is not None}
+                if written or abandoned:
+                    raise PartialWriteError(written, e, abandoned) from e
+                raise
+            returned = response.data or []
+            if len(returned) != len(chunk):
+                # 请求已提交但无法对应回传行, 这些行不能重试
+                mismatch = Exception(f"批量插入 {table} 返回 {len(returned)} 行, 预期 {len(chunk)} 行")
+                abandoned.extend(chunk)
+                continue
+            for position, generated in zip(chunk, returned):
+                results[position] = {**rows[position], **generated}
+
+    if mismatch is not None:
+        written = {position: row for position, row in enumerate(results) if row is not None}
+        raise PartialWriteError(written, mismatch, abandoned)
+    return results
+
+
+@instrumented
+async def bulk_create_bubble_notes(notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    批量创建气泡笔记 (导入等场景, 每 BULK_INSERT_CHUNK_SIZE 行一个请求)
+
+    Args:
+        notes: 笔记数据字典列表 (字段同 create_bubble_note)
+
+    Returns:
+        按输入顺序插入后的笔记; 中途失败时抛出异常, 已提交的分块不回滚
+    """
+    try:
+        created = await _insert_notes([_note_insert_row(data) for data in notes])
+        logger.info(f"批量创建气泡笔记: {len(created)} 条")
+        return created
+    except Exception as e:
+        logger.error(f"批量创建气泡笔记失败: {e}")
+        raise
+
+
+@instrumented
+async def bulk_create_genius_loci_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    批量创建地灵 AI 处理结果记录 (导入等场景, 每 BULK_INSERT_CHUNK_SIZE 行一个请求)
+
+    Args:
+        records: 记录字典列表 (键为 create_genius_loci_record 的参数名)
+
+    Returns:
+        按输入顺序插入后的记录; 中途失败时抛出异常, 已提交的分块不回滚
+    """
+    try:
+        created = await _insert_records([_record_insert_row(**record) for record in records])
+        logger.info(f"批量创建地灵AI记录: {len(created)} 条")
+        return created
+    except Exception as e:
+        logger.error(f"批量创建地灵AI记录失败: {e}")
+        raise
+
+
+def _write_queue(name: str, flush, after_write) -> WriteBehindQueue:
+    return WriteBehindQueue(
+        name=name,
+        flush=flush,
+        is_transient=_is_transient_write_error,
+        is_data_error=_is_data_write_error,
+        after_write=after_write,
+        max_batch=settings.BULK_INSERT_CHUNK_SIZE,
+        max_delay=settings.WRITE_BEHIND_FLUSH_SECONDS,
+        max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+        max_retries=settings.WRITE_BEHIND_MAX_RETRIES,
+        backoff_seconds=settings.WRITE_BEHIND_BACKOFF_SECONDS,
+        backoff_max_seconds=settings.WRITE_BEHIND_BACKOFF_MAX_SECONDS
+    )
+
+
+# 地灵记录写入队列 (归档写入合并为批量插入)
+record_writer: Optional[WriteBehindQueue] = (
+    _write_queue("genius_loci_record", _write_records, _index_records) if settings.WRITE_BEHIND_ENABLED else None
+)
+# 笔记写入队列 (创建请求需要等待生成的 id, 合并窗口会增加创建延迟, 默认关闭)
+note_writer: Optional[WriteBehindQueue] = (
+    _write_queue("bubble_note", _write_notes, _index_notes) if settings.WRITE_BEHIND_NOTES_ENABLED else None
+)
+
+
+def start_write_behind() -> None:
+    """启动写入队列 (应用启动时调用, 未开启时为空操作)"""
+    for writer in (record_writer, note_writer):
+        if writer is not None:
+            writer.start()
+
+
+async def stop_write_behind() -> None:
+    """停止写入队列并写入全部积压的行 (应用退出时调用, 须在关闭存储后端之前)"""
+    for writer in (note_writer, record_writer):
+        if writer is not None:
+            await writer.stop(timeout=settings.WRITE_BEHIND_SHUTDOWN_SECONDS)
+
+
+def get_write_queue_stats() -> Dict[str, Any]:
+    """获取写入队列统计 (健康检查展示)"""
+    return {writer.name: writer.get_stats() for writer in (record_writer, note_writer) if writer is not None}
+
+
+# ========================================
+# weight_score 批量计算
+# ========================================
+
+# 表不存在 (迁移 003 未执行) 的错误码
+_MISSING_TABLE_CODES = ("PGRST205", "42P01")
+
+# bulk_update_weight_scores 函数是否可用 (None 表示尚未调用过)
+_bulk_score_rpc_available: Optional[bool] = None
+
+
+@instrumented
+async def iter_bubbles_for_scoring(batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    按 id 键集分页读取全部有效笔记的打分特征 (全量计算)
+
+    Args:
+        batch_size: 每批行数
+
+    Yields:
+        一批笔记行 (SCORING_COLUMNS)
+    """
+    client = db.get_client(use_admin=True)
+    last_id = 0
+    while True:
+        query = client.table("bubble_note").select(SCORING_COLUMNS)
+        query = query.eq("is_valid", 1).gt("id", last_id)
+        query = query.order("id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+@instrumented
+async def get_bubbles_for_scoring(note_ids: List[int], batch_size: int) -> List[Dict[str, Any]]:
+    """
+    按 id 批量读取有效笔记的打分特征 (增量计算)
+
+    Args:
+        note_ids: 笔记 ID 列表
+        batch_size: 每次请求的 id 数
+
+    Returns:
+        笔记行列表 (按 id 升序)
+    """
+    client = db.get_client(use_admin=True)
+    rows: List[Dict[str, Any]] = []
+    ids = sorted(set(note_ids))
+    for start in range(0, len(ids), batch_size):
+        query = client.table("bubble_note").select(SCORING_COLUMNS)
+        query = query.in_("id", ids[start:start + batch_size]).eq("is_valid", 1)
+        response = await db.execute(query.order("id"))
+        rows.extend(response.data or [])
+    return rows
+
+
+@instrumented
+async def get_changed_bubble_ids(watermark: str, batch_size: int) -> List[int]:
+    """
+    读取 update_time 水位之后变更的有效笔记 id (含新建的笔记)
+
+    Args:
+        watermark: update_time 水位 (闭区间)
+        batch_size: 每批行数
+
+    Returns:
+        笔记 ID 列表
+    """
+    client = db.get_client(use_admin=True)
+    note_ids: List[int] = []
+    after: Optional[Tuple[str, int]] = None
+    while True:
+        query = client.table("bubble_note").select("id,update_time")
+        query = query.eq("is_valid", 1).gte("update_time", watermark)
+        if after is not None:
+            query = query.or_(keyset_filter("update_time", after[0], after[1], descending=False))
+        query = _order(query, "update_time", "id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        note_ids.extend(row["id"] for row in rows)
+        if len(rows) < batch_size:
+            return note_ids
+        after = (rows[-1]["update_time"], rows[-1]["id"])
+
+
+@instrumented
+async def get_recent_memory_bubble_ids(watermark: str, batch_size: int) -> List[int]:
+    """
+    读取 process_time 水位之后新增地灵记忆的笔记 id
+
+    Args:
+        watermark: process_time 水位 (闭区间)
+        batch_size: 每批行数
+
+    Returns:
+        去重后的笔记 ID 列表
+    """
+    client = db.get_client(use_admin=True)
+    bubble_ids = set()
+    after: Optional[Tuple[str, int]] = None
+    while True:
+        query = client.table("genius_loci_record").select("id,bubble_id,process_time")
+        query = query.eq("ai_process_type", 5).gte("process_time", watermark)
+        if after is not None:
+            query = query.or_(keyset_filter("process_time", after[0], after[1], descending=False))
+        query = _order(query, "process_time", "id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        bubble_ids.update(row["bubble_id"] for row in rows if row.get("bubble_id") is not None)
+        if len(rows) < batch_size:
+            return sorted(bubble_ids)
+        after = (rows[-1]["process_time"], rows[-1]["id"])
+
+
+@instrumented
+async def get_memory_records_for_scoring(bubble_ids: List[int], batch_size: int) -> List[Dict[str, Any]]:
+    """
+    读取一批笔记的有效对话总结记录 (用于统计记忆数与对话轮数)
+
+    Args:
+        bubble_ids: 笔记 ID 列表
+        batch_size: 每批行数
+
+    Returns:
+        记录列表 (SCORING_RECORD_COLUMNS)
+    """
+    if not bubble_ids:
+        return []
+
+    client = db.get_client(use_admin=True)
+    records: List[Dict[str, Any]] = []
+    last_id = 0
+    while True:
+        query = client.table("genius_loci_record").select(SCORING_RECORD_COLUMNS)
+        query = query.in_("bubble_id", bubble_ids).eq("ai_process_type", 5).eq("is_effective", 1)
+        query = _recent(_unexpired(query))
+        query = query.gt("id", last_id).order("id").limit(batch_size)
+        response = await db.execute(query)
+
+        rows = response.data or []
+        records.extend(rows)
+        if len(rows) < batch_size:
+            return records
+        last_id = rows[-1]["id"]
+
+
+@instrumented
+async def get_latest_change_times() -> Tuple[Optional[str], Optional[str]]:
+    """
+    读取当前最新的笔记 update_time 与记忆 process_time (本次运行结束后保存为水位)
+
+    Returns:
+        (bubble_note 最新 update_time, genius_loci_record 最新 process_time)
+    """
+    client = db.get_client(use_admin=True)
+
+    query = client.table("bubble_note").select("update_time").order("update_time", desc=True).limit(1)
+    notes = (await db.execute(query)).data or []
+
+    query = client.table("genius_loci_record").select("process_time").order("process_time", desc=True).limit(1)
+    records = (await db.execute(query)).data or []
+
+    return (
+        notes[0]["update_time"] if notes else None,
+        records[0]["process_time"] if records else None,
+    )
+
+
+@instrumented
+async def get_job_watermark(job_name: str) -> Optional[str]:
+    """
+    读取批处理任务的增量水位
+
+    Args:
+        job_name: 任务名
+
+    Returns:
+        水位时间戳, 未运行过 (或水位表不存在) 时返回 None
+    """
+    try:
+        client = db.get_client(use_admin=True)
+        query = client.table("job_watermark").select("watermark").eq("job_name", job_name).limit(1)
+        response = await db.execute(query)
+        return response.data[0]["watermark"] if response.data else None
+    except APIError as e:
+        if e.code in _MISSING_TABLE_CODES:
+            logger.warning("job_watermark 表不存在 (未执行迁移 003), 将按全量计算")
+            return None
+        raise
+
+
+@instrumented
+async def set_job_watermark(job_name: str, watermark: Optional[str]) -> None:
+    """
+    保存批处理任务的增量水位
+
+    Args:
+        job_name: 任务名
+        watermark: 水位时间戳
+    """
+    if watermark is None:
+        return
+
+    try:
+        client = db.get_client(use_admin=True)
+        query = client.table("job_watermark").upsert(
+            {"job_name": job_name, "watermark": watermark, "updated_at": datetime.now(timezone.utc).isoformat()},
+            on_conflict="job_name"
+        )
+        await db.execute(_returning(query, "job_name"))
+    except APIError as e:
+        if e.code in _MISSING_TABLE_CODES:
+            logger.warning("job_watermark 表不存在 (未执行迁移 003), 水位未保存")
+            return
+        raise
+
+
+@instrumented
+async def bulk_update_weight_scores(updates: List[Dict[str, Any]]) -> int:
+    """
+    批量写回 weight_score 并同步进程内缓存/索引/排行榜
+
+    优先调用数据库函数 bulk_update_weight_scores (迁移 003, 一次请求写一批);
+    函数不存在时逐行更新 (受数据库线程池并发限制)
+
+    Args:
+        updates: 笔记行列表, 需包含 id / user_id / status / is_valid / weight_score
+
+    Returns:
+        数据库实际写入的行数
+    """
+    global _bulk_score_rpc_available
+    if not updates:
+        return 0
+
+    client = db.get_client(use_admin=True)
+    written = None
+    if _bulk_score_rpc_available is not False:
+        try:
+            query = client.rpc("bulk_update_weight_scores", {
+                "ids": [row["id"] for row in updates],
+                "scores": [row["weight_score"] for row in updates],
+            })
+            response = await db.execute(query)
+            written = int(response.data or 0)
+            _bulk_score_rpc_available = True
+        except Exception as e:
+            if not _is_missing_function(e):
+                raise
+            logger.warning("数据库函数 bulk_update_weight_scores 不存在 (未执行迁移 003), 改为逐行更新")
+            _bulk_score_rpc_available = False
+
+    if written is None:
+        responses = await asyncio.gather(*(
+            db.execute(_returning(
+                client.table("bubble_note").update({"weight_score": row["weight_score"]}).eq("id", row["id"]),
+                "id"
+            ))
+            for row in updates
+        ))
+        written = sum(len(response.data or []) for response in responses)
+
+    for row in updates:
+        note_cache.invalidate(row["id"])
+        fields = {key: row[key] for key in ("user_id", "status", "is_valid", "weight_score") if key in row}
+        if spatial_index is not None:
+            spatial_index.apply_update(row["id"], fields)
+        if leaderboard is not None:
+            leaderboard.apply_update(row["id"], fields)
+
+    return written
+
+
+# ========================================
+# 冷数据归档 (compaction)
+# ========================================
+
+async def _call_compaction(function: str, params: Dict[str, Any], migration: str = "004") -> Any:
+    """调用迁移 004 (或 migration 指定的迁移) 中的数据库函数, 函数不存在 (未执行迁移) 时返回 None"""
+    client = db.get_client(use_admin=True)
+    try:
+        response = await db.execute(client.rpc(function, params))
+        return response.data
+    except Exception as e:
+        if _is_missing_function(e):
+            logger.warning(f"数据库函数 {function} 不存在 (未执行迁移 {migration}), 跳过")
+            return None
+        raise
+
+
+@instrumented
+async def compact_bubble_notes(batch_size: int, deleted_before: str) -> Optional[Dict[str, int]]:
+    """
+    把一批软删除笔记连同其地灵记录移到冷数据表
+
+    Args:
+        batch_size: 本批最多移动的笔记数
+        deleted_before: 只移动 update_time 早于该时间的笔记 (删除宽限期)
+
+    Returns:
+        {"notes": 移动的笔记数, "records": 移动的记录数}, 未执行迁移 004 时返回 None
+    """
+    data = await _call_compaction("compact_bubble_notes", {"batch_size": batch_size, "deleted_before": deleted_before})
+    if data is None:
+        return None
+    row = data[0] if isinstance(data, list) and data else {}
+    moved = {"notes": int(row.get("notes") or 0), "records": int(row.get("records") or 0)}
+
+    # 移走的记录可能还在记忆网格缓存与总结投影中
+    if moved["records"]:
+        memory_index.clear()
+        summary_cache.clear()
+    return moved
+
+
+@instrumented
+async def compact_expired_records(batch_size: int, expired_before: str) -> Optional[int]:
+    """
+    把一批已过期的地灵记录移到冷数据表
+
+    Args:
+        batch_size: 本批最多移动的记录数
+        expired_before: 只移动 expire_time 早于该时间的记录
+
+    Returns:
+        移动的记录数, 未执行迁移 004 时返回 None
+    """
+    data = await _call_compaction("compact_expired_records", {"batch_size": batch_size, "expired_before": expired_before})
+    return None if data is None else int(data or 0)
+
+
+@instrumented
+async def get_table_storage_stats() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    读取热表与冷数据表的行数、表与索引大小
+
+    Returns:
+        {表名: {table_bytes, index_bytes, live_rows, dead_rows}}, 未执行迁移 004 时返回 None
+    """
+    data = await _call_compaction("table_storage_stats", {})
+    if data is None:
+        return None
+    return {row["table_name"]: {key: value for key, value in row.items() if key != "table_name"} for row in data}
+
+
+# ========================================
+# 地灵记录月份分区 (迁移 006)
+# ========================================
+
+@instrumented
+async def ensure_record_partitions(months_ahead: int) -> Optional[int]:
+    """
+    提前创建 genius_loci_record 的月份分区
+
+    Args:
+        months_ahead: 除当月外再创建之后多少个月的分区
+
+    Returns:
+        新建的分区数, 未执行迁移 006 时返回 None
+    """
+    data = await _call_compaction("ensure_genius_loci_record_partitions", {"months_ahead": months_ahead}, "006")
+    return None if data is None else int(data or 0)
+
+
+@instrumented
+async def drop_expired_record_partitions(retain_months: int) -> Optional[List[str]]:
+    """
+    按保留策略删除过早的 genius_loci_record 月份分区 (其中的记录永久删除)
+
+    Args:
+        retain_months: 保留的整月数 (另加当月), <= 0 时不删除
+
+    Returns:
+        删除的分区名列表, 未执行迁移 006 时返回 None
+    """
+    data = await _call_compaction("drop_expired_genius_loci_record_partitions", {"retain_months": retain_months}, "006")
+    if data is None:
+        return None
+    dropped = list(data or [])
+
+    # 删除的记录可能还在记忆网格缓存与总结投影中
+    if dropped:
+        memory_index.clear()
+        summary_cache.clear()
+    return dropped
+
+
+# ========================================
+# 冷数据文件归档 (Parquet, 见 app/core/cold_store.py)
+# ========================================
+
+# 未开启或未安装 pyarrow 时为 None
+cold_store: Optional[ColdStore] = create_cold_store() if settings.COLD_ARCHIVE_ENABLED else None
+
+# 按 (列, 值, 起始月份) 缓存的归档记录, 归档任务删除热数据后清空
+archived_records_cache = TTLCache(
+    name="archived_records",
+    max_entries=settings.COLD_ARCHIVE_CACHE_ENTRIES,
+    ttl_seconds=settings.COLD_ARCHIVE_CACHE_TTL_SECONDS
+)
+
+
+@instrumented
+async def get_records_before(cutoff: str, after_id: int, batch_size: int) -> List[Dict[str, Any]]:
+    """
+    按 id 顺序读取一批处理时间早于 cutoff 的地灵记录 (冷数据文件归档)
+
+    Args:
+        cutoff: 处理时间上界 (不含)
+        after_id: 只读取 id 大于该值的记录
+        batch_size: 本批最多读取的记录数
+
+    Returns:
+        记录列表 (RECORD_DETAIL_COLUMNS)
+    """
+    client = db.get_client(use_admin=True)
+    query = client.table("genius_loci_record").select(RECORD_DETAIL_COLUMNS) \
+        .lt("process_time", cutoff) \
+        .gt("id", after_id)
+    query = _order(query, "id").limit(batch_size)
+    response = await db.execute(query)
+    return response.data or []
+
+
+@instrumented
+async def get_deleted_notes_before(cutoff: str, after_id: int, batch_size: int) -> List[Dict[str, Any]]:
+    """
+    按 id 顺序读取一批软删除时间早于 cutoff 的笔记 (冷数据文件归档)
+
+    Args:
+        cutoff: update_time 上界 (不含), 软删除会刷新 update_time
+        after_id: 只读取 id 大于该值的笔记
+        batch_size: 本批最多读取的笔记数
+
+    Returns:
+        笔记列表 (BUBBLE_DETAIL_COLUMNS)
+    """
+    client = db.get_client(use_admin=True)
+    query = client.table("bubble_note").select(BUBBLE_DETAIL_COLUMNS) \
+        .eq("is_valid", 0) \
+        .lt("update_time", cutoff) \
+        .gt("id", after_id)
+    query = _order(query, "id").limit(batch_size)
+    response = await db.execute(query)
+    return response.data or []
+
+
+@instrumented
+async def get_records_for_bubbles(bubble_ids: List[int], batch_size: int) -> List[Dict[str, Any]]:
+    """
+    读取若干笔记的全部地灵记录 (不论是否有效/过期, 笔记归档前先归档其记录)
+
+    Args:
+        bubble_ids: 笔记 ID 列表
+        batch_size: 每次请求读取的记录数
+
+    Returns:
+        记录列表 (RECORD_DETAIL_COLUMNS)
+    """
+    if not bubble_ids:
+        return []
+
+    client = db.get_client(use_admin=True)
+    records: List[Dict[str, Any]] = []
+    last_id = 0
+    while True:
+        query = client.table("genius_loci_record").select(RECORD_DETAIL_COLUMNS) \
+            .in_("bubble_id", bubble_ids) \
+            .gt("id", last_id)
+        query = _order(query, "id").limit(batch_size)
+        response = await db.execute(query)
+        rows = response.data or []
+        records.extend(rows)
+        if len(rows) < batch_size:
+            return records
+        last_id = rows[-1]["id"]
+
+
+async def _purge(table: str, ids: List[int], batch_size: int) -> int:
+    """按 id 分批删除已归档的行, 返回删除的行数"""
+    client = db.get_client(use_admin=True)
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        query = client.table(table).delete().in_("id", ids[start:start + batch_size])
+        response = await db.execute(_returning(query, "id"))
+        deleted += len(response.data or [])
+    return deleted
+
+
+@instrumented
+async def purge_archived_records(ids: List[int], batch_size: int) -> int:
+    """
+    删除已写入归档文件的地灵记录
+
+    Args:
+        ids: 记录 ID 列表
+        batch_size: 每次请求删除的行数
+
+    Returns:
+        删除的记录数
+    """
+    deleted = await _purge("genius_loci_record", ids, batch_size)
+
+    # 删除的记录可能还在记忆网格缓存与总结投影中; 归档文件新增了内容
+    if deleted:
+        memory_index.clear()
+        summary_cache.clear()
+    archived_records_cache.clear()
+    return deleted
+
+
+@instrumented
+async def purge_archived_notes(ids: List[int], batch_size: int) -> int:
+    """
+    删除已写入归档文件的软删除笔记 (调用前先归档并删除其地灵记录)
+
+    Args:
+        ids: 笔记 ID 列表
+        batch_size: 每次请求删除的行数
+
+    Returns:
+        删除的笔记数
+    """
+    deleted = await _purge("bubble_note", ids, batch_size)
+    for note_id in ids:
+        note_cache.invalidate(note_id)
+    return deleted
+
+
+async def _read_archived_records(column: str, value: int, since: Optional[datetime]) -> List[Dict[str, Any]]:
+    """读取某列等于 value 的归档记录 (带缓存), 只读取 since 所在月份及之后的文件"""
+    key = (column, value, since.strftime("%Y-%m") if since is not None else None)
+    cached = archived_records_cache.get(key)
+    if cached is not None:
+        return cached["rows"]
+
+    loop = asyncio.get_running_loop()
+    rows = await loop.run_in_executor(None, cold_store.read, "genius_loci_record", column, value, since)
+    archived_records_cache.set(key, {"rows": rows})
+    return rows
+
+
+async def _fill_from_archive(
+    records: List[Dict[str, Any]],
+    column: str,
+    value: int,
+    limit: int,
+    after: Optional[Tuple[str, int]],
+    ai_process_type: Optional[int] = None,
+    since: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    热数据不足一页时补读归档文件中的记录, 与热数据合并后按 (process_time, id) 倒序取一页
+
+    归档记录只接在热数据之后 (排在最后一条热数据之后, 热数据为空时排在分页位置之后):
+    热数据满一页时不读取归档, 比热数据新的归档记录 (只有软删除笔记的记录会提前归档) 不返回,
+    保证各页之间不重不漏; 归档不受热数据保留期 (RECORD_RETENTION_MONTHS) 限制
+
+    Args:
+        records: 热数据查询结果 (已按 (process_time, id) 倒序)
+        column: 过滤列 (user_id / bubble_id)
+        value: 过滤值
+        limit: 每页数量
+        after: 分页位置 (process_time, id)
+        ai_process_type: AI 处理类型 (可选)
+        since: 调用方语义允许的最早处理时间
+
+    Returns:
+        合并后的一页记录, 读取归档失败时原样返回热数据
+    """
+    if cold_store is None or not settings.COLD_ARCHIVE_QUERY_THROUGH or len(records) >= limit:
+        return records
+
+    try:
+        archived = await _read_archived_records(column, value, since)
+    except Exception as e:
+        logger.error(f"读取归档地灵记录失败: {e}")
+        return records
+
+    now = datetime.now(timezone.utc)
+    if records:
+        boundary = (time_sort_key(records[-1]["process_time"]), records[-1]["id"])
+    elif after is not None:
+        boundary = (time_sort_key(after[0]), after[1])
+    else:
+        boundary = None
+    hot_ids = {record["id"] for record in records}
+    merged = list(records)
+    for record in archived:
+        moment = parse_time(record["process_time"])
+        if moment is None or record["id"] in hot_ids or record["is_effective"] != 1 or _is_expired(record, now):
+            continue
+        if ai_process_type is not None and record["ai_process_type"] != ai_process_type:
+            continue
+        if boundary is not None and (moment, record["id"]) >= boundary:
+            continue
+        if since is not None and moment < since:
+            continue
+        merged.append(record)
+        if len(merged) >= limit:
+            break
+
+    merged.sort(key=lambda record: (time_sort_key(record["process_time"]), record["id"]), reverse=True)
+    return merged[:limit]
 
 
 # ========================================
@@ -634,12 +2505,17 @@ async def get_ai_summary_by_bubble_id(
 # ========================================
 
 if __name__ == "__main__":
-    # 测试数据库连接
-    print("测试 Supabase 连接...")
+    # 测试数据库连接 (经由存储后端, 适用于 supabase / memory / sqlite)
+    print(f"测试存储后端连接 ({db.name})...")
+
+    async def _check_connection():
+        query = db.get_client(read_only=True).table("bubble_note").select(BUBBLE_LIST_COLUMNS).limit(1)
+        return await db.execute(query)
 
     try:
-        # 测试查询
-        result = db.client.table("bubble_note").select("*").limit(1).execute()
+        result = asyncio.run(_check_connection())
         print(f"连接成功! 查询结果: {result.data}")
     except Exception as e:
         print(f"连接失败: {e}")
+    finally:
+        db.shutdown()
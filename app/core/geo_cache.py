@@ -0,0 +1,291 @@
+"""
+附近气泡地理瓦片缓存
+把附近查询量化到固定网格瓦片, 缓存每个瓦片的候选集合,
+调用方的精确半径/数量由本地向量化过滤完成
+"""
+
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+import numpy as np
+
+from app.utils.geo import (
+    TileKey,
+    BBox,
+    DistanceKey,
+    haversine_m,
+    nearest_order,
+    bounding_box,
+    tile_key,
+    tile_bounds,
+    tile_count,
+    tiles_for_bbox,
+)
+
+logger = logging.getLogger(__name__)
+
+# 失效记录保留时间 (秒), 需大于单次瓦片加载的最长耗时
+_INVALIDATION_HORIZON_SECONDS = 60.0
+
+# 瓦片加载函数: 传入瓦片经纬度范围, 返回该范围内的有效笔记 (最多 max_rows + 1 条)
+TileLoader = Callable[[BBox, int], Awaitable[List[Dict[str, Any]]]]
+
+
+class _Tile:
+    """单个瓦片的候选集合"""
+
+    __slots__ = ("expires_at", "rows", "ids", "lons", "lats", "statuses")
+
+    def __init__(self, rows: List[Dict[str, Any]], expires_at: float):
+        self.expires_at = expires_at
+        self.rows = rows
+        self.ids = np.fromiter((r["id"] for r in rows), dtype=np.int64, count=len(rows))
+        self.lons = np.fromiter((r["gps_longitude"] for r in rows), dtype=np.float64, count=len(rows))
+        self.lats = np.fromiter((r["gps_latitude"] for r in rows), dtype=np.float64, count=len(rows))
+        self.statuses = np.fromiter((r.get("status") or 0 for r in rows), dtype=np.int16, count=len(rows))
+
+
+class GeoTileCache:
+    """
+    地理瓦片结果缓存
+
+    - 瓦片边长 tile_deg (度), 查询覆盖的瓦片数超过 max_tiles_per_query 时不走缓存
+    - 瓦片内笔记数超过 max_rows_per_tile 时视为热点瓦片, 不缓存 (交给数据库排序)
+    - 写入路径只失效受影响的瓦片
+    - 只在事件循环线程中访问, 不加锁
+    """
+
+    def __init__(
+        self,
+        tile_deg: float,
+        ttl_seconds: float,
+        max_tiles: int,
+        max_rows_per_tile: int,
+        max_tiles_per_query: int
+    ):
+        self.tile_deg = tile_deg
+        self.ttl_seconds = ttl_seconds
+        self.max_tiles = max_tiles
+        self.max_rows_per_tile = max_rows_per_tile
+        self.max_tiles_per_query = max_tiles_per_query
+
+        self._tiles: "OrderedDict[TileKey, _Tile]" = OrderedDict()
+        self._note_tiles: Dict[int, TileKey] = {}  # 笔记 ID -> 所在瓦片 (用于更新/删除时定位)
+        self._oversized: Dict[TileKey, float] = {}  # 热点瓦片 -> 过期时间
+        self._invalidated_at: Dict[TileKey, float] = {}  # 瓦片 -> 最近一次失效时间
+
+        # 统计计数 (按瓦片粒度)
+        self.tile_hits = 0
+        self.tile_misses = 0
+        self.queries_served = 0
+        self.queries_bypassed = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ========================================
+    # 查询
+    # ========================================
+
+    async def query(
+        self,
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        limit: int,
+        status: Optional[int],
+        loader: TileLoader,
+        after: Optional[DistanceKey] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        通过瓦片缓存回答附近查询
+
+        Args:
+            longitude: 中心点经度
+            latitude: 中心点纬度
+            radius_km: 半径 (公里)
+            limit: 返回数量限制
+            status: 状态筛选, None 表示全部
+            loader: 瓦片加载函数
+            after: 分页位置 (距离, id), 只返回排在其后的笔记
+
+        Returns:
+            按 (距离, id) 升序的笔记列表 (含 distance_meters); 无法由缓存回答时返回 None
+        """
+        bbox = bounding_box(longitude, latitude, radius_km)
+        if tile_count(bbox, self.tile_deg) > self.max_tiles_per_query:
+            self.queries_bypassed += 1
+            return None
+
+        keys = tiles_for_bbox(bbox, self.tile_deg)
+        now = time.monotonic()
+
+        if any(self._oversized.get(key, 0.0) > now for key in keys):
+            self.queries_bypassed += 1
+            return None
+
+        tiles: List[Optional[_Tile]] = []
+        missing: List[TileKey] = []
+        for key in keys:
+            tile = self._get_tile(key, now)
+            if tile is None:
+                missing.append(key)
+            tiles.append(tile)
+
+        if missing:
+            started = time.monotonic()
+            loaded = await asyncio.gather(
+                *[loader(tile_bounds(key, self.tile_deg), self.max_rows_per_tile + 1) for key in missing]
+            )
+            now = time.monotonic()
+
+            fresh: Dict[TileKey, _Tile] = {}
+            oversized = False
+            for key, rows in zip(missing, loaded):
+                if len(rows) > self.max_rows_per_tile:
+                    self._oversized[key] = now + self.ttl_seconds
+                    oversized = True
+                    continue
+                fresh[key] = _Tile(rows, now + self.ttl_seconds)
+                # 加载期间瓦片被写入路径失效: 本次可以使用, 但不写入缓存
+                if self._invalidated_at.get(key, 0.0) < started:
+                    self._put_tile(key, fresh[key])
+
+            if oversized:
+                self.queries_bypassed += 1
+                return None
+
+            tiles = [tile if tile is not None else fresh[key] for key, tile in zip(keys, tiles)]
+
+        self.queries_served += 1
+        return self._filter(tiles, longitude, latitude, radius_km, limit, status, after)
+
+    def _filter(
+        self,
+        tiles: List[_Tile],
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        limit: int,
+        status: Optional[int],
+        after: Optional[DistanceKey] = None
+    ) -> List[Dict[str, Any]]:
+        """在候选集合上做精确半径过滤与距离排序"""
+        rows = [row for tile in tiles for row in tile.rows]
+        if not rows:
+            return []
+
+        lons = np.concatenate([tile.lons for tile in tiles])
+        lats = np.concatenate([tile.lats for tile in tiles])
+        distances = haversine_m(longitude, latitude, lons, lats)
+
+        mask = distances <= radius_km * 1000.0
+        if status:
+            statuses = np.concatenate([tile.statuses for tile in tiles])
+            mask &= statuses == status
+
+        ids = np.concatenate([tile.ids for tile in tiles])
+        candidates = np.flatnonzero(mask)
+        order = candidates[nearest_order(distances[candidates], ids[candidates], limit, after)]
+
+        return [{**rows[i], "distance_meters": float(distances[i])} for i in order.tolist()]
+
+    # ========================================
+    # 瓦片存取
+    # ========================================
+
+    def _get_tile(self, key: TileKey, now: float) -> Optional[_Tile]:
+        tile = self._tiles.get(key)
+        if tile is None or tile.expires_at < now:
+            if tile is not None:
+                self._drop_tile(key)
+            self.tile_misses += 1
+            return None
+
+        self._tiles.move_to_end(key)
+        self.tile_hits += 1
+        return tile
+
+    def _put_tile(self, key: TileKey, tile: _Tile) -> None:
+        if key in self._tiles:
+            self._drop_tile(key)
+
+        self._tiles[key] = tile
+        for row in tile.rows:
+            self._note_tiles[row["id"]] = key
+        self._oversized.pop(key, None)
+
+        while len(self._tiles) > self.max_tiles:
+            oldest = next(iter(self._tiles))
+            self._drop_tile(oldest)
+            self.evictions += 1
+
+    def _drop_tile(self, key: TileKey) -> None:
+        tile = self._tiles.pop(key, None)
+        if tile is None:
+            return
+        for row in tile.rows:
+            if self._note_tiles.get(row["id"]) == key:
+                del self._note_tiles[row["id"]]
+
+    # ========================================
+    # 写入失效
+    # ========================================
+
+    def invalidate_point(self, longitude: float, latitude: float) -> None:
+        """失效坐标所在的瓦片"""
+        key = tile_key(longitude, latitude, self.tile_deg)
+        self._oversized.pop(key, None)
+        self._invalidate(key)
+
+    def invalidate_note(self, note_id: int) -> None:
+        """失效笔记当前所在的瓦片 (更新/删除时坐标可能已改变)"""
+        key = self._note_tiles.get(note_id)
+        if key is not None:
+            self._invalidate(key)
+
+    def _invalidate(self, key: TileKey) -> None:
+        now = time.monotonic()
+        self._invalidated_at[key] = now
+
+        # 失效记录只需覆盖进行中的加载, 定期清理旧记录
+        if len(self._invalidated_at) > self.max_tiles:
+            horizon = now - _INVALIDATION_HORIZON_SECONDS
+            self._invalidated_at = {k: t for k, t in self._invalidated_at.items() if t >= horizon}
+
+        if key in self._tiles:
+            self._drop_tile(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._tiles.clear()
+        self._note_tiles.clear()
+        self._oversized.clear()
+        self._invalidated_at.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息 (按瓦片粒度区分, 便于比较不同瓦片大小的命中率)
+
+        Returns:
+            统计信息字典
+        """
+        lookups = self.tile_hits + self.tile_misses
+        queries = self.queries_served + self.queries_bypassed
+        return {
+            "tile_deg": self.tile_deg,
+            "tiles": len(self._tiles),
+            "max_tiles": self.max_tiles,
+            "indexed_notes": len(self._note_tiles),
+            "tile_hits": self.tile_hits,
+            "tile_misses": self.tile_misses,
+            "tile_hit_ratio": round(self.tile_hits / lookups, 4) if lookups else 0.0,
+            "queries_served": self.queries_served,
+            "queries_bypassed": self.queries_bypassed,
+            "served_ratio": round(self.queries_served / queries, 4) if queries else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,173 @@
+"""
+Supabase HTTP 连接池
+匿名客户端与管理员客户端共享同一个 keep-alive 连接池
+"""
+
+import threading
+import logging
+from typing import Dict, Any, Iterator
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+from supabase import Client
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 按线程累计的响应字节数 (数据库线程池中一个线程同一时间只执行一个查询)
+_response_bytes = threading.local()
+
+
+def take_response_bytes() -> int:
+    """
+    取出并清零当前线程累计的响应字节数 (网络传输字节数, 压缩响应按压缩后计)
+
+    Returns:
+        上次取出之后当前线程收到的响应字节数
+    """
+    count = getattr(_response_bytes, "count", 0)
+    _response_bytes.count = 0
+    return count
+
+
+class _CountingStream(httpx.SyncByteStream):
+    """读取响应体时把字节数累计到当前线程"""
+
+    def __init__(self, stream: httpx.SyncByteStream):
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            _response_bytes.count = getattr(_response_bytes, "count", 0) + len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """带饱和度统计的共享 HTTP 传输层"""
+
+    def __init__(self, max_connections: int, **kwargs):
+        super().__init__(**kwargs)
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total_requests = 0
+        self._saturated_requests = 0  # 发起时连接池已满 (需要排队) 的请求数
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            if self._in_flight >= self.max_connections:
+                self._saturated_requests += 1
+            self._in_flight += 1
+            self._total_requests += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            response = super().handle_request(request)
+            response.stream = _CountingStream(response.stream)
+            return response
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计信息
+
+        Returns:
+            连接数、空闲连接数、排队请求数以及饱和度计数
+        """
+        pool = self._pool
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        queued = sum(
+            1 for req in getattr(pool, "_requests", [])
+            if getattr(req, "is_queued", lambda: False)()
+        )
+
+        with self._lock:
+            return {
+                "max_connections": self.max_connections,
+                "connections": len(connections),
+                "idle_connections": idle,
+                "active_connections": len(connections) - idle,
+                "queued_requests": queued,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "total_requests": self._total_requests,
+                "saturated_requests": self._saturated_requests,
+                "saturation_ratio": round(
+                    self._saturated_requests / self._total_requests, 4
+                ) if self._total_requests else 0.0,
+            }
+
+
+def create_shared_transport() -> PooledTransport:
+    """
+    根据配置创建共享连接池
+
+    Returns:
+        共享的 HTTP 传输层实例
+    """
+    limits = httpx.Limits(
+        max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY,
+    )
+
+    http2 = settings.SUPABASE_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 h2, HTTP/2 不可用, 回退到 HTTP/1.1 (pip install httpx[http2])")
+            http2 = False
+
+    transport = PooledTransport(
+        max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+        limits=limits,
+        http2=http2,
+        retries=settings.SUPABASE_CONNECT_RETRIES,
+    )
+    logger.info(
+        f"Supabase 连接池创建成功: max_connections={settings.SUPABASE_POOL_MAX_CONNECTIONS}, "
+        f"keepalive={settings.SUPABASE_POOL_MAX_KEEPALIVE}, http2={http2}"
+    )
+    return transport
+
+
+def bind_transport(client: Client, transport: httpx.BaseTransport) -> None:
+    """
+    让 Supabase 客户端的 PostgREST 请求走共享连接池
+
+    supabase-py 在认证状态变化时会重建 PostgREST 客户端,
+    因此这里替换的是客户端工厂, 而不仅仅是当前会话.
+
+    Args:
+        client: Supabase 客户端
+        transport: 共享传输层
+    """
+    pooled_timeout = httpx.Timeout(
+        settings.SUPABASE_TIMEOUT,
+        connect=settings.SUPABASE_CONNECT_TIMEOUT,
+        pool=settings.SUPABASE_POOL_TIMEOUT,
+    )
+
+    def init_postgrest_client(rest_url, headers, schema, timeout=None) -> SyncPostgrestClient:
+        postgrest = SyncPostgrestClient(rest_url, headers=headers, schema=schema, timeout=pooled_timeout)
+        default_session = postgrest.session
+        postgrest.session = SyncClient(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=pooled_timeout,
+            transport=transport,
+        )
+        default_session.close()
+        return postgrest
+
+    client._init_postgrest_client = init_postgrest_client
+    client._postgrest = None
@@ -0,0 +1,343 @@
+"""
+进程内 Top 排行榜
+全局与按用户的有界排行榜 (按 weight_score 降序, 同分按 id 降序), Top 查询直接由内存回答
+
+- 全局榜在启动时加载, 用户榜在首次查询时加载 (最久未使用的用户榜被淘汰)
+- database.py 的创建/更新/删除路径增量维护, 后台任务定期从数据库重新加载全局榜对账,
+  用户榜按 ttl_seconds 过期后重新加载 (覆盖其它进程/直接写库产生的变更)
+- 榜单只保留前 capacity 条: 排在末位之后的写入无法判断名次, 不进入榜单;
+  成员被移出导致榜单少于 min_size 时让该榜过期, 下次查询重新加载
+- 只在事件循环线程中访问, 不加锁
+"""
+
+import time
+import logging
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 榜单排序键: (-weight_score, -id) 升序
+RankKey = Tuple[float, int]
+
+
+class _Board:
+    """单个有界排行榜"""
+
+    __slots__ = ("keys", "rows", "exhaustive", "expires")
+
+    def __init__(self, rows: List[Dict[str, Any]], capacity: int, expires: float):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.keys: List[RankKey] = []
+        # 加载的行数少于容量时, 榜单包含了该范围内的全部公开笔记
+        self.exhaustive = len(rows) < capacity
+        self.expires = expires
+        for row in rows[:capacity]:
+            self.rows[row["id"]] = dict(row)
+            self.keys.append(_rank_key(row))
+        self.keys.sort()
+
+    def discard(self, note_id: int) -> bool:
+        row = self.rows.pop(note_id, None)
+        if row is None:
+            return False
+        key = _rank_key(row)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+        return True
+
+    def admits(self, key: RankKey) -> bool:
+        """该排序键的笔记是否排在榜单范围内"""
+        return self.exhaustive or (bool(self.keys) and key < self.keys[-1])
+
+    def insert(self, row: Dict[str, Any], capacity: int) -> None:
+        key = _rank_key(row)
+        if not self.admits(key):
+            return
+        self.rows[row["id"]] = row
+        insort(self.keys, key)
+        if len(self.keys) > capacity:
+            _, last_id = self.keys.pop()
+            del self.rows[-last_id]
+            self.exhaustive = False
+
+
+class Leaderboard:
+    """
+    全局 + 按用户的 Top 排行榜
+
+    加载期间发生的写入记入该次加载的日志, 加载结果保存时重放, 不会被旧结果覆盖
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        capacity: int,
+        user_capacity: int,
+        max_users: int,
+        ttl_seconds: float,
+        min_size: int = 0
+    ):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.user_capacity = user_capacity
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.min_size = min_size
+
+        self._global: Optional[_Board] = None
+        self._users: "OrderedDict[int, _Board]" = OrderedDict()
+        # 进行中的加载: (用户 ID, None 表示全局榜) -> 加载期间的写入日志
+        self._journals: List[Tuple[Optional[int], List[Tuple[str, Any]]]] = []
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.reconciles = 0
+        self.last_drift = 0
+        self.last_reconcile_at: Optional[float] = None
+
+    # ========================================
+    # 查询
+    # ========================================
+
+    def needs_load(self, user_id: Optional[int] = None) -> bool:
+        """
+        榜单是否需要从数据库加载 (未加载/已过期/成员不足)
+
+        Args:
+            user_id: 用户 ID, None 表示全局榜
+        """
+        board = self._board(user_id)
+        return board is None or board.expires < time.monotonic()
+
+    def page(
+        self,
+        limit: int,
+        user_id: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top 查询
+
+        Args:
+            limit: 返回数量限制
+            user_id: 用户 ID (可选)
+            after: 分页位置 (weight_score, id), 只返回排在其后的笔记
+
+        Returns:
+            Top 笔记列表; 榜单未加载或翻页超出榜单范围时返回 None (由调用方查询数据库)
+        """
+        board = self._board(user_id)
+        if board is None or board.expires < time.monotonic():
+            self.misses += 1
+            return None
+
+        start = 0 if after is None else bisect_right(board.keys, (-float(after[0]), -int(after[1])))
+        keys = board.keys[start:start + limit]
+        if len(keys) < limit and not board.exhaustive:
+            self.misses += 1
+            return None
+
+        if user_id is not None:
+            self._users.move_to_end(user_id)
+        self.hits += 1
+        return [dict(board.rows[-note_id]) for _, note_id in keys]
+
+    # ========================================
+    # 加载与对账
+    # ========================================
+
+    def begin_load(self, user_id: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """
+        开始加载榜单, 返回加载期间的写入日志 (需原样传给 store)
+
+        Args:
+            user_id: 用户 ID, None 表示全局榜
+        """
+        journal: List[Tuple[str, Any]] = []
+        self._journals.append((user_id, journal))
+        return journal
+
+    def abort_load(self, journal: List[Tuple[str, Any]]) -> None:
+        """加载失败时丢弃写入日志"""
+        self._journals = [entry for entry in self._journals if entry[1] is not journal]
+
+    def store(
+        self,
+        user_id: Optional[int],
+        rows: List[Dict[str, Any]],
+        journal: List[Tuple[str, Any]]
+    ) -> int:
+        """
+        保存从数据库加载的榜单并重放加载期间的写入
+
+        Args:
+            user_id: 用户 ID, None 表示全局榜
+            rows: 按 (weight_score, id) 降序的公开笔记, 最多 capacity 条
+            journal: begin_load 返回的写入日志
+
+        Returns:
+            与原榜单相比新进入榜单的笔记数 (对账偏差)
+        """
+        self.abort_load(journal)
+        # 全局榜由后台任务定期重新加载, 不按 ttl 过期
+        capacity = self._capacity_for(user_id)
+        expires = float("inf") if user_id is None else time.monotonic() + self.ttl_seconds
+        board = _Board(rows, capacity, expires)
+        for op, payload in journal:
+            if op == "upsert":
+                self._upsert_into(board, payload, capacity)
+            elif op == "update":
+                self._update_in(board, payload[0], payload[1], capacity)
+            else:
+                board.discard(payload)
+
+        old = self._board(user_id)
+        drift = len(board.rows.keys() - old.rows.keys()) if old is not None else 0
+
+        if user_id is None:
+            self._global = board
+        else:
+            self._users[user_id] = board
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evictions += 1
+
+        self.loads += 1
+        return drift
+
+    def record_reconcile(self, drift: int) -> None:
+        """记录一次全局榜对账"""
+        self.reconciles += 1
+        self.last_drift = drift
+        self.last_reconcile_at = time.time()
+
+    def clear(self) -> None:
+        """清空全部榜单"""
+        self._global = None
+        self._users.clear()
+
+    # ========================================
+    # 增量维护
+    # ========================================
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """
+        写入或替换一条完整的笔记 (创建路径)
+
+        Args:
+            row: 包含 columns 全部列的笔记数据
+        """
+        row = {column: row.get(column) for column in self.columns}
+        for user_id, board in self._boards_for(row.get("user_id")):
+            self._upsert_into(board, row, self._capacity_for(user_id))
+            self._check_size(board)
+        self._journal_append(row.get("user_id"), ("upsert", row))
+
+    def apply_update(self, note_id: int, fields: Dict[str, Any]) -> None:
+        """
+        合并部分字段更新 (更新路径)
+
+        Args:
+            note_id: 笔记 ID
+            fields: 更新后的字段 (需包含 user_id)
+        """
+        for user_id, board in self._boards_for(fields.get("user_id")):
+            self._update_in(board, note_id, fields, self._capacity_for(user_id))
+            self._check_size(board)
+        self._journal_append(fields.get("user_id"), ("update", (note_id, dict(fields))))
+
+    def remove(self, note_id: int, user_id: Optional[int] = None) -> None:
+        """
+        移除一条笔记 (删除路径)
+
+        Args:
+            note_id: 笔记 ID
+            user_id: 笔记所属用户 ID
+        """
+        for _, board in self._boards_for(user_id):
+            board.discard(note_id)
+            self._check_size(board)
+        self._journal_append(user_id, ("remove", note_id))
+
+    def _upsert_into(self, board: _Board, row: Dict[str, Any], capacity: int) -> None:
+        board.discard(row["id"])
+        if _public(row):
+            board.insert(dict(row), capacity)
+
+    def _update_in(self, board: _Board, note_id: int, fields: Dict[str, Any], capacity: int) -> None:
+        old = board.rows.get(note_id)
+        if old is not None:
+            self._upsert_into(board, {**old, **fields, "id": note_id}, capacity)
+            return
+
+        # 榜单外的笔记变为可上榜 (如私有改为公开): 缺少完整列时让榜单过期重新加载
+        row = {**fields, "id": note_id}
+        if _public(row) and row.get("weight_score") is not None and board.admits(_rank_key(row)):
+            if all(column in row for column in self.columns):
+                board.insert(row, capacity)
+            else:
+                board.expires = 0.0
+
+    def _check_size(self, board: _Board) -> None:
+        """成员被移出导致榜单少于 min_size 时让榜单过期 (末位之后的名次未知)"""
+        if not board.exhaustive and len(board.keys) < self.min_size:
+            board.expires = 0.0
+
+    def _board(self, user_id: Optional[int]) -> Optional[_Board]:
+        return self._global if user_id is None else self._users.get(user_id)
+
+    def _boards_for(self, user_id: Optional[int]) -> List[Tuple[Optional[int], _Board]]:
+        boards = []
+        if self._global is not None:
+            boards.append((None, self._global))
+        if user_id is not None and user_id in self._users:
+            boards.append((user_id, self._users[user_id]))
+        return boards
+
+    def _capacity_for(self, user_id: Optional[int]) -> int:
+        return self.capacity if user_id is None else self.user_capacity
+
+    def _journal_append(self, user_id: Optional[int], entry: Tuple[str, Any]) -> None:
+        for scope, journal in self._journals:
+            if scope is None or user_id is None or scope == user_id:
+                journal.append(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取排行榜统计信息
+
+        Returns:
+            榜单规模/命中/对账统计
+        """
+        lookups = self.hits + self.misses
+        return {
+            "global_size": len(self._global.keys) if self._global is not None else None,
+            "global_exhaustive": self._global.exhaustive if self._global is not None else None,
+            "users": len(self._users),
+            "capacity": self.capacity,
+            "user_capacity": self.user_capacity,
+            "max_users": self.max_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "reconciles": self.reconciles,
+            "last_drift": self.last_drift,
+            "last_reconcile_at": self.last_reconcile_at,
+        }
+
+
+def _rank_key(row: Dict[str, Any]) -> RankKey:
+    return (-float(row.get("weight_score") or 0.0), -int(row["id"]))
+
+
+def _public(row: Dict[str, Any]) -> bool:
+    return row.get("is_valid", 1) == 1 and row.get("status") == 1
@@ -0,0 +1,266 @@
+"""
+地灵记忆网格索引
+按网格缓存 "该地点最近的若干条记忆" (按 process_time 倒序), 首次对话的记忆检索变为一次字典查找;
+空网格做负缓存, 写入路径 (create_genius_loci_record) 直接更新受影响的网格
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+
+from app.utils.geo import (
+    METERS_PER_DEGREE_LAT,
+    BBox,
+    TileKey,
+    bounding_box,
+    tile_key,
+    tile_bounds,
+    tiles_for_bbox,
+)
+from app.utils.time import time_sort_key
+
+logger = logging.getLogger(__name__)
+
+# 索引键: (ai_process_type, 网格编号)
+MemoryKey = Tuple[int, TileKey]
+
+
+class PlaceMemoryIndex:
+    """
+    地点 -> 最近 depth 条记忆 的网格索引
+
+    - 网格的检索范围 = 网格本身向外扩展 radius_km, 落在范围内的记忆都属于该网格,
+      因此查询点只需查自己所在网格 (与按半径边界框检索的结果近似一致)
+    - 有记忆的网格缓存 ttl_seconds, 空网格缓存 negative_ttl_seconds (多进程部署下限制陈旧窗口)
+    - 超过 max_entries 时淘汰最久未使用的网格
+    - 只在事件循环线程中访问, 不加锁
+    """
+
+    def __init__(
+        self,
+        cell_deg: float,
+        radius_km: float,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        max_entries: int,
+        depth: int = 1
+    ):
+        self.cell_deg = cell_deg
+        self.radius_km = radius_km
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.depth = depth
+
+        # 键 -> (过期时间, 最近的记忆列表 (process_time 倒序), 空列表表示空网格)
+        self._cells: "OrderedDict[MemoryKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        # 进行中的加载: 索引键 -> 加载期间写入路径放入的记忆
+        self._journals: List[Tuple[MemoryKey, List[Dict[str, Any]]]] = []
+
+        # 统计计数
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.offers = 0
+
+    def key_for(self, longitude: float, latitude: float, ai_process_type: int) -> MemoryKey:
+        """
+        计算查询点所在网格的索引键
+
+        Args:
+            longitude: 经度
+            latitude: 纬度
+            ai_process_type: AI 处理类型
+
+        Returns:
+            索引键
+        """
+        return (ai_process_type, tile_key(longitude, latitude, self.cell_deg))
+
+    def region(self, key: MemoryKey) -> BBox:
+        """
+        计算网格的检索范围 (网格边界向外扩展 radius_km)
+
+        Args:
+            key: 索引键
+
+        Returns:
+            (min_lon, max_lon, min_lat, max_lat)
+        """
+        min_lon, max_lon, min_lat, max_lat = tile_bounds(key[1], self.cell_deg)
+        delta_lon, delta_lat = self._deltas(max(abs(min_lat), abs(max_lat)))
+        return (
+            max(min_lon - delta_lon, -180.0),
+            min(max_lon + delta_lon, 180.0),
+            max(min_lat - delta_lat, -90.0),
+            min(max_lat + delta_lat, 90.0),
+        )
+
+    def lookup(self, key: MemoryKey) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        查找网格的最近记忆
+
+        Args:
+            key: 索引键
+
+        Returns:
+            (是否命中, 最近的记忆列表副本); 命中空网格时返回 (True, [])
+        """
+        entry = self._cells.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return False, []
+
+        self._cells.move_to_end(key)
+        records = entry[1]
+        if not records:
+            self.negative_hits += 1
+            return True, []
+
+        self.hits += 1
+        return True, [dict(r) for r in records]
+
+    def begin_load(self, key: MemoryKey) -> List[Dict[str, Any]]:
+        """
+        开始从数据库加载网格, 返回加载期间的写入日志 (需原样传给 store)
+
+        Args:
+            key: 索引键
+        """
+        journal: List[Dict[str, Any]] = []
+        self._journals.append((key, journal))
+        return journal
+
+    def abort_load(self, journal: List[Dict[str, Any]]) -> None:
+        """加载失败时丢弃写入日志"""
+        self._journals = [entry for entry in self._journals if entry[1] is not journal]
+
+    def store(
+        self,
+        key: MemoryKey,
+        records: List[Dict[str, Any]],
+        journal: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        保存从数据库加载的网格结果
+
+        加载期间写入路径放入的记忆 (写入日志与未过期的条目) 与加载结果合并,
+        不会被旧结果或空结果 (如来自只读副本) 覆盖
+
+        Args:
+            key: 索引键
+            records: 网格内最近的记忆 (最多 depth 条, process_time 倒序), 空列表表示空网格
+            journal: begin_load 返回的写入日志
+
+        Returns:
+            合并后的最近记忆列表副本
+        """
+        self.abort_load(journal)
+        if journal:
+            records = _merge_latest(records, journal, self.depth)
+
+        current = self._cells.get(key)
+        if current is not None and current[0] >= time.monotonic():
+            records = _merge_latest(current[1], records, self.depth)
+
+        ttl = self.ttl_seconds if records else self.negative_ttl_seconds
+        self._put(key, records, ttl)
+        return [dict(r) for r in records]
+
+    def offer(self, record: Dict[str, Any]) -> None:
+        """
+        写入路径: 把新记忆并入其检索范围覆盖的、已缓存的网格
+
+        未缓存的网格不创建条目 (网格内更早的记忆未知), 下次查询时从数据库加载;
+        正在加载的网格记入写入日志, 由 store 合并
+
+        Args:
+            record: 新建的记忆记录 (需包含 ai_process_type 与经纬度)
+        """
+        longitude = record.get("gps_longitude")
+        latitude = record.get("gps_latitude")
+        if longitude is None or latitude is None:
+            return
+
+        self.offers += 1
+        ai_process_type = record["ai_process_type"]
+        now = time.monotonic()
+        cells = self._cells_covering(longitude, latitude)
+        for key, journal in self._journals:
+            if key[0] == ai_process_type and key[1] in cells:
+                journal.append(dict(record))
+
+        for cell in cells:
+            key = (ai_process_type, cell)
+            current = self._cells.get(key)
+            if current is not None and current[0] >= now:
+                self._put(key, _merge_latest(current[1], [record], self.depth), self.ttl_seconds)
+
+    def clear(self) -> None:
+        """清空索引"""
+        self._cells.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计信息
+
+        Returns:
+            命中/负缓存命中/未命中计数与命中率
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._cells),
+            "empty_cells": sum(1 for _, records in self._cells.values() if not records),
+            "max_entries": self.max_entries,
+            "cell_deg": self.cell_deg,
+            "radius_km": self.radius_km,
+            "depth": self.depth,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "offers": self.offers,
+        }
+
+    # ---------- 内部方法 ----------
+
+    def _deltas(self, latitude: float) -> Tuple[float, float]:
+        """半径对应的经度/纬度跨度 (度), 经度按纬度余弦修正"""
+        _, delta_lon, _, _ = bounding_box(0.0, latitude, self.radius_km)
+        return delta_lon, self.radius_km * 1000.0 / METERS_PER_DEGREE_LAT
+
+    def _cells_covering(self, longitude: float, latitude: float) -> List[TileKey]:
+        """检索范围包含该点的全部网格 (经度跨度按相邻网格的较高纬度取, 与 region 一致或更大)"""
+        delta_lon, delta_lat = self._deltas(min(abs(latitude) + self.cell_deg, 90.0))
+        bbox = (longitude - delta_lon, longitude + delta_lon, latitude - delta_lat, latitude + delta_lat)
+        return tiles_for_bbox(bbox, self.cell_deg)
+
+    def _put(self, key: MemoryKey, records: List[Dict[str, Any]], ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+
+        self._cells[key] = (time.monotonic() + ttl, [dict(r) for r in records])
+        self._cells.move_to_end(key)
+
+        while len(self._cells) > self.max_entries:
+            self._cells.popitem(last=False)
+            self.evictions += 1
+
+
+def _merge_latest(
+    current: List[Dict[str, Any]],
+    incoming: List[Dict[str, Any]],
+    depth: int
+) -> List[Dict[str, Any]]:
+    """
+    合并两组记忆, 按 id 去重, 保留最近的 depth 条
+
+    process_time 的小数秒位数不固定, 解析后比较 (同一时间按 id 倒序)
+    """
+    merged = {r["id"]: r for r in current}
+    merged.update((r["id"], r) for r in incoming)
+    ordered = sorted(merged.values(), key=lambda r: (time_sort_key(r.get("process_time")), r["id"]), reverse=True)
+    return ordered[:depth]
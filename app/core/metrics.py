@@ -0,0 +1,283 @@
+"""
+数据库调用指标
+database.py 的每次 PostgREST 请求记录耗时/返回行数/响应字节数/目标表或函数/结果,
+按 "操作 (database.py 函数名) x 目标" 汇总为延迟直方图; 超过阈值的请求记慢查询日志
+
+- 操作名由 @instrumented 装饰器通过 ContextVar 传递, 同一函数内的多次请求都归到该函数
+- 只在事件循环线程中更新, 不加锁
+"""
+
+import time
+import inspect
+import logging
+import functools
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上界 (毫秒), 最后一个桶收集更慢的请求
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+
+# 当前所在的 database.py 函数 (未经装饰的调用记为 "-")
+_current_operation: ContextVar[str] = ContextVar("db_operation", default="-")
+
+
+class LatencyHistogram:
+    """固定桶延迟直方图 (分位数按桶上界估计)"""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> float:
+        """估计分位数 (返回所在桶的上界, 最后一个桶返回最大值)"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 2),
+            "p90_ms": round(self.quantile(0.9), 2),
+            "p99_ms": round(self.quantile(0.99), 2),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)
+            },
+        }
+
+
+class _Series:
+    """单个 (操作, 目标, 方法) 的累计指标"""
+
+    __slots__ = ("latency", "errors", "rows", "bytes")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.rows = 0
+        self.bytes = 0
+
+
+class QueryMetrics:
+    """数据库调用指标汇总"""
+
+    def __init__(self, slow_query_ms: float, slow_log_size: int = 50):
+        """
+        初始化指标汇总
+
+        Args:
+            slow_query_ms: 慢查询阈值 (毫秒), <= 0 表示不记录
+            slow_log_size: 保留最近的慢查询条数
+        """
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_size = slow_log_size
+        self.started_at = time.time()
+
+        self._calls: Dict[Tuple[str, str, str], _Series] = {}
+        self._operations: Dict[str, _Series] = {}
+        self._slow: List[Dict[str, Any]] = []
+        self.slow_total = 0
+
+    def record_call(
+        self,
+        target: str,
+        method: str,
+        elapsed_ms: float,
+        rows: int,
+        payload_bytes: int,
+        outcome: str
+    ) -> None:
+        """
+        记录一次数据库请求
+
+        Args:
+            target: 表名或 rpc/函数名
+            method: HTTP 方法 (GET/POST/PATCH/DELETE)
+            elapsed_ms: 耗时 (毫秒, 含线程池排队)
+            rows: 返回行数
+            payload_bytes: 响应字节数
+            outcome: ok / error
+        """
+        operation = _current_operation.get()
+        series = self._calls.get((operation, target, method))
+        if series is None:
+            series = self._calls[(operation, target, method)] = _Series()
+
+        series.latency.observe(elapsed_ms)
+        series.rows += rows
+        series.bytes += payload_bytes
+        if outcome != OUTCOME_OK:
+            series.errors += 1
+
+        if 0 < self.slow_query_ms <= elapsed_ms:
+            entry = {
+                "at": time.time(),
+                "operation": operation,
+                "target": target,
+                "method": method,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "bytes": payload_bytes,
+                "outcome": outcome,
+            }
+            self._slow.append(entry)
+            del self._slow[:-self.slow_log_size]
+            self.slow_total += 1
+            logger.warning(
+                f"慢查询: {operation} {method} {target} {elapsed_ms:.1f}ms, "
+                f"rows={rows}, bytes={payload_bytes}, outcome={outcome}"
+            )
+
+    def record_operation(self, operation: str, elapsed_ms: float, outcome: str) -> None:
+        """
+        记录一次 database.py 函数调用 (含其中的全部请求与本地计算)
+
+        Args:
+            operation: 函数名
+            elapsed_ms: 耗时 (毫秒)
+            outcome: ok / error (函数抛出异常)
+        """
+        series = self._operations.get(operation)
+        if series is None:
+            series = self._operations[operation] = _Series()
+        series.latency.observe(elapsed_ms)
+        if outcome != OUTCOME_OK:
+            series.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取全部指标 (按累计耗时降序, 便于定位占用延迟最多的函数)
+
+        Returns:
+            operations: 按函数汇总; calls: 按 (函数, 目标, 方法) 汇总; slow_queries: 最近的慢查询
+        """
+        operations = [
+            {"operation": name, "errors": s.errors, **s.latency.to_dict()}
+            for name, s in self._operations.items()
+        ]
+        calls = [
+            {
+                "operation": operation,
+                "target": target,
+                "method": method,
+                "errors": s.errors,
+                "rows": s.rows,
+                "bytes": s.bytes,
+                **s.latency.to_dict(),
+            }
+            for (operation, target, method), s in self._calls.items()
+        ]
+        operations.sort(key=lambda item: item["avg_ms"] * item["count"], reverse=True)
+        calls.sort(key=lambda item: item["avg_ms"] * item["count"], reverse=True)
+        return {
+            "since": self.started_at,
+            "slow_query_ms": self.slow_query_ms,
+            "operations": operations,
+            "calls": calls,
+            "slow_queries": list(reversed(self._slow)),
+        }
+
+    def summary(self, top: int = 5) -> Dict[str, Any]:
+        """
+        健康检查用的简要指标
+
+        Args:
+            top: 列出累计耗时最多的函数数
+
+        Returns:
+            请求总数/错误数/慢查询数与累计耗时最多的函数
+        """
+        calls = list(self._calls.values())
+        snapshot = self.snapshot()
+        return {
+            "calls": sum(s.latency.count for s in calls),
+            "errors": sum(s.errors for s in calls),
+            "slow_queries": self.slow_total,
+            "top_operations": [
+                {key: item[key] for key in ("operation", "count", "errors", "avg_ms", "p99_ms")}
+                for item in snapshot["operations"][:top]
+            ],
+        }
+
+    def reset(self) -> None:
+        """清空指标"""
+        self._calls.clear()
+        self._operations.clear()
+        self._slow.clear()
+        self.slow_total = 0
+        self.started_at = time.time()
+
+
+def instrumented(func):
+    """
+    装饰 database.py 的异步函数/异步生成器: 记录函数耗时, 并把其中的数据库请求归到该函数名下
+
+    嵌套调用时请求归到最内层的函数
+    """
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def gen_wrapper(*args, **kwargs):
+            # 只在生成器执行期间设置操作名, yield 出去后恢复调用方的上下文
+            token = _current_operation.set(name)
+            try:
+                async for item in func(*args, **kwargs):
+                    _current_operation.reset(token)
+                    token = None
+                    yield item
+                    token = _current_operation.set(name)
+            finally:
+                if token is not None:
+                    _current_operation.reset(token)
+        return gen_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_operation.set(name)
+        start = time.perf_counter()
+        outcome = OUTCOME_ERROR
+        try:
+            result = await func(*args, **kwargs)
+            outcome = OUTCOME_OK
+            return result
+        finally:
+            _current_operation.reset(token)
+            if query_metrics is not None:
+                query_metrics.record_operation(name, (time.perf_counter() - start) * 1000.0, outcome)
+    return wrapper
+
+
+query_metrics: Optional[QueryMetrics] = QueryMetrics(
+    slow_query_ms=settings.DB_SLOW_QUERY_MS,
+    slow_log_size=settings.DB_SLOW_QUERY_LOG_SIZE
+) if settings.DB_METRICS_ENABLED else None
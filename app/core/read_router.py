@@ -0,0 +1,161 @@
+"""
+只读副本路由
+只读查询按延迟加权随机分配到健康的只读副本, 没有健康副本时回到主库
+
+- 每个副本维护请求延迟的指数滑动平均 (EWMA), 权重为其倒数, 延迟越低分到的请求越多
+- 副本健康状态由熔断器记录: 请求或后台探测连续失败达到阈值即摘除, 探测成功后恢复
+- 本进程有写入后的一小段时间内 (pin_seconds) 只读查询也走主库, 避免读不到刚写入的数据
+- 只在事件循环线程中访问, 不加锁
+"""
+
+import time
+import random
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.circuit_breaker import CircuitBreaker, STATE_CLOSED
+
+logger = logging.getLogger(__name__)
+
+
+class ReadEndpoint:
+    """一个只读副本"""
+
+    def __init__(self, name: str, client: Any, failure_threshold: int, recovery_seconds: float):
+        """
+        初始化副本
+
+        Args:
+            name: 名称 (副本 URL 的主机名)
+            client: 指向该副本的 Supabase 客户端
+            failure_threshold: 连续失败多少次后摘除
+            recovery_seconds: 摘除后至少等待多久才恢复
+        """
+        self.name = name
+        self.client = client
+        self.breaker = CircuitBreaker(
+            name=f"read_replica:{name}",
+            failure_threshold=failure_threshold,
+            recovery_seconds=recovery_seconds
+        )
+        self.latency_ms: Optional[float] = None
+        self.requests = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state == STATE_CLOSED
+
+    def observe(self, elapsed_ms: float, alpha: float) -> None:
+        """记录一次成功请求的延迟"""
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms += alpha * (elapsed_ms - self.latency_ms)
+
+
+class ReadRouter:
+    """只读副本路由"""
+
+    def __init__(self, pin_seconds: float, latency_alpha: float = 0.2):
+        """
+        初始化路由
+
+        Args:
+            pin_seconds: 本进程写入后多少秒内只读查询仍走主库
+            latency_alpha: 延迟 EWMA 平滑系数
+        """
+        self.pin_seconds = pin_seconds
+        self.latency_alpha = latency_alpha
+        self.endpoints: List[ReadEndpoint] = []
+        self._by_base_url: Dict[str, ReadEndpoint] = {}
+        self._last_write = float("-inf")
+
+        # 统计
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.failovers = 0
+
+    def add(self, endpoint: ReadEndpoint, base_url: str) -> None:
+        """
+        注册副本
+
+        Args:
+            endpoint: 副本
+            base_url: 该副本 PostgREST 会话的 base_url (用于识别查询发往哪个副本)
+        """
+        self.endpoints.append(endpoint)
+        self._by_base_url[base_url] = endpoint
+
+    def choose(self) -> Optional[ReadEndpoint]:
+        """
+        为一次只读查询选择副本
+
+        Returns:
+            选中的副本; None 表示应走主库 (没有健康副本, 或处于写入后的主库读取窗口内)
+        """
+        if not self.endpoints:
+            return None
+
+        if time.monotonic() - self._last_write < self.pin_seconds:
+            self.pinned_reads += 1
+            return None
+
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+
+        # 还没有延迟样本的副本按已知副本的平均延迟计权
+        known = [endpoint.latency_ms for endpoint in healthy if endpoint.latency_ms is not None]
+        default_ms = sum(known) / len(known) if known else 1.0
+        weights = [
+            1.0 / max(endpoint.latency_ms if endpoint.latency_ms is not None else default_ms, 1.0)
+            for endpoint in healthy
+        ]
+        endpoint = random.choices(healthy, weights=weights)[0]
+        endpoint.requests += 1
+        self.replica_reads += 1
+        return endpoint
+
+    def endpoint_for(self, base_url: str) -> Optional[ReadEndpoint]:
+        """按 PostgREST 会话的 base_url 查找副本 (主库返回 None)"""
+        return self._by_base_url.get(base_url)
+
+    def record_write(self) -> None:
+        """记录本进程的一次写入 (开始主库读取窗口)"""
+        self._last_write = time.monotonic()
+
+    def record_success(self, endpoint: ReadEndpoint, elapsed_ms: float) -> None:
+        """记录副本的一次成功请求 (含后台探测)"""
+        endpoint.observe(elapsed_ms, self.latency_alpha)
+        endpoint.breaker.record_success()
+
+    def record_failure(self, endpoint: ReadEndpoint, error: BaseException) -> None:
+        """记录副本的一次失败请求 (含后台探测)"""
+        endpoint.breaker.record_failure(error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取路由统计
+
+        Returns:
+            各副本的健康状态/延迟/请求数, 以及走副本/主库的只读查询数
+        """
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "failovers": self.failovers,
+            "pin_seconds": self.pin_seconds,
+            "replicas": [
+                {
+                    "name": endpoint.name,
+                    "healthy": endpoint.healthy,
+                    "latency_ms": round(endpoint.latency_ms, 2) if endpoint.latency_ms is not None else None,
+                    "requests": endpoint.requests,
+                    "breaker": endpoint.breaker.get_stats(),
+                }
+                for endpoint in self.endpoints
+            ],
+        }
@@ -0,0 +1,98 @@
+"""
+并发请求合并 (singleflight)
+同一键的并发读取共享一次进行中的上游调用: 第一个调用方发起请求, 其余调用方等待同一结果
+
+- 上游调用在独立的任务中执行, 发起方被取消 (如客户端断开) 不影响其它等待方
+- 等待方拿到结果的副本 (list/dict 逐层复制), 修改返回值不会影响其它调用方
+- 上游调用抛出的异常会传给全部等待方; 调用结束后立即移除, 不缓存结果
+- 只在事件循环线程中使用, 不加锁
+"""
+
+import copy
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, name: str):
+        """
+        初始化
+
+        Args:
+            name: 名称 (用于统计)
+        """
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+        # 统计
+        self.calls = 0
+        self.coalesced = 0
+        self.peak_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行调用, 同一键已有进行中的调用时等待其结果
+
+        Args:
+            key: 归一化后的查询参数
+            fn: 发起上游调用的函数
+
+        Returns:
+            调用结果 (合并的调用方拿到副本)
+        """
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self._waiters[key] = self._waiters.get(key, 1) + 1
+            self.peak_waiters = max(self.peak_waiters, self._waiters[key])
+            return clone_result(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = task
+        self._waiters[key] = 1
+        task.add_done_callback(lambda _: self._finish(key, task))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            self._waiters.pop(key, None)
+        # 没有调用方等待时 (全部被取消) 也要取出异常, 避免 "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"合并调用失败 ({self.name}): {task.exception()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取合并统计
+
+        Returns:
+            调用数/合并数/合并率/进行中的调用数
+        """
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.calls - self.coalesced,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._flights),
+            "peak_waiters": self.peak_waiters,
+        }
+
+
+def clone_result(value: Any) -> Any:
+    """复制查询结果 (list/dict 逐层复制, 标量直接返回, 其它对象深复制)"""
+    if isinstance(value, list):
+        return [clone_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: clone_result(item) for key, item in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return copy.deepcopy(value)
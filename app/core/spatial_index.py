@@ -0,0 +1,588 @@
+"""
+气泡笔记进程内空间索引
+有效笔记的内存副本 (NumPy 列存储 + 网格索引), 用于在进程内直接回答附近查询和 Top 查询
+
+- 启动时批量加载, 之后由 database.py 的写入路径增量维护, 并定期做增量同步
+- 已排序区: 行按网格编码排序存放, 查询用 searchsorted 取连续切片 (访存连续)
+- 追加区: 增量写入追加到末尾, 用网格 -> 位置列表的字典索引
+- 删除/更新只标记旧位置失效; 失效 + 追加比例过高时在后台线程重建
+"""
+
+import asyncio
+import time
+from bisect import bisect_left, bisect_right, insort
+import logging
+from typing import Optional, List, Dict, Any, Callable, Awaitable, AsyncIterator, Tuple
+
+import numpy as np
+
+from app.utils.geo import TileKey, DistanceKey, haversine_m, bounding_box, tile_key, nearest_order
+
+logger = logging.getLogger(__name__)
+
+# 索引行必须包含的列
+INDEX_FIELDS = ("id", "user_id", "gps_longitude", "gps_latitude", "status", "weight_score", "is_valid")
+
+# 全局 Top 候选数量 (limit 上限为 100, 预留余量); 删除导致候选少于下限时重新扫描
+_TOP_CANDIDATES = 1000
+_TOP_MIN_CANDIDATES = 200
+
+# 失效 + 追加槽位少于该数量时不重建 (小索引扫描追加区的开销可以忽略)
+_MIN_REBUILD_SLOTS = 1024
+
+# 网格编码: 列号左移 32 位 + 行号偏移, 同一列的网格按行号连续排列
+_ROW_OFFSET = 1 << 31
+
+
+def _cell_codes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (x.astype(np.int64) << 32) + (y.astype(np.int64) + _ROW_OFFSET)
+
+
+class _Store:
+    """列存储 + 网格索引 (单个快照)"""
+
+    _COLUMNS = ("ids", "user_ids", "lons", "lats", "weights", "statuses", "alive")
+
+    def __init__(self, cell_deg: float, capacity: int = 1024):
+        self.cell_deg = cell_deg
+        self.size = 0
+        self.dead = 0
+
+        capacity = max(capacity, 1024)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.user_ids = np.empty(capacity, dtype=np.int64)
+        self.lons = np.empty(capacity, dtype=np.float64)
+        self.lats = np.empty(capacity, dtype=np.float64)
+        self.weights = np.empty(capacity, dtype=np.float64)
+        self.statuses = np.empty(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        self.rows: List[Optional[Dict[str, Any]]] = []
+        self.positions: Dict[int, int] = {}  # 笔记 ID -> 位置
+
+        # 已排序区 (位置 < sealed, 位置即网格编码排序后的下标)
+        self.sealed = 0
+        self.cell_keys = np.empty(0, dtype=np.int64)
+        self.user_keys = np.empty(0, dtype=np.int64)
+        self.user_pos = np.empty(0, dtype=np.int64)
+
+        # 追加区 (位置 >= sealed)
+        self.cells: Dict[TileKey, List[int]] = {}
+        self.users: Dict[int, List[int]] = {}
+
+    @classmethod
+    def build(cls, rows: List[Dict[str, Any]], cell_deg: float) -> "_Store":
+        """
+        由行数据批量构建快照 (向量化, 在线程池中执行)
+
+        Args:
+            rows: 笔记行 (同一 ID 出现多次时保留最后一次)
+            cell_deg: 网格边长 (度)
+
+        Returns:
+            全部位于已排序区的新快照
+        """
+        rows = list({row["id"]: row for row in rows}.values())
+        count = len(rows)
+
+        columns = {
+            "ids": np.fromiter((r["id"] for r in rows), dtype=np.int64, count=count),
+            "user_ids": np.fromiter((r["user_id"] for r in rows), dtype=np.int64, count=count),
+            "lons": np.fromiter((r["gps_longitude"] for r in rows), dtype=np.float64, count=count),
+            "lats": np.fromiter((r["gps_latitude"] for r in rows), dtype=np.float64, count=count),
+            "weights": np.fromiter((r.get("weight_score") or 0.0 for r in rows), dtype=np.float64, count=count),
+            "statuses": np.fromiter((r.get("status") or 0 for r in rows), dtype=np.int8, count=count),
+        }
+        return cls._from_columns(rows, columns, cell_deg)
+
+    @classmethod
+    def compact(cls, old: "_Store", positions: np.ndarray, columns: Dict[str, np.ndarray]) -> "_Store":
+        """
+        由旧快照的有效槽位重建 (复用列数组, 不再逐行解析, 在线程池中执行)
+
+        Args:
+            old: 旧快照
+            positions: 调用时刻的有效槽位
+            columns: 这些槽位的列数据 (调用方在事件循环中复制)
+
+        Returns:
+            全部位于已排序区的新快照
+        """
+        rows = [old.rows[pos] for pos in positions.tolist()]
+
+        # 复制之后被删除/替换的行 (位置已置空) 丢弃, 由重建日志重放
+        kept = np.fromiter((row is not None for row in rows), dtype=bool, count=len(rows))
+        if not kept.all():
+            rows = [row for row in rows if row is not None]
+            columns = {name: values[kept] for name, values in columns.items()}
+        return cls._from_columns(rows, columns, old.cell_deg)
+
+    @classmethod
+    def _from_columns(
+        cls,
+        rows: List[Dict[str, Any]],
+        columns: Dict[str, np.ndarray],
+        cell_deg: float
+    ) -> "_Store":
+        count = len(rows)
+        codes = _cell_codes(np.floor(columns["lons"] / cell_deg), np.floor(columns["lats"] / cell_deg))
+
+        # 按网格编码重排, 同一网格的行在数组中连续
+        order = np.argsort(codes, kind="stable")
+        rows = [rows[i] for i in order.tolist()]
+
+        store = cls(cell_deg, capacity=int(count * 1.25))
+        for name, values in columns.items():
+            getattr(store, name)[:count] = values[order]
+        store.alive[:count] = True
+
+        store.rows = rows
+        store.positions = dict(zip(store.ids[:count].tolist(), range(count)))
+        store.cell_keys = codes[order]
+        store.user_pos = np.argsort(store.user_ids[:count], kind="stable")
+        store.user_keys = store.user_ids[:count][store.user_pos]
+        store.size = store.sealed = count
+        return store
+
+    def _grow(self) -> None:
+        capacity = len(self.ids) * 2
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """追加一行到追加区 (调用方保证 ID 不在索引中)"""
+        if self.size == len(self.ids):
+            self._grow()
+
+        pos = self.size
+        lon = float(row["gps_longitude"])
+        lat = float(row["gps_latitude"])
+        user_id = int(row["user_id"])
+
+        self.ids[pos] = row["id"]
+        self.user_ids[pos] = user_id
+        self.lons[pos] = lon
+        self.lats[pos] = lat
+        self.weights[pos] = float(row.get("weight_score") or 0.0)
+        self.statuses[pos] = int(row.get("status") or 0)
+        self.alive[pos] = True
+
+        self.rows.append(row)
+        self.positions[row["id"]] = pos
+        self.cells.setdefault(tile_key(lon, lat, self.cell_deg), []).append(pos)
+        self.users.setdefault(user_id, []).append(pos)
+        self.size += 1
+
+    def kill(self, note_id: int) -> Optional[Dict[str, Any]]:
+        """标记笔记失效, 返回原数据"""
+        pos = self.positions.pop(note_id, None)
+        if pos is None:
+            return None
+        self.alive[pos] = False
+        self.dead += 1
+        row = self.rows[pos]
+        self.rows[pos] = None
+        return row
+
+    @property
+    def stale(self) -> int:
+        """需要重建才能回收/排序的槽位数 (失效 + 追加区)"""
+        return self.dead + (self.size - self.sealed)
+
+    def live_columns(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """全部有效槽位及其列数据副本 (用于重建)"""
+        positions = np.flatnonzero(self.alive[:self.size])
+        columns = {name: getattr(self, name)[positions] for name in self._COLUMNS if name != "alive"}
+        return positions, columns
+
+    def positions_in_cells(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """网格范围 [x0, x1] x [y0, y1] 内的全部位置 (含已失效)"""
+        columns = np.arange(x0, x1 + 1, dtype=np.int64)
+        starts = np.searchsorted(self.cell_keys, _cell_codes(columns, np.full_like(columns, y0)))
+        ends = np.searchsorted(self.cell_keys, _cell_codes(columns, np.full_like(columns, y1 + 1)))
+        parts = [np.arange(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+
+        if self.cells:
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.cells):
+                tail = [self.cells.get((x, y)) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            else:
+                tail = [
+                    positions for (x, y), positions in self.cells.items()
+                    if x0 <= x <= x1 and y0 <= y <= y1
+                ]
+            parts.extend(np.asarray(positions, dtype=np.int64) for positions in tail if positions)
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def positions_of_user(self, user_id: int) -> np.ndarray:
+        """某用户的全部位置 (含已失效)"""
+        start, end = np.searchsorted(self.user_keys, [user_id, user_id + 1])
+        positions = self.user_pos[start:end]
+        tail = self.users.get(user_id)
+        if tail:
+            positions = np.concatenate([positions, np.asarray(tail, dtype=np.int64)])
+        return positions
+
+
+class SpatialIndex:
+    """
+    有效笔记空间索引
+
+    - 只在事件循环线程中读写; 重建在线程池中进行, 期间的写入记入日志并在切换后重放
+    - 未就绪 (启动加载中) 时 ready 为 False, 调用方应回退到数据库查询
+    """
+
+    def __init__(self, cell_deg: float, rebuild_ratio: float = 0.1):
+        self.cell_deg = cell_deg
+        self.rebuild_ratio = rebuild_ratio
+        self.ready = False
+
+        self._store = _Store(cell_deg)
+        self._journal: Optional[List[Tuple[str, Any]]] = None  # 重建期间的写入日志
+        # 全局 Top 候选: 按 (-weight_score, -id, 位置) 升序, 写入时增量维护, None 表示需要重新扫描
+        self._top: Optional[List[Tuple[float, int, int]]] = None
+        self._top_exhaustive = False  # 候选是否包含全部公开笔记
+        self.watermark: Optional[str] = None  # 增量同步水位 (update_time)
+
+        # 统计
+        self.nearby_queries = 0
+        self.top_queries = 0
+        self.upserts = 0
+        self.removals = 0
+        self.rebuilds = 0
+        self.last_sync_at: Optional[float] = None
+
+    # ========================================
+    # 加载与重建
+    # ========================================
+
+    async def bootstrap(self, batches: AsyncIterator[List[Dict[str, Any]]]) -> None:
+        """
+        批量加载全部有效笔记
+
+        Args:
+            batches: 分批产出笔记行的异步迭代器
+        """
+        start = time.perf_counter()
+        self._journal = []
+        rows: List[Dict[str, Any]] = []
+        try:
+            async for batch in batches:
+                rows.extend(row for row in batch if self._indexable(row))
+                self._track_watermark(batch)
+            await self._swap(_Store.build, rows, self.cell_deg)
+        finally:
+            self._journal = None
+
+        self.ready = True
+        logger.info(f"空间索引加载完成: {len(self._store.positions)} 条, 耗时 {time.perf_counter() - start:.2f}s")
+
+    async def maybe_rebuild(self) -> bool:
+        """
+        失效 + 追加槽位比例过高时在线程池中重建索引
+
+        Returns:
+            是否执行了重建
+        """
+        store = self._store
+        stale = store.stale
+        if self._journal is not None or stale < _MIN_REBUILD_SLOTS or stale < store.size * self.rebuild_ratio:
+            return False
+
+        self._journal = []
+        try:
+            positions, columns = store.live_columns()
+            await self._swap(_Store.compact, store, positions, columns)
+        finally:
+            self._journal = None
+        self.rebuilds += 1
+        return True
+
+    async def _swap(self, build: Callable[..., _Store], *args) -> None:
+        loop = asyncio.get_running_loop()
+        store = await loop.run_in_executor(None, build, *args)
+
+        # 重放构建期间发生的写入
+        for op, payload in self._journal:
+            if op == "upsert":
+                self._upsert_into(store, payload)
+            else:
+                store.kill(payload)
+
+        self._store = store
+        self._top = None
+
+    # ========================================
+    # 增量维护
+    # ========================================
+
+    @staticmethod
+    def _indexable(row: Dict[str, Any]) -> bool:
+        return (
+            row.get("is_valid", 1) == 1
+            and row.get("gps_longitude") is not None
+            and row.get("gps_latitude") is not None
+        )
+
+    def _upsert_into(self, store: _Store, row: Dict[str, Any]) -> None:
+        store.kill(row["id"])
+        if self._indexable(row):
+            store.append(row)
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """
+        写入或替换一行 (无效行会被移除)
+
+        Args:
+            row: 包含 INDEX_FIELDS 的笔记数据
+        """
+        row = dict(row)
+        row.pop("distance_meters", None)
+
+        store = self._store
+        old = store.positions.get(row["id"])
+        self._upsert_into(store, row)
+        if old is not None:
+            self._top_discard(old)
+        new = store.positions.get(row["id"])
+        if new is not None:
+            self._top_offer(new)
+
+        if self._journal is not None:
+            self._journal.append(("upsert", row))
+        self.upserts += 1
+
+    def apply_update(self, note_id: int, fields: Dict[str, Any]) -> None:
+        """
+        合并部分字段更新 (索引中不存在且字段不完整时忽略, 由增量同步补齐)
+
+        Args:
+            note_id: 笔记 ID
+            fields: 更新后的字段
+        """
+        pos = self._store.positions.get(note_id)
+        row = dict(self._store.rows[pos]) if pos is not None else {}
+        row.update(fields)
+        row["id"] = note_id
+
+        if all(field in row for field in INDEX_FIELDS):
+            self.upsert(row)
+        else:
+            self.remove(note_id)
+
+    def remove(self, note_id: int) -> None:
+        """移除一行"""
+        pos = self._store.positions.get(note_id)
+        if pos is not None:
+            self._store.kill(note_id)
+            self._top_discard(pos)
+            self.removals += 1
+        if self._journal is not None:
+            self._journal.append(("remove", note_id))
+
+    def _top_key(self, pos: int) -> Tuple[float, int, int]:
+        store = self._store
+        return (-float(store.weights[pos]), -int(store.ids[pos]), pos)
+
+    def _top_offer(self, pos: int) -> None:
+        """新写入的公开笔记进入 Top 候选 (排在当前候选之后的无法判断, 不插入)"""
+        top = self._top
+        if top is None or self._store.statuses[pos] != 1:
+            return
+
+        key = self._top_key(pos)
+        if self._top_exhaustive or (top and key < top[-1]):
+            insort(top, key)
+            if len(top) > _TOP_CANDIDATES:
+                top.pop()
+                self._top_exhaustive = False
+
+    def _top_discard(self, pos: int) -> None:
+        """失效位置移出 Top 候选"""
+        top = self._top
+        if top is None:
+            return
+
+        key = self._top_key(pos)
+        i = bisect_left(top, key)
+        if i < len(top) and top[i] == key:
+            del top[i]
+            if len(top) < _TOP_MIN_CANDIDATES and not self._top_exhaustive:
+                self._top = None
+
+    async def sync_delta(
+        self,
+        fetch_changes: Callable[[Optional[str]], Awaitable[List[Dict[str, Any]]]]
+    ) -> int:
+        """
+        增量同步: 拉取水位之后变更的行并合并 (覆盖其它进程/直接写库产生的变更)
+
+        Args:
+            fetch_changes: 按 update_time 水位拉取变更行的函数
+
+        Returns:
+            合并的行数
+        """
+        changes = await fetch_changes(self.watermark)
+        merged = 0
+        for row in changes:
+            # 跳过已由写入路径合并过的版本, 避免重复占用槽位
+            pos = self._store.positions.get(row["id"])
+            if pos is not None and self._store.rows[pos].get("update_time") == row.get("update_time"):
+                continue
+            self.upsert(row)
+            merged += 1
+
+        self._track_watermark(changes)
+        self.last_sync_at = time.time()
+        await self.maybe_rebuild()
+        return merged
+
+    def _track_watermark(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            update_time = row.get("update_time")
+            if update_time and (self.watermark is None or update_time > self.watermark):
+                self.watermark = update_time
+
+    # ========================================
+    # 查询
+    # ========================================
+
+    def nearby(
+        self,
+        longitude: float,
+        latitude: float,
+        radius_km: float,
+        limit: int,
+        status: Optional[int] = None,
+        after: Optional[DistanceKey] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        附近查询
+
+        Args:
+            longitude: 中心点经度
+            latitude: 中心点纬度
+            radius_km: 半径 (公里)
+            limit: 返回数量限制
+            status: 状态筛选, None 表示全部
+            after: 分页位置 (距离, id), 只返回排在其后的笔记
+
+        Returns:
+            按 (距离, id) 升序的笔记列表 (含 distance_meters)
+        """
+        self.nearby_queries += 1
+        store = self._store
+
+        min_lon, max_lon, min_lat, max_lat = bounding_box(longitude, latitude, radius_km)
+        x0, y0 = tile_key(min_lon, min_lat, self.cell_deg)
+        x1, y1 = tile_key(max_lon, max_lat, self.cell_deg)
+
+        positions = store.positions_in_cells(x0, y0, x1, y1)
+        if len(positions) == 0:
+            return []
+
+        # 先用边界框粗筛 (网格比查询范围大), 再计算精确距离
+        lons, lats = store.lons[positions], store.lats[positions]
+        mask = store.alive[positions] & (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        if status:
+            mask &= store.statuses[positions] == status
+        positions, lons, lats = positions[mask], lons[mask], lats[mask]
+
+        distances = haversine_m(longitude, latitude, lons, lats)
+        within = distances <= radius_km * 1000.0
+        positions, distances = positions[within], distances[within]
+
+        order = nearest_order(distances, store.ids[positions], limit, after)
+
+        rows = store.rows
+        return [
+            {**rows[pos], "distance_meters": distance}
+            for pos, distance in zip(positions[order].tolist(), distances[order].tolist())
+        ]
+
+    def top(
+        self,
+        limit: int,
+        user_id: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top 查询 (只返回公开笔记, 按 weight_score 降序, 同分按 id 降序)
+
+        Args:
+            limit: 返回数量限制
+            user_id: 用户 ID (可选)
+            after: 分页位置 (weight_score, id), 只返回排在其后的笔记
+
+        Returns:
+            Top 笔记列表; 全局翻页超出 Top 候选范围时返回 None (由调用方查询数据库)
+        """
+        self.top_queries += 1
+        store = self._store
+
+        if user_id is not None:
+            positions = store.positions_of_user(user_id)
+            mask = store.alive[positions] & (store.statuses[positions] == 1)
+            if after is not None:
+                weights, ids = store.weights[positions], store.ids[positions]
+                mask &= (weights < after[0]) | ((weights == after[0]) & (ids < after[1]))
+            positions = positions[mask]
+            order = np.lexsort((-store.ids[positions], -store.weights[positions]))
+            ranked = positions[order][:limit].tolist()
+        else:
+            ranked = self._global_top(store, limit, after)
+            if ranked is None:
+                return None
+
+        rows = store.rows
+        return [dict(rows[pos]) for pos in ranked]
+
+    def _global_top(self, store: _Store, limit: int, after: Optional[Tuple[float, int]] = None) -> Optional[List[int]]:
+        """全局 Top 候选位置 (首次或候选耗尽时全量扫描, 之后由写入增量维护)"""
+        if self._top is None:
+            positions = np.flatnonzero(store.alive[:store.size] & (store.statuses[:store.size] == 1))
+            self._top_exhaustive = len(positions) <= _TOP_CANDIDATES
+            if not self._top_exhaustive:
+                weights = store.weights[positions]
+                threshold = np.partition(weights, len(weights) - _TOP_CANDIDATES)[len(weights) - _TOP_CANDIDATES]
+                positions = positions[weights >= threshold]
+
+            order = np.lexsort((-store.ids[positions], -store.weights[positions]))
+            ranked = positions[order][:_TOP_CANDIDATES].tolist()
+            self._top = [self._top_key(pos) for pos in ranked]
+
+        start = 0 if after is None else bisect_right(self._top, (-float(after[0]), -int(after[1]), float("inf")))
+        page = self._top[start:start + limit]
+        if len(page) < limit and not self._top_exhaustive:
+            return None
+        return [pos for _, _, pos in page]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计信息
+
+        Returns:
+            统计信息字典
+        """
+        store = self._store
+        return {
+            "ready": self.ready,
+            "cell_deg": self.cell_deg,
+            "notes": len(store.positions),
+            "slots": store.size,
+            "sealed_slots": store.sealed,
+            "dead_slots": store.dead,
+            "watermark": self.watermark,
+            "last_sync_at": self.last_sync_at,
+            "nearby_queries": self.nearby_queries,
+            "top_queries": self.top_queries,
+            "upserts": self.upserts,
+            "removals": self.removals,
+            "rebuilds": self.rebuilds,
+        }
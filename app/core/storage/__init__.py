@@ -0,0 +1,42 @@
+"""
+存储后端
+app/core/database.py 通过 db.get_client() / db.execute() 访问数据, db 由 STORAGE_BACKEND 选择:
+
+- supabase: Supabase (PostgREST), 线上使用
+- memory:   进程内字典 + 哈希/网格索引, 压测与基准测试使用
+- sqlite:   本地 SQLite 文件 + 网格索引, 离线运行使用
+
+本地后端在进程内执行同样的 PostgREST 查询 (含 get_nearby_bubbles 等数据库函数),
+缓存、空间索引、排行榜等上层逻辑与线上完全一致
+"""
+
+from app.core.storage.base import StorageBackend
+
+BACKENDS = ("supabase", "memory", "sqlite")
+
+
+def create_backend(name: str) -> StorageBackend:
+    """
+    按名称创建存储后端 (配置见 app/core/config.py)
+
+    Args:
+        name: supabase / memory / sqlite
+
+    Returns:
+        存储后端实例
+    """
+    from app.core.config import settings
+
+    if name == "supabase":
+        from app.core.storage.supabase_backend import SupabaseBackend
+        return SupabaseBackend()
+    if name == "memory":
+        from app.core.storage.memory import MemoryBackend
+        return MemoryBackend(grid_deg=settings.STORAGE_GRID_DEG)
+    if name == "sqlite":
+        from app.core.storage.sqlite import SQLiteBackend
+        return SQLiteBackend(path=settings.SQLITE_PATH, grid_deg=settings.STORAGE_GRID_DEG)
+    raise ValueError(f"未知的存储后端: {name} (可选: {', '.join(BACKENDS)})")
+
+
+__all__ = ["StorageBackend", "BACKENDS", "create_backend"]
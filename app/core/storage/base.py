@@ -0,0 +1,86 @@
+"""
+存储后端接口
+app/core/database.py 的全部函数通过 db.get_client() 构建 PostgREST 查询、通过 db.execute() 执行,
+存储后端实现这两个方法即可替换数据来源 (Supabase / 内存 / SQLite)
+"""
+
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.core.metrics import query_metrics, OUTCOME_OK, OUTCOME_ERROR
+from app.core.read_router import ReadRouter
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    """存储后端基类"""
+
+    name = "base"
+
+    def __init__(self):
+        # 只读副本路由 (只有 Supabase 后端会配置副本, 其余后端为空路由)
+        self.read_router = ReadRouter(pin_seconds=0.0)
+
+    def get_client(self, use_admin: bool = False, read_only: bool = False):
+        """
+        获取用于构建查询的客户端 (提供 table() / rpc())
+
+        Args:
+            use_admin: 是否使用管理员客户端 (绕过 RLS)
+            read_only: 只读查询且可以容忍复制延迟时为 True
+
+        Returns:
+            客户端实例
+        """
+        raise NotImplementedError
+
+    async def execute(self, query):
+        """
+        执行构建好的查询
+
+        Args:
+            query: 构建好的查询 (select/insert/update/rpc 等)
+
+        Returns:
+            查询响应 (APIResponse)
+        """
+        raise NotImplementedError
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取后端运行统计 (健康检查展示)"""
+        return {"backend": self.name}
+
+    def shutdown(self) -> None:
+        """释放后端资源 (应用退出时调用)"""
+
+    async def _measure(self, query, run: Callable[[], Awaitable[Tuple[Any, int]]]):
+        """
+        执行查询并记录调用指标
+
+        Args:
+            query: 构建好的查询
+            run: 执行查询, 返回 (响应, 响应字节数)
+
+        Returns:
+            查询响应
+        """
+        if query_metrics is None:
+            response, _ = await run()
+            return response
+
+        # 记录耗时 (含线程池排队)/返回行数/响应字节数/目标表或函数/结果
+        target = getattr(query, "path", "").lstrip("/") or "-"
+        method = getattr(query, "http_method", "-")
+        start = time.perf_counter()
+        try:
+            response, payload_bytes = await run()
+        except Exception:
+            query_metrics.record_call(target, method, (time.perf_counter() - start) * 1000.0, 0, 0, OUTCOME_ERROR)
+            raise
+
+        data = response.data
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        query_metrics.record_call(target, method, (time.perf_counter() - start) * 1000.0, rows, payload_bytes, OUTCOME_OK)
+        return response
@@ -0,0 +1,268 @@
+"""
+本地存储后端公共部分
+解析 PostgREST 查询后由子类在内存或 SQLite 中执行; 写入时补齐列默认值与 update_time,
+数据库函数 (RPC) get_nearby_bubbles / bulk_update_weight_scores / compact_* / table_storage_stats /
+*_genius_loci_record_partitions 在本地实现, 语义与迁移脚本一致 (本地表不分区, 保留策略按行删除)
+
+查询在单线程的专用线程池中串行执行 (与 Supabase 后端一样不阻塞事件循环, 且无需加锁)
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from postgrest import SyncPostgrestClient
+from postgrest.base_request_builder import APIResponse
+
+from app.core.storage.base import StorageBackend
+from app.core.storage.query import (
+    Condition,
+    Filter,
+    OrderBy,
+    Request,
+    api_error,
+    parse_request,
+    project,
+    validate_columns,
+)
+from app.core.storage.schema import TABLES, TableSpec, BUBBLE_NOTE, GENIUS_LOCI_RECORD, retention_cutoff, utc_now
+from app.utils.geo import bounding_box, rank_by_distance
+
+logger = logging.getLogger(__name__)
+
+# 本地客户端只用于构建查询, 不会发出网络请求
+_LOCAL_REST_URL = "http://local.invalid/rest/v1"
+
+
+class LocalBackend(StorageBackend):
+    """本地存储后端基类"""
+
+    def __init__(self, grid_deg: float):
+        """
+        初始化
+
+        Args:
+            grid_deg: 网格索引边长 (度)
+        """
+        super().__init__()
+        self.grid_deg = grid_deg
+        self.client = SyncPostgrestClient(_LOCAL_REST_URL)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"storage-{self.name}")
+        self.queries = 0
+
+    def get_client(self, use_admin: bool = False, read_only: bool = False) -> SyncPostgrestClient:
+        return self.client
+
+    async def execute(self, query):
+        loop = asyncio.get_running_loop()
+        return await self._measure(query, lambda: loop.run_in_executor(self.executor, self._run, query))
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "queries": self.queries, "grid_deg": self.grid_deg}
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.client.session.close()
+        logger.info(f"本地存储后端 ({self.name}) 已关闭")
+
+    def load_rows(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        批量导入数据 (基准测试/离线运行准备数据用, 不经过查询解析; 需在没有查询执行时调用)
+
+        Args:
+            table: 表名
+            rows: 行 (缺少的列按默认值补齐, 未指定主键时自动生成)
+
+        Returns:
+            导入行数
+        """
+        spec = self._spec(table)
+        return len(self._insert(spec, [self._with_defaults(spec, row) for row in rows]))
+
+    # ========================================
+    # 请求分发
+    # ========================================
+
+    def _run(self, query) -> Tuple[APIResponse, int]:
+        """在后端线程中执行一个查询, 返回 (响应, 响应字节数); 本地执行不计字节数"""
+        self.queries += 1
+        request = parse_request(query)
+
+        if request.function is not None:
+            data = self._call(request)
+            # 返回表的函数按 select 投影, 返回标量集合 (SETOF text 等) 的原样返回
+            if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+                data = project(data, request.select)
+            return APIResponse.model_construct(data=data, count=None), 0
+
+        spec = self._spec(request.table)
+        if request.select is not None:
+            validate_columns(request.select, spec.columns)
+
+        if request.method == "GET":
+            rows = self._select(spec, request)
+        elif request.method == "POST":
+            body = request.body if isinstance(request.body, list) else [request.body]
+            rows = [self._with_defaults(spec, row) for row in body]
+            if request.upsert:
+                # 合并已存在的行时只更新请求中给出的列
+                rows = self._insert(spec, rows, request.on_conflict or spec.primary_key, sorted(set().union(*body)))
+            else:
+                rows = self._insert(spec, rows)
+        elif request.method == "PATCH":
+            rows = self._update(spec, request.filters, self._with_touch(spec, request.body))
+        elif request.method == "DELETE":
+            rows = self._delete(spec, request.filters)
+        else:
+            raise api_error("PGRST117", f"不支持的请求方法: {request.method}")
+
+        return APIResponse.model_construct(data=project(rows, request.select), count=None), 0
+
+    def _spec(self, table: str) -> TableSpec:
+        spec = TABLES.get(table)
+        if spec is None:
+            raise api_error("PGRST205", f"Could not find the table 'public.{table}' in the schema cache")
+        return spec
+
+    def _with_defaults(self, spec: TableSpec, row: Dict[str, Any]) -> Dict[str, Any]:
+        """补齐插入行的默认值"""
+        validate_columns(row, spec.columns)
+        full = {column: row[column] if column in row else spec.default(column) for column in spec.columns}
+        if full.get(spec.primary_key) is None and not spec.autoincrement:
+            raise api_error("23502", f'null value in column "{spec.primary_key}" violates not-null constraint')
+        return full
+
+    def _with_touch(self, spec: TableSpec, values: Dict[str, Any]) -> Dict[str, Any]:
+        """更新时刷新 update_time (对应数据库触发器)"""
+        validate_columns(values, spec.columns)
+        if spec.touch_column and spec.touch_column not in values:
+            return {**values, spec.touch_column: utc_now()}
+        return dict(values)
+
+    # ========================================
+    # 数据库函数 (RPC)
+    # ========================================
+
+    def _call(self, request: Request) -> Any:
+        params = request.body or {}
+        if request.function == "get_nearby_bubbles":
+            return self._nearby_bubbles(**params)
+        if request.function == "bulk_update_weight_scores":
+            return self._bulk_update_weight_scores(params["ids"], params["scores"])
+        if request.function == "compact_bubble_notes":
+            return [self._compact_bubble_notes(params["batch_size"], params["deleted_before"])]
+        if request.function == "compact_expired_records":
+            return self._compact_expired_records(params["batch_size"], params["expired_before"])
+        if request.function == "table_storage_stats":
+            return [{"table_name": name, **self._storage_stats(spec)} for name, spec in sorted(TABLES.items())
+                    if name != "job_watermark"]
+        if request.function == "ensure_genius_loci_record_partitions":
+            return 0
+        if request.function == "drop_expired_genius_loci_record_partitions":
+            return self._drop_expired_records(params["retain_months"])
+        raise api_error("PGRST202", f"Could not find the function public.{request.function} in the schema cache")
+
+    def _nearby_bubbles(
+        self,
+        lon: float,
+        lat: float,
+        radius_m: int,
+        lim: int = 20,
+        stat: Optional[int] = None,
+        after_distance: Optional[float] = None,
+        after_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """get_nearby_bubbles: 半径内有效笔记按 (距离, id) 升序 (网格索引取候选, 本地计算球面距离)"""
+        radius_km = radius_m / 1000.0
+        min_lon, max_lon, min_lat, max_lat = bounding_box(lon, lat, radius_km)
+        filters: List[Filter] = [
+            Condition("gps_longitude", "gte", str(min_lon)),
+            Condition("gps_longitude", "lte", str(max_lon)),
+            Condition("gps_latitude", "gte", str(min_lat)),
+            Condition("gps_latitude", "lte", str(max_lat)),
+            Condition("is_valid", "eq", "1"),
+        ]
+        if stat is not None:
+            filters.append(Condition("status", "eq", str(stat)))
+
+        candidates = self._select(BUBBLE_NOTE, Request(method="GET", table=BUBBLE_NOTE.name, filters=filters))
+        after = (after_distance, after_id) if after_distance is not None else None
+        return rank_by_distance(candidates, lon, lat, radius_km, lim, after)
+
+    def _bulk_update_weight_scores(self, ids: List[int], scores: List[float]) -> int:
+        """bulk_update_weight_scores: 按 id 写回分数, 跳过未变化的行, 返回写入行数"""
+        written = 0
+        for note_id, score in zip(ids, scores):
+            filters = [Condition("id", "eq", str(note_id)), Condition("weight_score", "neq", repr(float(score)))]
+            written += len(self._update(BUBBLE_NOTE, filters, self._with_touch(BUBBLE_NOTE, {"weight_score": score})))
+        return written
+
+    def _compact_bubble_notes(self, batch_size: int, deleted_before: str) -> Dict[str, int]:
+        """compact_bubble_notes: 一批软删除笔记及其地灵记录移到冷数据表"""
+        filters: List[Filter] = [Condition("is_valid", "eq", "0"), Condition("update_time", "lt", deleted_before)]
+        order = [OrderBy("update_time", False, False), OrderBy("id", False, False)]
+        notes = self._select(BUBBLE_NOTE, Request(method="GET", table=BUBBLE_NOTE.name, filters=filters, order=order, limit=batch_size))
+        if not notes:
+            return {"notes": 0, "records": 0}
+
+        note_ids = [str(note["id"]) for note in notes]
+        records = self._archive_rows(GENIUS_LOCI_RECORD, [Condition("bubble_id", "in", note_ids)])
+        return {"notes": self._archive_rows(BUBBLE_NOTE, [Condition("id", "in", note_ids)]), "records": records}
+
+    def _compact_expired_records(self, batch_size: int, expired_before: str) -> int:
+        """compact_expired_records: 一批已过期的地灵记录移到冷数据表"""
+        filters: List[Filter] = [Condition("expire_time", "lt", expired_before)]
+        order = [OrderBy("expire_time", False, False), OrderBy("id", False, False)]
+        request = Request(method="GET", table=GENIUS_LOCI_RECORD.name, filters=filters, order=order, limit=batch_size)
+        record_ids = [str(record["id"]) for record in self._select(GENIUS_LOCI_RECORD, request)]
+        if not record_ids:
+            return 0
+        return self._archive_rows(GENIUS_LOCI_RECORD, [Condition("id", "in", record_ids)])
+
+    def _drop_expired_records(self, retain_months: int) -> List[str]:
+        """drop_expired_genius_loci_record_partitions: 删除保留期之前的记录, 返回涉及的月份分区名"""
+        cutoff = retention_cutoff(retain_months)
+        if cutoff is None:
+            return []
+        rows = self._delete(GENIUS_LOCI_RECORD, [Condition("process_time", "lt", cutoff.isoformat())])
+        return sorted({f"genius_loci_record_p{row['process_time'][:7].replace('-', '')}" for row in rows})
+
+    def _archive_rows(self, spec: TableSpec, filters: List[Filter]) -> int:
+        """删除满足条件的行并写入冷数据表 (id 已存在时跳过), 返回移动的行数"""
+        rows = self._delete(spec, filters)
+        if rows:
+            archive = TABLES[f"{spec.name}_archive"]
+            archived_at = utc_now()
+            self._insert(archive, [{**row, "archived_at": archived_at} for row in rows], conflict=archive.primary_key)
+        return len(rows)
+
+    # ========================================
+    # 子类实现
+    # ========================================
+
+    def _storage_stats(self, spec: TableSpec) -> Dict[str, Any]:
+        """table_storage_stats 的一行 (本地后端只统计行数, 大小未知时为 None)"""
+        return {"table_bytes": None, "index_bytes": None, "live_rows": None, "dead_rows": 0}
+
+    def _select(self, spec: TableSpec, request: Request) -> List[Dict[str, Any]]:
+        """按条件/排序/分页查询完整行"""
+        raise NotImplementedError
+
+    def _insert(
+        self,
+        spec: TableSpec,
+        rows: List[Dict[str, Any]],
+        conflict: Optional[str] = None,
+        merge_columns: Sequence[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """插入完整行 (conflict 不为 None 时, 该列已存在的行改为更新 merge_columns), 返回写入后的行"""
+        raise NotImplementedError
+
+    def _update(self, spec: TableSpec, filters: List[Filter], values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """更新满足条件的行, 返回更新后的行"""
+        raise NotImplementedError
+
+    def _delete(self, spec: TableSpec, filters: List[Filter]) -> List[Dict[str, Any]]:
+        """删除满足条件的行, 返回被删除的行"""
+        raise NotImplementedError
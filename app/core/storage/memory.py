@@ -0,0 +1,193 @@
+"""
+内存存储后端
+数据保存在进程内的字典中 (进程退出即丢失), 用于压测、基准测试与离线运行
+
+- 主键与 hash_indexes 列建哈希索引, 顶层等值/IN 条件直接定位
+- 带坐标的表建网格索引 (与地理瓦片缓存相同的瓦片划分), 经纬度范围条件只扫描相交的网格
+- 行字典写入后不再原地修改 (更新时整体替换), 查询结果按投影复制后返回
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from app.core.storage.local import LocalBackend
+from app.core.storage.query import (
+    Filter,
+    Request,
+    api_error,
+    bbox_of,
+    coerce,
+    compile_predicate,
+    key_lookup,
+    sort_rows,
+    validate_columns,
+)
+from app.core.storage.schema import TABLES, TableSpec
+from app.utils.geo import TileKey, tile_count, tile_key, tiles_for_bbox
+
+# 范围条件覆盖的网格数超过该值时改为全表扫描
+_MAX_GRID_CELLS = 4096
+
+
+class _Table:
+    """一张表的行与索引"""
+
+    def __init__(self, spec: TableSpec, grid_deg: float):
+        self.spec = spec
+        self.grid_deg = grid_deg
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Set[Any]]] = {
+            column: {} for column in spec.hash_indexes if column != spec.primary_key
+        }
+        self.grid: Dict[TileKey, Set[Any]] = {}
+        self.next_id = 1
+
+    def add(self, row: Dict[str, Any]) -> None:
+        key = row[self.spec.primary_key]
+        self.rows[key] = row
+        for column, index in self.indexes.items():
+            index.setdefault(row.get(column), set()).add(key)
+        cell = self._cell(row)
+        if cell is not None:
+            self.grid.setdefault(cell, set()).add(key)
+
+    def discard(self, key: Any) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        for column, index in self.indexes.items():
+            _remove(index, row.get(column), key)
+        cell = self._cell(row)
+        if cell is not None:
+            _remove(self.grid, cell, key)
+
+    def replace(self, row: Dict[str, Any]) -> None:
+        self.discard(row[self.spec.primary_key])
+        self.add(row)
+
+    def find(self, column: str, value: Any) -> Optional[Dict[str, Any]]:
+        """按列值查找一行 (用于 upsert 冲突检测)"""
+        if column == self.spec.primary_key:
+            return self.rows.get(value)
+        if column in self.indexes:
+            keys = self.indexes[column].get(value)
+            return self.rows[next(iter(keys))] if keys else None
+        return next((row for row in self.rows.values() if row.get(column) == value), None)
+
+    def candidates(self, filters: Sequence[Filter]) -> Iterable[Dict[str, Any]]:
+        """按索引缩小候选行 (调用方仍需按全部条件过滤)"""
+        spec = self.spec
+        lookup = key_lookup(filters, (spec.primary_key, *self.indexes))
+        if lookup is not None:
+            column, values = lookup
+            keys = {coerce(spec.columns, column, value) for value in values}
+            if column == spec.primary_key:
+                return [self.rows[key] for key in keys if key in self.rows]
+            matched = set().union(*(self.indexes[column].get(key, ()) for key in keys))
+            return [self.rows[key] for key in matched]
+
+        if spec.grid:
+            bbox = bbox_of(filters)
+            if bbox is not None and tile_count(bbox, self.grid_deg) <= _MAX_GRID_CELLS:
+                matched = set().union(*(self.grid.get(cell, ()) for cell in tiles_for_bbox(bbox, self.grid_deg)))
+                return [self.rows[key] for key in matched]
+
+        return list(self.rows.values())
+
+    def _cell(self, row: Dict[str, Any]) -> Optional[TileKey]:
+        if not self.spec.grid:
+            return None
+        longitude, latitude = row.get("gps_longitude"), row.get("gps_latitude")
+        if longitude is None or latitude is None:
+            return None
+        return tile_key(longitude, latitude, self.grid_deg)
+
+
+def _remove(index: Dict[Any, Set[Any]], value: Any, key: Any) -> None:
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+
+class MemoryBackend(LocalBackend):
+    """内存存储后端"""
+
+    name = "memory"
+
+    def __init__(self, grid_deg: float):
+        """
+        初始化
+
+        Args:
+            grid_deg: 网格索引边长 (度)
+        """
+        super().__init__(grid_deg)
+        self._tables = {name: _Table(spec, grid_deg) for name, spec in TABLES.items()}
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {
+            **super().get_pool_stats(),
+            "rows": {name: len(table.rows) for name, table in self._tables.items()},
+        }
+
+    def _storage_stats(self, spec: TableSpec) -> Dict[str, Any]:
+        return {**super()._storage_stats(spec), "live_rows": len(self._tables[spec.name].rows)}
+
+    def _select(self, spec: TableSpec, request: Request) -> List[Dict[str, Any]]:
+        validate_columns((item.column for item in request.order), spec.columns)
+        predicate = compile_predicate(request.filters, spec.columns)
+        rows = list(filter(predicate, self._tables[spec.name].candidates(request.filters)))
+
+        end = None if request.limit is None else request.offset + request.limit
+        rows = sort_rows(rows, request.order, end)
+        return rows[request.offset:] if request.offset else rows
+
+    def _insert(
+        self,
+        spec: TableSpec,
+        rows: List[Dict[str, Any]],
+        conflict: Optional[str] = None,
+        merge_columns: Sequence[str] = ()
+    ) -> List[Dict[str, Any]]:
+        table = self._tables[spec.name]
+        written = []
+        for row in rows:
+            if conflict is not None:
+                existing = table.find(conflict, row.get(conflict))
+                if existing is not None:
+                    merged = {**existing, **{column: row[column] for column in merge_columns}}
+                    table.replace(merged)
+                    written.append(merged)
+                    continue
+
+            key = row.get(spec.primary_key)
+            if key is None:
+                key = table.next_id
+                row = {**row, spec.primary_key: key}
+            elif key in table.rows:
+                raise api_error("23505", f'duplicate key value violates unique constraint "{spec.name}_pkey"')
+            if spec.autoincrement:
+                table.next_id = max(table.next_id, key + 1)
+
+            table.add(row)
+            written.append(row)
+        return written
+
+    def _update(self, spec: TableSpec, filters: List[Filter], values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        table = self._tables[spec.name]
+        predicate = compile_predicate(filters, spec.columns)
+        updated = []
+        for row in [row for row in table.candidates(filters) if predicate(row)]:
+            new_row = {**row, **values}
+            table.replace(new_row)
+            updated.append(new_row)
+        return updated
+
+    def _delete(self, spec: TableSpec, filters: List[Filter]) -> List[Dict[str, Any]]:
+        table = self._tables[spec.name]
+        predicate = compile_predicate(filters, spec.columns)
+        deleted = [row for row in table.candidates(filters) if predicate(row)]
+        for row in deleted:
+            table.discard(row[spec.primary_key])
+        return deleted
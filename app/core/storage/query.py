@@ -0,0 +1,456 @@
+"""
+PostgREST 请求解析 (本地存储后端使用)
+把 postgrest-py 构建好的查询 (方法/路径/参数/请求体) 解析为过滤条件树、投影列、排序与分页,
+由本地后端在内存或 SQLite 中执行
+
+支持 app/core/database.py 用到的语法:
+- 运算符 eq / neq / gt / gte / lt / lte / in / is, 可带 not. 前缀
+- and / or / not.and / not.or 组合条件 (可嵌套, 值可带双引号)
+- select / order (多列, asc/desc, nullsfirst/nullslast) / limit / offset / on_conflict
+"""
+
+import heapq
+import operator
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from postgrest.exceptions import APIError
+
+from app.utils.geo import BBox
+
+_COMPARATORS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+_SQL_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_LOGIC_PREFIXES = ("not.and(", "not.or(", "and(", "or(")
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class Condition(NamedTuple):
+    """单列条件 (value 为字符串, in 运算为字符串列表)"""
+
+    column: str
+    op: str
+    value: Union[str, List[str]]
+    negate: bool = False
+
+
+class Logic(NamedTuple):
+    """and / or 组合条件"""
+
+    kind: str
+    children: List[Any]
+    negate: bool = False
+
+
+Filter = Union[Condition, Logic]
+
+
+class OrderBy(NamedTuple):
+    column: str
+    descending: bool
+    nulls_first: bool
+
+
+class Request(NamedTuple):
+    """解析后的请求"""
+
+    method: str
+    table: Optional[str] = None  # 表名 (RPC 时为 None)
+    function: Optional[str] = None  # RPC 函数名
+    select: Optional[List[str]] = None  # 投影列, None 表示全部列
+    filters: List[Filter] = []
+    order: List[OrderBy] = []
+    limit: Optional[int] = None
+    offset: int = 0
+    body: Any = None
+    on_conflict: Optional[str] = None
+    upsert: bool = False
+
+
+def api_error(code: str, message: str) -> APIError:
+    """构造与 PostgREST 响应一致的错误"""
+    return APIError({"code": code, "message": message, "hint": None, "details": None})
+
+
+# ========================================
+# 解析
+# ========================================
+
+def parse_request(query) -> Request:
+    """
+    解析 postgrest-py 查询
+
+    Args:
+        query: 构建好的查询 (select/insert/update/upsert/delete/rpc)
+
+    Returns:
+        解析后的请求
+    """
+    path = query.path.strip("/")
+    function = path[len("rpc/"):] if path.startswith("rpc/") else None
+
+    select = None
+    order: List[OrderBy] = []
+    limit = None
+    offset = 0
+    on_conflict = None
+    filters: List[Filter] = []
+
+    for key, value in query.params.multi_items():
+        if key == "select":
+            columns = [column.strip() for column in value.split(",") if column.strip()]
+            select = None if columns == ["*"] else columns
+        elif key == "order":
+            order = [_parse_order(item) for item in value.split(",") if item]
+        elif key == "limit":
+            limit = int(value)
+        elif key == "offset":
+            offset = int(value)
+        elif key == "on_conflict":
+            on_conflict = value
+        elif key in _RESERVED_PARAMS:
+            continue
+        elif key in ("and", "or", "not.and", "not.or"):
+            negate = key.startswith("not.")
+            filters.append(Logic(key[4:] if negate else key, _parse_group(value), negate))
+        else:
+            filters.append(_parse_condition(key, value))
+
+    prefer = query.headers.get("prefer", "")
+    return Request(
+        method=query.http_method,
+        table=None if function else path,
+        function=function,
+        select=select,
+        filters=filters,
+        order=order,
+        limit=limit,
+        offset=offset,
+        body=query.json,
+        on_conflict=on_conflict,
+        upsert="resolution=merge-duplicates" in prefer,
+    )
+
+
+def _parse_order(item: str) -> OrderBy:
+    column, *modifiers = item.strip().split(".")
+    descending = "desc" in modifiers
+    # 与 PostgreSQL 一致: 升序时 NULL 在后, 降序时 NULL 在前
+    nulls_first = descending
+    if "nullsfirst" in modifiers:
+        nulls_first = True
+    elif "nullslast" in modifiers:
+        nulls_first = False
+    return OrderBy(column, descending, nulls_first)
+
+
+def _split_top_level(text: str) -> List[str]:
+    """按顶层逗号拆分 (忽略括号与双引号内的逗号)"""
+    parts, depth, quoted, escaped, start = [], 0, False, False, 0
+    for i, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part for part in parts if part]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def _parse_operand(text: str) -> Tuple[bool, str, Union[str, List[str]]]:
+    """解析 "[not.]op.value", 返回 (是否取反, 运算符, 值)"""
+    negate = text.startswith("not.")
+    if negate:
+        text = text[4:]
+    op, _, raw = text.partition(".")
+    if op not in _COMPARATORS and op not in ("in", "is"):
+        raise api_error("PGRST100", f"不支持的运算符: {op}")
+    if op == "in":
+        if not (raw.startswith("(") and raw.endswith(")")):
+            raise api_error("PGRST100", f"in 条件格式错误: {raw}")
+        return negate, op, [_unquote(item) for item in _split_top_level(raw[1:-1])]
+    return negate, op, _unquote(raw)
+
+
+def _parse_condition(column: str, text: str) -> Condition:
+    negate, op, value = _parse_operand(text)
+    return Condition(column, op, value, negate)
+
+
+def _parse_group(text: str) -> List[Filter]:
+    """解析 "(条件,条件,and(...))" """
+    if not (text.startswith("(") and text.endswith(")")):
+        raise api_error("PGRST100", f"组合条件格式错误: {text}")
+    return [_parse_item(item) for item in _split_top_level(text[1:-1])]
+
+
+def _parse_item(item: str) -> Filter:
+    for prefix in _LOGIC_PREFIXES:
+        if item.startswith(prefix):
+            negate = prefix.startswith("not.")
+            kind = prefix[4:-1] if negate else prefix[:-1]
+            return Logic(kind, _parse_group(item[len(prefix) - 1:]), negate)
+    column, _, rest = item.partition(".")
+    return _parse_condition(column, rest)
+
+
+# ========================================
+# 内存执行
+# ========================================
+
+def coerce(columns: Dict[str, type], column: str, value: str) -> Any:
+    """把条件中的字符串值转换为列类型"""
+    kind = columns.get(column)
+    if kind is None:
+        raise api_error("42703", f"column {column} does not exist")
+    if kind is str:
+        return value
+    number = float(value)
+    return int(number) if kind is int and number.is_integer() else number
+
+
+def compile_predicate(filters: Sequence[Filter], columns: Dict[str, type]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    把过滤条件编译为行判断函数 (顶层条件之间为 and)
+
+    Args:
+        filters: 过滤条件
+        columns: 列类型
+
+    Returns:
+        row -> 是否满足条件
+    """
+    # 顶层等值条件合并为一次取值比较 (NULL 不等于任何非 NULL 值, 与 SQL 结果一致)
+    equal = [node for node in filters if isinstance(node, Condition) and node.op == "eq" and not node.negate]
+    checks = [_compile(node, columns) for node in filters if node not in equal]
+    if equal:
+        for node in equal:
+            if node.column not in columns:
+                raise api_error("42703", f"column {node.column} does not exist")
+        getter = operator.itemgetter(*(node.column for node in equal))
+        expected = tuple(coerce(columns, node.column, node.value) for node in equal)
+        if len(equal) == 1:
+            expected = expected[0]
+        checks.insert(0, lambda row: getter(row) == expected)
+
+    if not checks:
+        return lambda row: True
+    if len(checks) == 1:
+        return checks[0]
+    first, *rest = checks
+    return lambda row: first(row) and all(check(row) for check in rest)
+
+
+def _compile(node: Filter, columns: Dict[str, type]) -> Callable[[Dict[str, Any]], bool]:
+    if isinstance(node, Logic):
+        children = [_compile(child, columns) for child in node.children]
+        combine = all if node.kind == "and" else any
+        if node.negate:
+            return lambda row: not combine(check(row) for check in children)
+        return lambda row: combine(check(row) for check in children)
+
+    column, op, value, negate = node
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(value.lower())
+        if column not in columns:
+            raise api_error("42703", f"column {column} does not exist")
+        if expected is None:
+            return (lambda row: row.get(column) is not None) if negate else (lambda row: row.get(column) is None)
+        return lambda row: (bool(row.get(column)) == expected) != negate
+
+    # 与 SQL 一致: 列值为 NULL 时比较结果为 NULL, 取反后仍不满足
+    if op == "in":
+        allowed = {coerce(columns, column, item) for item in value}
+        return lambda row: row.get(column) is not None and ((row[column] in allowed) != negate)
+
+    target = coerce(columns, column, value)
+    compare = _COMPARATORS[op]
+    return lambda row: row.get(column) is not None and (compare(row[column], target) != negate)
+
+
+def sort_rows(rows: List[Dict[str, Any]], order: Sequence[OrderBy], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    多列排序 (只需要前 limit 条且排序列不含 NULL 时使用堆选择)
+
+    Args:
+        rows: 行
+        order: 排序列
+        limit: 需要的条数
+
+    Returns:
+        排序后的行
+    """
+    if not order:
+        return rows if limit is None else rows[:limit]
+
+    if limit is not None and limit < len(rows):
+        top = _select_top(rows, order, limit)
+        if top is not None:
+            return top
+
+    # 从最后一个排序列开始做稳定排序; NULL 按 nulls_first 放在两端
+    for item in reversed(order):
+        present = [row for row in rows if row.get(item.column) is not None]
+        missing = [row for row in rows if row.get(item.column) is None]
+        present.sort(key=lambda row: row[item.column], reverse=item.descending)
+        rows = missing + present if item.nulls_first else present + missing
+    return rows if limit is None else rows[:limit]
+
+
+def _select_top(rows: List[Dict[str, Any]], order: Sequence[OrderBy], limit: int) -> Optional[List[Dict[str, Any]]]:
+    """堆选择前 limit 条; 排序列含 NULL (或升降序混合时含非数值列) 时返回 None, 由调用方完整排序"""
+    columns = [item.column for item in order]
+    kinds = [set(map(type, map(operator.itemgetter(column), rows))) for column in columns]
+    if any(type(None) in column_kinds for column_kinds in kinds):
+        return None
+
+    if len({item.descending for item in order}) == 1:
+        select = heapq.nlargest if order[0].descending else heapq.nsmallest
+        return select(limit, rows, key=operator.itemgetter(*columns))
+
+    if not all(column_kinds <= {int, float} for column_kinds in kinds):
+        return None
+    signs = [(item.column, -1 if item.descending else 1) for item in order]
+    return heapq.nsmallest(limit, rows, key=lambda row: tuple(sign * row[column] for column, sign in signs))
+
+
+def project(rows: Iterable[Dict[str, Any]], select: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """按投影列复制行 (select 为 None 时复制全部列)"""
+    if select is None:
+        return [dict(row) for row in rows]
+    return [{column: row.get(column) for column in select} for row in rows]
+
+
+def validate_columns(columns: Iterable[str], known: Dict[str, type], extra: Sequence[str] = ()) -> None:
+    """校验列名 (未知列与 PostgREST 一样报错)"""
+    for column in columns:
+        if column not in known and column not in extra:
+            raise api_error("42703", f"column {column} does not exist")
+
+
+# ========================================
+# 索引辅助
+# ========================================
+
+def key_lookup(filters: Sequence[Filter], indexed: Sequence[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    找出可用索引回答的顶层等值/IN 条件
+
+    Args:
+        filters: 过滤条件
+        indexed: 有索引的列
+
+    Returns:
+        (列名, 值列表); 没有可用条件时返回 None
+    """
+    for node in filters:
+        if isinstance(node, Condition) and not node.negate and node.column in indexed:
+            if node.op == "eq":
+                return node.column, [node.value]
+            if node.op == "in":
+                return node.column, list(node.value)
+    return None
+
+
+def bbox_of(filters: Sequence[Filter]) -> Optional[BBox]:
+    """
+    从顶层经纬度范围条件中提取边界框 (四个方向都有限制时才返回)
+
+    Args:
+        filters: 过滤条件
+
+    Returns:
+        (min_lon, max_lon, min_lat, max_lat) 或 None
+    """
+    bounds: Dict[Tuple[str, str], float] = {}
+    for node in filters:
+        if not isinstance(node, Condition) or node.negate:
+            continue
+        if node.column not in ("gps_longitude", "gps_latitude") or node.op not in ("gt", "gte", "lt", "lte", "eq"):
+            continue
+        value = float(node.value)
+        sides = ("min", "max") if node.op == "eq" else (("min",) if node.op in ("gt", "gte") else ("max",))
+        for side in sides:
+            key = (node.column, side)
+            bounds[key] = max(bounds.get(key, value), value) if side == "min" else min(bounds.get(key, value), value)
+
+    keys = [("gps_longitude", "min"), ("gps_longitude", "max"), ("gps_latitude", "min"), ("gps_latitude", "max")]
+    if not all(key in bounds for key in keys):
+        return None
+    return tuple(bounds[key] for key in keys)
+
+
+# ========================================
+# SQL 翻译
+# ========================================
+
+def to_sql(filters: Sequence[Filter], columns: Dict[str, type]) -> Tuple[str, List[Any]]:
+    """
+    把过滤条件翻译为 SQL WHERE 子句 (参数化)
+
+    Args:
+        filters: 过滤条件
+        columns: 列类型 (同时用于校验列名, 列名不会出现在参数之外的用户输入中)
+
+    Returns:
+        (条件 SQL, 参数); 没有条件时为 ("1", [])
+    """
+    params: List[Any] = []
+    parts = [_node_sql(node, columns, params) for node in filters]
+    return (" AND ".join(parts) if parts else "1"), params
+
+
+def _node_sql(node: Filter, columns: Dict[str, type], params: List[Any]) -> str:
+    if isinstance(node, Logic):
+        joiner = " AND " if node.kind == "and" else " OR "
+        sql = "(" + joiner.join(_node_sql(child, columns, params) for child in node.children) + ")"
+        return f"NOT {sql}" if node.negate else sql
+
+    column, op, value, negate = node
+    if column not in columns:
+        raise api_error("42703", f"column {column} does not exist")
+    quoted = f'"{column}"'
+
+    if op == "is":
+        literal = value.lower()
+        if literal == "null":
+            sql = f"{quoted} IS NULL"
+        elif literal in ("true", "false"):
+            sql = f"{quoted} = {1 if literal == 'true' else 0}"
+        else:
+            raise api_error("PGRST100", f"is 条件格式错误: {value}")
+    elif op == "in":
+        params.extend(coerce(columns, column, item) for item in value)
+        sql = f"{quoted} IN ({', '.join('?' * len(value))})" if value else "0"
+    else:
+        params.append(coerce(columns, column, value))
+        sql = f"{quoted} {_SQL_OPERATORS[op]} ?"
+    return f"NOT ({sql})" if negate else sql
+
+
+def order_sql(order: Sequence[OrderBy], columns: Dict[str, type]) -> str:
+    """把排序翻译为 SQL ORDER BY 子句 (不含关键字; 没有排序时为空串)"""
+    validate_columns((item.column for item in order), columns)
+    return ", ".join(
+        f'"{item.column}" {"DESC" if item.descending else "ASC"} NULLS {"FIRST" if item.nulls_first else "LAST"}'
+        for item in order
+    )
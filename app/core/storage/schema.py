@@ -0,0 +1,137 @@
+"""
+本地存储后端的表结构
+与 Supabase 中的表保持一致 (只包含 app/core/database.py 读写的列)
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+def utc_now() -> str:
+    """当前时间 (与 PostgREST 返回的 timestamptz 格式一致)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def retention_cutoff(retain_months: int, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    地灵记录保留期起点 (与迁移 006 的 drop_expired_genius_loci_record_partitions 一致)
+
+    Args:
+        retain_months: 保留的整月数 (另加当月), <= 0 表示永久保留
+        now: 当前时间, 默认取当前 UTC 时间
+
+    Returns:
+        当月 (UTC) 月初往前 retain_months 个月的时间点, 永久保留时返回 None
+    """
+    if retain_months <= 0:
+        return None
+    now = now or datetime.now(timezone.utc)
+    months = now.year * 12 + now.month - 1 - retain_months
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class TableSpec(NamedTuple):
+    """表结构"""
+
+    name: str
+    columns: Dict[str, type]  # 列名 -> 类型 (int/float/str)
+    primary_key: str
+    autoincrement: bool = False
+    defaults: Dict[str, Any] = {}  # 列默认值, 可调用对象在插入时求值
+    touch_column: Optional[str] = None  # 更新时自动刷新的时间列 (对应数据库中的触发器)
+    hash_indexes: Tuple[str, ...] = ()  # 等值/IN 查询使用的索引列
+    grid: bool = False  # 是否按 gps_longitude / gps_latitude 建网格索引
+
+    def default(self, column: str) -> Any:
+        value = self.defaults.get(column)
+        return value() if callable(value) else value
+
+
+BUBBLE_NOTE = TableSpec(
+    name="bubble_note",
+    columns={
+        "id": int,
+        "user_id": int,
+        "note_type": int,
+        "content": str,
+        "image_urls": str,
+        "gps_longitude": float,
+        "gps_latitude": float,
+        "status": int,
+        "emotion": str,
+        "create_time": str,
+        "update_time": str,
+        "weight_score": float,
+        "is_valid": int,
+    },
+    primary_key="id",
+    autoincrement=True,
+    defaults={
+        "status": 1,
+        "emotion": "未知",
+        "create_time": utc_now,
+        "update_time": utc_now,
+        "weight_score": 0.0,
+        "is_valid": 1,
+    },
+    touch_column="update_time",
+    hash_indexes=("id", "user_id"),
+    grid=True,
+)
+
+GENIUS_LOCI_RECORD = TableSpec(
+    name="genius_loci_record",
+    columns={
+        "id": int,
+        "bubble_id": int,
+        "user_id": int,
+        "ai_process_type": int,
+        "ai_result": str,
+        "process_time": str,
+        "expire_time": str,
+        "is_effective": int,
+        "model_version": str,
+        "gps_longitude": float,
+        "gps_latitude": float,
+    },
+    primary_key="id",
+    autoincrement=True,
+    defaults={
+        "process_time": utc_now,
+        "is_effective": 1,
+    },
+    hash_indexes=("id", "bubble_id"),
+    grid=True,
+)
+
+JOB_WATERMARK = TableSpec(
+    name="job_watermark",
+    columns={
+        "job_name": str,
+        "watermark": str,
+        "updated_at": str,
+    },
+    primary_key="job_name",
+    defaults={"updated_at": utc_now},
+    hash_indexes=("job_name",),
+)
+
+
+def _archive(spec: TableSpec, hash_indexes: Tuple[str, ...]) -> TableSpec:
+    """冷数据表 (迁移 004): 热表的列 + archived_at, 主键沿用热表的 id"""
+    return TableSpec(
+        name=f"{spec.name}_archive",
+        columns={**spec.columns, "archived_at": str},
+        primary_key=spec.primary_key,
+        defaults={"archived_at": utc_now},
+        hash_indexes=hash_indexes,
+    )
+
+
+BUBBLE_NOTE_ARCHIVE = _archive(BUBBLE_NOTE, hash_indexes=("id",))
+GENIUS_LOCI_RECORD_ARCHIVE = _archive(GENIUS_LOCI_RECORD, hash_indexes=("id", "bubble_id"))
+
+TABLES: Dict[str, TableSpec] = {
+    spec.name: spec
+    for spec in (BUBBLE_NOTE, GENIUS_LOCI_RECORD, JOB_WATERMARK, BUBBLE_NOTE_ARCHIVE, GENIUS_LOCI_RECORD_ARCHIVE)
+}
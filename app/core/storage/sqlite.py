@@ -0,0 +1,241 @@
+"""
+SQLite 存储后端
+数据保存在本地 SQLite 文件中 (或 ":memory:"), 用于离线运行与需要持久化的压测
+
+- 表结构见 schema.py, 时间列以 ISO 8601 文本存储 (与 PostgREST 返回格式一致, 可直接按文本比较)
+- 带坐标的表额外存网格列 grid_x / grid_y 并建联合索引, 经纬度范围条件附加网格范围后走索引
+- 排序/翻页用到的列建普通索引 (与线上库的索引对应)
+"""
+
+import os
+import math
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.storage.local import LocalBackend
+from app.core.storage.query import Filter, Request, api_error, bbox_of, order_sql, to_sql, validate_columns
+from app.core.storage.schema import TABLES, TableSpec
+from app.utils.geo import tile_key
+
+logger = logging.getLogger(__name__)
+
+_SQL_TYPES = {int: "INTEGER", float: "REAL", str: "TEXT"}
+_GRID_COLUMNS = ("grid_x", "grid_y")
+
+# 排序/翻页索引 (hash_indexes 中的列另建单列索引)
+_SORT_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "bubble_note": [("weight_score", "id"), ("update_time", "id")],
+    "genius_loci_record": [("process_time", "id")],
+}
+
+
+class SQLiteBackend(LocalBackend):
+    """SQLite 存储后端"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, grid_deg: float):
+        """
+        初始化 (表与索引不存在时创建)
+
+        Args:
+            path: 数据库文件路径, ":memory:" 表示内存数据库
+            grid_deg: 网格索引边长 (度), 修改后需重建数据库文件
+        """
+        super().__init__(grid_deg)
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # 只在后端线程中使用 (check_same_thread=False 仅为允许在其它线程创建)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.create_function("grid_cell", 1, self._grid_cell, deterministic=True)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        logger.info(f"SQLite 存储后端初始化成功: {path}")
+
+    def shutdown(self) -> None:
+        super().shutdown()
+        self.conn.close()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {**super().get_pool_stats(), "path": self.path}
+
+    def _run(self, query):
+        # 约束冲突与 PostgreSQL 报同样的错误码
+        try:
+            return super()._run(query)
+        except sqlite3.IntegrityError as e:
+            raise api_error("23505", str(e)) from e
+
+    def load_rows(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """批量导入数据 (单个事务 executemany, 不回传写入的行)"""
+        spec = self._spec(table)
+        rows = [self._with_defaults(spec, row) for row in rows]
+        columns = self._write_columns(spec)
+        sql = (
+            f'INSERT INTO "{spec.name}" ({", ".join(_quote(c) for c in columns)}) '
+            f'VALUES ({", ".join("?" * len(columns))})'
+        )
+        with self._transaction():
+            self.conn.executemany(sql, [self._write_values(spec, row) for row in rows])
+        return len(rows)
+
+    # ========================================
+    # 表结构
+    # ========================================
+
+    def _create_schema(self) -> None:
+        for spec in TABLES.values():
+            definitions = []
+            for column, kind in spec.columns.items():
+                definition = f"{_quote(column)} {_SQL_TYPES[kind]}"
+                if column == spec.primary_key:
+                    definition += " PRIMARY KEY AUTOINCREMENT" if spec.autoincrement else " PRIMARY KEY"
+                definitions.append(definition)
+            if spec.grid:
+                definitions.extend(f"{column} INTEGER" for column in _GRID_COLUMNS)
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{spec.name}" ({", ".join(definitions)})')
+
+            indexes = [(column,) for column in spec.hash_indexes if column != spec.primary_key]
+            indexes += _SORT_INDEXES.get(spec.name, [])
+            if spec.grid:
+                indexes.append(_GRID_COLUMNS)
+            for columns in indexes:
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{spec.name}_{"_".join(columns)}" '
+                    f'ON "{spec.name}" ({", ".join(_quote(c) for c in columns)})'
+                )
+
+    def _grid_cell(self, value: Optional[float]) -> Optional[int]:
+        return None if value is None else math.floor(value / self.grid_deg)
+
+    def _storage_stats(self, spec: TableSpec) -> Dict[str, Any]:
+        stats = {
+            **super()._storage_stats(spec),
+            "live_rows": self.conn.execute(f'SELECT COUNT(*) FROM "{spec.name}"').fetchone()[0],
+        }
+        # dbstat 虚拟表需要编译选项 SQLITE_ENABLE_DBSTAT_VTAB, 不可用时不统计大小
+        try:
+            pages = dict(self.conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+        except sqlite3.OperationalError:
+            return stats
+        indexes = [row[1] for row in self.conn.execute(f'PRAGMA index_list("{spec.name}")').fetchall()]
+        stats["table_bytes"] = pages.get(spec.name, 0)
+        stats["index_bytes"] = sum(pages.get(index, 0) for index in indexes)
+        return stats
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    # ========================================
+    # 读写
+    # ========================================
+
+    def _select(self, spec: TableSpec, request: Request) -> List[Dict[str, Any]]:
+        where, params = to_sql(request.filters, spec.columns)
+
+        bbox = bbox_of(request.filters) if spec.grid else None
+        if bbox is not None:
+            min_lon, max_lon, min_lat, max_lat = bbox
+            x0, y0 = tile_key(min_lon, min_lat, self.grid_deg)
+            x1, y1 = tile_key(max_lon, max_lat, self.grid_deg)
+            where += " AND grid_x BETWEEN ? AND ? AND grid_y BETWEEN ? AND ?"
+            params += [x0, x1, y0, y1]
+
+        sql = f'SELECT {_select_list(spec)} FROM "{spec.name}" WHERE {where}'
+        if request.order:
+            sql += f" ORDER BY {order_sql(request.order, spec.columns)}"
+        if request.limit is not None or request.offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if request.limit is None else request.limit, request.offset]
+        return self._fetch(spec, sql, params)
+
+    def _insert(
+        self,
+        spec: TableSpec,
+        rows: List[Dict[str, Any]],
+        conflict: Optional[str] = None,
+        merge_columns: Sequence[str] = ()
+    ) -> List[Dict[str, Any]]:
+        columns = self._write_columns(spec)
+        sql = (
+            f'INSERT INTO "{spec.name}" ({", ".join(_quote(c) for c in columns)}) '
+            f'VALUES ({", ".join("?" * len(columns))})'
+        )
+        if conflict is not None:
+            validate_columns([conflict], spec.columns)
+            updates = [column for column in merge_columns if column != conflict]
+            if spec.grid and any(column in updates for column in ("gps_longitude", "gps_latitude")):
+                updates += list(_GRID_COLUMNS)
+            if updates:
+                assignments = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in updates)
+                sql += f" ON CONFLICT ({_quote(conflict)}) DO UPDATE SET {assignments}"
+            else:
+                sql += f" ON CONFLICT ({_quote(conflict)}) DO NOTHING"
+        sql += f" RETURNING {_select_list(spec)}"
+
+        written = []
+        with self._transaction():
+            for row in rows:
+                written.extend(self._fetch(spec, sql, self._write_values(spec, row)))
+        return written
+
+    def _update(self, spec: TableSpec, filters: List[Filter], values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        where, where_params = to_sql(filters, spec.columns)
+        assignments = [f"{_quote(column)} = ?" for column in values]
+        params = list(values.values())
+        # SET 子句中引用的列是更新前的值, 网格列按新坐标计算
+        if spec.grid:
+            for column, grid_column in (("gps_longitude", "grid_x"), ("gps_latitude", "grid_y")):
+                if column in values:
+                    assignments.append(f"{grid_column} = grid_cell(?)")
+                    params.append(values[column])
+
+        sql = f'UPDATE "{spec.name}" SET {", ".join(assignments)} WHERE {where} RETURNING {_select_list(spec)}'
+        with self._transaction():
+            return self._fetch(spec, sql, params + where_params)
+
+    def _delete(self, spec: TableSpec, filters: List[Filter]) -> List[Dict[str, Any]]:
+        where, params = to_sql(filters, spec.columns)
+        with self._transaction():
+            return self._fetch(spec, f'DELETE FROM "{spec.name}" WHERE {where} RETURNING {_select_list(spec)}', params)
+
+    def _fetch(self, spec: TableSpec, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        columns = list(spec.columns)
+        return [dict(zip(columns, values)) for values in self.conn.execute(sql, params).fetchall()]
+
+    def _write_columns(self, spec: TableSpec) -> List[str]:
+        return list(spec.columns) + (list(_GRID_COLUMNS) if spec.grid else [])
+
+    def _write_values(self, spec: TableSpec, row: Dict[str, Any]) -> List[Any]:
+        values = [row.get(column) for column in spec.columns]
+        if spec.grid:
+            values += [self._grid_cell(row.get("gps_longitude")), self._grid_cell(row.get("gps_latitude"))]
+        return values
+
+
+class _Transaction:
+    """显式事务 (连接为自动提交模式)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _quote(column: str) -> str:
+    return f'"{column}"'
+
+
+def _select_list(spec: TableSpec) -> str:
+    return ", ".join(_quote(column) for column in spec.columns)
@@ -0,0 +1,182 @@
+"""
+Supabase 存储后端
+PostgREST 查询在专用线程池中执行 (supabase-py 为同步客户端), 匿名/管理员/只读副本客户端共享连接池
+"""
+
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+from supabase import create_client, Client
+from postgrest.exceptions import APIError
+
+from app.core.config import settings
+from app.core.http_pool import create_shared_transport, bind_transport, take_response_bytes
+from app.core.read_router import ReadRouter, ReadEndpoint
+from app.core.storage.base import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase (PostgREST) 存储后端"""
+
+    name = "supabase"
+
+    def __init__(self):
+        """初始化 Supabase 客户端"""
+        super().__init__()
+
+        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+            raise ValueError("SUPABASE_URL 和 SUPABASE_KEY 必须在 .env 文件中配置")
+
+        # 创建 Supabase 客户端 (使用匿名 key)
+        self.client: Client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY
+        )
+
+        # 创建管理员客户端 (使用 service_role key, 绕过 RLS)
+        self.admin_client: Client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_SERVICE_ROLE_KEY if settings.SUPABASE_SERVICE_ROLE_KEY else settings.SUPABASE_KEY
+        )
+
+        # 两个客户端共享同一个 keep-alive 连接池, 减少 TCP/TLS 握手与连接抖动
+        self.transport = create_shared_transport()
+        bind_transport(self.client, self.transport)
+        bind_transport(self.admin_client, self.transport)
+
+        # 只读副本 (使用匿名 key, 与主库共享连接池); 未配置时只读查询也走主库
+        self.read_router = ReadRouter(pin_seconds=settings.READ_REPLICA_PIN_SECONDS)
+        for url in settings.SUPABASE_READ_URLS:
+            replica = create_client(url, settings.SUPABASE_KEY)
+            bind_transport(replica, self.transport)
+            self.read_router.add(
+                ReadEndpoint(
+                    name=urlsplit(url).netloc or url,
+                    client=replica,
+                    failure_threshold=settings.READ_REPLICA_FAILURE_THRESHOLD,
+                    recovery_seconds=settings.READ_REPLICA_RECOVERY_SECONDS
+                ),
+                base_url=str(replica.postgrest.session.base_url)
+            )
+
+        # 专用数据库线程池 (supabase-py 的 execute() 是同步阻塞调用,
+        # 放到有界线程池中执行, 避免阻塞事件循环和进行中的 SSE 流)
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.DB_MAX_WORKERS,
+            thread_name_prefix="supabase-db"
+        )
+
+        logger.info(
+            f"Supabase 客户端初始化成功 (数据库线程池大小: {settings.DB_MAX_WORKERS}, "
+            f"只读副本: {len(self.read_router.endpoints)})"
+        )
+
+    def get_client(self, use_admin: bool = False, read_only: bool = False) -> Client:
+        """
+        获取 Supabase 客户端
+
+        Args:
+            use_admin: 是否使用管理员客户端 (绕过 RLS)
+            read_only: 只读查询且可以容忍复制延迟时为 True, 匿名查询会被路由到只读副本
+                       (写入、写后读、所属权校验等需要读到最新数据的查询保持 False)
+
+        Returns:
+            Supabase 客户端实例
+        """
+        if use_admin:
+            return self.admin_client
+        if read_only:
+            endpoint = self.read_router.choose()
+            if endpoint is not None:
+                return endpoint.client
+        return self.client
+
+    async def execute(self, query):
+        """
+        在数据库线程池中执行 PostgREST 查询 (非阻塞)
+
+        发往只读副本的查询在副本不可用时改由主库重试一次
+
+        Args:
+            query: 构建好的查询 (select/insert/update/rpc 等)
+
+        Returns:
+            查询响应 (APIResponse)
+        """
+        endpoint = self.read_router.endpoint_for(str(query.session.base_url)) if self.read_router.endpoints else None
+        if endpoint is None:
+            response = await self._execute(query)
+        else:
+            response = await self._execute_on_replica(query, endpoint)
+
+        # 本进程的写入: 之后一小段时间内的只读查询走主库
+        if query.http_method != "GET" and not query.path.startswith("/rpc/"):
+            self.read_router.record_write()
+        return response
+
+    async def _execute_on_replica(self, query, endpoint: ReadEndpoint):
+        """在只读副本上执行查询, 记录延迟与健康状态; 副本不可用时改由主库执行"""
+        start = time.perf_counter()
+        try:
+            response = await self._execute(query)
+        except APIError as e:
+            if e.code not in _REPLICA_RETRY_CODES:
+                raise
+            error: BaseException = e
+        except Exception as e:
+            error = e
+        else:
+            self.read_router.record_success(endpoint, (time.perf_counter() - start) * 1000.0)
+            return response
+
+        self.read_router.record_failure(endpoint, error)
+        self.read_router.failovers += 1
+        logger.warning(f"只读副本 {endpoint.name} 查询失败, 改由主库执行: {error}")
+        query.session = self.client.postgrest.session
+        return await self._execute(query)
+
+    async def _execute(self, query):
+        """在数据库线程池中执行查询, 并记录调用指标"""
+        loop = asyncio.get_running_loop()
+        return await self._measure(query, lambda: loop.run_in_executor(self.executor, _execute_counted, query))
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        获取连接池、线程池与只读副本统计信息 (用于调优)
+
+        Returns:
+            统计信息字典
+        """
+        return {
+            "backend": self.name,
+            "http_pool": self.transport.get_stats(),
+            "executor": {
+                "max_workers": self.executor._max_workers,
+                "threads": len(self.executor._threads),
+                "queued": self.executor._work_queue.qsize(),
+            },
+            "read_replicas": self.read_router.get_stats(),
+        }
+
+    def shutdown(self):
+        """关闭数据库线程池与连接池 (应用退出时调用)"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.transport.close()
+        logger.info("数据库线程池与连接池已关闭")
+
+
+# 只读副本返回这些错误码时改由主库重试 (副本连不上数据库、恢复冲突导致查询被取消等)
+_REPLICA_RETRY_CODES = {"PGRST000", "PGRST001", "PGRST002", "40001", "57P01", "57P03"}
+
+
+def _execute_counted(query):
+    """在数据库线程中执行查询, 同时返回本次请求的响应字节数"""
+    take_response_bytes()
+    response = query.execute()
+    return response, take_response_bytes()
@@ -0,0 +1,297 @@
+"""
+写入队列 (write-behind)
+把逐条插入合并为批量插入: 积压达到 max_batch 行, 或最早一行已等待 max_delay 秒时刷新一批
+
+- 每次提交返回一个 Future, 刷新成功后得到写入后的行; 调用方可以等待结果, 也可以不等待 (后台写入)
+- 暂时性错误 (请求未到达数据库/事务已回滚) 整批按指数退避重试; 数据错误 (约束/类型) 把批次二分, 只让出错的行失败;
+  其余错误 (可能已提交) 不重试也不二分, 避免重复插入
+- 写入函数部分提交时抛出 PartialWriteError, 已提交的行直接完成, 重试与二分只针对未提交的行
+- 缓存/索引等后续处理 (after_write) 只在写入成功后执行一次, 不在重试范围内
+- 积压达到 max_pending 时提交方等待 (背压); 停止时刷新全部积压的行
+- 只在事件循环线程中使用, 不加锁
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (行, Future, 入队时间)
+_Entry = Tuple[Dict[str, Any], asyncio.Future, float]
+
+
+class PartialWriteError(Exception):
+    """批量写入只提交了一部分行"""
+
+    def __init__(self, written: Dict[int, Dict[str, Any]], cause: Exception, abandoned: Sequence[int] = ()):
+        """
+        Args:
+            written: 已提交的行 (输入位置 -> 写入后的行)
+            cause: 导致中断的错误 (决定其余行是否重试)
+            abandoned: 提交状态未知的位置 (不重试, 直接失败)
+        """
+        super().__init__(f"{len(written)} 行已提交, {len(abandoned)} 行状态未知: {cause}")
+        self.written = written
+        self.cause = cause
+        self.abandoned = list(abandoned)
+
+
+class WriteBehindQueue:
+    """批量写入队列"""
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[List[Dict[str, Any]]], Awaitable[List[Optional[Dict[str, Any]]]]],
+        is_transient: Callable[[Exception], bool],
+        is_data_error: Callable[[Exception], bool],
+        max_batch: int,
+        max_delay: float,
+        max_pending: int,
+        max_retries: int,
+        backoff_seconds: float,
+        backoff_max_seconds: float,
+        after_write: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ):
+        """
+        初始化
+
+        Args:
+            name: 名称 (用于日志与统计)
+            flush: 批量写入函数, 按输入顺序返回写入后的行; 部分提交时抛出 PartialWriteError
+            is_transient: 判断错误是否值得整批重试 (写入确定未提交)
+            is_data_error: 判断错误是否为个别行的数据错误 (写入已回滚, 二分定位出错的行)
+            max_batch: 每批最多行数
+            max_delay: 最早一行最多等待多少秒后刷新
+            max_pending: 积压上限, 达到后提交方等待
+            max_retries: 暂时性错误的最大重试次数
+            backoff_seconds: 第一次重试前的等待秒数 (之后每次翻倍)
+            backoff_max_seconds: 重试等待上限
+            after_write: 写入成功后对写入后的行执行一次的后续处理 (缓存/索引), 异常只记录日志
+        """
+        self.name = name
+        self.flush = flush
+        self.is_transient = is_transient
+        self.is_data_error = is_data_error
+        self.after_write = after_write
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max(max_pending, max_batch)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._pending: Deque[_Entry] = deque()
+        self._inflight: List[_Entry] = []
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # 统计
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.splits = 0
+        self.blocked = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    def start(self) -> None:
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        停止队列: 不再接受提交, 刷新全部积压的行后返回
+
+        Args:
+            timeout: 最多等待秒数, 超时后未写入的行按失败处理
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._space.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            dropped = self._fail_all(RuntimeError(f"写入队列 ({self.name}) 关闭超时"))
+            logger.error(f"写入队列 ({self.name}) 关闭超时, 放弃 {dropped} 行")
+        except Exception as e:
+            dropped = self._fail_all(e)
+            logger.error(f"写入队列 ({self.name}) 异常退出, 放弃 {dropped} 行: {e}")
+        self._task = None
+
+    async def put(self, row: Dict[str, Any]) -> asyncio.Future:
+        """
+        提交一行
+
+        Args:
+            row: 待插入的行
+
+        Returns:
+            Future, 写入成功后结果为写入后的行, 最终失败时为异常
+        """
+        while len(self._pending) >= self.max_pending and self.running:
+            self.blocked += 1
+            self._space.clear()
+            self._wakeup.set()
+            await self._space.wait()
+        if not self.running:
+            raise RuntimeError(f"写入队列 ({self.name}) 未运行")
+
+        future = asyncio.get_running_loop().create_future()
+        # 不等待结果的调用方不会取出异常, 这里取出以免事件循环报 "exception was never retrieved"
+        future.add_done_callback(_retrieve_exception)
+        self._pending.append((row, future, time.monotonic()))
+        self.submitted += 1
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return future
+
+    # ========================================
+    # 刷新
+    # ========================================
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # 凑满一批, 或等到最早一行超过 max_delay (停止时立即刷新)
+            deadline = self._pending[0][2] + self.max_delay
+            while len(self._pending) < self.max_batch and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            count = min(self.max_batch, len(self._pending))
+            self._inflight = [self._pending.popleft() for _ in range(count)]
+            self._space.set()
+            await self._flush_batch(self._inflight)
+            self._inflight = []
+
+    async def _flush_batch(self, batch: List[_Entry]) -> None:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                written = await self.flush([row for row, _, _ in batch])
+            except PartialWriteError as e:
+                committed, abandoned, error = e.written, set(e.abandoned), e.cause
+            except Exception as e:
+                committed, abandoned, error = {}, set(), e
+            else:
+                self._complete(batch, written, start)
+                return
+
+            # 已提交的行直接完成, 状态未知的行直接失败, 只有其余行参与重试/二分
+            if committed:
+                positions = sorted(committed)
+                self._complete([batch[i] for i in positions], [committed[i] for i in positions], start)
+            if abandoned:
+                self._fail([batch[i] for i in sorted(abandoned)], error)
+            batch = [entry for i, entry in enumerate(batch) if i not in committed and i not in abandoned]
+            if not batch:
+                return
+
+            if self.is_transient(error) and attempt < self.max_retries:
+                attempt += 1
+                self.retries += 1
+                delay = min(self.backoff_seconds * 2 ** (attempt - 1), self.backoff_max_seconds)
+                logger.warning(f"批量写入失败 ({self.name}, {len(batch)} 行), {delay:.1f} 秒后第 {attempt} 次重试: {error}")
+                await asyncio.sleep(delay)
+                continue
+
+            if self.is_data_error(error) and len(batch) > 1:
+                # 数据错误: 二分定位出错的行, 其余行照常写入
+                self.splits += 1
+                middle = len(batch) // 2
+                await self._flush_batch(batch[:middle])
+                await self._flush_batch(batch[middle:])
+                return
+
+            self._fail(batch, error)
+            return
+
+    def _complete(self, batch: List[_Entry], written: List[Optional[Dict[str, Any]]], start: float) -> None:
+        """完成已提交的行, 并执行一次后续处理"""
+        self.batches += 1
+        self.written += len(batch)
+        self.last_flush_ms = (time.perf_counter() - start) * 1000.0
+        for index, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(written[index] if index < len(written) else None)
+
+        if self.after_write is not None:
+            try:
+                self.after_write([row for row in written if row is not None])
+            except Exception as e:
+                logger.error(f"写入后处理失败 ({self.name}, {len(batch)} 行已写入): {e}")
+
+    def _fail(self, batch: List[_Entry], error: Exception) -> None:
+        """放弃一批行"""
+        logger.error(f"批量写入失败 ({self.name}), 放弃 {len(batch)} 行: {error}")
+        self.failed += len(batch)
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _fail_all(self, error: Exception) -> int:
+        """让在途与积压的行全部失败, 返回行数"""
+        entries = self._inflight + list(self._pending)
+        self._inflight = []
+        self._pending.clear()
+        dropped = 0
+        for _, future, _ in entries:
+            if not future.done():
+                future.set_exception(error)
+                dropped += 1
+        self.failed += dropped
+        return dropped
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取队列统计
+
+        Returns:
+            提交/写入/失败行数, 批次数, 重试与二分次数, 当前积压
+        """
+        return {
+            "running": self.running,
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "pending": len(self._pending) + len(self._inflight),
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "retries": self.retries,
+            "splits": self.splits,
+            "blocked": self.blocked,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+def _retrieve_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
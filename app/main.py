@@ -10,7 +10,21 @@ import logging
 
 from app.api import router
 from app.core.config import settings
-from app.core.database import db
+from app.core.database import (
+    db,
+    detect_rpc_capabilities,
+    start_read_replicas,
+    stop_read_replicas,
+    start_spatial_index,
+    stop_spatial_index,
+    start_leaderboard,
+    stop_leaderboard,
+    start_write_behind,
+    stop_write_behind,
+)
+from app.services.weight_score_service import start_weight_score_job, stop_weight_score_job
+from app.services.cold_archive_service import start_cold_archive_job, stop_cold_archive_job
+from app.services.compaction_service import start_compaction_job, stop_compaction_job
 from app.core.oss_storage import oss_storage
 
 # 配置日志
@@ -35,8 +49,9 @@ async def lifespan(app: FastAPI):
     logger.info(f"调试模式: {settings.DEBUG}")
     logger.info("=" * 50)
 
-    # 测试数据库连接
+    # 测试数据库连接, 并探测数据库函数 (RPC) 是否可用
     try:
+        await detect_rpc_capabilities()
         logger.info("Supabase 数据库连接成功")
     except Exception as e:
         logger.error(f"Supabase 连接失败: {e}")
@@ -50,9 +65,33 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"OSS 连接失败: {e}")
 
+    # 只读副本健康检查 (未配置副本时为空操作)
+    start_read_replicas()
+    # 后台加载进程内空间索引 (未开启时为空操作, 加载完成前查询走数据库)
+    start_spatial_index()
+    # 后台加载全局 Top 排行榜并定期对账 (加载完成前查询走数据库)
+    start_leaderboard()
+    # 地灵记录/笔记写入队列 (未开启时为空操作)
+    start_write_behind()
+    # 定时增量计算 weight_score (未配置间隔时为空操作)
+    start_weight_score_job()
+    # 定时归档软删除/过期数据 (未配置间隔时为空操作)
+    start_compaction_job()
+    # 定时把旧数据写成冷数据文件 (未开启或未配置间隔时为空操作)
+    start_cold_archive_job()
+
     yield
 
     # 关闭时执行
+    await stop_cold_archive_job()
+    await stop_compaction_job()
+    await stop_weight_score_job()
+    await stop_leaderboard()
+    await stop_spatial_index()
+    await stop_read_replicas()
+    # 写入队列积压的行须在关闭存储后端前写完
+    await stop_write_behind()
+    db.shutdown()
     logger.info("气泡笔记 API 服务关闭")
 
 
@@ -97,7 +136,8 @@ async def root():
         "message": f"欢迎使用 {settings.APP_NAME}",
         "version": settings.APP_VERSION,
         "docs": "/docs",
-        "health": "/api/v1/bubbles/health"
+        "health": "/api/v1/bubbles/health",
+        "metrics": "/api/v1/bubbles/metrics"
     }
 
 
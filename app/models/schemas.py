@@ -256,7 +256,8 @@ class BubbleNoteListResponse(BaseModel):
     code: int = 200
     message: str = "success"
     data: List[BubbleNoteResponse]
-    total: int = Field(0, description="总数")
+    total: int = Field(0, description="本页条数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标 (原样传回 cursor 参数), 为空表示没有更多")
 
     class Config:
         json_schema_extra = {
@@ -264,7 +265,8 @@ class BubbleNoteListResponse(BaseModel):
                 "code": 200,
                 "message": "success",
                 "data": [],
-                "total": 0
+                "total": 0,
+                "next_cursor": None
             }
         }
 
@@ -361,6 +363,61 @@ class GeniusLociRecordResponse(BaseModel):
             }
         }
 
+
+class GeniusLociRecordDetailResponse(BaseModel):
+    """地灵 AI 处理记录 (列表项)"""
+
+    id: int
+    bubble_id: Optional[int] = None
+    user_id: int
+    ai_process_type: int
+    ai_result: Optional[str] = None
+    process_time: datetime
+    expire_time: Optional[datetime] = None
+    is_effective: int
+    model_version: Optional[str] = None
+    gps_longitude: Optional[float] = None
+    gps_latitude: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "id": 1,
+                "bubble_id": 1,
+                "user_id": 1,
+                "ai_process_type": 5,
+                "ai_result": "{\"summary\": \"用户在西湖边散步\"}",
+                "process_time": "2025-01-17T12:00:00",
+                "expire_time": None,
+                "is_effective": 1,
+                "model_version": "qwen-plus",
+                "gps_longitude": 120.15507,
+                "gps_latitude": 30.27408
+            }
+        }
+
+
+class GeniusLociRecordListResponse(BaseModel):
+    """地灵 AI 处理记录列表响应"""
+
+    code: int = 200
+    message: str = "success"
+    data: List[GeniusLociRecordDetailResponse]
+    total: int = Field(0, description="本页条数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标 (原样传回 cursor 参数), 为空表示没有更多")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "code": 200,
+                "message": "success",
+                "data": [],
+                "total": 0,
+                "next_cursor": None
+            }
+        }
+
 # ========================================
 # AI 总结查询请求/响应模型
 # ========================================
@@ -6,7 +6,12 @@ import logging
 from typing import Optional, List, Dict, Any
 
 from app.utils.emotion_analyzer import analyze_emotion
-from app.core.database import create_bubble_note, update_bubble_note, get_bubble_note_by_id
+from app.core.database import (
+    create_bubble_note,
+    update_bubble_note,
+    delete_bubble_note,
+    get_bubble_note_by_id
+)
 from app.core.oss_storage import oss_storage
 from app.models.schemas import BubbleNoteCreate
 
@@ -137,6 +142,7 @@ class BubbleNoteService:
 
             if is_update:
                 # 更新模式: 保持 create_time 不变,更新其他字段
+                # (条件更新会再次校验所属权, 防止校验与写入之间笔记被删除或转移)
                 result = await update_bubble_note(data.note_id, data.user_id, note_data)
                 if not result:
                     raise Exception("更新笔记失败")
@@ -175,8 +181,6 @@ class BubbleNoteService:
         Returns:
             是否删除成功
         """
-        from database import delete_bubble_note
-
         try:
             success = await delete_bubble_note(note_id, user_id)
             if success:
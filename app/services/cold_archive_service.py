@@ -0,0 +1,207 @@
+"""
+冷数据文件归档
+把处理时间超过 COLD_ARCHIVE_AFTER_DAYS 天的地灵记录、软删除超过同样天数的笔记 (连同其全部地灵记录)
+写成 Parquet 文件 (本地目录或 OSS, 见 app/core/cold_store.py), 写入成功后再从数据库删除
+
+- 按 id 键集分页读取, 累积 file_rows 行写一批文件, 每次运行最多归档 max_rows_per_run 行
+- 先写文件后删除: 中途失败时下次运行会重新归档同一批行, 读取归档时按 id 去重
+- 用户/笔记的地灵记录列表在热数据不足一页时补读归档文件 (COLD_ARCHIVE_QUERY_THROUGH)
+- 与迁移 004 的冷数据表归档 (compaction_service) 互相独立; 同时开启时软删除笔记由先运行的任务处理
+
+运行方式 (在项目根目录):
+    python -m app.services.cold_archive_service
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+
+from app.core.config import settings
+from app.core.cold_store import ColdStore
+from app.core import database
+from app.core.database import (
+    get_deleted_notes_before,
+    get_records_before,
+    get_records_for_bubbles,
+    purge_archived_notes,
+    purge_archived_records,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ColdArchiveJob:
+    """冷数据文件归档任务"""
+
+    def __init__(self, after_days: float, batch_size: int, file_rows: int, max_rows_per_run: int):
+        """
+        初始化任务
+
+        Args:
+            after_days: 超过多少天的记录/软删除笔记归档
+            batch_size: 每次从数据库读取/删除的行数
+            file_rows: 累积多少行写一批文件
+            max_rows_per_run: 每次运行最多归档的行数 (笔记与记录合计)
+        """
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.file_rows = file_rows
+        self.max_rows_per_run = max_rows_per_run
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    async def run(self, store: Optional[ColdStore] = None) -> Dict[str, Any]:
+        """
+        执行一次归档
+
+        Args:
+            store: 冷数据文件存储, 默认使用 database.cold_store
+
+        Returns:
+            运行统计 (归档的笔记/记录数, 写入的文件数, 耗时)
+        """
+        store = store or database.cold_store
+        if store is None:
+            result = {"skipped": "冷数据文件归档未开启 (COLD_ARCHIVE_ENABLED) 或未安装 pyarrow"}
+            self.last_result = result
+            return result
+
+        start = time.perf_counter()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.after_days)).isoformat()
+        run = _ArchiveRun(store, self.batch_size)
+
+        # 1. 软删除笔记 (先归档其全部地灵记录, 删除笔记时不会级联删除未归档的记录)
+        notes: List[Dict[str, Any]] = []
+        records: List[Dict[str, Any]] = []
+        last_id = 0
+        while run.rows < self.max_rows_per_run:
+            batch = await get_deleted_notes_before(cutoff, last_id, self.batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            note_records = await get_records_for_bubbles([note["id"] for note in batch], self.batch_size)
+            notes.extend(batch)
+            records.extend(note_records)
+            run.rows += len(batch) + len(note_records)
+            if len(notes) + len(records) >= self.file_rows:
+                await run.flush(records, notes)
+                notes, records = [], []
+            if len(batch) < self.batch_size:
+                break
+        await run.flush(records, notes)
+
+        # 2. 超过热数据窗口的地灵记录
+        records = []
+        last_id = 0
+        while run.rows < self.max_rows_per_run:
+            batch = await get_records_before(cutoff, last_id, self.batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            records.extend(batch)
+            run.rows += len(batch)
+            if len(records) >= self.file_rows:
+                await run.flush(records, [])
+                records = []
+            if len(batch) < self.batch_size:
+                break
+        await run.flush(records, [])
+
+        elapsed = time.perf_counter() - start
+        result = {
+            "cutoff": cutoff,
+            "notes_archived": run.notes_archived,
+            "records_archived": run.records_archived,
+            "files_written": len(run.files),
+            "files": run.files,
+            "seconds": round(elapsed, 3),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.last_result = result
+
+        logger.info(
+            f"冷数据文件归档完成: 笔记 {run.notes_archived} 条, 地灵记录 {run.records_archived} 条, "
+            f"写入 {len(run.files)} 个文件 ({store.base_path}), 耗时 {elapsed:.2f}s"
+        )
+        return result
+
+
+class _ArchiveRun:
+    """一次归档运行的状态: 文件编号与计数"""
+
+    def __init__(self, store: ColdStore, batch_size: int):
+        self.store = store
+        self.batch_size = batch_size
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.sequence = 0
+        self.rows = 0  # 已读取的行数 (用于 max_rows_per_run)
+        self.notes_archived = 0
+        self.records_archived = 0
+        self.files: List[str] = []
+
+    async def flush(self, records: List[Dict[str, Any]], notes: List[Dict[str, Any]]) -> None:
+        """写入文件, 成功后删除数据库中的行 (记录先于笔记删除)"""
+        for table, rows in (("genius_loci_record", records), ("bubble_note", notes)):
+            if rows:
+                self.sequence += 1
+                loop = asyncio.get_running_loop()
+                self.files.extend(await loop.run_in_executor(
+                    None, self.store.write, table, rows, f"{self.run_id}-{self.sequence:04d}"
+                ))
+
+        if records:
+            self.records_archived += await purge_archived_records([row["id"] for row in records], self.batch_size)
+        if notes:
+            self.notes_archived += await purge_archived_notes([row["id"] for row in notes], self.batch_size)
+
+
+cold_archive_job = ColdArchiveJob(
+    after_days=settings.COLD_ARCHIVE_AFTER_DAYS,
+    batch_size=settings.COLD_ARCHIVE_BATCH_SIZE,
+    file_rows=settings.COLD_ARCHIVE_FILE_ROWS,
+    max_rows_per_run=settings.COLD_ARCHIVE_MAX_ROWS_PER_RUN
+)
+
+_cold_archive_task: Optional[asyncio.Task] = None
+
+
+async def _run_periodically() -> None:
+    """后台任务: 按间隔执行归档"""
+    while True:
+        await asyncio.sleep(settings.COLD_ARCHIVE_INTERVAL_SECONDS)
+        try:
+            await cold_archive_job.run()
+        except Exception as e:
+            logger.error(f"冷数据文件归档失败: {e}")
+
+
+def start_cold_archive_job() -> None:
+    """启动定时归档 (应用启动时调用, 未开启或 COLD_ARCHIVE_INTERVAL_SECONDS <= 0 时为空操作)"""
+    global _cold_archive_task
+    if database.cold_store is not None and settings.COLD_ARCHIVE_INTERVAL_SECONDS > 0 and _cold_archive_task is None:
+        _cold_archive_task = asyncio.create_task(_run_periodically())
+
+
+async def stop_cold_archive_job() -> None:
+    """停止定时归档 (应用退出时调用)"""
+    global _cold_archive_task
+    if _cold_archive_task is not None:
+        _cold_archive_task.cancel()
+        try:
+            await _cold_archive_task
+        except asyncio.CancelledError:
+            pass
+        _cold_archive_task = None
+
+
+# ========================================
+# 命令行入口
+# ========================================
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    stats = asyncio.run(cold_archive_job.run())
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
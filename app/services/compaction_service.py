@@ -0,0 +1,202 @@
+"""
+冷数据归档 (compaction)
+分批把软删除的笔记 (连同其地灵记录) 与已过期的地灵记录从热表移到冷数据表 (迁移 004),
+按 max_rows_per_second 限速, 每次运行最多移动 max_rows_per_run 行, 避免长时间占用数据库
+
+运行前后各读取一次表/索引大小; 删除只让空间可被复用, 索引文件在 VACUUM/REINDEX 后才会变小
+
+归档前先维护 genius_loci_record 的月份分区 (迁移 006): 提前创建之后几个月的分区,
+按 RECORD_RETENTION_MONTHS 整块删除保留期之前的分区
+
+运行方式 (在项目根目录):
+    python -m app.services.compaction_service
+"""
+
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+
+from app.core.config import settings
+from app.core.database import (
+    compact_bubble_notes,
+    compact_expired_records,
+    drop_expired_record_partitions,
+    ensure_record_partitions,
+    get_table_storage_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CompactionJob:
+    """冷数据归档任务"""
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_rows_per_second: float,
+        max_rows_per_run: int,
+        grace_seconds: float,
+        partition_months_ahead: int,
+        retention_months: int
+    ):
+        """
+        初始化任务
+
+        Args:
+            batch_size: 每批移动的行数 (一次数据库函数调用, 一个事务)
+            max_rows_per_second: 限速 (<= 0 表示不限速)
+            max_rows_per_run: 每次运行最多移动的行数 (笔记与记录分别计算)
+            grace_seconds: 软删除后至少经过多少秒才归档
+            partition_months_ahead: 提前创建的地灵记录月份分区数
+            retention_months: 地灵记录保留的整月数 (另加当月), <= 0 表示永久保留
+        """
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second
+        self.max_rows_per_run = max_rows_per_run
+        self.grace_seconds = grace_seconds
+        self.partition_months_ahead = partition_months_ahead
+        self.retention_months = retention_months
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行一次归档
+
+        Returns:
+            运行统计 (分区维护结果, 移动的笔记/记录数, 批次数, 耗时, 运行前后的表与索引大小)
+        """
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        storage_before = await get_table_storage_stats()
+
+        result: Dict[str, Any] = {"notes_archived": 0, "records_archived": 0, "expired_records_archived": 0, "batches": 0}
+
+        # 0. 地灵记录月份分区 (未执行迁移 006 时为 None)
+        result["partitions_created"] = await ensure_record_partitions(self.partition_months_ahead)
+        result["partitions_dropped"] = (
+            await drop_expired_record_partitions(self.retention_months) if self.retention_months > 0 else []
+        )
+
+        # 1. 软删除笔记 (及其地灵记录)
+        deleted_before = (now - timedelta(seconds=self.grace_seconds)).isoformat()
+        while result["notes_archived"] < self.max_rows_per_run:
+            batch_start = time.perf_counter()
+            moved = await compact_bubble_notes(self.batch_size, deleted_before)
+            if moved is None:
+                result["skipped"] = "迁移 004 未执行"
+                break
+            result["batches"] += 1
+            result["notes_archived"] += moved["notes"]
+            result["records_archived"] += moved["records"]
+            if moved["notes"] < self.batch_size:
+                break
+            await self._throttle(moved["notes"] + moved["records"], batch_start)
+
+        # 2. 过期地灵记录
+        expired_before = now.isoformat()
+        while "skipped" not in result and result["expired_records_archived"] < self.max_rows_per_run:
+            batch_start = time.perf_counter()
+            moved = await compact_expired_records(self.batch_size, expired_before)
+            if moved is None:
+                result["skipped"] = "迁移 004 未执行"
+                break
+            result["batches"] += 1
+            result["expired_records_archived"] += moved
+            if moved < self.batch_size:
+                break
+            await self._throttle(moved, batch_start)
+
+        storage_after = await get_table_storage_stats()
+        result["rows_reclaimed"] = (
+            result["notes_archived"] + result["records_archived"] + result["expired_records_archived"]
+        )
+        result["storage_before"] = storage_before
+        result["storage_after"] = storage_after
+        result["index_bytes_before"] = _index_bytes(storage_before)
+        result["index_bytes_after"] = _index_bytes(storage_after)
+
+        elapsed = time.perf_counter() - start
+        result["seconds"] = round(elapsed, 3)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_result = result
+
+        logger.info(
+            f"冷数据归档完成: 笔记 {result['notes_archived']} 条 (关联记录 {result['records_archived']} 条), "
+            f"过期记录 {result['expired_records_archived']} 条, {result['batches']} 批, "
+            f"删除过期分区 {len(result['partitions_dropped'] or [])} 个, "
+            f"热表索引 {result['index_bytes_before']} -> {result['index_bytes_after']} 字节, 耗时 {elapsed:.2f}s"
+        )
+        return result
+
+    async def _throttle(self, rows: int, batch_start: float) -> None:
+        """按限速等待 (本批耗时已计入)"""
+        if self.max_rows_per_second <= 0:
+            return
+        delay = rows / self.max_rows_per_second - (time.perf_counter() - batch_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _index_bytes(storage: Optional[Dict[str, Dict[str, Any]]]) -> Optional[int]:
+    """热表 (bubble_note / genius_loci_record) 的索引总大小, 无统计时返回 None"""
+    if not storage:
+        return None
+    sizes = [storage.get(table, {}).get("index_bytes") for table in ("bubble_note", "genius_loci_record")]
+    if any(size is None for size in sizes):
+        return None
+    return sum(sizes)
+
+
+compaction_job = CompactionJob(
+    batch_size=settings.COMPACTION_BATCH_SIZE,
+    max_rows_per_second=settings.COMPACTION_MAX_ROWS_PER_SECOND,
+    max_rows_per_run=settings.COMPACTION_MAX_ROWS_PER_RUN,
+    grace_seconds=settings.COMPACTION_GRACE_SECONDS,
+    partition_months_ahead=settings.RECORD_PARTITION_MONTHS_AHEAD,
+    retention_months=settings.RECORD_RETENTION_MONTHS
+)
+
+_compaction_task: Optional[asyncio.Task] = None
+
+
+async def _run_periodically() -> None:
+    """后台任务: 按间隔执行归档"""
+    while True:
+        await asyncio.sleep(settings.COMPACTION_INTERVAL_SECONDS)
+        try:
+            await compaction_job.run()
+        except Exception as e:
+            logger.error(f"冷数据归档失败: {e}")
+
+
+def start_compaction_job() -> None:
+    """启动定时归档 (应用启动时调用, COMPACTION_INTERVAL_SECONDS <= 0 时为空操作)"""
+    global _compaction_task
+    if settings.COMPACTION_INTERVAL_SECONDS > 0 and _compaction_task is None:
+        _compaction_task = asyncio.create_task(_run_periodically())
+
+
+async def stop_compaction_job() -> None:
+    """停止定时归档 (应用退出时调用)"""
+    global _compaction_task
+    if _compaction_task is not None:
+        _compaction_task.cancel()
+        try:
+            await _compaction_task
+        except asyncio.CancelledError:
+            pass
+        _compaction_task = None
+
+
+# ========================================
+# 命令行入口
+# ========================================
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    stats = asyncio.run(compaction_job.run())
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -18,9 +18,10 @@ from app.services.vision_service import vision_service
 from app.services.chat_service import chat_service
 from app.core.database import (
     create_genius_loci_record,
-    get_nearby_genius_loci_memory,
+    get_nearby_genius_loci_memories,
     create_bubble_note
 )
+from app.services.memory_ranker import parse_memories, rank_memories, pack_memories, build_memory_context
 from app.core.config import settings
 from app.core.database import db
 
@@ -99,7 +100,8 @@ class SessionManager:
             "is_first": True,  # 是否为首次对话
             "vision_analyzed": False,  # 是否已进行视觉分析
             "context_initialized": False,  # 是否已初始化上下文
-            "conversation_turns": 0  # 对话轮数计数器
+            "conversation_turns": 0,  # 对话轮数计数器
+            "emotion": None  # 首次对话识别的情感（用于记忆排序与归档）
         }
 
         self.last_activity[session_id] = time.time()
@@ -182,7 +184,9 @@ class SessionManager:
                 session_id=session_id,
                 conversation=session["history"],
                 gps_longitude=session["location"]["longitude"],
-                gps_latitude=session["location"]["latitude"]
+                gps_latitude=session["location"]["latitude"],
+                emotion=session.get("emotion"),
+                wait=False
             )
 
             # 清除会话
@@ -297,7 +301,8 @@ async def genius_loci_chat_stream(
                 session_id=session_id,
                 conversation=session["history"],
                 gps_longitude=session["location"]["longitude"],
-                gps_latitude=session["location"]["latitude"]
+                gps_latitude=session["location"]["latitude"],
+                emotion=session.get("emotion")
             )
 
             # 创建新会话（继承上下文）
@@ -320,6 +325,7 @@ async def genius_loci_chat_stream(
             session_manager.sessions[new_session_id]["bubble_id"] = old_bubble_id
             session_manager.sessions[new_session_id]["is_first"] = False
             session_manager.sessions[new_session_id]["context_initialized"] = True
+            session_manager.sessions[new_session_id]["emotion"] = session.get("emotion")
 
             # 切换到新会话
             session_id = new_session_id
@@ -364,6 +370,7 @@ async def genius_loci_chat_stream(
                     bubble_id = result.get("note_id")
                     session_manager.set_bubble_id(session_id, bubble_id)
                     emotion = result.get("emotion", "平静")
+                    session["emotion"] = emotion
                     logger.info(f"✓ 场景气泡记录创建成功: bubble_id={bubble_id}, emotion={emotion}")
                 else:
                     logger.warning("⚠ 气泡创建返回异常结果")
@@ -387,26 +394,33 @@ async def genius_loci_chat_stream(
                     except Exception as e:
                         logger.error(f"✗ 视觉分析异常: {e}")
 
-            # 2.2 记忆层：检索历史记忆
-            memory_result = None
+            # 2.2 记忆层：检索附近候选记忆（一次查询），本地打分排序并按字数预算打包
+            memory_context = None
             try:
                 logger.info(f"检索附近记忆，位置: ({gps_longitude}, {gps_latitude})")
-                memory_result = await get_nearby_genius_loci_memory(
+                records = await get_nearby_genius_loci_memories(
                     gps_longitude=gps_longitude,
                     gps_latitude=gps_latitude,
-                    radius_km=1.0,
-                    exclude_user_id=user_id,  # 排除当前用户
-                    ai_process_type=AI_PROCESS_TYPE_CHAT_SUMMARY
+                    radius_km=settings.MEMORY_INDEX_RADIUS_KM,
+                    ai_process_type=AI_PROCESS_TYPE_CHAT_SUMMARY,
+                    limit=settings.MEMORY_INDEX_DEPTH
                 )
 
-                if memory_result:
-                    # 解析 JSON 格式的 ai_result
-                    try:
-                        ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                        memory_summary = ai_result_json.get("summary", memory_result.get("ai_result", ""))
-                        logger.info(f"✓ 检索到历史记忆: {memory_summary[:50]}...")
-                    except:
-                        logger.info(f"✓ 检索到历史记忆: {memory_result.get('ai_result', '')[:50]}...")
+                memories = rank_memories(
+                    parse_memories(records),
+                    longitude=gps_longitude,
+                    latitude=gps_latitude,
+                    radius_km=settings.MEMORY_INDEX_RADIUS_KM,
+                    half_life_days=settings.MEMORY_RECENCY_HALF_LIFE_DAYS,
+                    limit=settings.MEMORY_CONTEXT_MAX_ITEMS,
+                    emotion=session.get("emotion")
+                )
+                memory_context = build_memory_context(
+                    pack_memories(memories, settings.MEMORY_CONTEXT_CHAR_BUDGET)
+                )
+
+                if memory_context:
+                    logger.info(f"✓ 检索到历史记忆 {len(memories)} 条 (候选 {len(records)} 条): {memories[0].summary[:50]}...")
                 else:
                     logger.info("✓ 附近无历史记忆，跳过记忆检索")
 
@@ -419,13 +433,8 @@ async def genius_loci_chat_stream(
                 content_parts.append(f"用户输入: {message}")
             if vision_description:
                 content_parts.append(f"\n【场景描述】{vision_description}")
-            if memory_result:
-                try:
-                    ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                    memory_summary = ai_result_json.get("summary", "")
-                    content_parts.append(f"\n【此地记忆】{memory_summary}")
-                except:
-                    content_parts.append(f"\n【此地记忆】{memory_result.get('ai_result', '')}")
+            if memory_context:
+                content_parts.append(f"\n{memory_context}")
 
             # # 即使没有任何额外信息，也要创建气泡（用户至少输入了消息）
             # if not content_parts:
@@ -497,13 +506,8 @@ async def genius_loci_chat_stream(
             context_parts = []
             if vision_description:
                 context_parts.append(f"【当前场景】{vision_description}")
-            if memory_result:
-                try:
-                    ai_result_json = json.loads(memory_result.get("ai_result", "{}"))
-                    memory_summary = ai_result_json.get("summary", memory_result.get("ai_result", ""))
-                    context_parts.append(f"【此地记忆】{memory_summary}")
-                except:
-                    context_parts.append(f"【此地记忆】{memory_result.get('ai_result', '')}")
+            if memory_context:
+                context_parts.append(memory_context)
 
             if context_parts:
                 system_context = "\n".join(context_parts)
@@ -555,7 +559,9 @@ async def archive_conversation(
     session_id: str,
     conversation: List[Dict[str, str]],
     gps_longitude: float,
-    gps_latitude: float
+    gps_latitude: float,
+    emotion: Optional[str] = None,
+    wait: bool = True
 ):
     """
     归档对话总结（手动或超时触发）
@@ -567,6 +573,8 @@ async def archive_conversation(
         conversation: 对话记录列表
         gps_longitude: 经度
         gps_latitude: 纬度
+        emotion: 首次对话识别的情感（可选，写入 ai_result 供记忆排序使用）
+        wait: 是否等待记录写入完成（超时归档传 False，记录经写入队列批量写入）
     """
     try:
         if not conversation:
@@ -592,6 +600,8 @@ async def archive_conversation(
             "turns": len(conversation) // 2,
             "session_id": session_id
         }
+        if emotion:
+            ai_result_json["emotion"] = emotion
 
         # 保存到数据库（使用实际的表结构）
         record = await create_genius_loci_record(
@@ -601,12 +611,13 @@ async def archive_conversation(
             ai_result=json.dumps(ai_result_json, ensure_ascii=False),
             model_version=settings.MODEL_NAME,
             gps_longitude=gps_longitude,
-            gps_latitude=gps_latitude
+            gps_latitude=gps_latitude,
+            wait=wait
         )
 
         if record:
             logger.info(f"✓ 对话归档成功: record_id={record['id']}, bubble_id={bubble_id}")
-        else:
+        elif wait:
             logger.error("✗ 对话归档失败")
 
     except Exception as e:
@@ -0,0 +1,231 @@
+"""
+地灵记忆排序
+候选记忆逐条解析一次为 PlaceMemory, 按距离 / 时间 / 情感向量化打分,
+贪心挑选时惩罚与已选记忆相似的候选 (多样性), 最后按字数预算打包为上下文
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from app.utils.geo import haversine_m
+from app.utils.time import parse_time
+
+logger = logging.getLogger(__name__)
+
+# 打分权重 (距离 / 时间 / 情感)
+DISTANCE_WEIGHT = 0.4
+RECENCY_WEIGHT = 0.4
+EMOTION_WEIGHT = 0.2
+# 多样性惩罚系数: 与已选记忆相似度为 1 时扣除的分数
+DIVERSITY_PENALTY = 0.5
+# 两条记忆相距该距离 (米) 时位置相似度约为 0.37
+DIVERSITY_DISTANCE_M = 50.0
+# 情感未知时的情感得分
+UNKNOWN_EMOTION_SCORE = 0.5
+
+MEMORY_HEADER = "【此地记忆】"
+
+@dataclass
+class PlaceMemory:
+    """解析后的地灵记忆 (ai_result 只解析一次)"""
+    id: int
+    bubble_id: Optional[int]
+    user_id: Optional[int]
+    summary: str
+    longitude: Optional[float]
+    latitude: Optional[float]
+    process_time: Optional[datetime]
+    emotion: Optional[str] = None
+    turns: Optional[int] = None
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "PlaceMemory":
+        """
+        从 genius_loci_record 记录解析
+
+        ai_result 为 JSON ({"summary", "turns", "emotion", ...}) 时取 summary, 否则按纯文本处理
+
+        Args:
+            record: 数据库记录
+
+        Returns:
+            PlaceMemory 实例
+        """
+        raw = record.get("ai_result") or ""
+        summary, emotion, turns = raw, None, None
+        try:
+            parsed = json.loads(raw)
+            if isinstance(parsed, dict):
+                summary = parsed.get("summary") or raw
+                emotion = parsed.get("emotion")
+                turns = parsed.get("turns")
+        except (TypeError, ValueError):
+            pass
+
+        return cls(
+            id=record["id"],
+            bubble_id=record.get("bubble_id"),
+            user_id=record.get("user_id"),
+            summary=str(summary).strip(),
+            longitude=record.get("gps_longitude"),
+            latitude=record.get("gps_latitude"),
+            process_time=parse_time(record.get("process_time")),
+            emotion=emotion,
+            turns=turns,
+        )
+
+
+def parse_memories(records: List[Dict[str, Any]]) -> List[PlaceMemory]:
+    """
+    批量解析记忆记录, 跳过内容为空或无法解析的记录
+
+    Args:
+        records: 数据库记录列表
+
+    Returns:
+        PlaceMemory 列表 (保持原顺序)
+    """
+    memories = []
+    for record in records:
+        try:
+            memory = PlaceMemory.from_record(record)
+        except Exception as e:
+            logger.warning(f"记忆记录解析失败, id={record.get('id')}: {e}")
+            continue
+        if memory.summary:
+            memories.append(memory)
+    return memories
+
+
+def rank_memories(
+    memories: List[PlaceMemory],
+    longitude: float,
+    latitude: float,
+    radius_km: float,
+    half_life_days: float,
+    limit: int,
+    emotion: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> List[PlaceMemory]:
+    """
+    按距离 / 时间 / 情感打分, 贪心挑选并惩罚相似候选
+
+    - 距离得分: exp(-距离 / 半径)
+    - 时间得分: 0.5 ^ (距今天数 / 半衰期)
+    - 情感得分: 与当前情感相同为 1, 未知为 0.5, 不同为 0
+    - 多样性: 每选出一条, 同一气泡 (相似度 1) / 同一用户 (0.5) / 位置相近的候选扣分
+
+    Args:
+        memories: 候选记忆
+        longitude: 当前经度
+        latitude: 当前纬度
+        radius_km: 检索半径 (公里), 用作距离衰减尺度
+        half_life_days: 时间衰减半衰期 (天)
+        limit: 最多返回条数
+        emotion: 当前情感 (可选)
+        now: 当前时间 (默认 UTC 当前时间)
+
+    Returns:
+        按挑选顺序排列的记忆
+    """
+    n = len(memories)
+    if n == 0 or limit <= 0:
+        return []
+
+    now = now or datetime.now(timezone.utc)
+    lons = np.array([m.longitude if m.longitude is not None else np.nan for m in memories], dtype=np.float64)
+    lats = np.array([m.latitude if m.latitude is not None else np.nan for m in memories], dtype=np.float64)
+    ages = np.array(
+        [(now - m.process_time).total_seconds() / 86400.0 if m.process_time else np.nan for m in memories],
+        dtype=np.float64
+    )
+
+    # 坐标或时间缺失的候选对应得分按 0 计
+    distances = haversine_m(longitude, latitude, lons, lats)
+    distance_score = np.nan_to_num(np.exp(-distances / max(radius_km * 1000.0, 1.0)))
+    recency_score = np.nan_to_num(np.power(0.5, np.clip(ages, 0.0, None) / max(half_life_days, 1e-6)))
+
+    if emotion:
+        emotion_score = np.array(
+            [UNKNOWN_EMOTION_SCORE if not m.emotion else float(m.emotion == emotion) for m in memories],
+            dtype=np.float64
+        )
+    else:
+        emotion_score = np.full(n, UNKNOWN_EMOTION_SCORE)
+
+    base = DISTANCE_WEIGHT * distance_score + RECENCY_WEIGHT * recency_score + EMOTION_WEIGHT * emotion_score
+
+    bubbles = np.array([m.bubble_id if m.bubble_id is not None else -1 for m in memories], dtype=np.int64)
+    users = np.array([m.user_id if m.user_id is not None else -1 for m in memories], dtype=np.int64)
+
+    similarity = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    for _ in range(min(limit, n)):
+        adjusted = np.where(available, base - DIVERSITY_PENALTY * similarity, -np.inf)
+        best = int(np.argmax(adjusted))
+        picked.append(best)
+        available[best] = False
+
+        # 与本次选出记忆的相似度, 累计取最大值
+        same_bubble = (bubbles == bubbles[best]) & (bubbles >= 0)
+        same_user = (users == users[best]) & (users >= 0)
+        if np.isnan(lons[best]):
+            nearby = np.zeros(n)
+        else:
+            nearby = np.nan_to_num(
+                np.exp(-haversine_m(lons[best], lats[best], lons, lats) / DIVERSITY_DISTANCE_M)
+            )
+        current = np.maximum.reduce([same_bubble.astype(np.float64), 0.5 * same_user, nearby])
+        similarity = np.maximum(similarity, current)
+
+    return [memories[i] for i in picked]
+
+
+def pack_memories(memories: List[PlaceMemory], char_budget: int) -> List[str]:
+    """
+    按顺序把记忆摘要装入字数预算 (中文约 1 字 1 token), 放不下的跳过
+
+    第一条超出预算时截断保留, 保证有记忆时上下文不为空
+
+    Args:
+        memories: 已排序的记忆
+        char_budget: 总字数上限
+
+    Returns:
+        摘要文本列表
+    """
+    packed: List[str] = []
+    used = 0
+    for memory in memories:
+        text = memory.summary
+        if used + len(text) <= char_budget:
+            packed.append(text)
+            used += len(text)
+        elif not packed and char_budget > 1:
+            packed.append(text[: char_budget - 1] + "…")
+            used = char_budget
+    return packed
+
+
+def build_memory_context(summaries: List[str]) -> Optional[str]:
+    """
+    把记忆摘要格式化为 system_context 片段
+
+    Args:
+        summaries: 摘要文本列表
+
+    Returns:
+        上下文文本, 无记忆时返回 None
+    """
+    if not summaries:
+        return None
+    if len(summaries) == 1:
+        return f"{MEMORY_HEADER}{summaries[0]}"
+    lines = [f"{i}. {text}" for i, text in enumerate(summaries, start=1)]
+    return MEMORY_HEADER + "\n" + "\n".join(lines)
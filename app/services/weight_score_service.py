@@ -0,0 +1,183 @@
+"""
+weight_score 批量计算
+分批读取笔记与其地灵记忆, 用 NumPy 向量化计算分数并批量写回;
+增量模式只重算上次运行之后变更的笔记 (笔记被修改/新建, 或新增了地灵记忆)
+
+打分公式见 app/services/weight_scoring.py (分数不随时间变化, 所以增量重算是完整的)
+
+运行方式 (在项目根目录):
+    python -m app.services.weight_score_service          # 增量 (首次运行为全量)
+    python -m app.services.weight_score_service --full   # 全量
+"""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import (
+    iter_bubbles_for_scoring,
+    get_bubbles_for_scoring,
+    get_changed_bubble_ids,
+    get_recent_memory_bubble_ids,
+    get_memory_records_for_scoring,
+    get_latest_change_times,
+    get_job_watermark,
+    set_job_watermark,
+    bulk_update_weight_scores,
+)
+from app.services.weight_scoring import (
+    SCORE_EPOCH,
+    SCORE_EPSILON,
+    KNOWN_EMOTIONS,
+    compute_weight_scores,
+    memory_features,
+    days_since_epoch,
+)
+
+logger = logging.getLogger(__name__)
+
+# 任务水位名 (job_watermark 表)
+NOTE_WATERMARK = "weight_score.bubble_note"
+MEMORY_WATERMARK = "weight_score.genius_loci_record"
+
+
+class WeightScoreJob:
+    """weight_score 批量计算任务"""
+
+    def __init__(self, batch_size: int, half_life_days: float):
+        """
+        初始化任务
+
+        Args:
+            batch_size: 每批读取/写回的笔记数
+            half_life_days: 时间衰减半衰期 (天)
+        """
+        self.batch_size = batch_size
+        self.half_life_days = half_life_days
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    async def run(self, full: bool = False) -> Dict[str, Any]:
+        """
+        执行一次计算
+
+        Args:
+            full: 是否全量重算 (否则只重算水位之后变更的笔记, 没有水位时按全量)
+
+        Returns:
+            运行统计 (扫描/写回行数, 耗时, 吞吐 rows/s)
+        """
+        start = time.perf_counter()
+
+        # 先记录当前最新的变更时间, 运行期间发生的变更留给下一次 (水位为闭区间, 不会遗漏)
+        note_mark, memory_mark = await get_latest_change_times()
+        note_since = None if full else await get_job_watermark(NOTE_WATERMARK)
+        memory_since = None if full else await get_job_watermark(MEMORY_WATERMARK)
+
+        result = {"mode": "full", "scanned": 0, "changed": 0, "written": 0}
+        if note_since is None:
+            async for rows in iter_bubbles_for_scoring(self.batch_size):
+                await self._score_batch(rows, result)
+        else:
+            result["mode"] = "incremental"
+            note_ids = set(await get_changed_bubble_ids(note_since, self.batch_size))
+            if memory_since is not None:
+                note_ids.update(await get_recent_memory_bubble_ids(memory_since, self.batch_size))
+            else:
+                # 从未记录过记忆水位: 有记忆的笔记都视为变更 (等价于全量统计记忆)
+                note_ids.update(await get_recent_memory_bubble_ids(SCORE_EPOCH.isoformat(), self.batch_size))
+
+            rows = await get_bubbles_for_scoring(sorted(note_ids), self.batch_size)
+            for i in range(0, len(rows), self.batch_size):
+                await self._score_batch(rows[i:i + self.batch_size], result)
+
+        await set_job_watermark(NOTE_WATERMARK, note_mark)
+        await set_job_watermark(MEMORY_WATERMARK, memory_mark)
+
+        elapsed = time.perf_counter() - start
+        result["seconds"] = round(elapsed, 3)
+        result["rows_per_second"] = round(result["scanned"] / elapsed, 1) if elapsed > 0 else 0.0
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_result = result
+
+        logger.info(
+            f"weight_score 计算完成 ({result['mode']}): 扫描 {result['scanned']} 条, "
+            f"变化 {result['changed']} 条, 写回 {result['written']} 条, "
+            f"耗时 {elapsed:.2f}s, {result['rows_per_second']} rows/s"
+        )
+        return result
+
+    async def _score_batch(self, rows: List[Dict[str, Any]], result: Dict[str, Any]) -> None:
+        """计算一批笔记的分数, 写回变化的部分"""
+        rows = sorted(rows, key=lambda r: r["id"])
+        if not rows:
+            return
+
+        note_ids = np.array([r["id"] for r in rows], dtype=np.int64)
+        records = await get_memory_records_for_scoring(note_ids.tolist(), self.batch_size)
+        memory_counts, turn_counts = memory_features(note_ids, records)
+
+        created_days = np.array([days_since_epoch(r.get("create_time")) for r in rows], dtype=np.float64)
+        emotion_known = np.array([r.get("emotion") in KNOWN_EMOTIONS for r in rows], dtype=bool)
+        old_scores = np.array([r.get("weight_score") or 0.0 for r in rows], dtype=np.float64)
+
+        scores = compute_weight_scores(created_days, emotion_known, memory_counts, turn_counts, self.half_life_days)
+        changed = np.flatnonzero(np.abs(scores - old_scores) > SCORE_EPSILON)
+
+        updates = [{**rows[i], "weight_score": float(scores[i])} for i in changed.tolist()]
+        result["scanned"] += len(rows)
+        result["changed"] += len(updates)
+        result["written"] += await bulk_update_weight_scores(updates)
+
+
+weight_score_job = WeightScoreJob(
+    batch_size=settings.WEIGHT_SCORE_BATCH_SIZE,
+    half_life_days=settings.WEIGHT_SCORE_HALF_LIFE_DAYS
+)
+
+_weight_score_task: Optional[asyncio.Task] = None
+
+
+async def _run_periodically() -> None:
+    """后台任务: 按间隔执行增量计算"""
+    while True:
+        try:
+            await weight_score_job.run()
+        except Exception as e:
+            logger.error(f"weight_score 计算失败: {e}")
+        await asyncio.sleep(settings.WEIGHT_SCORE_INTERVAL_SECONDS)
+
+
+def start_weight_score_job() -> None:
+    """启动定时计算 (应用启动时调用, WEIGHT_SCORE_INTERVAL_SECONDS <= 0 时为空操作)"""
+    global _weight_score_task
+    if settings.WEIGHT_SCORE_INTERVAL_SECONDS > 0 and _weight_score_task is None:
+        _weight_score_task = asyncio.create_task(_run_periodically())
+
+
+async def stop_weight_score_job() -> None:
+    """停止定时计算 (应用退出时调用)"""
+    global _weight_score_task
+    if _weight_score_task is not None:
+        _weight_score_task.cancel()
+        try:
+            await _weight_score_task
+        except asyncio.CancelledError:
+            pass
+        _weight_score_task = None
+
+
+# ========================================
+# 命令行入口
+# ========================================
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    stats = asyncio.run(weight_score_job.run(full="--full" in sys.argv[1:]))
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -0,0 +1,108 @@
+"""
+weight_score 打分公式
+分数 = SCORE_SCALE x (质量分 + 创建时间距 SCORE_EPOCH 的天数 / 半衰期)
+
+- 质量分 (以 2 为底的对数尺度): 情感 + 对话轮数 (互动) + 记忆数
+- 时间项随创建时间线性增长: 按分数排序等价于按 "2^质量分 x 0.5^(笔记年龄 / 半衰期)" 排序,
+  但已写入的分数不随时间变化, 所以只需重算变更过的笔记; 修改半衰期或权重后需全量重算
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from app.utils.time import parse_time
+
+# 时间项起点与缩放 (每过一个半衰期, 新笔记的分数比旧笔记高 SCORE_SCALE)
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SCORE_SCALE = 10.0
+
+# 质量分权重 (以 2 为底的对数尺度, 1 分相当于一个半衰期)
+EMOTION_BONUS = 0.5  # 识别出明确情感的笔记
+ENGAGEMENT_WEIGHT = 0.5  # x log2(1 + 对话总轮数)
+MEMORY_WEIGHT = 1.0  # x log2(1 + 记忆数)
+KNOWN_EMOTIONS = ("难过", "开心", "平静", "神秘", "愤怒")
+
+# 分数变化小于该值时不写回
+SCORE_EPSILON = 1e-6
+
+
+def compute_weight_scores(
+    created_days: np.ndarray,
+    emotion_known: np.ndarray,
+    memory_counts: np.ndarray,
+    turn_counts: np.ndarray,
+    half_life_days: float
+) -> np.ndarray:
+    """
+    向量化计算一批笔记的分数
+
+    Args:
+        created_days: 创建时间距 SCORE_EPOCH 的天数
+        emotion_known: 是否识别出明确情感
+        memory_counts: 地灵记忆数
+        turn_counts: 地灵对话总轮数
+        half_life_days: 时间衰减半衰期 (天)
+
+    Returns:
+        分数数组 (保留 4 位小数)
+    """
+    quality = (
+        EMOTION_BONUS * emotion_known.astype(np.float64)
+        + ENGAGEMENT_WEIGHT * np.log2(1.0 + turn_counts)
+        + MEMORY_WEIGHT * np.log2(1.0 + memory_counts)
+    )
+    recency = created_days / max(half_life_days, 1e-6)
+    return np.round(SCORE_SCALE * (quality + recency), 4)
+
+
+def memory_features(
+    note_ids: np.ndarray,
+    records: List[Dict[str, Any]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    统计每条笔记的记忆数与对话总轮数
+
+    Args:
+        note_ids: 升序的笔记 ID 数组
+        records: 这些笔记的对话总结记录 (bubble_id, ai_result)
+
+    Returns:
+        (记忆数, 对话总轮数), 与 note_ids 一一对应
+    """
+    counts = np.zeros(len(note_ids), dtype=np.float64)
+    turns = np.zeros(len(note_ids), dtype=np.float64)
+    if not records or len(note_ids) == 0:
+        return counts, turns
+
+    bubble_ids = np.array([r["bubble_id"] for r in records], dtype=np.int64)
+    record_turns = np.array([parse_turns(r.get("ai_result")) for r in records], dtype=np.float64)
+
+    slots = np.searchsorted(note_ids, bubble_ids)
+    slots = np.minimum(slots, len(note_ids) - 1)
+    matched = note_ids[slots] == bubble_ids
+
+    counts += np.bincount(slots[matched], minlength=len(note_ids))
+    turns += np.bincount(slots[matched], weights=record_turns[matched], minlength=len(note_ids))
+    return counts, turns
+
+
+def days_since_epoch(value: Any) -> float:
+    """创建时间距 SCORE_EPOCH 的天数 (无法解析时按 0 计)"""
+    parsed = parse_time(value)
+    if parsed is None:
+        return 0.0
+    return (parsed - SCORE_EPOCH).total_seconds() / 86400.0
+
+
+def parse_turns(ai_result: Any) -> float:
+    """从对话总结 JSON 中取对话轮数 (纯文本总结按 1 轮计)"""
+    try:
+        parsed = json.loads(ai_result or "")
+        if isinstance(parsed, dict):
+            return max(float(parsed.get("turns") or 0), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return 1.0
@@ -0,0 +1,242 @@
+"""
+地理计算工具
+球面距离 (向量化 haversine)、半径边界框与网格瓦片划分
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8  # 地球平均半径 (米)
+METERS_PER_DEGREE_LAT = 111320.0  # 每纬度约 111.32 公里
+
+TileKey = Tuple[int, int]
+BBox = Tuple[float, float, float, float]  # (min_lon, max_lon, min_lat, max_lat)
+DistanceKey = Tuple[float, int]  # 附近查询分页位置 (distance_meters, id)
+# 分页比较距离的容差 (米): 翻页可能换用另一条服务路径 (PostGIS <-> / 本地 haversine),
+# 两者对同一行算出的距离有微小差异, 容差内视为同距离, 按 id 判断先后
+DISTANCE_EPSILON_M = 1e-3
+
+
+def haversine_m(
+    longitude: float,
+    latitude: float,
+    lons: np.ndarray,
+    lats: np.ndarray
+) -> np.ndarray:
+    """
+    计算一个点到一组点的球面距离 (向量化)
+
+    Args:
+        longitude: 中心点经度
+        latitude: 中心点纬度
+        lons: 目标点经度数组
+        lats: 目标点纬度数组
+
+    Returns:
+        距离数组 (米)
+    """
+    lon1 = math.radians(longitude)
+    lat1 = math.radians(latitude)
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2.0) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(longitude: float, latitude: float, radius_km: float) -> BBox:
+    """
+    计算覆盖指定半径的经纬度边界框 (经度方向按纬度余弦修正)
+
+    Args:
+        longitude: 中心点经度
+        latitude: 中心点纬度
+        radius_km: 半径 (公里)
+
+    Returns:
+        (min_lon, max_lon, min_lat, max_lat)
+    """
+    radius_m = radius_km * 1000.0
+    delta_lat = radius_m / METERS_PER_DEGREE_LAT
+
+    # 高纬度地区经度跨度急剧增大, 极点附近直接取全经度范围
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(radius_m / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+
+    return (
+        max(longitude - delta_lon, -180.0),
+        min(longitude + delta_lon, 180.0),
+        max(latitude - delta_lat, -90.0),
+        min(latitude + delta_lat, 90.0),
+    )
+
+
+def tile_key(longitude: float, latitude: float, tile_deg: float) -> TileKey:
+    """
+    计算坐标所在的网格瓦片编号
+
+    Args:
+        longitude: 经度
+        latitude: 纬度
+        tile_deg: 瓦片边长 (度)
+
+    Returns:
+        (列号, 行号)
+    """
+    return (math.floor(longitude / tile_deg), math.floor(latitude / tile_deg))
+
+
+def tile_bounds(key: TileKey, tile_deg: float) -> BBox:
+    """
+    计算瓦片的经纬度范围 (左闭右开)
+
+    Args:
+        key: 瓦片编号
+        tile_deg: 瓦片边长 (度)
+
+    Returns:
+        (min_lon, max_lon, min_lat, max_lat)
+    """
+    x, y = key
+    return (x * tile_deg, (x + 1) * tile_deg, y * tile_deg, (y + 1) * tile_deg)
+
+
+def tile_count(bbox: BBox, tile_deg: float) -> int:
+    """
+    计算与边界框相交的瓦片数量 (不生成列表)
+
+    Args:
+        bbox: (min_lon, max_lon, min_lat, max_lat)
+        tile_deg: 瓦片边长 (度)
+
+    Returns:
+        瓦片数量
+    """
+    min_lon, max_lon, min_lat, max_lat = bbox
+    x0, y0 = tile_key(min_lon, min_lat, tile_deg)
+    x1, y1 = tile_key(max_lon, max_lat, tile_deg)
+    return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+
+def tiles_for_bbox(bbox: BBox, tile_deg: float) -> List[TileKey]:
+    """
+    列出与边界框相交的全部瓦片
+
+    Args:
+        bbox: (min_lon, max_lon, min_lat, max_lat)
+        tile_deg: 瓦片边长 (度)
+
+    Returns:
+        瓦片编号列表
+    """
+    min_lon, max_lon, min_lat, max_lat = bbox
+    x0, y0 = tile_key(min_lon, min_lat, tile_deg)
+    x1, y1 = tile_key(max_lon, max_lat, tile_deg)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def nearest_order(
+    distances: np.ndarray,
+    ids: np.ndarray,
+    limit: int,
+    after: Optional[DistanceKey] = None
+) -> np.ndarray:
+    """
+    按 (距离, id) 升序取前 limit 个下标 (向量化), 同距离按 id 排序保证分页稳定
+
+    Args:
+        distances: 距离数组 (米)
+        ids: 对应的 id 数组
+        limit: 返回数量限制
+        after: 分页位置 (距离, id), 只返回排在其后的元素 (距离差在 DISTANCE_EPSILON_M 内按 id 比较)
+
+    Returns:
+        下标数组
+    """
+    candidates = np.arange(len(distances))
+    if after is not None:
+        after_distance, after_id = after
+        candidates = np.flatnonzero(
+            (distances > after_distance + DISTANCE_EPSILON_M)
+            | ((distances >= after_distance - DISTANCE_EPSILON_M) & (ids > after_id))
+        )
+
+    if len(candidates) > limit:
+        # 先按距离取前 limit 个的阈值, 阈值处的并列元素全部保留, 再按 (距离, id) 精确排序
+        threshold = np.partition(distances[candidates], limit - 1)[limit - 1]
+        candidates = candidates[distances[candidates] <= threshold]
+
+    order = np.lexsort((ids[candidates], distances[candidates]))
+    return candidates[order][:limit]
+
+
+def rank_by_distance(
+    rows: List[Dict[str, Any]],
+    longitude: float,
+    latitude: float,
+    radius_km: float,
+    limit: int,
+    after: Optional[DistanceKey] = None
+) -> List[Dict[str, Any]]:
+    """
+    按球面距离过滤并排序一组带坐标的行 (向量化)
+
+    Args:
+        rows: 含 id / gps_longitude / gps_latitude 的行
+        longitude: 中心点经度
+        latitude: 中心点纬度
+        radius_km: 半径 (公里)
+        limit: 返回数量限制
+        after: 分页位置 (距离, id), 只返回排在其后的行
+
+    Returns:
+        半径内按 (距离, id) 升序的行 (附加 distance_meters)
+    """
+    rows = [r for r in rows if r.get("gps_longitude") is not None and r.get("gps_latitude") is not None]
+    if not rows:
+        return []
+
+    lons = np.fromiter((r["gps_longitude"] for r in rows), dtype=np.float64, count=len(rows))
+    lats = np.fromiter((r["gps_latitude"] for r in rows), dtype=np.float64, count=len(rows))
+    ids = np.fromiter((r["id"] for r in rows), dtype=np.int64, count=len(rows))
+    distances = haversine_m(longitude, latitude, lons, lats)
+
+    within = np.flatnonzero(distances <= radius_km * 1000.0)
+    order = within[nearest_order(distances[within], ids[within], limit, after)]
+
+    return [{**rows[i], "distance_meters": float(distances[i])} for i in order.tolist()]
+
+
+def within_radius(
+    rows: List[Dict[str, Any]],
+    longitude: float,
+    latitude: float,
+    radius_km: float
+) -> List[Dict[str, Any]]:
+    """
+    按球面距离过滤一组带坐标的行 (向量化), 保持原顺序
+
+    Args:
+        rows: 含 gps_longitude / gps_latitude 的行 (缺少坐标的行被丢弃)
+        longitude: 中心点经度
+        latitude: 中心点纬度
+        radius_km: 半径 (公里)
+
+    Returns:
+        半径内的行
+    """
+    rows = [r for r in rows if r.get("gps_longitude") is not None and r.get("gps_latitude") is not None]
+    if not rows:
+        return []
+
+    lons = np.fromiter((r["gps_longitude"] for r in rows), dtype=np.float64, count=len(rows))
+    lats = np.fromiter((r["gps_latitude"] for r in rows), dtype=np.float64, count=len(rows))
+    distances = haversine_m(longitude, latitude, lons, lats)
+    return [rows[i] for i in np.flatnonzero(distances <= radius_km * 1000.0).tolist()]
@@ -0,0 +1,130 @@
+"""
+键集 (游标) 分页工具
+游标是对 "上一页最后一条记录的排序键" 的不透明编码, 下一页从该位置继续,
+数据库按索引定位, 翻到多深都与第一页开销相同 (不使用 OFFSET)
+"""
+
+import json
+import base64
+import binascii
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 游标类型
+CURSOR_TOP = "top"  # (weight_score, id), 降序
+CURSOR_NEARBY = "nearby"  # (distance_meters, id), 升序
+CURSOR_RECORDS = "records"  # (process_time, id), 降序
+
+
+def encode_cursor(kind: str, key: Sequence[Any], scope: Optional[Sequence[Any]] = None) -> str:
+    """
+    编码游标
+
+    Args:
+        kind: 游标类型
+        key: 排序键 (上一页最后一条记录的值)
+        scope: 查询条件 (翻页时必须一致, 防止游标被用于其它查询)
+
+    Returns:
+        URL 安全的游标字符串
+    """
+    payload = {"k": kind, "v": list(key)}
+    if scope is not None:
+        payload["s"] = list(scope)
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str],
+    kind: str,
+    scope: Optional[Sequence[Any]] = None
+) -> Optional[Tuple[Any, ...]]:
+    """
+    解码游标
+
+    Args:
+        cursor: 游标字符串, 为空表示第一页
+        kind: 期望的游标类型
+        scope: 当前查询条件 (需与编码时一致)
+
+    Returns:
+        排序键元组, 第一页返回 None
+
+    Raises:
+        ValueError: 游标无效或与当前查询不匹配
+    """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("分页游标无效")
+
+    if not isinstance(payload, dict) or payload.get("k") != kind or not isinstance(payload.get("v"), list):
+        raise ValueError("分页游标无效")
+    if scope is not None and payload.get("s") != list(scope):
+        raise ValueError("分页游标与当前查询条件不匹配")
+
+    return tuple(payload["v"])
+
+
+def split_page(
+    rows: List[Dict[str, Any]],
+    limit: int,
+    kind: str,
+    key: Callable[[Dict[str, Any]], Sequence[Any]],
+    scope: Optional[Sequence[Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    切分一页结果 (调用方多取一条, 用于判断是否还有下一页)
+
+    Args:
+        rows: 按排序键有序的结果 (最多 limit + 1 条)
+        limit: 每页数量
+        kind: 游标类型
+        key: 从记录中取排序键的函数
+        scope: 查询条件
+
+    Returns:
+        (本页记录, 下一页游标); 没有下一页时游标为 None
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    page = rows[:limit]
+    return page, encode_cursor(kind, key(page[-1]), scope)
+
+
+def top_key(row: Dict[str, Any]) -> Tuple[float, int]:
+    """Top 列表排序键"""
+    return (row["weight_score"], row["id"])
+
+
+def nearby_key(row: Dict[str, Any]) -> Tuple[float, int]:
+    """附近列表排序键"""
+    return (row["distance_meters"], row["id"])
+
+
+def records_key(row: Dict[str, Any]) -> Tuple[str, int]:
+    """地灵记录排序键"""
+    return (row["process_time"], row["id"])
+
+
+def keyset_filter(column: str, value: Any, row_id: int, descending: bool) -> str:
+    """
+    构造 PostgREST 键集过滤条件 (传给 query.or_), 排序为 (column, id) 同向
+
+    Args:
+        column: 主排序列
+        value: 上一页最后一条记录的主排序列值
+        row_id: 上一页最后一条记录的 id
+        descending: 是否降序
+
+    Returns:
+        形如 col.lt.v,and(col.eq.v,id.lt.i) 的条件串 (值带双引号, 兼容时间戳中的 . 与 :)
+    """
+    op = "lt" if descending else "gt"
+    quoted = '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return f"{column}.{op}.{quoted},and({column}.eq.{quoted},id.{op}.{int(row_id)})"
@@ -0,0 +1,46 @@
+"""
+时间戳解析
+PostgREST 返回的 timestamptz 为 ISO 8601 字符串, 小数秒会省略末尾的 0 (如 .12), 偏移可能写成 Z;
+Python 3.10 的 datetime.fromisoformat 不接受这两种写法, 解析前统一补齐
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+# 小数秒补齐到 6 位 (超过 6 位的截断)
+_FRACTION_RE = re.compile(r"\.(\d{1,6})\d*")
+
+
+def parse_time(value: Any) -> Optional[datetime]:
+    """
+    解析时间戳
+
+    Args:
+        value: ISO 8601 字符串或 datetime
+
+    Returns:
+        UTC 时间 (不带时区的按 UTC 处理), 为空或无法解析时返回 None
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            text = _FRACTION_RE.sub(lambda m: "." + m.group(1).ljust(6, "0"), str(value).replace("Z", "+00:00"))
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+# 无法解析的时间排在最早
+MIN_TIME = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def time_sort_key(value: Any) -> datetime:
+    """排序用的时间 (无法解析时为 MIN_TIME)"""
+    return parse_time(value) or MIN_TIME
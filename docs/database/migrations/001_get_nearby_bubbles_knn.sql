@@ -0,0 +1,112 @@
+-- ============================================
+-- 迁移 001: 附近气泡查询函数 get_nearby_bubbles (PostGIS KNN)
+-- ============================================
+-- 功能：
+--   1. 为 bubble_note 增加由经纬度生成的 geography 列 geog（应用只写 gps_longitude / gps_latitude）
+--   2. 在有效笔记上建立 GiST 空间索引
+--   3. 创建 RPC 函数 get_nearby_bubbles：ST_DWithin 过滤半径 + <-> 索引辅助 KNN 排序
+-- 调用方：app/core/database.py -> _call_nearby_rpc()
+-- 依赖：PostgreSQL 12+（生成列），PostGIS 2.2+（geography KNN）
+-- 可重复执行
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+-- --------------------------------------------
+-- 1. geography 生成列
+-- --------------------------------------------
+-- 由 gps_longitude / gps_latitude 自动计算，写入路径无需改动；
+-- 直接使用 geography 类型，查询时不需要对列做类型转换（否则无法使用索引）
+ALTER TABLE bubble_note
+    ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+    GENERATED ALWAYS AS (
+        ST_SetSRID(ST_MakePoint(gps_longitude, gps_latitude), 4326)::geography
+    ) STORED;
+
+-- --------------------------------------------
+-- 2. GiST 空间索引（只索引有效笔记，与查询条件 is_valid = 1 对应）
+-- --------------------------------------------
+-- 数据量较大的线上库请改用 CREATE INDEX CONCURRENTLY（不能放在事务中执行）
+CREATE INDEX IF NOT EXISTS idx_bubble_note_geog_valid
+    ON bubble_note USING GIST (geog)
+    WHERE is_valid = 1;
+
+ANALYZE bubble_note;
+
+-- --------------------------------------------
+-- 3. RPC 函数
+-- --------------------------------------------
+-- 参数名与 Python 端调用一致：lon / lat / radius_m / lim / stat
+-- 返回列 = 列表卡片列 (BUBBLE_LIST_COLUMNS) + distance_meters
+-- 排序使用 <-> (球面距离, GiST 索引辅助 KNN), 找到 lim 条即停止扫描;
+-- ST_DWithin 同样走该索引, 保证结果不超出半径
+DROP FUNCTION IF EXISTS get_nearby_bubbles(double precision, double precision, integer, integer, integer);
+
+CREATE FUNCTION get_nearby_bubbles(
+    lon double precision,
+    lat double precision,
+    radius_m integer,
+    lim integer DEFAULT 20,
+    stat integer DEFAULT NULL
+)
+RETURNS TABLE (
+    id bubble_note.id%TYPE,
+    user_id bubble_note.user_id%TYPE,
+    note_type bubble_note.note_type%TYPE,
+    content bubble_note.content%TYPE,
+    image_urls bubble_note.image_urls%TYPE,
+    gps_longitude bubble_note.gps_longitude%TYPE,
+    gps_latitude bubble_note.gps_latitude%TYPE,
+    status bubble_note.status%TYPE,
+    emotion bubble_note.emotion%TYPE,
+    create_time bubble_note.create_time%TYPE,
+    update_time bubble_note.update_time%TYPE,
+    weight_score bubble_note.weight_score%TYPE,
+    is_valid bubble_note.is_valid%TYPE,
+    distance_meters double precision
+)
+LANGUAGE sql
+STABLE
+PARALLEL SAFE
+AS $$
+    SELECT
+        b.id,
+        b.user_id,
+        b.note_type,
+        b.content,
+        b.image_urls,
+        b.gps_longitude,
+        b.gps_latitude,
+        b.status,
+        b.emotion,
+        b.create_time,
+        b.update_time,
+        b.weight_score,
+        b.is_valid,
+        ST_Distance(b.geog, ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) AS distance_meters
+    FROM bubble_note AS b
+    WHERE b.is_valid = 1
+      AND (stat IS NULL OR b.status = stat)
+      AND ST_DWithin(b.geog, ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography, radius_m)
+    ORDER BY b.geog <-> ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography
+    LIMIT lim;
+$$;
+
+COMMENT ON FUNCTION get_nearby_bubbles(double precision, double precision, integer, integer, integer)
+    IS '附近气泡查询: 半径内有效笔记按距离升序 (GiST KNN), 返回列表卡片列 + distance_meters';
+
+-- Supabase: 允许匿名 / 登录用户通过 PostgREST 调用
+GRANT EXECUTE ON FUNCTION get_nearby_bubbles(double precision, double precision, integer, integer, integer)
+    TO anon, authenticated, service_role;
+
+-- 通知 PostgREST 重新加载函数签名
+NOTIFY pgrst, 'reload schema';
+
+-- ============================================
+-- 验证
+-- ============================================
+-- 应看到 Index Scan using idx_bubble_note_geog_valid 且 Order By: (geog <-> ...)
+-- EXPLAIN (ANALYZE, BUFFERS)
+-- SELECT * FROM get_nearby_bubbles(120.15507, 30.27408, 1000, 20, NULL);
+--
+-- 基准测试（本地 PostGIS 容器 + 合成数据）见 tests/bench_postgis_nearby.py
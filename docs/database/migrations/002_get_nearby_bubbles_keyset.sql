@@ -0,0 +1,90 @@
+-- ============================================
+-- 迁移 002: get_nearby_bubbles 支持键集分页
+-- ============================================
+-- 功能：
+--   1. 增加分页参数 after_distance / after_id：只返回 (距离, id) 排在上一页最后一条之后的笔记
+--   2. 距离统一使用 <-> 的球面距离，与排序键一致（同距离按 id 升序），保证翻页不重不漏
+--   3. 比较距离时留 1 毫米容差（与 app/utils/geo.py 的 DISTANCE_EPSILON_M 一致）：翻页可能在本函数与
+--      本地 haversine（网格索引/降级方案）之间切换，两者对同一行的距离有微小差异，容差内按 id 判断先后
+-- 调用方：app/core/database.py -> _call_nearby_rpc()（不带分页参数时与 001 行为一致）
+-- 依赖：001_get_nearby_bubbles_knn.sql（geog 列与 GiST 索引）
+-- 可重复执行
+-- ============================================
+
+DROP FUNCTION IF EXISTS get_nearby_bubbles(double precision, double precision, integer, integer, integer);
+DROP FUNCTION IF EXISTS get_nearby_bubbles(double precision, double precision, integer, integer, integer, double precision, bigint);
+
+-- 说明：
+--   KNN 索引扫描按距离由近到远产出行，翻页条件在扫描中过滤，找到 lim 条即停止；
+--   distance_meters 与 ORDER BY 使用同一个 <-> 表达式，游标中的距离与排序完全一致
+CREATE FUNCTION get_nearby_bubbles(
+    lon double precision,
+    lat double precision,
+    radius_m integer,
+    lim integer DEFAULT 20,
+    stat integer DEFAULT NULL,
+    after_distance double precision DEFAULT NULL,
+    after_id bigint DEFAULT NULL
+)
+RETURNS TABLE (
+    id bubble_note.id%TYPE,
+    user_id bubble_note.user_id%TYPE,
+    note_type bubble_note.note_type%TYPE,
+    content bubble_note.content%TYPE,
+    image_urls bubble_note.image_urls%TYPE,
+    gps_longitude bubble_note.gps_longitude%TYPE,
+    gps_latitude bubble_note.gps_latitude%TYPE,
+    status bubble_note.status%TYPE,
+    emotion bubble_note.emotion%TYPE,
+    create_time bubble_note.create_time%TYPE,
+    update_time bubble_note.update_time%TYPE,
+    weight_score bubble_note.weight_score%TYPE,
+    is_valid bubble_note.is_valid%TYPE,
+    distance_meters double precision
+)
+LANGUAGE sql
+STABLE
+PARALLEL SAFE
+AS $$
+    SELECT
+        b.id,
+        b.user_id,
+        b.note_type,
+        b.content,
+        b.image_urls,
+        b.gps_longitude,
+        b.gps_latitude,
+        b.status,
+        b.emotion,
+        b.create_time,
+        b.update_time,
+        b.weight_score,
+        b.is_valid,
+        b.geog <-> ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS distance_meters
+    FROM bubble_note AS b
+    WHERE b.is_valid = 1
+      AND (stat IS NULL OR b.status = stat)
+      AND ST_DWithin(b.geog, ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography, radius_m)
+      AND (
+          after_distance IS NULL
+          OR (b.geog <-> ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) > after_distance + 0.001
+          OR ((b.geog <-> ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) >= after_distance - 0.001 AND b.id > after_id)
+      )
+    ORDER BY b.geog <-> ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography, b.id
+    LIMIT lim;
+$$;
+
+COMMENT ON FUNCTION get_nearby_bubbles(double precision, double precision, integer, integer, integer, double precision, bigint)
+    IS '附近气泡查询: 半径内有效笔记按 (距离, id) 升序 (GiST KNN), 支持键集分页, 返回列表卡片列 + distance_meters';
+
+GRANT EXECUTE ON FUNCTION get_nearby_bubbles(double precision, double precision, integer, integer, integer, double precision, bigint)
+    TO anon, authenticated, service_role;
+
+NOTIFY pgrst, 'reload schema';
+
+-- ============================================
+-- 验证
+-- ============================================
+-- 第一页与第二页（第二页的 after_* 取第一页最后一条的 distance_meters / id）：
+-- SELECT id, distance_meters FROM get_nearby_bubbles(120.15507, 30.27408, 1000, 20);
+-- SELECT id, distance_meters FROM get_nearby_bubbles(120.15507, 30.27408, 1000, 20, NULL, 312.5, 1024);
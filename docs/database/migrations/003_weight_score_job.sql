@@ -0,0 +1,82 @@
+-- ============================================
+-- 迁移 003: weight_score 批量计算任务
+-- ============================================
+-- 功能：
+--   1. job_watermark 表：保存批处理任务的增量水位（只需重算上次运行之后变更的行）
+--   2. bulk_update_weight_scores 函数：一次请求批量写回分数（PostgREST 的 upsert 需要
+--      提供全部非空列，不适合只改一列），分数未变化的行不写
+--   3. 增量扫描用到的 update_time / process_time 索引
+-- 调用方：app/core/database.py -> bulk_update_weight_scores() / get_job_watermark()
+--        app/services/weight_score_service.py
+-- 可重复执行
+-- ============================================
+
+-- --------------------------------------------
+-- 1. 任务水位表
+-- --------------------------------------------
+CREATE TABLE IF NOT EXISTS job_watermark (
+    job_name    text PRIMARY KEY,
+    watermark   timestamptz,
+    updated_at  timestamptz NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE job_watermark IS '批处理任务增量水位 (如 weight_score.bubble_note)';
+
+-- 只允许服务端 (service_role) 读写
+ALTER TABLE job_watermark ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON job_watermark FROM anon, authenticated;
+GRANT SELECT, INSERT, UPDATE ON job_watermark TO service_role;
+
+-- --------------------------------------------
+-- 2. 批量写回函数
+-- --------------------------------------------
+-- ids 与 scores 按位置一一对应；返回实际写入的行数
+CREATE OR REPLACE FUNCTION bulk_update_weight_scores(
+    ids bigint[],
+    scores double precision[]
+)
+RETURNS integer
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH input AS (
+        SELECT *
+        FROM unnest(ids, scores) AS t(id, score)
+    ),
+    updated AS (
+        UPDATE bubble_note AS b
+        SET weight_score = input.score
+        FROM input
+        WHERE b.id = input.id
+          AND b.weight_score IS DISTINCT FROM input.score
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM updated;
+$$;
+
+COMMENT ON FUNCTION bulk_update_weight_scores(bigint[], double precision[])
+    IS '批量写回 weight_score (按 id 对应), 跳过分数未变化的行, 返回写入行数';
+
+REVOKE EXECUTE ON FUNCTION bulk_update_weight_scores(bigint[], double precision[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_weight_scores(bigint[], double precision[]) TO service_role;
+
+-- --------------------------------------------
+-- 3. 增量扫描索引
+-- --------------------------------------------
+-- 数据量较大的线上库请改用 CREATE INDEX CONCURRENTLY（不能放在事务中执行）
+CREATE INDEX IF NOT EXISTS idx_bubble_note_update_time
+    ON bubble_note (update_time, id);
+
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_process_time
+    ON genius_loci_record (process_time);
+
+ANALYZE bubble_note;
+ANALYZE genius_loci_record;
+
+NOTIFY pgrst, 'reload schema';
+
+-- ============================================
+-- 验证
+-- ============================================
+-- SELECT bulk_update_weight_scores(ARRAY[1, 2]::bigint[], ARRAY[12.5, 8.25]::double precision[]);
+-- SELECT * FROM job_watermark;
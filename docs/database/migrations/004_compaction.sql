@@ -0,0 +1,207 @@
+-- ============================================
+-- 迁移 004: 软删除/过期数据归档 (compaction)
+-- ============================================
+-- 功能：
+--   1. 冷数据表 bubble_note_archive / genius_loci_record_archive（列与热表相同 + archived_at）
+--   2. compact_bubble_notes 函数：把一批软删除（is_valid = 0）的笔记连同其地灵记录移到冷数据表
+--   3. compact_expired_records 函数：把一批已过期（expire_time 早于给定时间）的地灵记录移到冷数据表
+--   4. table_storage_stats 函数：热表/冷数据表的行数、表与索引大小（任务运行前后各取一次）
+--   5. 查找待归档行用到的部分索引
+-- 调用方：app/core/database.py -> compact_bubble_notes() / compact_expired_records() / get_table_storage_stats()
+--        app/services/compaction_service.py
+-- 可重复执行
+--
+-- 注意：
+--   - 冷数据表按热表的列顺序创建, 函数用 SELECT moved.* 写入; 热表以后增加列时, 须在冷数据表
+--     archived_at 之前的位置补上同样的列 (或重建冷数据表), 否则归档会报列不匹配
+--   - 删除只让行空间可被复用, 表/索引文件不会立即变小; 大批量归档后可在低峰期执行
+--     VACUUM (ANALYZE) 或 REINDEX INDEX CONCURRENTLY 回收索引空间
+-- ============================================
+
+-- --------------------------------------------
+-- 1. 冷数据表
+-- --------------------------------------------
+-- LIKE 只复制列与类型 (生成列 geog 在冷数据表中是普通列), 不复制索引/约束/默认值
+CREATE TABLE IF NOT EXISTS bubble_note_archive (LIKE bubble_note);
+ALTER TABLE bubble_note_archive ADD COLUMN IF NOT EXISTS archived_at timestamptz NOT NULL DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS genius_loci_record_archive (LIKE genius_loci_record);
+ALTER TABLE genius_loci_record_archive ADD COLUMN IF NOT EXISTS archived_at timestamptz NOT NULL DEFAULT now();
+
+-- 归档可能被重试, 按 id 去重
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bubble_note_archive_id ON bubble_note_archive (id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_genius_loci_record_archive_id ON genius_loci_record_archive (id);
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_archive_bubble_id ON genius_loci_record_archive (bubble_id);
+
+COMMENT ON TABLE bubble_note_archive IS '已软删除笔记的冷数据 (由 compact_bubble_notes 迁入)';
+COMMENT ON TABLE genius_loci_record_archive IS '已过期或所属笔记已删除的地灵记录冷数据';
+
+-- 只允许服务端 (service_role) 读写
+ALTER TABLE bubble_note_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE genius_loci_record_archive ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON bubble_note_archive, genius_loci_record_archive FROM anon, authenticated;
+GRANT SELECT, INSERT ON bubble_note_archive, genius_loci_record_archive TO service_role;
+
+-- --------------------------------------------
+-- 2. 待归档行的部分索引 (只包含死行, 体积很小)
+-- --------------------------------------------
+-- 数据量较大的线上库请改用 CREATE INDEX CONCURRENTLY（不能放在事务中执行）
+CREATE INDEX IF NOT EXISTS idx_bubble_note_deleted
+    ON bubble_note (update_time, id)
+    WHERE is_valid = 0;
+
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_expire_time
+    ON genius_loci_record (expire_time)
+    WHERE expire_time IS NOT NULL;
+
+-- --------------------------------------------
+-- 3. 归档软删除笔记
+-- --------------------------------------------
+-- 每次最多移动 batch_size 条 update_time 早于 deleted_before 的软删除笔记 (宽限期由调用方决定);
+-- 先移动这些笔记的地灵记录 (外键 ON DELETE CASCADE 会在删除笔记时直接删掉它们), 整个函数在一个事务中执行;
+-- SKIP LOCKED: 多个实例同时运行时各自处理不同的行
+CREATE OR REPLACE FUNCTION compact_bubble_notes(
+    batch_size integer,
+    deleted_before timestamptz
+)
+RETURNS TABLE (notes integer, records integer)
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+DECLARE
+    note_ids bigint[];
+BEGIN
+    SELECT array_agg(id) INTO note_ids
+    FROM (
+        SELECT id
+        FROM bubble_note
+        WHERE is_valid = 0
+          AND update_time < deleted_before
+        ORDER BY update_time, id
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) AS batch;
+
+    notes := 0;
+    records := 0;
+    IF note_ids IS NULL THEN
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    WITH moved AS (
+        DELETE FROM genius_loci_record
+        WHERE bubble_id = ANY (note_ids)
+        RETURNING *
+    ),
+    archived AS (
+        INSERT INTO genius_loci_record_archive
+        SELECT moved.*, now() FROM moved
+        ON CONFLICT (id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*)::integer INTO records FROM moved;
+
+    WITH moved AS (
+        DELETE FROM bubble_note
+        WHERE id = ANY (note_ids)
+        RETURNING *
+    ),
+    archived AS (
+        INSERT INTO bubble_note_archive
+        SELECT moved.*, now() FROM moved
+        ON CONFLICT (id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*)::integer INTO notes FROM moved;
+
+    RETURN NEXT;
+END;
+$$;
+
+COMMENT ON FUNCTION compact_bubble_notes(integer, timestamptz)
+    IS '把一批软删除笔记及其地灵记录移到冷数据表, 返回移动的笔记数与记录数';
+
+-- --------------------------------------------
+-- 4. 归档过期地灵记录
+-- --------------------------------------------
+CREATE OR REPLACE FUNCTION compact_expired_records(
+    batch_size integer,
+    expired_before timestamptz
+)
+RETURNS integer
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH batch AS (
+        SELECT id
+        FROM genius_loci_record
+        WHERE expire_time < expired_before
+        ORDER BY expire_time, id
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM genius_loci_record AS r
+        USING batch
+        WHERE r.id = batch.id
+        RETURNING r.*
+    ),
+    archived AS (
+        INSERT INTO genius_loci_record_archive
+        SELECT moved.*, now() FROM moved
+        ON CONFLICT (id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM moved;
+$$;
+
+COMMENT ON FUNCTION compact_expired_records(integer, timestamptz)
+    IS '把一批已过期的地灵记录移到冷数据表, 返回移动的记录数';
+
+-- --------------------------------------------
+-- 5. 存储统计
+-- --------------------------------------------
+-- live_rows / dead_rows 来自统计信息 (autovacuum/ANALYZE 后更新), 大小单位为字节
+CREATE OR REPLACE FUNCTION table_storage_stats()
+RETURNS TABLE (
+    table_name text,
+    table_bytes bigint,
+    index_bytes bigint,
+    live_rows bigint,
+    dead_rows bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.relname::text,
+        pg_table_size(c.oid),
+        pg_indexes_size(c.oid),
+        coalesce(s.n_live_tup, 0),
+        coalesce(s.n_dead_tup, 0)
+    FROM pg_class AS c
+    LEFT JOIN pg_stat_user_tables AS s ON s.relid = c.oid
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND c.relname IN ('bubble_note', 'genius_loci_record', 'bubble_note_archive', 'genius_loci_record_archive')
+    ORDER BY c.relname;
+$$;
+
+REVOKE EXECUTE ON FUNCTION compact_bubble_notes(integer, timestamptz) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION compact_expired_records(integer, timestamptz) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION table_storage_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION compact_bubble_notes(integer, timestamptz) TO service_role;
+GRANT EXECUTE ON FUNCTION compact_expired_records(integer, timestamptz) TO service_role;
+GRANT EXECUTE ON FUNCTION table_storage_stats() TO service_role;
+
+ANALYZE bubble_note;
+ANALYZE genius_loci_record;
+
+NOTIFY pgrst, 'reload schema';
+
+-- ============================================
+-- 验证
+-- ============================================
+-- SELECT * FROM compact_bubble_notes(100, now() - interval '1 day');
+-- SELECT compact_expired_records(100, now());
+-- SELECT * FROM table_storage_stats();
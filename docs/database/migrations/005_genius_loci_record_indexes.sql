@@ -0,0 +1,94 @@
+-- ============================================
+-- 迁移 005: genius_loci_record 复合/部分/空间索引
+-- ============================================
+-- 功能：按 app/core/database.py 中的实际查询为 genius_loci_record 建索引
+--   1. 范围内最新记忆 (_query_latest_memories)：经纬度范围 + ai_process_type + is_effective，按 process_time 倒序
+--      -> GiST (btree_gist) 空间索引，经度/纬度两个范围条件同时走索引
+--   2. 笔记的最新对话总结 (_query_ai_summary / get_memory_records_for_scoring)：bubble_id + ai_process_type = 5 + is_effective
+--      -> (bubble_id, ai_process_type, process_time DESC, id DESC) 部分索引
+--   3. 笔记的记录列表 (get_bubble_genius_loci_records)：bubble_id + is_effective，按 (process_time, id) 倒序
+--      -> (bubble_id, process_time DESC, id DESC) 部分索引
+--   4. 用户的记忆列表 (get_user_genius_loci_memories)：user_id + is_effective [+ ai_process_type]，按 (process_time, id) 倒序
+--      -> (user_id, process_time DESC, id DESC) 部分索引
+-- 依赖：btree_gist 扩展（Supabase 自带，Dashboard -> Database -> Extensions 中可见）
+-- 可重复执行
+--
+-- 说明：
+--   - 所有查询都带 is_effective = 1，索引只包含有效记录 (WHERE is_effective = 1)，体积更小；
+--     查询条件必须写成 is_effective = 1（与 PostgREST 生成的 is_effective=eq.1 一致）才能命中部分索引
+--   - expire_time 条件 (expire_time IS NULL OR expire_time > now) 在索引扫描后过滤，过期记录由迁移 004 的归档任务移出热表
+--   - 应用通过 PostgREST 对 gps_longitude / gps_latitude 做范围过滤，geography 列上的索引用不到，
+--     因此空间索引直接建在两个经纬度列上（btree_gist 支持 numeric 与 double precision）
+--   - 前后执行计划对比：python -m tests.bench_genius_loci_indexes
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- 数据量较大的线上库请改用 CREATE INDEX CONCURRENTLY（不能放在事务中执行）
+
+-- --------------------------------------------
+-- 1. 范围内最新记忆（空间索引）
+-- --------------------------------------------
+-- B-tree 复合索引只能对第一个范围列做索引扫描，另一个范围列只能逐行过滤；
+-- GiST 同时按经度与纬度收窄，ai_process_type 放在第一列按等值过滤
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_type_gps
+    ON genius_loci_record USING GIST (ai_process_type, gps_longitude, gps_latitude)
+    WHERE is_effective = 1;
+
+-- --------------------------------------------
+-- 2. 笔记的最新对话总结
+-- --------------------------------------------
+-- ORDER BY process_time DESC LIMIT 1 直接取索引中的第一行；
+-- 权重计算任务按 bubble_id IN (...) AND ai_process_type = 5 批量读取时同样使用此索引
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_bubble_type_time
+    ON genius_loci_record (bubble_id, ai_process_type, process_time DESC, id DESC)
+    WHERE is_effective = 1;
+
+-- --------------------------------------------
+-- 3. 笔记的记录列表（键集分页）
+-- --------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_bubble_time
+    ON genius_loci_record (bubble_id, process_time DESC, id DESC)
+    WHERE is_effective = 1;
+
+-- --------------------------------------------
+-- 4. 用户的记忆列表（键集分页）
+-- --------------------------------------------
+-- 指定 ai_process_type 时按索引顺序扫描并过滤类型，仍不需要排序
+CREATE INDEX IF NOT EXISTS idx_genius_loci_record_user_time
+    ON genius_loci_record (user_id, process_time DESC, id DESC)
+    WHERE is_effective = 1;
+
+ANALYZE genius_loci_record;
+
+-- --------------------------------------------
+-- 5. 可删除的单列索引（确认后手动执行）
+-- --------------------------------------------
+-- 上面的索引覆盖了 ai_process_type / is_effective / user_id 单列索引的全部用途；
+-- bubble_id 单列索引仍用于外键级联删除与归档 (compact_bubble_notes)，保留。
+-- 删除前先确认线上索引名，并观察 idx_scan 不再增长：
+--   SELECT indexrelname, idx_scan, pg_size_pretty(pg_relation_size(indexrelid))
+--   FROM pg_stat_user_indexes WHERE relname = 'genius_loci_record';
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_process_type;
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_is_effective;
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_user_id;
+
+-- ============================================
+-- 验证 (过滤值写成带引号的字面量, 与 PostgREST 一样按列类型解析)
+-- ============================================
+-- EXPLAIN (ANALYZE, BUFFERS)
+-- SELECT id, bubble_id, user_id, ai_result, gps_longitude, gps_latitude, process_time, expire_time
+-- FROM genius_loci_record
+-- WHERE gps_longitude >= 120.150 AND gps_longitude <= 120.160
+--   AND gps_latitude >= 30.270 AND gps_latitude <= 30.280
+--   AND ai_process_type = '5' AND is_effective = '1'
+--   AND (expire_time IS NULL OR expire_time > now())
+-- ORDER BY process_time DESC
+-- LIMIT 10;
+-- 应看到 Bitmap Index Scan on idx_genius_loci_record_type_gps
+--
+-- EXPLAIN (ANALYZE, BUFFERS)
+-- SELECT id, ai_result, process_time FROM genius_loci_record
+-- WHERE bubble_id = 1 AND ai_process_type = '5' AND is_effective = '1'
+-- ORDER BY process_time DESC LIMIT 1;
+-- 应看到 Index Scan using idx_genius_loci_record_bubble_type_time，且没有 Sort 节点
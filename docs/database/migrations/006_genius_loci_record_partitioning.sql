@@ -0,0 +1,277 @@
+-- ============================================
+-- 迁移 006: genius_loci_record 按月分区
+-- ============================================
+-- 功能：
+--   1. 把 genius_loci_record 改为按 process_time 月份范围分区的分区表
+--      （每月一个分区 genius_loci_record_pYYYYMM，按 UTC 月份划分；默认分区 genius_loci_record_default 兜底），
+--      原有数据在同一事务中复制到分区表
+--   2. ensure_genius_loci_record_partitions 函数：提前创建当月及之后若干个月的分区
+--   3. drop_expired_genius_loci_record_partitions 函数：保留策略，整块删除保留期之前的月份分区
+-- 调用方：app/core/database.py -> ensure_record_partitions() / drop_expired_record_partitions()
+--        app/services/compaction_service.py（每次归档前维护分区）
+-- 依赖：迁移 003 / 004 / 005（在分区表上重建这些迁移的索引，005 需要 btree_gist 扩展）
+-- 可重复执行（表已经是分区表时跳过转换）
+--
+-- 注意：
+--   - 转换会复制整张表并重建索引，期间持有 genius_loci_record 的排他锁，请在低峰期执行，
+--     并先在备份库上演练估算耗时；有视图等对象依赖原表时转换会报错并整体回滚
+--   - 分区表的主键必须包含分区键：主键由 (id) 变为 (id, process_time)，id 仍由序列生成，不会重复
+--   - process_time 改为 NOT NULL（分区键），原表中为空的行按转换时间填充
+--   - 原表的 RLS 状态与策略会复制到分区表；分区本身只允许服务端访问（与冷数据表一致）
+--   - 不再重建已被迁移 005 索引覆盖的 user_id / ai_process_type / is_effective 单列索引
+--   - 读接口按 process_time 加了下界/上界（保留期起点、分页游标），分区裁剪后只扫描相关月份
+--   - 删除分区即永久删除该月的记录；需要留存时先导出，再设置 RECORD_RETENTION_MONTHS
+-- ============================================
+
+-- --------------------------------------------
+-- 1. 创建单个月份分区
+-- --------------------------------------------
+-- 默认分区中已有该月的行时先移到新表再挂载 (否则 ATTACH 会因默认分区中存在范围内的行而失败);
+-- SECURITY DEFINER: 挂载分区需要表的所有者权限, 服务端 (service_role) 通过 RPC 调用
+CREATE OR REPLACE FUNCTION create_genius_loci_record_partition(month_start date)
+RETURNS boolean
+LANGUAGE plpgsql
+VOLATILE
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+DECLARE
+    partition_name text;
+    lower_bound timestamptz;
+    upper_bound timestamptz;
+BEGIN
+    month_start := date_trunc('month', month_start)::date;
+    partition_name := format('genius_loci_record_p%s', to_char(month_start, 'YYYYMM'));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+    upper_bound := (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+
+    EXECUTE format('CREATE TABLE %I (LIKE genius_loci_record INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', partition_name);
+
+    IF to_regclass('genius_loci_record_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS ('
+            || 'DELETE FROM genius_loci_record_default WHERE process_time >= %L AND process_time < %L RETURNING *'
+            || ') INSERT INTO %I SELECT * FROM moved',
+            lower_bound, upper_bound, partition_name
+        );
+    END IF;
+
+    EXECUTE format(
+        'ALTER TABLE genius_loci_record ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, lower_bound, upper_bound
+    );
+    RETURN true;
+END;
+$$;
+
+COMMENT ON FUNCTION create_genius_loci_record_partition(date)
+    IS '创建 month_start 所在月份的 genius_loci_record 分区, 已存在时返回 false';
+
+-- --------------------------------------------
+-- 2. 转换为分区表
+-- --------------------------------------------
+DO $$
+DECLARE
+    first_month date;
+    current_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+    month_start date;
+    max_id bigint;
+    con record;
+    pol record;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('public.genius_loci_record')) = 'p' THEN
+        RAISE NOTICE 'genius_loci_record 已是分区表, 跳过转换';
+        RETURN;
+    END IF;
+
+    LOCK TABLE genius_loci_record IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE genius_loci_record RENAME TO genius_loci_record_unpartitioned;
+
+    -- 应用写入时 process_time 由默认值填充, 正常不会为空
+    UPDATE genius_loci_record_unpartitioned SET process_time = now() WHERE process_time IS NULL;
+
+    -- 列、类型、非空约束与默认值与原表一致 (列顺序不变, 迁移 004 的冷数据表仍可直接 SELECT *)
+    CREATE TABLE genius_loci_record (LIKE genius_loci_record_unpartitioned INCLUDING DEFAULTS INCLUDING COMMENTS)
+        PARTITION BY RANGE (process_time);
+    ALTER TABLE genius_loci_record ALTER COLUMN process_time SET NOT NULL;
+    ALTER TABLE genius_loci_record ALTER COLUMN process_time SET DEFAULT now();
+
+    -- 原表的 id 可能是 identity 列 (PostgreSQL 17 之前分区表不支持), 统一改用普通序列
+    CREATE SEQUENCE IF NOT EXISTS genius_loci_record_id_part_seq AS bigint;
+    ALTER TABLE genius_loci_record ALTER COLUMN id SET DEFAULT nextval('genius_loci_record_id_part_seq');
+    ALTER SEQUENCE genius_loci_record_id_part_seq OWNED BY genius_loci_record.id;
+
+    -- 覆盖已有数据的月份 + 未来 3 个月 + 默认分区
+    SELECT date_trunc('month', min(process_time) AT TIME ZONE 'UTC')::date INTO first_month
+    FROM genius_loci_record_unpartitioned;
+    month_start := least(coalesce(first_month, current_month), current_month);
+    WHILE month_start <= current_month + interval '3 months' LOOP
+        PERFORM create_genius_loci_record_partition(month_start);
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    CREATE TABLE genius_loci_record_default PARTITION OF genius_loci_record DEFAULT;
+    REVOKE ALL ON genius_loci_record_default FROM anon, authenticated;
+
+    -- 先复制数据再建索引 (批量写入比逐行维护索引快)
+    INSERT INTO genius_loci_record SELECT * FROM genius_loci_record_unpartitioned;
+
+    SELECT max(id) INTO max_id FROM genius_loci_record;
+    PERFORM setval('genius_loci_record_id_part_seq', greatest(coalesce(max_id, 0), 1), max_id IS NOT NULL);
+
+    -- 外键 (bubble_id -> bubble_note, ON DELETE CASCADE) 与检查约束
+    FOR con IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'genius_loci_record_unpartitioned'::regclass AND contype IN ('f', 'c')
+    LOOP
+        EXECUTE format('ALTER TABLE genius_loci_record ADD CONSTRAINT %I %s', con.conname, con.definition);
+    END LOOP;
+
+    -- RLS 状态与策略
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'genius_loci_record_unpartitioned'::regclass) THEN
+        ALTER TABLE genius_loci_record ENABLE ROW LEVEL SECURITY;
+    END IF;
+    FOR pol IN
+        SELECT * FROM pg_policies
+        WHERE schemaname = 'public' AND tablename = 'genius_loci_record_unpartitioned'
+    LOOP
+        EXECUTE format(
+            'CREATE POLICY %I ON genius_loci_record AS %s FOR %s TO %s%s%s',
+            pol.policyname, pol.permissive, pol.cmd, array_to_string(pol.roles, ', '),
+            CASE WHEN pol.qual IS NOT NULL THEN ' USING (' || pol.qual || ')' ELSE '' END,
+            CASE WHEN pol.with_check IS NOT NULL THEN ' WITH CHECK (' || pol.with_check || ')' ELSE '' END
+        );
+    END LOOP;
+
+    -- 不使用 CASCADE: 有其他对象依赖原表时报错, 整个转换回滚
+    DROP TABLE genius_loci_record_unpartitioned;
+
+    -- 索引 (在分区表上创建, 自动建到每个分区)
+    ALTER TABLE genius_loci_record ADD PRIMARY KEY (id, process_time);
+    CREATE INDEX idx_genius_loci_record_bubble_id ON genius_loci_record (bubble_id);  -- 外键级联删除与归档
+    CREATE INDEX idx_genius_loci_record_process_time ON genius_loci_record (process_time);  -- 迁移 003
+    CREATE INDEX idx_genius_loci_record_expire_time  -- 迁移 004
+        ON genius_loci_record (expire_time)
+        WHERE expire_time IS NOT NULL;
+    CREATE INDEX idx_genius_loci_record_type_gps  -- 迁移 005
+        ON genius_loci_record USING GIST (ai_process_type, gps_longitude, gps_latitude)
+        WHERE is_effective = 1;
+    CREATE INDEX idx_genius_loci_record_bubble_type_time
+        ON genius_loci_record (bubble_id, ai_process_type, process_time DESC, id DESC)
+        WHERE is_effective = 1;
+    CREATE INDEX idx_genius_loci_record_bubble_time
+        ON genius_loci_record (bubble_id, process_time DESC, id DESC)
+        WHERE is_effective = 1;
+    CREATE INDEX idx_genius_loci_record_user_time
+        ON genius_loci_record (user_id, process_time DESC, id DESC)
+        WHERE is_effective = 1;
+
+    GRANT SELECT, INSERT, UPDATE, DELETE ON genius_loci_record TO service_role;
+    GRANT USAGE, SELECT ON SEQUENCE genius_loci_record_id_part_seq TO service_role;
+END;
+$$;
+
+-- --------------------------------------------
+-- 3. 提前创建分区
+-- --------------------------------------------
+-- 没有提前创建分区时新记录写入默认分区 (不会失败), 之后创建该月分区时再移出
+CREATE OR REPLACE FUNCTION ensure_genius_loci_record_partitions(months_ahead integer DEFAULT 3)
+RETURNS integer
+LANGUAGE plpgsql
+VOLATILE
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+DECLARE
+    current_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+    created integer := 0;
+BEGIN
+    FOR i IN 0..greatest(months_ahead, 0) LOOP
+        IF create_genius_loci_record_partition((current_month + make_interval(months => i))::date) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+COMMENT ON FUNCTION ensure_genius_loci_record_partitions(integer)
+    IS '创建当月及之后 months_ahead 个月的 genius_loci_record 分区, 返回新建的分区数';
+
+-- --------------------------------------------
+-- 4. 保留策略
+-- --------------------------------------------
+-- 保留最近 retain_months 个整月及当月: 早于 (当月月初 - retain_months 个月) 的月份分区整块删除,
+-- 默认分区中早于该时间的行逐行删除; retain_months <= 0 时不删除
+CREATE OR REPLACE FUNCTION drop_expired_genius_loci_record_partitions(retain_months integer)
+RETURNS SETOF text
+LANGUAGE plpgsql
+VOLATILE
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+DECLARE
+    cutoff date;
+    part record;
+BEGIN
+    IF retain_months IS NULL OR retain_months <= 0 THEN
+        RETURN;
+    END IF;
+    cutoff := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => retain_months))::date;
+
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits AS i
+        JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'genius_loci_record'::regclass
+          AND c.relname ~ '^genius_loci_record_p[0-9]{6}$'
+          AND to_date(substring(c.relname FROM '[0-9]{6}$'), 'YYYYMM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE genius_loci_record DETACH PARTITION %I', part.relname);
+        EXECUTE format('DROP TABLE %I', part.relname);
+        RETURN NEXT part.relname;
+    END LOOP;
+
+    IF to_regclass('genius_loci_record_default') IS NOT NULL THEN
+        DELETE FROM genius_loci_record_default WHERE process_time < cutoff::timestamp AT TIME ZONE 'UTC';
+    END IF;
+END;
+$$;
+
+COMMENT ON FUNCTION drop_expired_genius_loci_record_partitions(integer)
+    IS '删除保留期 (retain_months 个整月) 之前的 genius_loci_record 月份分区, 返回删除的分区名';
+
+REVOKE EXECUTE ON FUNCTION create_genius_loci_record_partition(date) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ensure_genius_loci_record_partitions(integer) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_expired_genius_loci_record_partitions(integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_genius_loci_record_partitions(integer) TO service_role;
+GRANT EXECUTE ON FUNCTION drop_expired_genius_loci_record_partitions(integer) TO service_role;
+
+ANALYZE genius_loci_record;
+
+NOTIFY pgrst, 'reload schema';
+
+-- ============================================
+-- 验证
+-- ============================================
+-- SELECT inhrelid::regclass AS partition, pg_get_expr(c.relpartbound, c.oid) AS bounds
+-- FROM pg_inherits JOIN pg_class AS c ON c.oid = inhrelid
+-- WHERE inhparent = 'genius_loci_record'::regclass ORDER BY 1;
+--
+-- SELECT ensure_genius_loci_record_partitions(3);
+--
+-- EXPLAIN SELECT id, ai_result, process_time FROM genius_loci_record
+-- WHERE bubble_id = 1 AND ai_process_type = '5' AND is_effective = '1'
+--   AND process_time >= date_trunc('month', now()) - interval '12 months'
+-- ORDER BY process_time DESC LIMIT 1;
+-- 计划中只应出现最近 13 个月的分区 (及默认分区)
+--
+-- pg_cron 定时维护 (不使用应用内的归档任务时):
+-- SELECT cron.schedule('genius-loci-record-partitions', '0 3 * * *',
+--     $cron$SELECT ensure_genius_loci_record_partitions(3); SELECT drop_expired_genius_loci_record_partitions(12);$cron$);
@@ -0,0 +1,155 @@
+"""
+地理瓦片缓存基准测试脚本
+功能：用合成的城市级数据回放附近查询，比较不同瓦片大小下的缓存命中率与回源开销
+
+测试方法：
+1. 在城市范围内生成聚集分布的笔记（若干热点 + 均匀背景）
+2. 生成围绕热点的查询流（不同半径/数量），并按比例穿插写入
+3. 对每种瓦片大小回放同一查询流，统计：
+   - 瓦片命中率 / 被缓存回答的查询比例
+   - 每次查询平均回源次数与回源行数
+   - 本地过滤耗时
+
+无需启动服务或连接数据库（回源函数由内存数据模拟）
+
+运行方式（在项目根目录）：
+    python -m tests.bench_geo_tile_cache
+"""
+
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.core.geo_cache import GeoTileCache
+
+CITY_CENTER = (120.15507, 30.27408)
+CITY_SPAN_DEG = 0.3  # 城市范围约 30 公里
+NOTE_COUNT = 200_000
+HOTSPOTS = 50
+QUERY_COUNT = 20_000
+WRITE_RATIO = 0.02  # 每 100 次查询穿插约 2 次写入
+
+TILE_SIZES = [0.005, 0.01, 0.02, 0.05]
+
+
+def generate_notes(rng: np.random.Generator):
+    """生成聚集分布的笔记坐标"""
+    hotspots = rng.uniform(-CITY_SPAN_DEG / 2, CITY_SPAN_DEG / 2, size=(HOTSPOTS, 2)) + CITY_CENTER
+    clustered = NOTE_COUNT * 7 // 10
+    centers = hotspots[rng.integers(0, HOTSPOTS, size=clustered)]
+    points = np.vstack([
+        centers + rng.normal(0, 0.004, size=(clustered, 2)),
+        rng.uniform(-CITY_SPAN_DEG / 2, CITY_SPAN_DEG / 2, size=(NOTE_COUNT - clustered, 2)) + CITY_CENTER,
+    ])
+    return hotspots, points
+
+
+class InMemorySource:
+    """模拟数据库: 按瓦片范围返回笔记, 统计回源次数与行数"""
+
+    def __init__(self, points: np.ndarray):
+        self.lons = points[:, 0].copy()
+        self.lats = points[:, 1].copy()
+        order = np.argsort(self.lons)
+        self.lons, self.lats = self.lons[order], self.lats[order]
+        self.loads = 0
+        self.rows_loaded = 0
+
+    async def load(self, bounds, max_rows):
+        min_lon, max_lon, min_lat, max_lat = bounds
+        self.loads += 1
+        lo, hi = np.searchsorted(self.lons, [min_lon, max_lon])
+        lats = self.lats[lo:hi]
+        idx = np.flatnonzero((lats >= min_lat) & (lats < max_lat))[:max_rows]
+        self.rows_loaded += len(idx)
+        return [
+            {
+                "id": int(lo + i),
+                "gps_longitude": float(self.lons[lo + i]),
+                "gps_latitude": float(self.lats[lo + i]),
+                "status": 1,
+            }
+            for i in idx
+        ]
+
+
+def generate_workload(rng: np.random.Generator, hotspots: np.ndarray):
+    """生成围绕热点的查询流 (热点按 Zipf 分布被访问)"""
+    weights = 1.0 / np.arange(1, HOTSPOTS + 1)
+    weights /= weights.sum()
+    picks = rng.choice(HOTSPOTS, size=QUERY_COUNT, p=weights)
+    offsets = rng.normal(0, 0.003, size=(QUERY_COUNT, 2))
+    radii = rng.choice([0.5, 1.0, 1.0, 2.0], size=QUERY_COUNT)
+    limits = rng.choice([10, 20, 50], size=QUERY_COUNT)
+    return [
+        (float(hotspots[p][0] + o[0]), float(hotspots[p][1] + o[1]), float(r), int(n))
+        for p, o, r, n in zip(picks, offsets, radii, limits)
+    ]
+
+
+async def replay(tile_deg: float, points: np.ndarray, workload, seed: int):
+    """回放查询流"""
+    source = InMemorySource(points)
+    cache = GeoTileCache(
+        tile_deg=tile_deg,
+        ttl_seconds=3600,
+        max_tiles=4096,
+        max_rows_per_tile=5000,
+        max_tiles_per_query=64,
+    )
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    for lon, lat, radius_km, limit in workload:
+        if rng.random() < WRITE_RATIO:
+            cache.invalidate_point(lon, lat)
+        await cache.query(lon, lat, radius_km, limit, None, source.load)
+    elapsed = time.perf_counter() - start
+
+    stats = cache.get_stats()
+    return {
+        "tile_deg": tile_deg,
+        "tile_hit_ratio": stats["tile_hit_ratio"],
+        "served_ratio": stats["served_ratio"],
+        "loads_per_query": source.loads / len(workload),
+        "rows_per_load": source.rows_loaded / max(source.loads, 1),
+        "us_per_query": elapsed / len(workload) * 1e6,
+    }
+
+
+async def run_benchmark():
+    """执行基准测试"""
+
+    print("=" * 72)
+    print("地理瓦片缓存基准测试")
+    print(f"笔记数: {NOTE_COUNT}, 查询数: {QUERY_COUNT}, 写入比例: {WRITE_RATIO:.0%}")
+    print("=" * 72)
+
+    rng = np.random.default_rng(42)
+    hotspots, points = generate_notes(rng)
+    workload = generate_workload(rng, hotspots)
+
+    print(f"\n{'瓦片(度)':>8} {'瓦片命中率':>10} {'缓存回答率':>10} {'回源/查询':>10} {'行/回源':>9} {'耗时/查询':>12}")
+    for tile_deg in TILE_SIZES:
+        result = await replay(tile_deg, points, workload, seed=7)
+        print(
+            f"{result['tile_deg']:>8} "
+            f"{result['tile_hit_ratio']:>10.2%} "
+            f"{result['served_ratio']:>10.2%} "
+            f"{result['loads_per_query']:>10.3f} "
+            f"{result['rows_per_load']:>9.0f} "
+            f"{result['us_per_query']:>10.0f}us"
+        )
+
+
+# ========================================
+# 主程序
+# ========================================
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
+
+    print("\n基准测试完成！")
+    print("=" * 72)
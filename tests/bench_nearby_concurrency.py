@@ -0,0 +1,134 @@
+"""
+附近气泡并发基准测试脚本
+功能：验证 /bubbles/nearby 的并发请求不再在事件循环上串行排队
+
+测试方法：
+1. 串行发送 N 个 /nearby 请求，得到单请求平均耗时
+2. 同时并发发送 N 个 /nearby 请求，得到总耗时
+3. 并发期间持续探测 /health 接口，观察事件循环是否被阻塞
+
+判定标准：
+- 串行化系数 = 并发总耗时 / (单请求平均耗时 × N)
+  接近 1.0 表示请求仍在排队（事件循环被同步 I/O 阻塞）
+  远小于 1.0 表示请求真正并行执行
+- 并发期间 /health 的最大延迟应与空闲时同一量级
+"""
+
+import asyncio
+import httpx
+import statistics
+import time
+
+BASE_URL = "http://localhost:8000"
+NEARBY_ENDPOINT = "/api/v1/bubbles/nearby"
+HEALTH_ENDPOINT = "/api/v1/bubbles/health"
+
+CONCURRENCY = 32  # 并发请求数
+PARAMS = {
+    "longitude": 120.15507,
+    "latitude": 30.27408,
+    "radius_km": 1.0,
+    "limit": 20
+}
+
+
+async def fetch_nearby(client: httpx.AsyncClient, index: int) -> float:
+    """发送一次附近查询，返回耗时（秒）"""
+    # 轻微偏移坐标，避免命中任何上层缓存
+    params = dict(PARAMS)
+    params["longitude"] = PARAMS["longitude"] + index * 1e-5
+
+    start = time.perf_counter()
+    response = await client.get(f"{BASE_URL}{NEARBY_ENDPOINT}", params=params)
+    elapsed = time.perf_counter() - start
+
+    if response.status_code != 200:
+        print(f"  ⚠ 请求 {index} 返回状态码 {response.status_code}")
+    return elapsed
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    """并发期间持续探测健康检查接口，记录每次延迟"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{BASE_URL}{HEALTH_ENDPOINT}")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run_benchmark():
+    """执行基准测试"""
+
+    print("=" * 60)
+    print("/bubbles/nearby 并发基准测试")
+    print("=" * 60)
+
+    limits = httpx.Limits(max_connections=CONCURRENCY * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        # 预热
+        await fetch_nearby(client, 0)
+
+        # ========================================
+        # 1. 串行基线
+        # ========================================
+        print(f"\n1. 串行发送 {CONCURRENCY} 个请求...")
+        serial = []
+        for i in range(CONCURRENCY):
+            serial.append(await fetch_nearby(client, i))
+
+        avg_single = statistics.mean(serial)
+        print(f"  单请求平均耗时: {avg_single * 1000:.1f} ms")
+        print(f"  串行总耗时:     {sum(serial) * 1000:.1f} ms")
+
+        # ========================================
+        # 2. 并发请求 + 事件循环探测
+        # ========================================
+        print(f"\n2. 并发发送 {CONCURRENCY} 个请求...")
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe_health(client, stop))
+
+        start = time.perf_counter()
+        concurrent = await asyncio.gather(
+            *[fetch_nearby(client, i) for i in range(CONCURRENCY)]
+        )
+        wall = time.perf_counter() - start
+
+        stop.set()
+        health_latencies = await probe_task
+
+        print(f"  并发总耗时:     {wall * 1000:.1f} ms")
+        print(f"  单请求 p50:     {statistics.median(concurrent) * 1000:.1f} ms")
+        print(f"  单请求 max:     {max(concurrent) * 1000:.1f} ms")
+
+        # ========================================
+        # 3. 结果判定
+        # ========================================
+        serialization = wall / (avg_single * CONCURRENCY)
+        print("\n3. 结果")
+        print(f"  串行化系数: {serialization:.2f} (1.0 = 完全串行)")
+        print(f"  加速比:     {sum(serial) / wall:.1f}x")
+
+        if health_latencies:
+            print(f"  并发期间 /health 探测 {len(health_latencies)} 次, "
+                  f"最大延迟 {max(health_latencies) * 1000:.1f} ms")
+
+        if serialization > 0.8:
+            print("\n✗ 并发请求仍在串行排队，事件循环可能被同步 I/O 阻塞")
+        else:
+            print("\n✓ 并发请求已并行执行，事件循环未被阻塞")
+
+
+# ========================================
+# 主程序
+# ========================================
+
+if __name__ == "__main__":
+    print("\n开始基准测试...")
+    print("确保服务已启动: python run.py\n")
+
+    asyncio.run(run_benchmark())
+
+    print("\n基准测试完成！")
+    print("=" * 60)
@@ -0,0 +1,185 @@
+"""
+进程内空间索引基准测试脚本
+功能：用合成的百万级笔记测量空间索引的内存占用、加载耗时与查询延迟
+
+测试方法：
+1. 在城市范围内生成聚集分布的笔记（列表卡片字段齐全，content 约 60 字）
+2. 测量内存增量（tracemalloc 测样本后折算，区分行数据与索引结构）与构建耗时
+3. 测量附近查询（不同半径）与 Top 查询的 p50/p99 延迟
+4. 测量增量写入吞吐与失效槽位重建耗时
+
+无需启动服务或连接数据库
+
+运行方式（在项目根目录）：
+    python -m tests.bench_spatial_index
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.core.spatial_index import SpatialIndex
+
+CITY_CENTER = (120.15507, 30.27408)
+CITY_SPAN_DEG = 0.6  # 城市范围约 60 公里
+NOTE_COUNT = 1_000_000
+HOTSPOTS = 200
+QUERY_COUNT = 5_000
+WRITE_COUNT = 100_000
+MEMORY_SAMPLE = 200_000  # 内存测量样本 (tracemalloc 开销大, 按比例折算到百万条)
+CELL_DEG = 0.01
+
+
+def generate_rows(rng: np.random.Generator, count: int, start_id: int = 1):
+    """生成聚集分布的笔记行"""
+    hotspots = rng.uniform(-CITY_SPAN_DEG / 2, CITY_SPAN_DEG / 2, size=(HOTSPOTS, 2)) + CITY_CENTER
+    centers = hotspots[rng.integers(0, HOTSPOTS, size=count)]
+    points = centers + rng.normal(0, 0.01, size=(count, 2))
+    weights = rng.exponential(1.0, size=count)
+    users = rng.integers(1, 50_000, size=count)
+    statuses = rng.choice([1, 1, 1, 2], size=count)
+
+    rows = [
+        {
+            "id": start_id + i,
+            "user_id": int(users[i]),
+            "note_type": 2,
+            "content": f"第{start_id + i}条笔记: 今天在这里看到了很美的风景, 记录一下此刻的心情和想法",
+            "image_urls": None,
+            "gps_longitude": float(points[i, 0]),
+            "gps_latitude": float(points[i, 1]),
+            "status": int(statuses[i]),
+            "emotion": "开心",
+            "create_time": "2026-01-01T12:00:00.000000",
+            "update_time": "2026-01-01T12:00:00.000000",
+            "weight_score": float(weights[i]),
+            "is_valid": 1,
+        }
+        for i in range(count)
+    ]
+    return hotspots, rows
+
+
+async def batches(rows, size=5000):
+    """模拟分批加载"""
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def percentiles(samples):
+    arr = np.asarray(samples) * 1e6
+    return np.percentile(arr, 50), np.percentile(arr, 99)
+
+
+async def run_benchmark():
+    """执行基准测试"""
+
+    print("=" * 72)
+    print("进程内空间索引基准测试")
+    print(f"笔记数: {NOTE_COUNT}, 网格: {CELL_DEG} 度, 查询数: {QUERY_COUNT}")
+    print("=" * 72)
+
+    rng = np.random.default_rng(42)
+
+    # 内存 (样本)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    _, sample = generate_rows(rng, MEMORY_SAMPLE)
+    rows_bytes = tracemalloc.get_traced_memory()[0] - before
+
+    index = SpatialIndex(cell_deg=CELL_DEG)
+    before = tracemalloc.get_traced_memory()[0]
+    await index.bootstrap(batches(sample))
+    index_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del index, sample
+
+    # 加载耗时 (全量)
+    hotspots, rows = generate_rows(rng, NOTE_COUNT)
+    index = SpatialIndex(cell_deg=CELL_DEG)
+    start = time.perf_counter()
+    await index.bootstrap(batches(rows))
+    build_seconds = time.perf_counter() - start
+
+    per_million = 1_000_000 / MEMORY_SAMPLE
+    print(f"\n[内存] 行数据 (列表卡片 dict): {rows_bytes * per_million / 2**20:.0f} MiB / 百万条")
+    print(f"[内存] 索引结构 (列数组 + 网格 + 映射): {index_bytes * per_million / 2**20:.0f} MiB / 百万条")
+    print(f"[内存] 合计: {(rows_bytes + index_bytes) * per_million / 2**20:.0f} MiB / 百万条")
+    print(f"[加载] {build_seconds:.2f}s ({NOTE_COUNT / build_seconds:,.0f} 行/秒)")
+
+    # 附近查询
+    picks = hotspots[rng.integers(0, HOTSPOTS, size=QUERY_COUNT)] + rng.normal(0, 0.01, size=(QUERY_COUNT, 2))
+    print(f"\n{'查询':<16} {'p50':>10} {'p99':>10} {'平均结果数':>10}")
+    for radius_km, limit in [(0.5, 20), (1.0, 20), (2.0, 50), (10.0, 50)]:
+        samples, returned = [], 0
+        for lon, lat in picks:
+            t0 = time.perf_counter()
+            result = index.nearby(float(lon), float(lat), radius_km, limit)
+            samples.append(time.perf_counter() - t0)
+            returned += len(result)
+        p50, p99 = percentiles(samples)
+        print(f"{f'nearby {radius_km}km':<16} {p50:>8.0f}us {p99:>8.0f}us {returned / QUERY_COUNT:>10.1f}")
+
+    # Top 查询 (首次计算后按版本缓存)
+    samples = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        index.top(20)
+        samples.append(time.perf_counter() - t0)
+    p50, p99 = percentiles(samples)
+    print(f"{'top 全局':<16} {p50:>8.0f}us {p99:>8.0f}us")
+
+    user_ids = rng.integers(1, 50_000, size=QUERY_COUNT)
+    samples = []
+    for user_id in user_ids:
+        t0 = time.perf_counter()
+        index.top(20, int(user_id))
+        samples.append(time.perf_counter() - t0)
+    p50, p99 = percentiles(samples)
+    print(f"{'top 单用户':<16} {p50:>8.0f}us {p99:>8.0f}us")
+
+    # 写入后首次全局 Top (缓存失效, 需重新扫描)
+    samples = []
+    for i in range(20):
+        index.apply_update(i + 1, {"weight_score": 100.0 + i})
+        t0 = time.perf_counter()
+        index.top(20)
+        samples.append(time.perf_counter() - t0)
+    p50, p99 = percentiles(samples)
+    print(f"{'top 写入后':<16} {p50:>8.0f}us {p99:>8.0f}us")
+
+    # 增量写入
+    _, updates = generate_rows(rng, WRITE_COUNT, start_id=NOTE_COUNT + 1)
+    start = time.perf_counter()
+    for row in updates:
+        index.upsert(row)
+    write_seconds = time.perf_counter() - start
+    print(f"\n[写入] {WRITE_COUNT} 次 upsert: {WRITE_COUNT / write_seconds:,.0f} 次/秒")
+
+    # 追加区未合并时的查询延迟
+    samples = []
+    for lon, lat in picks:
+        t0 = time.perf_counter()
+        index.nearby(float(lon), float(lat), 1.0, 20)
+        samples.append(time.perf_counter() - t0)
+    p50, p99 = percentiles(samples)
+    print(f"[写入] 追加区 {WRITE_COUNT} 条时 nearby 1.0km: p50 {p50:.0f}us, p99 {p99:.0f}us")
+
+    # 失效槽位重建
+    index.rebuild_ratio = 0.0
+    start = time.perf_counter()
+    await index.maybe_rebuild()
+    print(f"[重建] {index.get_stats()['notes']} 条: {time.perf_counter() - start:.2f}s (线程池中执行, 不阻塞查询)")
+
+
+# ========================================
+# 主程序
+# ========================================
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
+
+    print("\n基准测试完成！")
+    print("=" * 72)
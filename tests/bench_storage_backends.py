@@ -0,0 +1,156 @@
+"""
+本地存储后端基准测试脚本
+功能：在内存 / SQLite 后端上以真实数据规模跑完整的数据访问路径 (app/core/database.py), 无需网络
+
+测试方法：
+1. 每个后端用 load_rows 导入 NOTE_COUNT 条分布在城市范围内的笔记与地灵记录
+2. 依次测量附近查询 (RPC 路径)、Top 排行、按 ID 读取、更新、创建地灵记录的单次耗时
+3. 附近查询每次使用不同坐标, 并在测量前清空笔记/瓦片缓存, 测的是后端本身
+
+运行方式（在项目根目录）：
+    python -m tests.bench_storage_backends
+"""
+
+import os
+
+# 须在导入 app 之前选择后端 (这里先用内存后端初始化, 测量时逐个替换)
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LEADERBOARD_ENABLED", "False")
+
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from app.core import database
+from app.core.storage.memory import MemoryBackend
+from app.core.storage.sqlite import SQLiteBackend
+
+NOTE_COUNT = 200_000
+RECORD_COUNT = 50_000
+ROUNDS = 200
+CENTER = (120.15507, 30.27408)
+SPREAD_DEG = 0.2  # 约 20 km 见方
+GRID_DEG = 0.01
+
+
+def make_rows(rng: random.Random):
+    """生成笔记与地灵记录"""
+    notes = [
+        {
+            "user_id": rng.randint(1, 5000),
+            "note_type": 1,
+            "content": f"note {i}",
+            "gps_longitude": CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+            "gps_latitude": CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+            "weight_score": rng.random(),
+        }
+        for i in range(NOTE_COUNT)
+    ]
+    records = [
+        {
+            "bubble_id": rng.randint(1, NOTE_COUNT),
+            "user_id": rng.randint(1, 5000),
+            "ai_process_type": 5,
+            "ai_result": json.dumps({"summary": "s", "turns": 3}),
+        }
+        for _ in range(RECORD_COUNT)
+    ]
+    return notes, records
+
+
+def clear_caches():
+    """清空数据访问层缓存, 让每次查询都落到后端"""
+    if database.note_cache is not None:
+        database.note_cache.clear()
+    if database.geo_tile_cache is not None:
+        database.geo_tile_cache.clear()
+
+
+async def measure(name: str, rng: random.Random, operation) -> None:
+    """执行 ROUNDS 次操作并打印耗时分布"""
+    latencies = []
+    for _ in range(ROUNDS):
+        clear_caches()
+        start = time.perf_counter()
+        await operation(rng)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"  {name:<16} p50 {statistics.median(latencies):7.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms")
+
+
+async def nearby(rng: random.Random):
+    lon = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    lat = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    await database.get_nearby_bubbles(lon, lat, 1.0, 20)
+
+
+async def top(rng: random.Random):
+    await database.get_top_bubbles(20)
+
+
+async def read_note(rng: random.Random):
+    await database.get_bubble_note_by_id(rng.randint(1, NOTE_COUNT))
+
+
+async def update_note(rng: random.Random):
+    note_id = rng.randint(1, NOTE_COUNT)
+    note = await database.get_bubble_note_by_id(note_id)
+    await database.update_bubble_note(note_id, note["user_id"], {"content": "updated"})
+
+
+async def create_record(rng: random.Random):
+    await database.create_genius_loci_record(
+        rng.randint(1, NOTE_COUNT), 1, 5, json.dumps({"summary": "s", "turns": 1}),
+        gps_longitude=CENTER[0], gps_latitude=CENTER[1]
+    )
+
+
+async def run_backend(backend, notes, records):
+    """导入数据并测量一个后端"""
+    print(f"\n后端: {backend.name}")
+
+    start = time.perf_counter()
+    backend.load_rows("bubble_note", notes)
+    backend.load_rows("genius_loci_record", records)
+    print(f"  导入 {len(notes) + len(records)} 行: {time.perf_counter() - start:.1f} s")
+
+    database.db = backend
+    await database.detect_rpc_capabilities()
+
+    rng = random.Random(7)
+    await measure("nearby (1 km)", rng, nearby)
+    await measure("top 20", rng, top)
+    await measure("get by id", rng, read_note)
+    await measure("update", rng, update_note)
+    await measure("create record", rng, create_record)
+
+    backend.shutdown()
+
+
+async def run_benchmark():
+    """执行基准测试"""
+
+    print("=" * 60)
+    print("本地存储后端基准测试")
+    print(f"笔记数: {NOTE_COUNT}, 地灵记录数: {RECORD_COUNT}, 每项 {ROUNDS} 次")
+    print("=" * 60)
+
+    notes, records = make_rows(random.Random(42))
+    await run_backend(MemoryBackend(grid_deg=GRID_DEG), notes, records)
+    await run_backend(SQLiteBackend(path=":memory:", grid_deg=GRID_DEG), notes, records)
+
+
+# ========================================
+# 主程序
+# ========================================
+
+if __name__ == "__main__":
+    print("\n开始基准测试...")
+
+    asyncio.run(run_benchmark())
+
+    print("\n基准测试完成！")
+    print("=" * 60)
@@ -0,0 +1,78 @@
+"""
+weight_score 批量计算基准测试脚本
+功能：用合成数据测量打分计算本身 (不含数据库往返) 的吞吐
+
+测试方法：
+1. 按批生成笔记特征（创建时间、情感）与地灵对话总结记录（每条笔记 0~N 条）
+2. 每批依次执行：记忆特征统计 (memory_features) + 向量化打分 (compute_weight_scores)
+3. 输出不同批大小下的 rows/s
+
+无需启动服务或连接数据库；实际运行吞吐受数据库往返限制，见任务日志中的 rows/s
+
+运行方式（在项目根目录）：
+    python -m tests.bench_weight_score
+"""
+
+import json
+import time
+
+import numpy as np
+
+from app.services.weight_scoring import compute_weight_scores, memory_features
+
+NOTE_COUNT = 1_000_000
+BATCH_SIZES = [500, 2000, 10000]
+MEMORIES_PER_NOTE = 0.3  # 平均每条笔记的对话总结数
+
+
+def make_batches(batch_size: int, rng: np.random.Generator):
+    """生成 (笔记 ID, 创建天数, 情感标记, 记忆记录) 批次"""
+    for start in range(0, NOTE_COUNT, batch_size):
+        note_ids = np.arange(start + 1, min(start + batch_size, NOTE_COUNT) + 1, dtype=np.int64)
+        created_days = rng.uniform(0, 365, len(note_ids))
+        emotion_known = rng.random(len(note_ids)) < 0.7
+        memory_total = rng.poisson(MEMORIES_PER_NOTE * len(note_ids))
+        records = [
+            {"bubble_id": int(bubble_id), "ai_result": json.dumps({"summary": "s", "turns": int(turns)})}
+            for bubble_id, turns in zip(rng.choice(note_ids, memory_total), rng.integers(1, 10, memory_total))
+        ]
+        yield note_ids, created_days, emotion_known, records
+
+
+def run_benchmark():
+    """执行基准测试"""
+
+    print("=" * 72)
+    print("weight_score 批量计算基准测试")
+    print(f"笔记数: {NOTE_COUNT}, 平均每条笔记记忆数: {MEMORIES_PER_NOTE}")
+    print("=" * 72)
+
+    print(f"\n{'批大小':>8} {'打分 rows/s':>14} {'含记忆统计 rows/s':>20}")
+    for batch_size in BATCH_SIZES:
+        rng = np.random.default_rng(42)
+        batches = list(make_batches(batch_size, rng))
+
+        start = time.perf_counter()
+        for note_ids, created_days, emotion_known, _ in batches:
+            zeros = np.zeros(len(note_ids))
+            compute_weight_scores(created_days, emotion_known, zeros, zeros, 7.0)
+        score_only = NOTE_COUNT / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for note_ids, created_days, emotion_known, records in batches:
+            counts, turns = memory_features(note_ids, records)
+            compute_weight_scores(created_days, emotion_known, counts, turns, 7.0)
+        with_memory = NOTE_COUNT / (time.perf_counter() - start)
+
+        print(f"{batch_size:>8} {score_only:>14,.0f} {with_memory:>20,.0f}")
+
+
+# ========================================
+# 主程序
+# ========================================
+
+if __name__ == "__main__":
+    run_benchmark()
+
+    print("\n基准测试完成！")
+    print("=" * 72)
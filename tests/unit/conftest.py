@@ -0,0 +1,36 @@
+"""
+单元测试公共配置
+在导入 app 之前设置环境变量: 使用内存存储后端, 关闭后台任务与外部依赖
+"""
+
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("SPATIAL_INDEX_ENABLED", "false")
+os.environ.setdefault("WRITE_BEHIND_ENABLED", "false")
+os.environ.setdefault("COLD_ARCHIVE_ENABLED", "false")
+
+
+@pytest.fixture(scope="session")
+def event_loop_runner():
+    """会话级事件循环: 返回在该循环中执行协程的函数, 结束时取消遗留的后台任务"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    pending = asyncio.all_tasks(loop)
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.wait(pending))
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def bubbles_api(event_loop_runner):
+    """app.api.v1.bubbles (导入时会话管理器启动后台任务, 需要运行中的事件循环)"""
+    async def load():
+        from app.api.v1 import bubbles
+        return bubbles
+    return event_loop_runner(load())
@@ -0,0 +1,31 @@
+"""
+空间索引增量同步拉取测试 (内存存储后端)
+"""
+
+from app.core import database
+
+WATERMARK = "2099-01-01T00:00:00+00:00"  # 晚于其它测试写入的笔记
+
+
+def note(note_id: int, update_time: str) -> dict:
+    return {
+        "id": note_id, "user_id": 1, "note_type": 1, "content": "n", "gps_longitude": 120.15,
+        "gps_latitude": 30.27, "status": 1, "is_valid": 1, "emotion": "平静", "weight_score": 0.0,
+        "create_time": WATERMARK, "update_time": update_time,
+    }
+
+
+def test_pages_past_rows_sharing_the_watermark(monkeypatch, event_loop_runner):
+    monkeypatch.setattr(database.settings, "SPATIAL_INDEX_BATCH_SIZE", 3)
+    # 批量更新: 7 行同一 update_time (超过一批), 之后还有更新的行
+    rows = [note(9300 + i, WATERMARK) for i in range(7)]
+    rows.append(note(9310, "2099-01-01T00:00:01+00:00"))
+    rows.append({**note(9311, "2099-01-01T00:00:02+00:00"), "is_valid": 0})  # 失效的行也要同步
+    database.db.load_rows("bubble_note", rows)
+
+    changes = event_loop_runner(database._fetch_bubble_changes(WATERMARK))
+    assert [row["id"] for row in changes] == [row["id"] for row in rows]
+
+
+def test_no_watermark_means_no_incremental_sync(event_loop_runner):
+    assert event_loop_runner(database._fetch_bubble_changes(None)) == []
@@ -0,0 +1,156 @@
+"""
+熔断器单元测试
+覆盖状态机 (关闭 -> 打开 -> 半开 -> 关闭/打开) 与被取消的探测请求
+"""
+
+import asyncio
+
+import pytest
+
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def tripped_breaker(clock: FakeClock) -> CircuitBreaker:
+    """连续失败达到阈值并度过冷却期, 下一次调用即为半开探测"""
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_seconds=10)
+    breaker.record_failure(RuntimeError("a"))
+    breaker.record_failure(RuntimeError("b"))
+    assert breaker.state == STATE_OPEN
+    clock.now += 10
+    return breaker
+
+
+def test_opens_after_threshold_and_rejects(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_seconds=10)
+    breaker.record_failure(RuntimeError("a"))
+    assert breaker.state == STATE_CLOSED and breaker.allow_request()
+
+    breaker.record_failure(RuntimeError("b"))
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+    assert breaker.get_stats()["rejected"] == 1
+    assert breaker.get_stats()["last_error"] == "b"
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_seconds=10)
+    breaker.record_failure(RuntimeError("a"))
+    breaker.record_success()
+    breaker.record_failure(RuntimeError("b"))
+    assert breaker.state == STATE_CLOSED
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = tripped_breaker(clock)
+    assert breaker.allow_request()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = tripped_breaker(clock)
+    assert breaker.allow_request()
+    breaker.record_failure(RuntimeError("still down"))
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 10
+    assert breaker.allow_request()
+
+
+def test_trip_uses_custom_duration(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, recovery_seconds=10)
+    breaker.trip(60, reason="missing function")
+    clock.now += 30
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
+    assert breaker.get_stats()["trips"] == 1
+
+
+def test_release_frees_half_open_probe(clock):
+    breaker = tripped_breaker(clock)
+    assert breaker.allow_request()
+    breaker.release()  # 探测被取消: 既无成功也无失败
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_cancelled_probe_does_not_wedge_breaker(clock):
+    breaker = tripped_breaker(clock)
+
+    async def probe():
+        if not breaker.allow_request():
+            return "fallback"
+        try:
+            await asyncio.sleep(10)
+            breaker.record_success()
+            return "rpc"
+        except Exception:
+            breaker.record_failure()
+            return "fallback"
+        finally:
+            breaker.release()
+
+    async def main():
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        assert await probe() == "fallback"  # 探测进行中, 其余请求降级
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.allow_request()
+
+
+def test_cancelled_nearby_rpc_releases_probe(clock, monkeypatch):
+    from app.core import database
+
+    breaker = database.nearby_rpc_breaker
+    monkeypatch.setattr(breaker, "state", STATE_OPEN)
+    monkeypatch.setattr(breaker, "_open_until", clock.now)
+    monkeypatch.setattr(breaker, "_probing", False)
+    monkeypatch.setattr(database, "geo_tile_cache", None)
+    monkeypatch.setattr(database, "spatial_index", None)
+
+    started = asyncio.Event()
+
+    async def hanging_rpc(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(database, "_call_nearby_rpc", hanging_rpc)
+
+    async def main():
+        task = asyncio.create_task(database._query_nearby_bubbles(120.15, 30.27, 1.0, 5, None, None))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
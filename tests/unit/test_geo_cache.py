@@ -0,0 +1,185 @@
+"""
+地理瓦片缓存单元测试
+覆盖瓦片命中/加载、精确过滤与分页、热点瓦片与大范围查询旁路、过期与淘汰、写入失效 (含加载进行中的失效)
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from app.core import database
+from app.core.geo_cache import GeoTileCache
+from app.utils.geo import rank_by_distance
+
+CENTER = (120.155, 30.275)
+
+
+class Loader:
+    """按瓦片范围从内存行中取数, 记录调用次数; gate 不为空时等待放行后再返回"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self.gate = None
+
+    async def __call__(self, bounds, max_rows):
+        self.calls += 1
+        min_lon, max_lon, min_lat, max_lat = bounds
+        rows = [
+            dict(r) for r in self.rows
+            if min_lon <= r["gps_longitude"] < max_lon and min_lat <= r["gps_latitude"] < max_lat
+        ]
+        if self.gate is not None:
+            await self.gate.wait()
+        return rows[:max_rows]
+
+
+def make_cache(**kwargs) -> GeoTileCache:
+    options = dict(tile_deg=0.01, ttl_seconds=60, max_tiles=100, max_rows_per_tile=500, max_tiles_per_query=16)
+    options.update(kwargs)
+    return GeoTileCache(**options)
+
+
+def make_rows(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    return [{
+        "id": i, "gps_longitude": CENTER[0] + rng.uniform(-0.02, 0.02),
+        "gps_latitude": CENTER[1] + rng.uniform(-0.02, 0.02), "status": rng.choice([1, 2]),
+    } for i in range(1, count + 1)]
+
+
+def query(cache, loader, radius_km=1.0, limit=20, status=None, after=None, center=CENTER):
+    return asyncio.run(cache.query(*center, radius_km, limit, status, loader, after))
+
+
+def expected(rows, radius_km, limit, status=None, after=None):
+    rows = [r for r in rows if status is None or r["status"] == status]
+    return [r["id"] for r in rank_by_distance(rows, *CENTER, radius_km, limit, after)]
+
+
+def test_second_query_is_served_from_cache():
+    rows = make_rows(300)
+    cache, loader = make_cache(), Loader(rows)
+    first = query(cache, loader)
+    calls = loader.calls
+    assert calls > 0
+    assert [r["id"] for r in first] == expected(rows, 1.0, 20)
+
+    second = query(cache, loader)
+    assert loader.calls == calls
+    assert [r["id"] for r in second] == [r["id"] for r in first]
+    assert cache.get_stats()["tile_hits"] == calls
+
+
+@pytest.mark.parametrize("status", [None, 1, 2])
+def test_pages_match_brute_force(status):
+    rows = make_rows(300)
+    cache, loader = make_cache(), Loader(rows)
+    seen, after = [], None
+    while True:
+        page = query(cache, loader, radius_km=1.5, limit=13, status=status, after=after)
+        if not page:
+            break
+        seen += [r["id"] for r in page]
+        after = (page[-1]["distance_meters"], page[-1]["id"])
+    assert seen == expected(rows, 1.5, len(rows), status)
+
+
+def test_large_query_and_hot_tiles_bypass_cache():
+    rows = make_rows(300)
+    cache, loader = make_cache(max_tiles_per_query=2), Loader(rows)
+    assert query(cache, loader, radius_km=5.0) is None
+    assert loader.calls == 0
+
+    cache, loader = make_cache(max_rows_per_tile=5), Loader(rows)
+    assert query(cache, loader) is None
+    calls = loader.calls
+    assert query(cache, loader) is None  # 热点瓦片在有效期内直接旁路, 不再加载
+    assert loader.calls == calls
+    assert cache.get_stats()["queries_bypassed"] == 2
+
+
+def test_expired_tiles_reload_and_lru_evicts(monkeypatch):
+    from app.core import geo_cache as geo_cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(geo_cache_module.time, "monotonic", lambda: now[0])
+    rows = make_rows(50)
+    cache, loader = make_cache(ttl_seconds=10), Loader(rows)
+    query(cache, loader, radius_km=0.1)
+    calls = loader.calls
+    now[0] += 11
+    query(cache, loader, radius_km=0.1)
+    assert loader.calls == 2 * calls
+
+    cache = make_cache(max_tiles=1)
+    query(cache, loader, radius_km=0.1, center=(121.005, 31.005))
+    query(cache, loader, radius_km=0.1, center=(122.005, 31.005))
+    assert cache.get_stats()["tiles"] == 1 and cache.get_stats()["evictions"] == 1
+
+
+def test_invalidate_note_and_point_drop_affected_tile():
+    rows = make_rows(100)
+    cache, loader = make_cache(), Loader(rows)
+    query(cache, loader)
+    tiles = cache.get_stats()["tiles"]
+
+    note = next(r for r in rows if r["id"] in cache._note_tiles)
+    cache.invalidate_note(note["id"])
+    assert cache.get_stats()["tiles"] == tiles - 1
+    assert note["id"] not in cache._note_tiles
+
+    cache.invalidate_point(CENTER[0], CENTER[1])
+    assert cache.get_stats()["invalidations"] == 2
+
+
+def test_invalidation_during_load_is_not_cached():
+    rows = make_rows(100)
+    cache, loader = make_cache(), Loader(rows)
+
+    async def run():
+        loader.gate = asyncio.Event()
+        task = asyncio.create_task(cache.query(*CENTER, 0.1, 20, None, loader))
+        await asyncio.sleep(0)
+        # 加载中的瓦片尚未登记笔记, 按 id 失效无效, 需按坐标失效
+        cache.invalidate_note(rows[0]["id"])
+        cache.invalidate_point(*CENTER)
+        loader.gate.set()
+        return await task
+
+    assert asyncio.run(run()) is not None  # 本次结果可以使用
+    calls = loader.calls
+    loader.gate = None
+    query(cache, loader, radius_km=0.1)
+    assert loader.calls > calls  # 但没有写入缓存
+
+
+def test_deleted_note_is_not_cached_by_in_flight_tile_load(monkeypatch, event_loop_runner):
+    lon, lat = 100.5005, 10.5005  # 独立的瓦片
+    note = event_loop_runner(database.create_bubble_note({
+        "user_id": 4242, "note_type": 2, "content": "x", "gps_longitude": lon, "gps_latitude": lat, "status": 1,
+    }))
+    database.geo_tile_cache.clear()
+
+    load = database._load_bubble_tile
+    gate = asyncio.Event()
+
+    async def slow_load(bounds, max_rows):
+        rows = await load(bounds, max_rows)  # 在删除提交之前读到
+        await gate.wait()
+        return rows
+
+    monkeypatch.setattr(database, "_load_bubble_tile", slow_load)
+
+    async def run():
+        task = asyncio.create_task(database.get_nearby_bubbles(lon, lat, 0.5, 5))
+        await asyncio.sleep(0.01)
+        assert await database.delete_bubble_note(note["id"], 4242)
+        gate.set()
+        await task
+
+    event_loop_runner(run())
+    monkeypatch.setattr(database, "_load_bubble_tile", load)
+    after = event_loop_runner(database.get_nearby_bubbles(lon, lat, 0.5, 5))
+    assert note["id"] not in [r["id"] for r in after]
@@ -0,0 +1,172 @@
+"""
+Top 排行榜单元测试
+覆盖加载与分页、增量维护、加载期间写入日志的重放与丢弃、容量与末位之后的写入、用户榜淘汰与过期、对账偏差
+"""
+
+import pytest
+
+from app.core import leaderboard as leaderboard_module
+from app.core.leaderboard import Leaderboard
+
+COLUMNS = ("id", "user_id", "weight_score", "status", "is_valid")
+
+
+def note(id, score, user_id=1, status=1):
+    return {"id": id, "user_id": user_id, "weight_score": score, "status": status, "is_valid": 1}
+
+
+def ranked(rows):
+    return sorted(rows, key=lambda r: (r["weight_score"], r["id"]), reverse=True)
+
+
+def load(board, rows, user_id=None):
+    capacity = board.capacity if user_id is None else board.user_capacity
+    journal = board.begin_load(user_id)
+    return board.store(user_id, ranked(rows)[:capacity], journal)
+
+
+def ids(rows):
+    return [r["id"] for r in rows]
+
+
+def make_board(**kwargs) -> Leaderboard:
+    options = dict(capacity=5, user_capacity=3, max_users=2, ttl_seconds=60, min_size=3)
+    options.update(kwargs)
+    return Leaderboard(COLUMNS, **options)
+
+
+def test_page_before_load_misses():
+    board = make_board()
+    assert board.needs_load()
+    assert board.page(3) is None
+    assert board.get_stats()["misses"] == 1
+
+
+def test_pages_follow_score_then_id_descending():
+    board = make_board(capacity=10)
+    rows = [note(1, 0.5), note(2, 0.9), note(3, 0.5), note(4, 0.1)]
+    load(board, rows)
+    assert not board.needs_load()
+    assert ids(board.page(2)) == [2, 3]
+    assert ids(board.page(2, after=(0.5, 3))) == [1, 4]
+    # 榜单包含全部笔记时, 翻到末尾返回空页而不是回源
+    assert board.page(2, after=(0.1, 4)) == []
+
+
+def test_page_beyond_bounded_board_falls_back_to_database():
+    board = make_board(capacity=3)
+    load(board, [note(i, i / 10) for i in range(1, 6)])
+    assert ids(board.page(3)) == [5, 4, 3]
+    assert board.page(1, after=(0.3, 3)) is None
+
+
+def test_incremental_upsert_update_remove():
+    board = make_board(capacity=10)
+    load(board, [note(1, 0.5), note(2, 0.4)])
+
+    board.upsert({**note(3, 0.6), "content": "不在榜单列中"})
+    assert ids(board.page(10)) == [3, 1, 2]
+    assert "content" not in board.page(1)[0]
+
+    board.apply_update(2, {"user_id": 1, "weight_score": 0.9})
+    assert ids(board.page(10)) == [2, 3, 1]
+
+    board.apply_update(3, {"user_id": 1, "status": 2})  # 改为私有
+    board.remove(1, user_id=1)
+    assert ids(board.page(10)) == [2]
+
+
+def test_writes_below_last_place_are_not_admitted():
+    board = make_board(capacity=3, min_size=0)
+    load(board, [note(i, i / 10) for i in range(1, 6)])  # 榜单为 5, 4, 3
+    board.upsert(note(9, 0.05))
+    assert ids(board.page(3)) == [5, 4, 3]
+
+    board.upsert(note(8, 0.45))  # 挤掉末位
+    assert ids(board.page(3)) == [5, 8, 4]
+
+
+def test_removal_below_min_size_expires_board():
+    board = make_board(capacity=3, min_size=3)
+    load(board, [note(i, i / 10) for i in range(1, 6)])
+    board.remove(5, user_id=1)
+    assert board.needs_load()
+    assert board.page(1) is None
+
+
+def test_private_to_public_update_without_full_columns_expires_board():
+    board = make_board(capacity=10)
+    load(board, [note(1, 0.5)])
+    board.apply_update(2, {"user_id": 1, "status": 1, "weight_score": 0.7})
+    assert board.needs_load()
+
+
+def test_writes_during_load_are_replayed_over_stale_rows():
+    board = make_board(capacity=10)
+    journal = board.begin_load()
+    stale = ranked([note(1, 0.5), note(2, 0.4), note(3, 0.3)])  # 数据库结果读取于写入之前
+    board.upsert(note(4, 0.8))
+    board.apply_update(2, {"user_id": 1, "weight_score": 0.9})
+    board.remove(3, user_id=1)
+    board.store(None, stale, journal)
+    assert ids(board.page(10)) == [2, 4, 1]
+
+
+def test_user_load_journal_only_records_that_users_writes():
+    board = make_board()
+    journal = board.begin_load(user_id=7)
+    board.upsert(note(1, 0.5, user_id=8))
+    board.upsert(note(2, 0.5, user_id=7))
+    board.remove(3)  # 用户未知的删除对所有榜单生效
+    assert [op for op, _ in journal] == ["upsert", "remove"]
+    assert journal[0][1]["id"] == 2
+
+
+def test_abort_load_discards_journal():
+    board = make_board()
+    journal = board.begin_load()
+    board.abort_load(journal)
+    board.upsert(note(1, 0.5))
+    assert journal == []
+
+
+def test_user_boards_use_user_capacity_and_lru_eviction():
+    board = make_board(user_capacity=2, max_users=2)
+    load(board, [note(i, i / 10, user_id=7) for i in range(1, 4)], user_id=7)
+    assert ids(board.page(2, user_id=7)) == [3, 2]
+    assert board.page(3, user_id=7) is None
+
+    load(board, [note(10, 0.5, user_id=8)], user_id=8)
+    board.page(1, user_id=7)  # 用户 7 最近使用
+    load(board, [note(20, 0.5, user_id=9)], user_id=9)
+    assert board.needs_load(user_id=8) and not board.needs_load(user_id=7)
+    assert board.get_stats()["evictions"] == 1
+
+
+def test_user_boards_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(leaderboard_module.time, "monotonic", lambda: now[0])
+    board = make_board(ttl_seconds=10)
+    load(board, [note(1, 0.5, user_id=7)], user_id=7)
+    load(board, [note(1, 0.5, user_id=7)])
+    now[0] += 11
+    assert board.needs_load(user_id=7)
+    assert not board.needs_load()  # 全局榜由后台对账重新加载, 不过期
+
+
+def test_store_reports_drift_against_previous_board():
+    board = make_board(capacity=10)
+    assert load(board, [note(1, 0.5), note(2, 0.4)]) == 0
+    assert load(board, [note(1, 0.5), note(3, 0.6), note(4, 0.1)]) == 2
+    board.record_reconcile(2)
+    stats = board.get_stats()
+    assert stats["reconciles"] == 1 and stats["last_drift"] == 2 and stats["loads"] == 2
+
+
+@pytest.mark.parametrize("user_id", [None, 7])
+def test_board_excludes_private_rows_on_replay(user_id):
+    board = make_board(capacity=10, user_capacity=10)
+    journal = board.begin_load(user_id)
+    board.upsert(note(1, 0.9, user_id=7, status=2))
+    board.store(user_id, [note(2, 0.5, user_id=7)], journal)
+    assert ids(board.page(10, user_id=user_id)) == [2]
@@ -0,0 +1,141 @@
+"""
+地灵记忆网格索引单元测试
+覆盖查找/回填/负缓存、写入路径 offer、加载期间的写入日志合并与时间排序
+"""
+
+import pytest
+
+from app.core import memory_index as memory_index_module
+from app.core.memory_index import PlaceMemoryIndex, _merge_latest
+
+LON, LAT = 120.155, 30.275
+TYPE = 5
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(memory_index_module.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+def make_index(**kwargs) -> PlaceMemoryIndex:
+    options = dict(cell_deg=0.01, radius_km=1.0, ttl_seconds=60, negative_ttl_seconds=10, max_entries=100, depth=3)
+    options.update(kwargs)
+    return PlaceMemoryIndex(**options)
+
+
+def memory(record_id: int, process_time: str, lon: float = LON, lat: float = LAT) -> dict:
+    return {
+        "id": record_id, "ai_process_type": TYPE, "gps_longitude": lon, "gps_latitude": lat,
+        "process_time": process_time,
+    }
+
+
+def ids(records) -> list:
+    return [r["id"] for r in records]
+
+
+def test_lookup_miss_store_hit_and_copy(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+    assert index.lookup(key) == (False, [])
+
+    index.store(key, [memory(1, "2025-01-01T00:00:00+00:00")], index.begin_load(key))
+    found, records = index.lookup(key)
+    assert found and ids(records) == [1]
+
+    records[0]["id"] = 99  # 返回副本, 不影响缓存
+    assert ids(index.lookup(key)[1]) == [1]
+
+
+def test_negative_entry_expires_sooner(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+    index.store(key, [], index.begin_load(key))
+    assert index.lookup(key) == (True, [])
+    assert index.get_stats()["negative_hits"] == 1
+
+    clock.now += 11
+    assert index.lookup(key) == (False, [])
+
+
+def test_offer_updates_live_cells_only(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+    index.offer(memory(1, "2025-01-01T00:00:00+00:00"))
+    assert index.lookup(key) == (False, [])  # 未缓存的网格不创建条目
+
+    index.store(key, [], index.begin_load(key))
+    index.offer(memory(2, "2025-01-02T00:00:00+00:00"))
+    assert ids(index.lookup(key)[1]) == [2]
+
+
+def test_offer_reaches_neighbouring_cells_within_radius(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+    index.store(key, [], index.begin_load(key))
+
+    # 相邻网格中但在检索范围 (网格 + 1km) 内的记忆
+    _, max_lon, _, _ = index.region(key)
+    index.offer(memory(3, "2025-01-03T00:00:00+00:00", lon=max_lon - 0.001))
+    assert ids(index.lookup(key)[1]) == [3]
+
+
+def test_offer_during_pending_load_survives_stale_result(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+
+    journal = index.begin_load(key)
+    index.offer(memory(5, "2025-01-05T00:00:00+00:00"))  # 加载进行中写入
+    stored = index.store(key, [], journal)  # 落后的只读副本返回空结果
+
+    assert ids(stored) == [5]
+    assert ids(index.lookup(key)[1]) == [5]
+    assert index._journals == []
+
+
+def test_offer_for_other_type_or_far_away_is_not_journaled(clock):
+    index = make_index()
+    key = index.key_for(LON, LAT, TYPE)
+
+    journal = index.begin_load(key)
+    index.offer({**memory(6, "2025-01-06T00:00:00+00:00"), "ai_process_type": TYPE + 1})
+    index.offer(memory(7, "2025-01-07T00:00:00+00:00", lon=LON + 1.0))
+    assert journal == []
+    index.abort_load(journal)
+    assert index._journals == []
+
+
+def test_store_merges_with_live_entry_and_truncates_to_depth(clock):
+    index = make_index(depth=2)
+    key = index.key_for(LON, LAT, TYPE)
+    index.store(key, [memory(1, "2025-01-01T00:00:00+00:00")], index.begin_load(key))
+    index.offer(memory(3, "2025-01-03T00:00:00+00:00"))
+
+    stored = index.store(key, [memory(2, "2025-01-02T00:00:00+00:00")], index.begin_load(key))
+    assert ids(stored) == [3, 2]
+
+
+def test_max_entries_evicts_least_recently_used(clock):
+    index = make_index(max_entries=2)
+    keys = [index.key_for(LON + i * 0.01, LAT, TYPE) for i in range(3)]
+    for key in keys:
+        index.store(key, [], index.begin_load(key))
+    assert index.lookup(keys[0]) == (False, [])
+    assert index.get_stats()["evictions"] == 1
+
+
+def test_merge_latest_orders_by_parsed_time():
+    # 小数秒位数与时区写法不同: 按字符串比较时 "00Z" 排在 "00.5+00:00" 之前
+    current = [memory(1, "2025-01-01T00:00:00.123456+00:00"), memory(2, "2025-01-01T00:00:00.5+00:00")]
+    incoming = [memory(3, "2025-01-01T00:00:00Z"), memory(4, "2025-01-01T00:00:00.3+00:00")]
+    assert ids(_merge_latest(current, incoming, 3)) == [2, 4, 1]
+
+
+def test_merge_latest_breaks_ties_by_id_and_handles_missing_time():
+    merged = _merge_latest([memory(1, "2025-01-01T00:00:00+00:00"), memory(2, None)],
+                           [memory(3, "2025-01-01T00:00:00.000+00:00")], 3)
+    assert ids(merged) == [3, 1, 2]
@@ -0,0 +1,104 @@
+"""
+地灵记忆排序单元测试
+覆盖记录解析、距离 / 时间 / 情感打分、多样性惩罚、缺失字段、字数预算打包
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.services.memory_ranker import (
+    PlaceMemory,
+    parse_memories,
+    rank_memories,
+    pack_memories,
+    build_memory_context,
+    MEMORY_HEADER,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+LON, LAT = 120.15, 30.27
+
+
+def memory(id, bubble_id=None, user_id=None, dlat=0.0, days=0.0, emotion=None, summary=None, coords=True):
+    return PlaceMemory(
+        id=id, bubble_id=bubble_id, user_id=user_id, summary=summary or f"记忆{id}",
+        longitude=LON if coords else None, latitude=LAT + dlat if coords else None,
+        process_time=NOW - timedelta(days=days) if days is not None else None, emotion=emotion,
+    )
+
+
+def rank(memories, limit=10, emotion=None):
+    return [m.id for m in rank_memories(memories, LON, LAT, 1.0, 30.0, limit, emotion=emotion, now=NOW)]
+
+
+def test_parse_memories_reads_json_and_plain_text_and_skips_empty():
+    records = [
+        {"id": 1, "ai_result": json.dumps({"summary": " 湖边散步 ", "emotion": "calm", "turns": 3}),
+         "gps_longitude": LON, "gps_latitude": LAT, "process_time": "2026-01-01T00:00:00Z"},
+        {"id": 2, "ai_result": "纯文本记忆"},
+        {"id": 3, "ai_result": ""},
+        {"ai_result": "缺少 id"},
+    ]
+    parsed = parse_memories(records)
+    assert [m.id for m in parsed] == [1, 2]
+    assert parsed[0].summary == "湖边散步" and parsed[0].emotion == "calm" and parsed[0].turns == 3
+    assert parsed[0].process_time == NOW
+    assert parsed[1].summary == "纯文本记忆" and parsed[1].process_time is None
+
+
+def test_nearer_and_newer_memories_rank_first():
+    assert rank([memory(1, dlat=0.01), memory(2, dlat=0.001)]) == [2, 1]
+    assert rank([memory(1, days=90), memory(2, days=1)]) == [2, 1]
+
+
+def test_matching_emotion_beats_unknown_beats_different():
+    memories = [memory(1, emotion="sad"), memory(2), memory(3, emotion="happy")]
+    assert rank(memories, emotion="happy") == [3, 2, 1]
+
+
+def test_missing_coordinates_or_time_score_zero():
+    complete = memory(1, dlat=0.005, days=10)
+    assert rank([memory(2, coords=False, days=10), complete]) == [1, 2]
+    assert rank([memory(3, dlat=0.005, days=None), complete]) == [1, 3]
+
+
+def test_same_bubble_is_pushed_down_by_diversity_penalty():
+    # 2 与 1 同一气泡, 虽然基础分高于 3 也应排在 3 之后
+    memories = [
+        memory(1, bubble_id=10, dlat=0.0),
+        memory(2, bubble_id=10, dlat=0.002),
+        memory(3, bubble_id=11, dlat=0.003),
+    ]
+    assert rank(memories) == [1, 3, 2]
+
+
+def test_same_user_and_nearby_memories_are_penalised():
+    memories = [
+        memory(1, user_id=5, dlat=0.0),
+        memory(2, user_id=5, dlat=0.002),
+        memory(3, user_id=6, dlat=0.003),
+    ]
+    assert rank(memories) == [1, 3, 2]
+
+    # 与已选记忆位置几乎重合 (相距约 1 米) 的候选也会被压后
+    stacked = [memory(1, dlat=0.0), memory(2, dlat=0.00001), memory(3, dlat=0.003)]
+    assert rank(stacked) == [1, 3, 2]
+
+
+def test_limit_and_empty_input():
+    memories = [memory(i, dlat=i * 0.01) for i in range(1, 6)]
+    assert rank(memories, limit=2) == [1, 2]
+    assert rank([]) == [] and rank(memories, limit=0) == []
+
+
+def test_pack_memories_respects_budget_and_truncates_first():
+    memories = [memory(1, summary="a" * 6), memory(2, summary="b" * 6), memory(3, summary="c" * 3)]
+    assert pack_memories(memories, 10) == ["a" * 6, "c" * 3]
+    assert pack_memories(memories, 4) == ["aaa…"]
+    assert pack_memories(memories, 1) == []
+
+
+def test_build_memory_context():
+    assert build_memory_context([]) is None
+    assert build_memory_context(["湖边"]) == f"{MEMORY_HEADER}湖边"
+    assert build_memory_context(["湖边", "桥上"]) == f"{MEMORY_HEADER}\n1. 湖边\n2. 桥上"
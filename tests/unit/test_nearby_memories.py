@@ -0,0 +1,56 @@
+"""
+附近地灵记忆检索测试 (内存存储后端): 网格索引与边界框两条路径都只返回半径内的记忆
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core import database
+from app.core.config import settings
+from app.utils.geo import haversine_m
+
+ORIGIN = (121.4000, 31.2000)
+AI_PROCESS_TYPE = 77  # 独立的处理类型, 不与其它测试的数据混在一起
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seed():
+    now = datetime.now(timezone.utc)
+    # (经度, 纬度) 偏移 (度): 约 0.19 / 0.57 / 1.14 / 1.71 公里, 以及 0.5 公里边界框角上约 0.62 公里的一条
+    offsets = [(0.002, 0.0), (0.006, 0.0), (0.012, 0.0), (0.018, 0.0), (0.0045, 0.004)]
+    rows = [{
+        "id": 7700 + i, "bubble_id": 7700 + i, "user_id": 1, "ai_process_type": AI_PROCESS_TYPE,
+        "ai_result": "{}", "model_version": "m", "is_effective": 1,
+        "gps_longitude": ORIGIN[0] + offset[0], "gps_latitude": ORIGIN[1] + offset[1],
+        "process_time": (now - timedelta(minutes=i)).isoformat(),
+    } for i, offset in enumerate(offsets)]
+    database.db.load_rows("genius_loci_record", rows)
+    database.memory_index.clear()
+    return rows
+
+
+def expected(rows, radius_km):
+    distances = haversine_m(*ORIGIN, [r["gps_longitude"] for r in rows], [r["gps_latitude"] for r in rows])
+    return [r["id"] for r, d in zip(rows, distances) if d <= radius_km * 1000.0]
+
+
+def test_index_path_drops_records_beyond_radius(seed, event_loop_runner):
+    radius_km = settings.MEMORY_INDEX_RADIUS_KM
+    records = event_loop_runner(database.get_nearby_genius_loci_memories(
+        *ORIGIN, radius_km=radius_km, ai_process_type=AI_PROCESS_TYPE, limit=settings.MEMORY_INDEX_DEPTH
+    ))
+    assert [r["id"] for r in records] == expected(seed, radius_km)
+
+    # 第二次命中网格缓存, 结果相同
+    again = event_loop_runner(database.get_nearby_genius_loci_memories(
+        *ORIGIN, radius_km=radius_km, ai_process_type=AI_PROCESS_TYPE, limit=settings.MEMORY_INDEX_DEPTH
+    ))
+    assert [r["id"] for r in again] == [r["id"] for r in records]
+
+
+def test_bounding_box_path_drops_corners(seed, event_loop_runner):
+    records = event_loop_runner(database.get_nearby_genius_loci_memories(
+        *ORIGIN, radius_km=0.5, ai_process_type=AI_PROCESS_TYPE, limit=10
+    ))
+    assert [r["id"] for r in records] == expected(seed, 0.5)
@@ -0,0 +1,89 @@
+"""
+键集分页工具单元测试
+覆盖游标编解码、查询条件校验、分页切分、PostgREST 键集条件与按距离分页的容差
+"""
+
+import numpy as np
+import pytest
+
+from app.utils.geo import nearest_order
+from app.utils.pagination import (
+    CURSOR_TOP,
+    CURSOR_NEARBY,
+    CURSOR_RECORDS,
+    encode_cursor,
+    decode_cursor,
+    split_page,
+    top_key,
+    nearby_key,
+    records_key,
+    keyset_filter,
+)
+
+
+def test_cursor_round_trip():
+    key = ("2026-01-01T08:00:00.5+08:00", 42)
+    cursor = encode_cursor(CURSOR_RECORDS, key, scope=[7, None])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, CURSOR_RECORDS, scope=[7, None]) == key
+    assert decode_cursor(encode_cursor(CURSOR_TOP, (0.5, 3)), CURSOR_TOP) == (0.5, 3)
+    assert decode_cursor(None, CURSOR_TOP) is None and decode_cursor("", CURSOR_TOP) is None
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", "W10", encode_cursor(CURSOR_NEARBY, (1.0, 2))])
+def test_invalid_or_foreign_cursor_raises(cursor):
+    # 非法编码 / {} / [] / 其它类型的游标
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, CURSOR_TOP)
+
+
+def test_scope_mismatch_raises():
+    cursor = encode_cursor(CURSOR_NEARBY, (10.0, 1), scope=[120.15, 30.27, 1.0])
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, CURSOR_NEARBY, scope=[120.15, 30.27, 2.0])
+
+
+def test_split_page():
+    rows = [{"id": i, "weight_score": 1.0 - i / 10} for i in range(1, 5)]
+    page, cursor = split_page(rows, 4, CURSOR_TOP, top_key)
+    assert page == rows and cursor is None
+
+    page, cursor = split_page(rows, 3, CURSOR_TOP, top_key, scope=[None])
+    assert page == rows[:3]
+    assert decode_cursor(cursor, CURSOR_TOP, scope=[None]) == (0.7, 3)
+
+
+def test_sort_keys():
+    row = {"id": 5, "weight_score": 0.9, "distance_meters": 12.5, "process_time": "2026-01-01T00:00:00Z"}
+    assert top_key(row) == (0.9, 5)
+    assert nearby_key(row) == (12.5, 5)
+    assert records_key(row) == ("2026-01-01T00:00:00Z", 5)
+
+
+def test_keyset_filter_quotes_values():
+    assert keyset_filter("weight_score", 0.5, 3, descending=True) == (
+        'weight_score.lt."0.5",and(weight_score.eq."0.5",id.lt.3)'
+    )
+    assert keyset_filter("update_time", "2026-01-01T00:00:00.5+00:00", "7", descending=False) == (
+        'update_time.gt."2026-01-01T00:00:00.5+00:00",'
+        'and(update_time.eq."2026-01-01T00:00:00.5+00:00",id.gt.7)'
+    )
+    assert keyset_filter("c", 'a"b\\', 1, descending=True) == 'c.lt."a\\"b\\\\",and(c.eq."a\\"b\\\\",id.lt.1)'
+
+
+def test_nearest_order_pages_without_gaps_or_duplicates_under_float_noise():
+    rng = np.random.default_rng(5)
+    ids = np.arange(1, 101)
+    # 大量并列距离; 游标中的距离经过序列化 / 重新计算会带有微小误差
+    distances = rng.choice([10.0, 20.0, 30.0], size=len(ids))
+    seen, after = [], None
+    while True:
+        page = nearest_order(distances, ids, 7, after)
+        if len(page) == 0:
+            break
+        seen += ids[page].tolist()
+        last = page[-1]
+        noise = rng.uniform(-1e-6, 1e-6)
+        after = (float(distances[last]) + noise, int(ids[last]))
+    assert sorted(seen) == ids.tolist()
+    assert len(seen) == len(set(seen))
@@ -0,0 +1,81 @@
+"""
+地灵 AI 处理记录列表的游标分页测试 (内存存储后端)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import database
+from app.utils.pagination import CURSOR_RECORDS, encode_cursor
+
+NOTE_ID = 9101
+OWNER_ID = 9101
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seed():
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    database.db.load_rows("bubble_note", [{
+        "id": NOTE_ID, "user_id": OWNER_ID, "note_type": 1, "content": "n", "gps_longitude": 120.15,
+        "gps_latitude": 30.27, "status": 1, "is_valid": 1, "emotion": "平静", "weight_score": 0.0,
+        "create_time": (base - timedelta(days=1)).isoformat(), "update_time": base.isoformat(),
+    }])
+    rows = []
+    for i in range(7):
+        # 成对的相同处理时间, 翻页依赖 id 打破并列
+        moment = base + timedelta(minutes=i // 2)
+        rows.append({
+            "id": 9100 + i, "bubble_id": NOTE_ID, "user_id": OWNER_ID, "ai_process_type": 5 if i % 2 else 1,
+            "ai_result": f"r{i}", "model_version": "m", "is_effective": 1,
+            "gps_longitude": 120.15, "gps_latitude": 30.27, "process_time": moment.isoformat(),
+        })
+    database.db.load_rows("genius_loci_record", rows)
+    return rows
+
+
+def expected_order(rows, ai_process_type=None):
+    rows = [r for r in rows if ai_process_type is None or r["ai_process_type"] == ai_process_type]
+    return [r["id"] for r in sorted(rows, key=lambda r: (r["process_time"], r["id"]), reverse=True)]
+
+
+def collect(run_until_complete, call, **kwargs):
+    async def run():
+        ids, cursor, pages = [], None, 0
+        while True:
+            response = await call(cursor=cursor, **kwargs)
+            ids += [record.id for record in response.data]
+            pages += 1
+            cursor = response.next_cursor
+            if cursor is None:
+                return ids, pages
+    return run_until_complete(run())
+
+
+def test_note_records_pages_in_keyset_order(seed, bubbles_api, event_loop_runner):
+    ids, pages = collect(event_loop_runner, bubbles_api.get_note_records_api, note_id=NOTE_ID, user_id=OWNER_ID, limit=2)
+    assert ids == expected_order(seed)
+    assert pages == 4
+
+
+def test_user_records_pages_by_type(seed, bubbles_api, event_loop_runner):
+    ids, _ = collect(event_loop_runner, bubbles_api.get_user_records_api, user_id=OWNER_ID, ai_process_type=5, limit=2)
+    assert ids == expected_order(seed, ai_process_type=5)
+
+
+def test_note_records_require_owner(bubbles_api, event_loop_runner):
+    with pytest.raises(HTTPException) as error:
+        event_loop_runner(bubbles_api.get_note_records_api(note_id=NOTE_ID, user_id=OWNER_ID + 1))
+    assert error.value.status_code == 404
+
+
+@pytest.mark.parametrize("cursor", [
+    encode_cursor(CURSOR_RECORDS, ["2025-01-01T00:00:00+00:00", 1], [OWNER_ID, 1]),  # 条件不一致
+    encode_cursor(CURSOR_RECORDS, [123, "x"], [OWNER_ID, None]),  # 排序键类型错误
+    "garbage!!",
+])
+def test_user_records_reject_bad_cursor(cursor, bubbles_api, event_loop_runner):
+    with pytest.raises(HTTPException) as error:
+        event_loop_runner(bubbles_api.get_user_records_api(user_id=OWNER_ID, cursor=cursor))
+    assert error.value.status_code == 400
@@ -0,0 +1,244 @@
+"""
+进程内空间索引单元测试
+覆盖已排序区/追加区查询、更新与删除、重建 (含重建期间的写入日志重放)、Top 候选与增量同步
+结果与按全部有效行暴力计算的结果比对
+"""
+
+import asyncio
+import random
+import threading
+
+import pytest
+
+from app.core import spatial_index as spatial_index_module
+from app.core.spatial_index import SpatialIndex, _Store
+from app.utils.geo import rank_by_distance
+
+CENTER = (120.155, 30.275)
+CELL_DEG = 0.01
+
+
+def make_row(note_id: int, rng: random.Random, **fields) -> dict:
+    row = {
+        "id": note_id,
+        "user_id": rng.randrange(5),
+        "gps_longitude": CENTER[0] + rng.uniform(-0.03, 0.03),
+        "gps_latitude": CENTER[1] + rng.uniform(-0.03, 0.03),
+        "status": rng.choice([1, 1, 2]),
+        "weight_score": float(rng.choice([1.0, 2.5, rng.random() * 10])),
+        "is_valid": 1,
+        "update_time": f"2025-01-01T00:00:{note_id % 60:02d}+00:00",
+    }
+    row.update(fields)
+    return row
+
+
+async def batches(rows, size=50):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def load(index: SpatialIndex, rows) -> None:
+    asyncio.run(index.bootstrap(batches(rows)))
+
+
+def expected_nearby(live: dict, radius_km: float, limit: int, status=None, after=None) -> list:
+    rows = [r for r in live.values() if status is None or r["status"] == status]
+    return [r["id"] for r in rank_by_distance(rows, *CENTER, radius_km, limit, after)]
+
+
+def expected_top(live: dict, limit: int, user_id=None) -> list:
+    rows = [r for r in live.values() if r["status"] == 1 and (user_id is None or r["user_id"] == user_id)]
+    rows.sort(key=lambda r: (-r["weight_score"], -r["id"]))
+    return [r["id"] for r in rows[:limit]]
+
+
+def nearby_ids(index: SpatialIndex, radius_km: float, limit: int, status=None, after=None) -> list:
+    return [r["id"] for r in index.nearby(*CENTER, radius_km, limit, status, after)]
+
+
+@pytest.fixture
+def rng():
+    return random.Random(7)
+
+
+@pytest.fixture
+def loaded(rng):
+    rows = [make_row(i, rng) for i in range(1, 401)]
+    index = SpatialIndex(cell_deg=CELL_DEG)
+    load(index, rows)
+    return index, {r["id"]: r for r in rows}
+
+
+def test_bootstrap_skips_unindexable_rows_and_tracks_watermark(rng):
+    rows = [
+        make_row(1, rng),
+        make_row(2, rng, is_valid=0),
+        make_row(3, rng, gps_longitude=None),
+        make_row(4, rng, update_time="2025-02-01T00:00:00+00:00"),
+    ]
+    index = SpatialIndex(cell_deg=CELL_DEG)
+    assert not index.ready
+    load(index, rows)
+
+    stats = index.get_stats()
+    assert index.ready
+    assert stats["notes"] == 2 and stats["sealed_slots"] == 2
+    assert index.watermark == "2025-02-01T00:00:00+00:00"
+
+
+@pytest.mark.parametrize("radius_km,status", [(0.5, None), (1.5, None), (2.0, 1), (3.0, 2)])
+def test_nearby_matches_brute_force_in_sealed_region(loaded, radius_km, status):
+    index, live = loaded
+    assert nearby_ids(index, radius_km, 30, status) == expected_nearby(live, radius_km, 30, status)
+
+
+def test_appends_updates_and_removals_are_visible(loaded, rng):
+    index, live = loaded
+    for note_id in range(401, 461):  # 追加区
+        live[note_id] = make_row(note_id, rng)
+        index.upsert(live[note_id])
+    for note_id in rng.sample(sorted(live), 40):  # 移动位置 (旧位置失效 + 追加)
+        live[note_id] = make_row(note_id, rng)
+        index.upsert(live[note_id])
+    for note_id in rng.sample(sorted(live), 30):
+        del live[note_id]
+        index.remove(note_id)
+    invalid = rng.choice(sorted(live))
+    index.upsert({**live.pop(invalid), "is_valid": 0})  # 失效的行被移除
+
+    stats = index.get_stats()
+    assert stats["notes"] == len(live)
+    assert stats["slots"] > stats["sealed_slots"] and stats["dead_slots"] > 0
+    for radius_km in (0.5, 1.0, 2.5):
+        assert nearby_ids(index, radius_km, 50) == expected_nearby(live, radius_km, 50)
+    assert [r["id"] for r in index.top(20)] == expected_top(live, 20)
+
+
+def test_apply_update_merges_fields_and_ignores_unknown_partial_rows(loaded):
+    index, live = loaded
+    note_id = next(iter(live))
+    index.apply_update(note_id, {"weight_score": 1000.0, "status": 1})
+    assert index.top(1)[0]["id"] == note_id
+
+    index.apply_update(99999, {"weight_score": 1.0})  # 不在索引中且字段不完整
+    assert 99999 not in {r["id"] for r in index.nearby(*CENTER, 10.0, 1000)}
+
+
+def test_nearby_pages_cover_every_row_once(loaded):
+    index, live = loaded
+    seen, after = [], None
+    while True:
+        page = index.nearby(*CENTER, 2.0, 17, None, after)
+        if not page:
+            break
+        seen += [r["id"] for r in page]
+        after = (page[-1]["distance_meters"], page[-1]["id"])
+    assert seen == expected_nearby(live, 2.0, len(live))
+
+
+def test_rebuild_compacts_into_sealed_region(loaded, rng, monkeypatch):
+    monkeypatch.setattr(spatial_index_module, "_MIN_REBUILD_SLOTS", 10)
+    index, live = loaded
+    for note_id in rng.sample(sorted(live), 60):
+        live[note_id] = make_row(note_id, rng)
+        index.upsert(live[note_id])
+
+    assert asyncio.run(index.maybe_rebuild())
+    stats = index.get_stats()
+    assert stats["rebuilds"] == 1
+    assert stats["slots"] == stats["sealed_slots"] == len(live) and stats["dead_slots"] == 0
+    assert nearby_ids(index, 2.0, 100) == expected_nearby(live, 2.0, 100)
+    assert not asyncio.run(index.maybe_rebuild())  # 无失效槽位, 不再重建
+
+
+def test_writes_during_rebuild_are_replayed(loaded, rng, monkeypatch):
+    monkeypatch.setattr(spatial_index_module, "_MIN_REBUILD_SLOTS", 10)
+    index, live = loaded
+    for note_id in rng.sample(sorted(live), 60):
+        index.remove(note_id)
+        del live[note_id]
+
+    # 重建在线程池中阻塞, 期间在事件循环中写入
+    started, release = threading.Event(), threading.Event()
+    compact = _Store.compact
+
+    def slow_compact(*args):
+        started.set()
+        release.wait(5)
+        return compact(*args)
+
+    monkeypatch.setattr(_Store, "compact", staticmethod(slow_compact))
+
+    async def run():
+        task = asyncio.create_task(index.maybe_rebuild())
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+
+        moved = rng.choice(sorted(live))
+        live[moved] = make_row(moved, rng)
+        index.upsert(live[moved])
+        removed = rng.choice(sorted(live))
+        del live[removed]
+        index.remove(removed)
+        live[999] = make_row(999, rng, gps_longitude=CENTER[0], gps_latitude=CENTER[1])
+        index.upsert(live[999])
+        assert not await index.maybe_rebuild()  # 重建进行中不重入
+
+        release.set()
+        assert await task
+
+    asyncio.run(run())
+    assert index.get_stats()["notes"] == len(live)
+    assert nearby_ids(index, 3.0, 500) == expected_nearby(live, 3.0, 500)
+
+
+def test_top_pages_and_user_top(loaded):
+    index, live = loaded
+    expected = expected_top(live, len(live))
+    seen, after = [], None
+    while True:
+        page = index.top(23, after=after)
+        if not page:
+            break
+        seen += [r["id"] for r in page]
+        after = (page[-1]["weight_score"], page[-1]["id"])
+    assert seen == expected
+
+    for user_id in range(5):
+        assert [r["id"] for r in index.top(10, user_id=user_id)] == expected_top(live, 10, user_id)
+
+
+def test_top_candidates_follow_removals_and_new_leaders(loaded, rng):
+    index, live = loaded
+    leader = index.top(1)[0]["id"]
+    index.remove(leader)
+    del live[leader]
+    assert [r["id"] for r in index.top(10)] == expected_top(live, 10)
+
+    live[5000] = make_row(5000, rng, status=1, weight_score=10_000.0)
+    index.upsert(live[5000])
+    assert [r["id"] for r in index.top(10)] == expected_top(live, 10)
+
+
+def test_sync_delta_merges_only_new_versions(loaded, rng):
+    index, live = loaded
+    note_id = next(iter(live))
+    unchanged = dict(live[note_id])
+    changed = make_row(note_id + 1, rng, update_time="2026-01-01T00:00:00+00:00")
+    created = make_row(7000, rng, update_time="2026-01-01T00:00:01+00:00")
+    deleted = {**live[note_id + 2], "is_valid": 0, "update_time": "2026-01-01T00:00:02+00:00"}
+
+    calls = []
+
+    async def fetch(watermark):
+        calls.append(watermark)
+        return [unchanged, changed, created, deleted]
+
+    watermark = index.watermark
+    merged = asyncio.run(index.sync_delta(fetch))
+    assert calls == [watermark]
+    assert merged == 3
+    assert index.watermark == "2026-01-01T00:00:02+00:00"
+    ids = {r["id"] for r in index.nearby(*CENTER, 10.0, 1000)}
+    assert created["id"] in ids and deleted["id"] not in ids
@@ -0,0 +1,203 @@
+"""
+写入队列单元测试
+覆盖合并批次、暂时性错误重试、部分提交 (不重复插入)、数据错误二分、后续处理异常、背压与停止超时
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.write_behind import WriteBehindQueue, PartialWriteError
+
+
+class Transient(Exception):
+    pass
+
+
+class DataError(Exception):
+    pass
+
+
+class Store:
+    """按批写入的假表, 可按批次注入错误"""
+
+    def __init__(self):
+        self.rows = []
+        self.batches = []
+        self.failures = []  # 依次取出: 异常, 或返回异常的函数 (参数为本批行)
+        self.after = []
+
+    async def flush(self, rows):
+        self.batches.append([row["n"] for row in rows])
+        if self.failures:
+            failure = self.failures.pop(0)
+            raise failure(rows) if callable(failure) and not isinstance(failure, type) else failure
+        if any(row.get("bad") for row in rows):
+            raise DataError("违反约束")
+        written = [{**row, "id": len(self.rows) + i + 1} for i, row in enumerate(rows)]
+        self.rows += written
+        return written
+
+
+def make_queue(store, **kwargs) -> WriteBehindQueue:
+    options = dict(
+        max_batch=4, max_delay=0.01, max_pending=8, max_retries=2,
+        backoff_seconds=0.001, backoff_max_seconds=0.002, after_write=store.after.extend,
+    )
+    options.update(kwargs)
+    return WriteBehindQueue(
+        "test", store.flush,
+        is_transient=lambda e: isinstance(e, Transient),
+        is_data_error=lambda e: isinstance(e, DataError),
+        **options,
+    )
+
+
+async def submit(queue, rows):
+    futures = [await queue.put(row) for row in rows]
+    return await asyncio.gather(*futures, return_exceptions=True)
+
+
+def run(store, rows, **kwargs):
+    async def main():
+        queue = make_queue(store, **kwargs)
+        queue.start()
+        results = await submit(queue, rows)
+        await queue.stop()
+        return queue, results
+
+    return asyncio.run(main())
+
+
+def rows(count, **extra):
+    return [{"n": i, **extra} for i in range(count)]
+
+
+def test_rows_are_merged_into_batches_in_order():
+    store = Store()
+    queue, results = run(store, rows(10))
+    assert [row["n"] for row in results] == list(range(10))
+    assert [len(batch) for batch in store.batches] == [4, 4, 2]
+    assert [row["n"] for row in store.after] == list(range(10))
+    assert queue.get_stats()["written"] == 10 and queue.get_stats()["pending"] == 0
+
+
+def test_transient_errors_retry_then_fail():
+    store = Store()
+    store.failures = [Transient("超时"), Transient("超时")]
+    queue, results = run(store, rows(3))
+    assert [row["n"] for row in results] == [0, 1, 2]
+    assert queue.retries == 2 and len(store.rows) == 3
+
+    store = Store()
+    store.failures = [Transient("超时")] * 3
+    queue, results = run(store, rows(3))
+    assert all(isinstance(result, Transient) for result in results)
+    assert queue.failed == 3 and store.rows == []
+
+
+def test_unknown_errors_are_not_retried():
+    store = Store()
+    store.failures = [RuntimeError("连接中断, 提交状态未知")]
+    queue, results = run(store, rows(2))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(store.batches) == 1 and queue.retries == 0 and queue.splits == 0
+
+
+def test_partial_write_retries_only_uncommitted_rows():
+    store = Store()
+
+    def commit_first_two(batch):
+        written = {i: {**row, "id": 100 + i} for i, row in enumerate(batch[:2])}
+        store.rows += written.values()
+        return PartialWriteError(written, Transient("第三行超时"), abandoned=[3])
+
+    store.failures = [commit_first_two]
+    queue, results = run(store, rows(4))
+
+    assert [row["n"] for row in store.rows] == [0, 1, 2]  # 没有重复插入
+    assert store.batches == [[0, 1, 2, 3], [2]]
+    assert [results[0]["id"], results[1]["id"]] == [100, 101]
+    assert results[2]["n"] == 2 and isinstance(results[3], Transient)
+
+
+def test_data_error_bisects_to_the_bad_row():
+    store = Store()
+    batch = rows(4)
+    batch[2]["bad"] = True
+    queue, results = run(store, batch)
+    assert isinstance(results[2], DataError)
+    assert [results[i]["n"] for i in (0, 1, 3)] == [0, 1, 3]
+    assert sorted(row["n"] for row in store.rows) == [0, 1, 3]
+    assert queue.splits == 2 and queue.failed == 1
+
+
+def test_after_write_errors_do_not_fail_writes():
+    store = Store()
+
+    def broken(_):
+        raise ValueError("缓存不可用")
+
+    queue, results = run(store, rows(3), after_write=broken)
+    assert [row["n"] for row in results] == [0, 1, 2]
+    assert queue.failed == 0
+
+
+def test_put_blocks_at_max_pending():
+    store = Store()
+
+    async def main():
+        gate = asyncio.Event()
+        original = store.flush
+
+        async def slow_flush(batch):
+            await gate.wait()
+            return await original(batch)
+
+        queue = make_queue(store, max_batch=2, max_pending=2)
+        queue.flush = slow_flush
+        queue.start()
+        futures = [await queue.put(row) for row in rows(4)]  # 一批在途, 一批积压
+        blocked_before = queue.blocked
+        blocked = asyncio.create_task(queue.put({"n": 4}))
+        await asyncio.sleep(0.05)
+        assert not blocked.done() and queue.blocked == blocked_before + 1
+        gate.set()
+        futures.append(await blocked)
+        results = await asyncio.gather(*futures)
+        await queue.stop()
+        return results
+
+    assert [row["n"] for row in asyncio.run(main())] == [0, 1, 2, 3, 4]
+
+
+def test_put_after_stop_raises():
+    async def main():
+        queue = make_queue(Store())
+        queue.start()
+        await queue.stop()
+        with pytest.raises(RuntimeError):
+            await queue.put({"n": 0})
+
+    asyncio.run(main())
+
+
+def test_stop_timeout_fails_unwritten_rows():
+    store = Store()
+
+    async def main():
+        async def hang(batch):
+            await asyncio.sleep(10)
+
+        queue = make_queue(store, max_batch=2, max_pending=4)
+        queue.flush = hang
+        queue.start()
+        futures = [await queue.put(row) for row in rows(4)]
+        await asyncio.sleep(0.02)
+        await queue.stop(timeout=0.05)
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return queue, results
+
+    queue, results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert queue.failed == 4 and queue.get_stats()["pending"] == 0